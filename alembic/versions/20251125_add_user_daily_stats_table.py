@@ -0,0 +1,119 @@
+"""add user_daily_stats table
+
+Revision ID: 20251125_daily_stats
+Revises: 7a991754681d
+Create Date: 2025-11-25 10:00:00.000000
+
+添加学情日汇总表，学情分析接口改为读取按天预聚合的计数。
+升级后需执行一次回填：
+
+    uv run python -m src.tasks.analytics_tasks --rebuild
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "20251125_daily_stats"
+down_revision: Union[str, None] = "7a991754681d"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """创建 user_daily_stats 表"""
+
+    op.create_table(
+        "user_daily_stats",
+        sa.Column("id", sa.UUID(), nullable=False, comment="主键ID"),
+        sa.Column("user_id", sa.UUID(), nullable=False, comment="用户ID"),
+        sa.Column("stat_date", sa.Date(), nullable=False, comment="统计日期"),
+        sa.Column(
+            "subject",
+            sa.String(length=50),
+            nullable=False,
+            comment="学科（未知学科记为 unknown）",
+        ),
+        sa.Column(
+            "question_count",
+            sa.Integer(),
+            nullable=False,
+            server_default="0",
+            comment="提问数",
+        ),
+        sa.Column(
+            "image_question_count",
+            sa.Integer(),
+            nullable=False,
+            server_default="0",
+            comment="图片提问数",
+        ),
+        sa.Column(
+            "session_count",
+            sa.Integer(),
+            nullable=False,
+            server_default="0",
+            comment="新建会话数",
+        ),
+        sa.Column(
+            "mistake_count",
+            sa.Integer(),
+            nullable=False,
+            server_default="0",
+            comment="新增错题数",
+        ),
+        sa.Column(
+            "review_count",
+            sa.Integer(),
+            nullable=False,
+            server_default="0",
+            comment="完成复习数",
+        ),
+        sa.Column(
+            "tokens_used",
+            sa.Integer(),
+            nullable=False,
+            server_default="0",
+            comment="token消耗",
+        ),
+        sa.Column(
+            "created_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.func.now(),
+            nullable=False,
+            comment="创建时间",
+        ),
+        sa.Column(
+            "updated_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.func.now(),
+            nullable=False,
+            comment="更新时间",
+        ),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint(
+            "user_id", "stat_date", "subject", name="uq_user_daily_stats_key"
+        ),
+    )
+
+    op.create_index(
+        "ix_user_daily_stats_user_id", "user_daily_stats", ["user_id"], unique=False
+    )
+    op.create_index(
+        "idx_user_daily_stats_user_date",
+        "user_daily_stats",
+        ["user_id", "stat_date"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    """删除 user_daily_stats 表"""
+
+    op.drop_index("idx_user_daily_stats_user_date", table_name="user_daily_stats")
+    op.drop_index("ix_user_daily_stats_user_id", table_name="user_daily_stats")
+    op.drop_table("user_daily_stats")
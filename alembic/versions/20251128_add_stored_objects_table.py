@@ -0,0 +1,104 @@
+"""add stored_objects table
+
+Revision ID: 20251128_stored_objects
+Revises: 20251125_daily_stats
+Create Date: 2025-11-28 10:00:00.000000
+
+添加内容寻址存储对象表，重复上传的文件按 SHA-256 复用已有对象，
+删除时递减引用计数
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "20251128_stored_objects"
+down_revision: Union[str, None] = "20251125_daily_stats"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """创建 stored_objects 表"""
+
+    op.create_table(
+        "stored_objects",
+        sa.Column("id", sa.UUID(), nullable=False, comment="主键ID"),
+        sa.Column(
+            "namespace", sa.String(length=64), nullable=False, comment="命名空间"
+        ),
+        sa.Column(
+            "content_hash",
+            sa.String(length=64),
+            nullable=False,
+            comment="文件内容SHA-256",
+        ),
+        sa.Column(
+            "storage_type",
+            sa.String(length=16),
+            nullable=False,
+            comment="存储类型：local或oss",
+        ),
+        sa.Column(
+            "object_key",
+            sa.String(length=512),
+            nullable=False,
+            comment="对象名或本地路径",
+        ),
+        sa.Column(
+            "file_url", sa.String(length=1024), nullable=False, comment="访问URL"
+        ),
+        sa.Column(
+            "file_size",
+            sa.Integer(),
+            nullable=False,
+            server_default="0",
+            comment="文件大小",
+        ),
+        sa.Column(
+            "mime_type", sa.String(length=100), nullable=True, comment="MIME类型"
+        ),
+        sa.Column("width", sa.Integer(), nullable=True, comment="图片宽度"),
+        sa.Column("height", sa.Integer(), nullable=True, comment="图片高度"),
+        sa.Column(
+            "ref_count",
+            sa.Integer(),
+            nullable=False,
+            server_default="1",
+            comment="引用计数",
+        ),
+        sa.Column(
+            "created_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.func.now(),
+            nullable=False,
+            comment="创建时间",
+        ),
+        sa.Column(
+            "updated_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.func.now(),
+            nullable=False,
+            comment="更新时间",
+        ),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint(
+            "namespace",
+            "content_hash",
+            "storage_type",
+            name="uq_stored_objects_content",
+        ),
+    )
+    op.create_index(
+        "idx_stored_objects_key", "stored_objects", ["namespace", "object_key"]
+    )
+
+
+def downgrade() -> None:
+    """删除 stored_objects 表"""
+
+    op.drop_index("idx_stored_objects_key", table_name="stored_objects")
+    op.drop_table("stored_objects")
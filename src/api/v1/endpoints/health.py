@@ -7,8 +7,8 @@ import logging
 import time
 from datetime import datetime
 
-from fastapi import APIRouter, Depends, status
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, Depends, Query, status
+from fastapi.responses import JSONResponse, PlainTextResponse, Response
 from sqlalchemy import text
 from sqlalchemy.ext.asyncio import AsyncSession
 
@@ -16,8 +16,11 @@ from src.core.config import get_settings
 from src.core.database import get_db
 from src.core.monitoring import get_formula_metrics, get_metrics_collector
 from src.core.security import get_rate_limiter
+from src.services.answer_cache import answer_cache
 from src.services.bailian_service import get_bailian_service
+from src.services.formula_service import hot_formula_cache
 from src.utils.cache import cache_manager
+from src.utils.oss_executor import oss_executor
 
 logger = logging.getLogger("health_api")
 settings = get_settings()
@@ -209,8 +212,35 @@ async def liveness_check() -> JSONResponse:
 
 
 @router.get("/metrics", summary="系统指标", description="获取系统运行指标和性能数据")
-async def get_metrics(db: AsyncSession = Depends(get_db)) -> JSONResponse:
+async def get_metrics(
+    db: AsyncSession = Depends(get_db),
+    format: str = Query(
+        "json", pattern="^(json|prometheus)$", description="输出格式: json | prometheus"
+    ),
+) -> Response:
     """获取系统指标"""
+    if format == "prometheus":
+        # Prometheus 抓取：导出阶段耗时直方图，按版本/环境打标签以区分部署
+        try:
+            get_metrics_collector().set_gauges(
+                "bailian_pool", get_bailian_service().get_pool_stats()
+            )
+            get_metrics_collector().set_gauges("answer_cache", answer_cache.get_stats())
+            get_metrics_collector().set_gauges("cache", cache_manager.get_tier_stats())
+            get_metrics_collector().set_gauges("oss_executor", oss_executor.get_stats())
+        except Exception as e:
+            logger.warning(f"Unable to collect bailian pool stats: {e}")
+
+        return PlainTextResponse(
+            get_metrics_collector().render_prometheus(
+                labels={
+                    "version": getattr(settings, "VERSION", "1.0.0"),
+                    "environment": settings.ENVIRONMENT,
+                }
+            ),
+            media_type="text/plain; version=0.0.4",
+        )
+
     try:
         import os
 
@@ -293,18 +323,33 @@ async def get_metrics(db: AsyncSession = Depends(get_db)) -> JSONResponse:
                 "request_stats": performance_summary.get("request_stats", {}),
                 "slowest_endpoints": performance_summary.get("slowest_endpoints", []),
                 "error_endpoints": performance_summary.get("error_endpoints", []),
+                # 流式问答首字延迟分阶段分布
+                "ttft": metrics_collector.get_histogram_stats("ttft"),
+                "context_prefetch_dropped": metrics_collector.get_counters(
+                    "context_prefetch_dropped"
+                ),
             }
         except Exception as e:
             metrics["performance"] = {
                 "error": f"Unable to collect performance metrics: {str(e)}"
             }
 
+        # 百炼连接池指标
+        try:
+            metrics["application"]["bailian_pool"] = (
+                get_bailian_service().get_pool_stats()
+            )
+        except Exception as e:
+            metrics["application"]["bailian_pool"] = {"error": str(e)}
+        metrics["application"]["answer_cache"] = answer_cache.get_stats()
+        metrics["application"]["cache_tiers"] = cache_manager.get_tier_stats()
+        metrics["application"]["oss_executor"] = oss_executor.get_stats()
+
         # 安全指标
         try:
             metrics["security"] = {
                 "rate_limiter_status": "active",
-                "active_counters": len(rate_limiter.counters),
-                "active_buckets": len(rate_limiter.buckets),
+                **rate_limiter.get_stats(),
             }
         except Exception as e:
             metrics["security"] = {
@@ -368,8 +413,7 @@ async def get_rate_limit_status() -> JSONResponse:
 
         rate_limit_data = {
             "timestamp": datetime.utcnow().isoformat(),
-            "active_counters": len(rate_limiter.counters),
-            "active_buckets": len(rate_limiter.buckets),
+            **rate_limiter.get_stats(),
             "rules_count": len(rate_limiter.rules),
             "rules": [
                 {
@@ -425,6 +469,7 @@ async def get_formula_render_metrics() -> JSONResponse:
             content={
                 "timestamp": datetime.utcnow().isoformat(),
                 "metrics": stats,
+                "hot_cache": hot_formula_cache.get_stats(),
             },
         )
     except Exception as e:
@@ -36,6 +36,7 @@ from src.schemas.learning import (
     AskQuestionResponse,
     CreateSessionRequest,
     FeedbackRequest,
+    FormulaOutputMode,
     LearningAnalyticsResponse,
     QuestionHistoryQuery,
     QuestionHistoryResponse,
@@ -532,6 +533,9 @@ async def get_session_questions(
     id: str,
     page: int = Query(1, ge=1, description="页码"),
     size: int = Query(20, ge=1, le=100, description="每页大小"),
+    formula_output: Optional[FormulaOutputMode] = Query(
+        None, description="答案中公式的输出方式 image / svg / mathml"
+    ),
     current_user_id: str = Depends(get_current_user_id),
     db: AsyncSession = Depends(get_db),
 ):
@@ -551,7 +555,9 @@ async def get_session_questions(
                 status_code=http_status.HTTP_404_NOT_FOUND, detail="无权限访问该会话"
             )
 
-        query = QuestionHistoryQuery(session_id=id, page=page, size=size)
+        query = QuestionHistoryQuery(
+            session_id=id, page=page, size=size, formula_output=formula_output
+        )
         result = await learning_service.get_question_history(current_user_id, query)
 
         return QuestionHistoryResponse(**result)
@@ -575,6 +581,9 @@ async def get_question_history(
     end_date: Optional[str] = Query(None, description="结束日期"),
     page: int = Query(1, ge=1, description="页码"),
     size: int = Query(20, ge=1, le=100, description="每页大小"),
+    formula_output: Optional[FormulaOutputMode] = Query(
+        None, description="答案中公式的输出方式 image / svg / mathml"
+    ),
     current_user_id: str = Depends(get_current_user_id),
     db: AsyncSession = Depends(get_db),
 ):
@@ -591,6 +600,7 @@ async def get_question_history(
             end_date=datetime.fromisoformat(end_date) if end_date else None,
             page=page,
             size=size,
+            formula_output=formula_output,
         )
 
         result = await learning_service.get_question_history(current_user_id, query)
@@ -620,6 +630,9 @@ async def get_questions_history_alias(
     end_date: Optional[str] = Query(None, description="结束日期"),
     page: int = Query(1, ge=1, description="页码"),
     size: int = Query(20, ge=1, le=100, description="每页大小"),
+    formula_output: Optional[FormulaOutputMode] = Query(
+        None, description="答案中公式的输出方式 image / svg / mathml"
+    ),
     current_user_id: str = Depends(get_current_user_id),
     db: AsyncSession = Depends(get_db),
 ):
@@ -639,6 +652,7 @@ async def get_questions_history_alias(
             end_date=datetime.fromisoformat(end_date) if end_date else None,
             page=page,
             size=size,
+            formula_output=formula_output,
         )
 
         result = await learning_service.get_question_history(current_user_id, query)
@@ -667,6 +681,9 @@ async def search_questions(
     end_date: Optional[str] = Query(None, description="结束日期"),
     page: int = Query(1, ge=1, description="页码"),
     size: int = Query(20, ge=1, le=100, description="每页大小"),
+    formula_output: Optional[FormulaOutputMode] = Query(
+        None, description="答案中公式的输出方式 image / svg / mathml"
+    ),
     current_user_id: str = Depends(get_current_user_id),
     db: AsyncSession = Depends(get_db),
 ):
@@ -687,6 +704,7 @@ async def search_questions(
             end_date=datetime.fromisoformat(end_date) if end_date else None,
             page=page,
             size=size,
+            formula_output=formula_output,
         )
 
         result = await learning_service.get_question_history(current_user_id, query)
@@ -720,6 +738,9 @@ async def get_session_history(
     id: UUID,
     page: int = Query(1, ge=1, description="页码"),
     size: int = Query(20, ge=1, le=100, description="每页大小"),
+    formula_output: Optional[FormulaOutputMode] = Query(
+        None, description="答案中公式的输出方式 image / svg / mathml"
+    ),
     current_user_id: str = Depends(get_current_user_id),
     db: AsyncSession = Depends(get_db),
 ):
@@ -739,7 +760,9 @@ async def get_session_history(
                 status_code=http_status.HTTP_404_NOT_FOUND, detail="无权限访问该会话"
             )
 
-        query = QuestionHistoryQuery(session_id=str(id), page=page, size=size)
+        query = QuestionHistoryQuery(
+            session_id=str(id), page=page, size=size, formula_output=formula_output
+        )
 
         result = await learning_service.get_question_history(current_user_id, query)
 
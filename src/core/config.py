@@ -60,6 +60,12 @@ class Settings(BaseSettings):
     REDIS_PORT: int = 6379
     REDIS_PASSWORD: Optional[str] = None
     REDIS_DB: int = 0
+    # 进程内一级缓存（L1），仅对显式开启 l1 的缓存生效；0 表示关闭
+    CACHE_L1_MAX_SIZE: int = 1024
+    CACHE_L1_TTL: int = 5  # 秒，各 worker 间最多不一致这么久
+    CACHE_EARLY_REFRESH_BETA: float = 1.0  # 概率提前刷新系数，0 表示不提前刷新
+    CACHE_COMPRESS_THRESHOLD: int = 4096  # 缓存值超过该字节数时压缩，0 表示不压缩
+    CACHE_COMPRESSION: str = "auto"  # auto / zstd / lz4 / zlib / none
 
     # 日志配置
     LOG_LEVEL: str = "INFO"
@@ -71,6 +77,14 @@ class Settings(BaseSettings):
     BAILIAN_BASE_URL: str = "https://dashscope.aliyuncs.com/api/v1"
     BAILIAN_TIMEOUT: int = 120  # 提高到120秒以支持图片OCR和AI分析
     BAILIAN_MAX_RETRIES: int = 3
+    # 百炼 HTTP 连接池（每个 worker 进程一个共享客户端）
+    BAILIAN_MAX_CONNECTIONS: int = 50
+    BAILIAN_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    BAILIAN_KEEPALIVE_EXPIRY: float = 60.0  # 空闲连接保活（秒）
+    BAILIAN_CONNECT_TIMEOUT: float = 10.0
+    BAILIAN_HTTP2: bool = True  # 需要安装 h2（httpx[http2]），否则回退 HTTP/1.1
+    BAILIAN_MAX_CONCURRENT_STREAMS: int = 32  # 每个 worker 同时进行的上游流式调用上限
+    BAILIAN_WARMUP_CONNECTIONS: int = 2  # 启动时预热的连接数，0 表示不预热
 
     # 阿里云基础配置
     ALICLOUD_ACCESS_KEY_ID: Optional[str] = None
@@ -95,9 +109,18 @@ class Settings(BaseSettings):
     OSS_ENDPOINT: str = "oss-cn-hangzhou.aliyuncs.com"
     OSS_ACCESS_KEY_ID: Optional[str] = None
     OSS_ACCESS_KEY_SECRET: Optional[str] = None
+    OSS_EXECUTOR_WORKERS: int = 8  # oss2 阻塞调用专用线程数
+    OSS_EXECUTOR_MAX_QUEUE: int = 64  # 排队上限，超出时拒绝上传
+    OSS_MULTIPART_THRESHOLD: int = 4 * 1024 * 1024  # 超过该大小使用分片上传
+    OSS_MULTIPART_PART_SIZE: int = 1024 * 1024  # 分片大小（OSS 要求至少 100KB）
     UPLOAD_MAX_SIZE: int = 10 * 1024 * 1024  # 10MB
     ALLOWED_EXTENSIONS: List[str] = [".jpg", ".jpeg", ".png", ".pdf", ".webp"]
     UPLOAD_DIR: str = "./uploads"  # 文件上传目录
+    UPLOAD_DEDUP_ENABLED: bool = True  # 按内容哈希复用已上传的文件
+    AI_IMAGE_RETENTION_HOURS: int = 24  # AI分析图片的保留时长，超过后被定期清理
+    # 只复用登记时间不超过该时长的AI分析图片，复用的 URL 至少还能保留
+    # AI_IMAGE_RETENTION_HOURS - AI_IMAGE_REUSE_HOURS 小时
+    AI_IMAGE_REUSE_HOURS: int = 12
 
     # 短信服务配置
     SMS_ACCESS_KEY_ID: Optional[str] = None
@@ -122,11 +145,44 @@ class Settings(BaseSettings):
     AI_MAX_TOKENS: int = 1500
     AI_TEMPERATURE: float = 0.7
     AI_TOP_P: float = 0.8
+    LEARNING_CONTEXT_CACHE_TTL: int = 120  # 学情上下文缓存（秒），0 表示不缓存
+    LEARNING_CONTEXT_CACHE_SIZE: int = 2048  # 学情上下文缓存最大条目数
+    # 构建学情上下文时全进程同时占用的数据库会话数上限（连接池默认 5 + 10）
+    LEARNING_CONTEXT_DB_CONCURRENCY: int = 4
+    MISTAKE_LIST_CACHE_TTL: int = 60  # 错题列表知识点关联缓存（秒），0 表示不缓存
+    # 流式问答上下文预取预算（毫秒）：超时未就绪的学情/作业上下文将被省略，0 表示全部等待
+    AI_CONTEXT_PREFETCH_BUDGET_MS: int = 0
+    # 非个性化问答答案缓存（按归一化题干，默认关闭）
+    AI_ANSWER_CACHE_ENABLED: bool = False
+    AI_ANSWER_CACHE_TTL: int = 86400  # 1天
+    AI_ANSWER_CACHE_SIZE: int = 5000
+    # 公式渲染：同时渲染的公式数上限（所有请求共享，避免压垮 QuickLaTeX）
+    FORMULA_RENDER_CONCURRENCY: int = 4
+    # 热门公式 URL 缓存（进程内 LRU，启动时按命中次数预热）
+    FORMULA_HOT_CACHE_SIZE: int = 2000
+    FORMULA_HOT_PRELOAD_COUNT: int = 500  # 启动时预热的公式数，0 表示不预热
+    FORMULA_URL_TRUST_SECONDS: int = 3600  # 信任期内直接使用缓存 URL，不再 HEAD 校验
+    FORMULA_HIT_FLUSH_INTERVAL: int = 60  # 命中次数批量写回数据库的间隔（秒）
+    # 默认公式输出方式：image（OSS 图片 URL）/ svg（内联 SVG）/ mathml（内联 MathML）
+    FORMULA_OUTPUT_MODE: str = "image"
+
+    # 视觉模型图片优化（发送给 qwen-vl 前缩放并重新编码）
+    VISION_IMAGE_OPTIMIZE_ENABLED: bool = True
+    VISION_IMAGE_FORMAT: str = "webp"  # webp / jpeg
+    VISION_IMAGE_QUALITY: int = 80
+    VISION_IMAGE_MAX_TOKENS: int = 1280  # 每张图的视觉 token 上限（模型默认 1280）
+    VISION_IMAGE_OPTIMIZE_TIMEOUT: float = 3.0  # 作业批改等待优化的时间预算（秒）
+    # 流式提问首字前的等待预算（秒）：只够命中缓存或复用 OSS 上已有的版本
+    VISION_IMAGE_PRESTREAM_TIMEOUT: float = 0.15
+    VISION_IMAGE_CACHE_SIZE: int = 1000
+    VISION_IMAGE_CACHE_TTL: int = 3600  # 需短于 AI 图片清理周期
 
     # OCR配置
     OCR_ENABLED: bool = True
     OCR_LANGUAGE: str = "chi_sim+eng"  # 中文简体+英文
     OCR_CONFIDENCE_THRESHOLD: float = 0.6
+    OCR_PREPROCESS_WORKERS: int = 2  # 图像预处理进程数
+    OCR_PREPROCESS_USE_PROCESSES: bool = True  # 关闭时使用线程池预处理
 
     # 监控配置
     ENABLE_METRICS: bool = True
@@ -145,6 +201,9 @@ class Settings(BaseSettings):
     RATE_LIMIT_PER_USER: int = 50  # 每用户每分钟请求限制
     RATE_LIMIT_AI_SERVICE: int = 20  # AI服务每分钟请求限制
     RATE_LIMIT_LOGIN: int = 10  # 登录端点每分钟请求限制
+    # 限流后端：redis 为跨 worker/节点的全局限流，Redis 不可用时自动退回进程内限流
+    RATE_LIMIT_BACKEND: str = "redis"  # redis / local
+    RATE_LIMIT_REDIS_TIMEOUT: float = 0.2  # 单次限流检查等待 Redis 的最长时间（秒）
 
     # 缓存配置
     CACHE_ENABLED: bool = True
@@ -158,6 +217,11 @@ class Settings(BaseSettings):
     )
     AUTO_MISTAKE_REQUIRE_IMAGE: bool = False  # 是否要求必须有图片才创建错题
 
+    # 知识图谱快照任务配置
+    KG_SNAPSHOT_CONCURRENCY: int = 8  # 并发生成快照的 worker 数
+    KG_SNAPSHOT_BATCH_SIZE: int = 20  # 每个 worker 累积多少个快照提交一次
+    KG_SNAPSHOT_CHECKPOINT_DIR: str = "./data/checkpoints"  # 断点续跑进度目录
+
     # 加密配置
     ENCRYPTION_KEY: Optional[str] = None  # 对称加密密钥
 
@@ -10,7 +10,7 @@ import time
 from collections import defaultdict, deque
 from dataclasses import dataclass
 from datetime import datetime, timedelta
-from typing import Any, Deque, Dict, Optional
+from typing import Any, Deque, Dict, List, Optional, Sequence, Tuple
 
 import psutil
 from fastapi import Request, Response
@@ -18,6 +18,22 @@ from starlette.middleware.base import BaseHTTPMiddleware
 
 logger = logging.getLogger(__name__)
 
+# 阶段耗时直方图的默认桶边界（秒），覆盖从毫秒级 DB 查询到十秒级上游首包
+LATENCY_BUCKETS: Tuple[float, ...] = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+)
+
 
 @dataclass
 class RequestMetrics:
@@ -45,6 +61,74 @@ class SystemMetrics:
     request_count: int = 0
 
 
+class LatencyHistogram:
+    """
+    固定桶边界的耗时直方图（Prometheus histogram 语义）
+
+    只保存各桶计数、总和与次数，内存占用与样本量无关；
+    分位数按桶内线性插值估算。
+    """
+
+    def __init__(self, buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.buckets: Tuple[float, ...] = tuple(sorted(buckets))
+        # 最后一个槽位对应 +Inf
+        self.counts: List[int] = [0] * (len(self.buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, seconds: float) -> None:
+        """记录一次耗时"""
+        seconds = max(0.0, float(seconds))
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if seconds <= bound:
+                index = i
+                break
+        self.counts[index] += 1
+        self.total += seconds
+        self.count += 1
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q: float) -> float:
+        """估算分位数（秒）"""
+        if self.count == 0:
+            return 0.0
+
+        rank = q * self.count
+        cumulative = 0
+        lower = 0.0
+        for i, bucket_count in enumerate(self.counts):
+            upper = self.buckets[i] if i < len(self.buckets) else self.max
+            if bucket_count and cumulative + bucket_count >= rank:
+                fraction = (rank - cumulative) / bucket_count
+                return min(lower + (upper - lower) * fraction, self.max)
+            cumulative += bucket_count
+            lower = upper
+        return self.max
+
+    def cumulative_counts(self) -> List[Tuple[str, int]]:
+        """返回 (le, 累计计数) 列表，用于 Prometheus 文本格式"""
+        result = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets, self.counts, strict=False):
+            cumulative += bucket_count
+            result.append((f"{bound:g}", cumulative))
+        result.append(("+Inf", self.count))
+        return result
+
+    def snapshot(self) -> Dict[str, Any]:
+        """获取统计摘要"""
+        return {
+            "count": self.count,
+            "avg": round(self.total / self.count, 4) if self.count else 0.0,
+            "p50": round(self.quantile(0.5), 4),
+            "p95": round(self.quantile(0.95), 4),
+            "p99": round(self.quantile(0.99), 4),
+            "max": round(self.max, 4),
+        }
+
+
 class MetricsCollector:
     """指标收集器"""
 
@@ -64,6 +148,12 @@ class MetricsCollector:
         self._active_requests = 0
         self._lock = threading.RLock()
         self._start_time = time.time()
+        # (指标名, 阶段) -> 耗时直方图
+        self._histograms: Dict[Tuple[str, str], LatencyHistogram] = {}
+        # (指标名, 排序后的标签) -> 累计次数
+        self._counters: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], int] = {}
+        # 指标名 -> 当前值
+        self._gauges: Dict[str, float] = {}
 
     def record_request(self, metrics: RequestMetrics) -> None:
         """记录请求指标"""
@@ -107,6 +197,127 @@ class MetricsCollector:
         with self._lock:
             self._active_requests = max(0, self._active_requests - 1)
 
+    def observe_stage(self, name: str, stage: str, seconds: float) -> None:
+        """
+        记录某个指标下单个阶段的耗时
+
+        Args:
+            name: 指标名，如 "ttft"
+            stage: 阶段名，如 "context_build"
+            seconds: 耗时（秒）
+        """
+        with self._lock:
+            histogram = self._histograms.get((name, stage))
+            if histogram is None:
+                histogram = self._histograms[(name, stage)] = LatencyHistogram()
+            histogram.observe(seconds)
+
+    def get_histogram_stats(self, name: str) -> Dict[str, Dict[str, Any]]:
+        """获取某个指标各阶段的耗时分布摘要"""
+        with self._lock:
+            return {
+                stage: histogram.snapshot()
+                for (metric, stage), histogram in sorted(self._histograms.items())
+                if metric == name
+            }
+
+    def increment_counter(self, name: str, amount: int = 1, **labels: str) -> None:
+        """
+        累加一个带标签的计数器
+
+        Args:
+            name: 计数器名，如 "context_prefetch_dropped"
+            amount: 增量
+            **labels: 标签，如 part="homework_context"
+        """
+        key = (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def get_counters(self, name: str) -> Dict[str, int]:
+        """获取某个计数器按标签展开的取值，键形如 part=homework_context"""
+        with self._lock:
+            return {
+                ",".join(f"{k}={v}" for k, v in labels) or "total": value
+                for (metric, labels), value in sorted(self._counters.items())
+                if metric == name
+            }
+
+    def set_gauges(self, prefix: str, values: Dict[str, Any]) -> None:
+        """
+        批量设置瞬时值指标（仅保留数值项）
+
+        Args:
+            prefix: 指标名前缀，如 "bailian_pool"
+            values: 指标字典，布尔值按 0/1 记录
+        """
+        with self._lock:
+            for key, value in values.items():
+                if isinstance(value, (bool, int, float)):
+                    self._gauges[f"{prefix}_{key}"] = float(value)
+
+    def render_prometheus(self, labels: Optional[Dict[str, str]] = None) -> str:
+        """
+        以 Prometheus 文本格式导出阶段耗时直方图和基础指标
+
+        Args:
+            labels: 附加到每个样本上的公共标签（如版本、环境）
+
+        Returns:
+            Prometheus exposition 格式文本
+        """
+
+        def _labels(extra: Dict[str, str]) -> str:
+            merged = {**(labels or {}), **extra}
+            pairs = ",".join(f'{key}="{value}"' for key, value in merged.items())
+            return f"{{{pairs}}}" if pairs else ""
+
+        lines: List[str] = []
+        with self._lock:
+            metric_names = sorted({metric for metric, _ in self._histograms})
+            for metric in metric_names:
+                family = f"wuhao_{metric}_stage_seconds"
+                lines.append(f"# HELP {family} Per-stage latency of {metric}")
+                lines.append(f"# TYPE {family} histogram")
+                for (name, stage), histogram in sorted(self._histograms.items()):
+                    if name != metric:
+                        continue
+                    for le, cumulative in histogram.cumulative_counts():
+                        lines.append(
+                            f"{family}_bucket"
+                            f"{_labels({'stage': stage, 'le': le})} {cumulative}"
+                        )
+                    lines.append(
+                        f"{family}_sum{_labels({'stage': stage})} {histogram.total:.6f}"
+                    )
+                    lines.append(
+                        f"{family}_count{_labels({'stage': stage})} {histogram.count}"
+                    )
+
+            counter_names = sorted({metric for metric, _ in self._counters})
+            for metric in counter_names:
+                family = f"wuhao_{metric}_total"
+                lines.append(f"# TYPE {family} counter")
+                for (name, counter_labels), value in sorted(self._counters.items()):
+                    if name == metric:
+                        lines.append(f"{family}{_labels(dict(counter_labels))} {value}")
+
+            for gauge, value in sorted(self._gauges.items()):
+                lines.append(f"# TYPE wuhao_{gauge} gauge")
+                lines.append(f"wuhao_{gauge}{_labels({})} {value:g}")
+
+            lines.append("# HELP wuhao_active_requests In-flight HTTP requests")
+            lines.append("# TYPE wuhao_active_requests gauge")
+            lines.append(f"wuhao_active_requests{_labels({})} {self._active_requests}")
+            lines.append("# HELP wuhao_uptime_seconds Process uptime")
+            lines.append("# TYPE wuhao_uptime_seconds gauge")
+            lines.append(
+                f"wuhao_uptime_seconds{_labels({})} "
+                f"{time.time() - self._start_time:.0f}"
+            )
+
+        return "\n".join(lines) + "\n"
+
     def get_request_stats(self, minutes: int = 60) -> Dict[str, Any]:
         """获取请求统计信息"""
         cutoff_time = datetime.utcnow() - timedelta(minutes=minutes)
@@ -238,6 +449,47 @@ class MetricsCollector:
             )
 
 
+class StageTimer:
+    """
+    按阶段打点的请求内计时器
+
+    每次 mark 记录距上一次打点的耗时，finish 记录从创建到当前的总耗时，
+    结果写入 MetricsCollector 的阶段直方图。
+    """
+
+    def __init__(self, name: str, collector: Optional["MetricsCollector"] = None):
+        self.name = name
+        self.collector = collector or metrics_collector
+        self.started_at = time.perf_counter()
+        self._last = self.started_at
+        self.stages: Dict[str, float] = {}
+
+    def mark(self, stage: str) -> float:
+        """记录从上一次打点到现在的阶段耗时（秒）"""
+        now = time.perf_counter()
+        elapsed = now - self._last
+        self._last = now
+        self.record(stage, elapsed)
+        return elapsed
+
+    def record(self, stage: str, seconds: float) -> None:
+        """直接记录一个外部测得的阶段耗时，不影响打点位置"""
+        self.stages[stage] = round(self.stages.get(stage, 0.0) + seconds, 4)
+        self.collector.observe_stage(self.name, stage, seconds)
+
+    def finish(self, stage: str = "total") -> float:
+        """记录从计时开始到现在的总耗时（秒）"""
+        elapsed = time.perf_counter() - self.started_at
+        self.record(stage, elapsed)
+        return elapsed
+
+    def summary(self) -> str:
+        """单行阶段耗时摘要，便于写日志"""
+        return ", ".join(
+            f"{stage}={seconds * 1000:.0f}ms" for stage, seconds in self.stages.items()
+        )
+
+
 class PerformanceMonitoringMiddleware(BaseHTTPMiddleware):
     """性能监控中间件"""
 
@@ -6,6 +6,7 @@
 import hashlib
 import json
 import logging
+import re
 import time
 from collections import defaultdict, deque
 from dataclasses import dataclass
@@ -61,30 +62,55 @@ class SlowQuery:
 
 
 class QueryCache:
-    """查询缓存管理器"""
+    """
+    查询缓存管理器
+
+    缓存键写入 "query" 命名空间，并按涉及的表和用户登记 Redis 标签，
+    失效操作对所有 worker 写入的缓存生效。
+    """
+
+    namespace = "query"
+
+    # 用于从 SQL 中提取表名
+    _TABLE_PATTERN = re.compile(
+        r"\b(?:from|join|update|into)\s+[\"`]?(\w+)", re.IGNORECASE
+    )
+    # 参数中视为用户标识的字段
+    _USER_PARAMS = ("user_id", "student_id")
 
     def __init__(self, default_ttl: int = 300, max_cache_size: int = 1000):
         self.default_ttl = default_ttl
         self.max_cache_size = max_cache_size
         self.hit_count = 0
         self.miss_count = 0
+        # 仅用于统计本 worker 写入的条目数，失效不依赖它
         self.cache_keys: deque = deque(maxlen=max_cache_size)
 
     def _generate_cache_key(
         self, query: str, params: Optional[Dict[str, Any]] = None
     ) -> str:
-        """生成缓存键"""
+        """生成缓存键（命名空间内）"""
         content = query
         if params:
             content += json.dumps(params, sort_keys=True, default=str)
-        return f"query:{hashlib.md5(content.encode()).hexdigest()}"
+        return hashlib.md5(content.encode()).hexdigest()
+
+    def _generate_tags(
+        self, query: str, params: Optional[Dict[str, Any]] = None
+    ) -> List[str]:
+        """根据 SQL 涉及的表和参数中的用户ID生成失效标签"""
+        tags = {f"table:{name.lower()}" for name in self._TABLE_PATTERN.findall(query)}
+        for field in self._USER_PARAMS:
+            if params and params.get(field) is not None:
+                tags.add(f"user:{params[field]}")
+        return sorted(tags)
 
     async def get(
         self, query: str, params: Optional[Dict[str, Any]] = None
     ) -> Optional[Any]:
         """获取缓存结果"""
         cache_key = self._generate_cache_key(query, params)
-        result = await cache_manager.get(cache_key)
+        result = await cache_manager.get(cache_key, self.namespace)
 
         if result is not None:
             self.hit_count += 1
@@ -105,7 +131,13 @@ class QueryCache:
         cache_key = self._generate_cache_key(query, params)
         ttl = ttl or self.default_ttl
 
-        await cache_manager.set(cache_key, result, ttl=ttl)
+        await cache_manager.set(
+            cache_key,
+            result,
+            ttl=ttl,
+            namespace=self.namespace,
+            tags=self._generate_tags(query, params),
+        )
 
         # 管理缓存键
         if cache_key not in self.cache_keys:
@@ -113,33 +145,31 @@ class QueryCache:
 
         logger.debug(f"Query cached: {cache_key}, TTL: {ttl}s")
 
+    async def invalidate_tags(self, *tags: str) -> int:
+        """按标签（如 "table:users"、"user:123"）清除缓存"""
+        count = await cache_manager.invalidate_tags(*tags)
+        logger.info(f"Invalidated {count} query cache entries for tags: {list(tags)}")
+        return count
+
     async def invalidate_pattern(self, pattern: str) -> int:
-        """按模式清除缓存"""
-        count = 0
-        keys_to_remove = []
-
-        for cache_key in list(self.cache_keys):
-            if pattern in cache_key:
-                await cache_manager.delete(cache_key)
-                keys_to_remove.append(cache_key)
-                count += 1
-
-        # 从跟踪列表中移除
-        for key in keys_to_remove:
-            try:
-                self.cache_keys.remove(key)
-            except ValueError:
-                pass
+        """
+        按模式清除缓存
+
+        "table:xxx" / "user:xxx" 形式按标签失效；其他模式在 query
+        命名空间内用 SCAN 匹配删除。
+        """
+        if pattern.startswith(("table:", "user:")):
+            return await self.invalidate_tags(pattern)
 
+        count = await cache_manager.scan_delete(
+            cache_manager._make_key(f"*{pattern}*", self.namespace)
+        )
         logger.info(f"Invalidated {count} cache entries matching pattern: {pattern}")
         return count
 
     async def clear_all(self) -> None:
         """清除所有查询缓存"""
-        count = 0
-        for cache_key in list(self.cache_keys):
-            await cache_manager.delete(cache_key)
-            count += 1
+        count = await cache_manager.clear_namespace(self.namespace)
 
         self.cache_keys.clear()
         self.hit_count = 0
@@ -371,8 +401,13 @@ class CachedQuery:
             result = await func(*args, **kwargs)
             execution_time = time.time() - start_time
 
-            # 缓存结果
-            await cache_manager.set(cache_key, result, ttl=self.ttl)
+            # 缓存结果，按 invalidate_on 中的表登记失效标签
+            await cache_manager.set(
+                cache_key,
+                result,
+                ttl=self.ttl,
+                tags=[f"table:{table}" for table in self.invalidate_on],
+            )
 
             # 记录指标
             query_monitor.record_query(
@@ -597,6 +632,5 @@ async def cached_db_query(
 
 
 async def invalidate_cache_for_table(table_name: str) -> int:
-    """使指定表的缓存失效"""
-    pattern = f"table:{table_name}"
-    return await query_cache.invalidate_pattern(pattern)
+    """使指定表的缓存失效（所有 worker）"""
+    return await query_cache.invalidate_tags(f"table:{table_name.lower()}")
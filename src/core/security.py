@@ -6,17 +6,21 @@
 import asyncio
 import hashlib
 import logging
+import math
 import time
-from collections import defaultdict, deque
+from array import array
+from collections import defaultdict
 from dataclasses import dataclass
 from enum import Enum
 from typing import Any, Callable, Dict, List, Optional
 
 from fastapi import HTTPException, Request, Response, status
+from redis.exceptions import RedisError
 from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.responses import JSONResponse
 
 from src.core.config import get_settings
+from src.core.monitoring import get_metrics_collector
 
 logger = logging.getLogger(__name__)
 
@@ -45,6 +49,52 @@ class RateLimitRule:
     endpoint: Optional[str] = None
     message: str = "请求过于频繁，请稍后重试"
 
+    @property
+    def label(self) -> str:
+        """用于统计的规则名"""
+        if self.endpoint:
+            return f"{self.rule_type.value}:{self.endpoint}"
+        return self.rule_type.value
+
+
+# GCRA（通用信元速率算法）：每个键只存一个“理论到达时间”（TAT，毫秒），
+# 内存与请求数无关。所有适用规则在一次调用内原子地检查，任一规则拒绝时
+# 不消耗其他规则的配额。时间取 Redis 服务器时间，避免各节点时钟偏差。
+#
+# KEYS[i]: 限流键
+# ARGV[2i-1]: 发放间隔（毫秒，= 窗口 / 次数）
+# ARGV[2i]: 突发容量（毫秒，= 窗口）
+# 返回 {1} 表示放行，{0, 规则序号, 可重试的毫秒数} 表示拒绝
+_GCRA_SCRIPT = """
+if redis.replicate_commands then
+    redis.replicate_commands()
+end
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local new_tats = {}
+for i, key in ipairs(KEYS) do
+    local interval = tonumber(ARGV[2 * i - 1])
+    local burst = tonumber(ARGV[2 * i])
+    local tat = tonumber(redis.call('GET', key)) or now
+    if tat < now then
+        tat = now
+    end
+    local new_tat = tat + interval
+    if new_tat - burst > now then
+        return {0, i, new_tat - burst - now}
+    end
+    new_tats[i] = new_tat
+end
+for i, key in ipairs(KEYS) do
+    redis.call('SET', key, new_tats[i], 'PX', new_tats[i] - now)
+end
+return {1}
+"""
+
+# AI服务令牌桶参数：20个令牌，每3秒补充1个
+AI_BUCKET_CAPACITY = 20
+AI_BUCKET_REFILL_SECONDS = 3
+
 
 class TokenBucket:
     """令牌桶算法实现"""
@@ -72,46 +122,121 @@ class TokenBucket:
 
 
 class SlidingWindowCounter:
-    """滑动窗口计数器"""
+    """
+    滑动窗口计数器（分桶环形数组）
+
+    把窗口切成固定数量的时间槽，每个槽只存一个计数，内存与请求量无关，
+    每次请求只更新当前槽和总数。窗口 [now - window, now] 会覆盖当前槽、
+    之前的 N - 1 个整槽和最旧槽的一部分，所以保留 N + 1 个槽，并把部分
+    落在窗口内的最旧槽整槽计入：任意一个窗口内放行的请求都不会超过上限，
+    代价是配额最多晚一个槽宽（窗口 / 槽数）释放。
+    """
+
+    __slots__ = (
+        "window_size",
+        "max_requests",
+        "slot_width",
+        "_slots",
+        "_size",
+        "_head_slot",
+        "_total",
+        "last_request",
+    )
+
+    # 每个窗口的槽数：60 秒窗口即每秒一个槽
+    MAX_SLOTS = 60
 
     def __init__(self, window_size: int, max_requests: int):
         self.window_size = window_size
         self.max_requests = max_requests
-        self.requests: deque = deque()
+        self.slot_width = window_size / self.MAX_SLOTS
+        # 多一个槽存放部分落在窗口内的最旧槽
+        self._size = self.MAX_SLOTS + 1
+        self._slots = array("I", bytes(4 * self._size))
+        self._head_slot = 0  # 当前槽的绝对序号
+        self._total = 0
+        self.last_request = 0.0
+
+    def _advance(self, slot: int) -> None:
+        """推进到指定槽，清空已滑出窗口的槽"""
+        elapsed = slot - self._head_slot
+        if elapsed <= 0:
+            return
+        slots = self._slots
+        size = self._size
+        if elapsed >= size:
+            for i in range(size):
+                slots[i] = 0
+            self._total = 0
+        else:
+            for step in range(1, elapsed + 1):
+                index = (self._head_slot + step) % size
+                self._total -= slots[index]
+                slots[index] = 0
+        self._head_slot = slot
 
     def is_allowed(self) -> bool:
         """检查是否允许请求"""
         now = time.time()
-        # 清理过期请求
-        while self.requests and self.requests[0] <= now - self.window_size:
-            self.requests.popleft()
-
-        if len(self.requests) < self.max_requests:
-            self.requests.append(now)
+        slot = int(now / self.slot_width)
+        if slot != self._head_slot:
+            self._advance(slot)
+        if self._total < self.max_requests:
+            self._slots[slot % self._size] += 1
+            self._total += 1
+            self.last_request = now
             return True
         return False
 
+    allow_request = is_allowed
+
+    def get_request_count(self) -> int:
+        """获取窗口内的请求数"""
+        self._advance(int(time.time() / self.slot_width))
+        return self._total
+
     def get_remaining_requests(self) -> int:
         """获取剩余请求数"""
-        now = time.time()
-        while self.requests and self.requests[0] <= now - self.window_size:
-            self.requests.popleft()
-        return max(0, self.max_requests - len(self.requests))
+        return max(0, self.max_requests - self.get_request_count())
 
     def get_reset_time(self) -> int:
-        """获取重置时间"""
-        if not self.requests:
-            return 0
-        return int(self.requests[0] + self.window_size)
+        """获取重置时间（最旧的非空槽滑出窗口的时刻）"""
+        self._advance(int(time.time() / self.slot_width))
+        size = self._size
+        for age in range(size - 1, -1, -1):
+            slot = self._head_slot - age
+            if self._slots[slot % size]:
+                return math.ceil((slot + size) * self.slot_width)
+        return 0
 
 
 class RateLimiter:
-    """综合限流器"""
-
-    def __init__(self):
+    """
+    综合限流器
+
+    check / check_ai_service 优先使用 Redis（GCRA）做跨 worker、跨节点的全局限流，
+    Redis 不可用时在一段冷却时间内退回进程内的滑动窗口和令牌桶。
+    """
+
+    # Redis 失败后暂停使用 Redis 的时间（秒）
+    REDIS_RETRY_INTERVAL = 30
+    REDIS_KEY_PREFIX = "wuhao:rl"
+
+    def __init__(self, redis_client: Any = None, backend: Optional[str] = None):
+        """
+        Args:
+            redis_client: Redis 客户端（默认复用缓存模块的客户端）
+            backend: 限流后端 redis / local（默认取配置）
+        """
         self.counters: Dict[str, SlidingWindowCounter] = {}
         self.buckets: Dict[str, TokenBucket] = {}
         self.rules: List[RateLimitRule] = []
+        self.rejections: Dict[str, int] = defaultdict(int)
+        self._redis_client = redis_client
+        self._backend = backend
+        self._redis_script: Any = None
+        self._redis_retry_at = 0.0
+        self._redis_failures = 0
         self._setup_default_rules()
 
     def _setup_default_rules(self) -> None:
@@ -172,10 +297,11 @@ class RateLimiter:
                 return f"ai:ip:{request.client.host if request.client else 'unknown'}"
         return "default"
 
-    def is_allowed(
+    def _applicable_rules(
         self, request: Request, user_id: Optional[str] = None
-    ) -> tuple[bool, Optional[RateLimitRule], Optional[dict]]:
-        """检查请求是否被允许"""
+    ) -> List[tuple[RateLimitRule, str]]:
+        """筛选适用于本次请求的规则及其限流键"""
+        applicable = []
         for rule in self.rules:
             # 检查端点匹配
             if rule.endpoint and request.url.path != rule.endpoint:
@@ -185,8 +311,14 @@ class RateLimiter:
             if rule.rule_type == RateLimitType.PER_USER and not user_id:
                 continue
 
-            key = self._get_key(request, rule, user_id)
+            applicable.append((rule, self._get_key(request, rule, user_id)))
+        return applicable
 
+    def is_allowed(
+        self, request: Request, user_id: Optional[str] = None
+    ) -> tuple[bool, Optional[RateLimitRule], Optional[dict]]:
+        """检查请求是否被允许（进程内限流）"""
+        for rule, key in self._applicable_rules(request, user_id):
             # 获取或创建计数器
             if key not in self.counters:
                 self.counters[key] = SlidingWindowCounter(rule.window, rule.limit)
@@ -204,18 +336,155 @@ class RateLimiter:
 
         return True, None, None
 
+    async def check(
+        self, request: Request, user_id: Optional[str] = None
+    ) -> tuple[bool, Optional[RateLimitRule], Optional[dict]]:
+        """
+        检查请求是否被允许（全局限流，Redis 不可用时退回进程内限流）
+
+        Args:
+            request: 请求
+            user_id: 用户ID
+
+        Returns:
+            (是否允许, 触发的规则, 限流信息)
+        """
+        applicable = self._applicable_rules(request, user_id)
+        if not applicable:
+            return True, None, None
+
+        result = await self._check_redis(
+            [
+                (key, rule.window * 1000, rule.limit, rule.window * 1000)
+                for rule, key in applicable
+            ]
+        )
+        if result is None:
+            allowed, rule, info = self.is_allowed(request, user_id)
+            backend = "local"
+        else:
+            allowed, index, retry_ms = result
+            rule, info = None, None
+            if not allowed:
+                rule = applicable[index][0]
+                info = {
+                    "limit": rule.limit,
+                    "remaining": 0,
+                    "reset": int(time.time() + math.ceil(retry_ms / 1000)),
+                    "window": rule.window,
+                }
+            backend = "redis"
+
+        if not allowed and rule:
+            self._record_rejection(rule.label, backend)
+        return allowed, rule, info
+
     def is_ai_service_allowed(
         self, user_id: Optional[str] = None, ip: Optional[str] = None
     ) -> bool:
-        """检查AI服务调用是否被允许"""
+        """检查AI服务调用是否被允许（进程内令牌桶）"""
         key = f"ai:user:{user_id}" if user_id else f"ai:ip:{ip or 'unknown'}"
 
         if key not in self.buckets:
-            # 创建令牌桶：20个令牌，每3秒补充1个
-            self.buckets[key] = TokenBucket(capacity=20, refill_rate=1 / 3)
+            self.buckets[key] = TokenBucket(
+                capacity=AI_BUCKET_CAPACITY, refill_rate=1 / AI_BUCKET_REFILL_SECONDS
+            )
 
         return self.buckets[key].consume()
 
+    async def check_ai_service(
+        self, user_id: Optional[str] = None, ip: Optional[str] = None
+    ) -> bool:
+        """
+        检查AI服务调用是否被允许（全局令牌桶，Redis 不可用时退回进程内）
+
+        GCRA 与令牌桶等价：容量对应突发容量，补充速率对应发放间隔。
+        """
+        key = f"ai:user:{user_id}" if user_id else f"ai:ip:{ip or 'unknown'}"
+        interval_ms = AI_BUCKET_REFILL_SECONDS * 1000
+        result = await self._check_redis(
+            [(f"bucket:{key}", interval_ms, 1, interval_ms * AI_BUCKET_CAPACITY)]
+        )
+        if result is None:
+            allowed, backend = self.is_ai_service_allowed(user_id, ip), "local"
+        else:
+            allowed, backend = result[0], "redis"
+
+        if not allowed:
+            self._record_rejection("ai_service_bucket", backend)
+        return allowed
+
+    def _use_redis(self) -> bool:
+        backend = self._backend or _get_settings().RATE_LIMIT_BACKEND
+        return backend == "redis" and time.time() >= self._redis_retry_at
+
+    def _get_redis_script(self) -> Any:
+        if self._redis_script is None:
+            client = self._redis_client
+            if client is None:
+                from src.utils.cache import cache_manager
+
+                client = cache_manager.redis_client
+            self._redis_script = client.register_script(_GCRA_SCRIPT)
+        return self._redis_script
+
+    async def _check_redis(
+        self, checks: List[tuple[str, int, int, int]]
+    ) -> Optional[tuple[bool, int, int]]:
+        """
+        在 Redis 中原子地检查一组 GCRA 限额
+
+        Args:
+            checks: (限流键, 窗口毫秒, 次数, 突发容量毫秒) 列表
+
+        Returns:
+            (是否允许, 拒绝的规则序号, 可重试的毫秒数)；Redis 不可用时返回 None
+        """
+        if not self._use_redis():
+            return None
+
+        keys = []
+        args: List[int] = []
+        for key, window_ms, limit, burst_ms in checks:
+            keys.append(f"{self.REDIS_KEY_PREFIX}:{key}:{limit}/{window_ms}")
+            # 间隔向上取整为整数毫秒，Lua 中全部按整数计算
+            args.extend((math.ceil(window_ms / limit), burst_ms))
+
+        try:
+            result = await asyncio.wait_for(
+                self._get_redis_script()(keys=keys, args=args),
+                timeout=_get_settings().RATE_LIMIT_REDIS_TIMEOUT,
+            )
+        except (RedisError, OSError, asyncio.TimeoutError) as e:
+            self._redis_failures += 1
+            self._redis_retry_at = time.time() + self.REDIS_RETRY_INTERVAL
+            logger.warning(
+                f"Redis 限流不可用，{self.REDIS_RETRY_INTERVAL}秒内改用进程内限流: {e}"
+            )
+            return None
+
+        if int(result[0]) == 1:
+            return True, -1, 0
+        return False, int(result[1]) - 1, int(result[2])
+
+    def _record_rejection(self, label: str, backend: str) -> None:
+        self.rejections[label] += 1
+        get_metrics_collector().increment_counter(
+            "rate_limit_rejections", rule=label, backend=backend
+        )
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取限流后端状态和各规则的拒绝次数"""
+        use_redis = self._use_redis()
+        return {
+            "backend": "redis" if use_redis else "local",
+            "configured_backend": self._backend or _get_settings().RATE_LIMIT_BACKEND,
+            "redis_failures": self._redis_failures,
+            "rejections": dict(self.rejections),
+            "active_counters": len(self.counters),
+            "active_buckets": len(self.buckets),
+        }
+
     def cleanup_old_counters(self) -> None:
         """清理过期的计数器"""
         current_time = time.time()
@@ -223,10 +492,7 @@ class RateLimiter:
 
         for key, counter in self.counters.items():
             # 如果计数器长时间没有请求，清理它
-            if (
-                not counter.requests
-                or current_time - counter.requests[-1] > counter.window_size * 2
-            ):
+            if current_time - counter.last_request > counter.window_size * 2:
                 keys_to_remove.append(key)
 
         for key in keys_to_remove:
@@ -263,7 +529,7 @@ class RateLimitMiddleware(BaseHTTPMiddleware):
             pass
 
         # 检查限流
-        allowed, rule, rate_limit_info = self.rate_limiter.is_allowed(request, user_id)
+        allowed, rule, rate_limit_info = await self.rate_limiter.check(request, user_id)
 
         if not allowed and rule and rate_limit_info:
             response = JSONResponse(
@@ -420,7 +686,7 @@ class AIServiceLimiter:
         self, user_id: Optional[str] = None, ip: Optional[str] = None
     ) -> bool:
         """检查AI服务调用限制"""
-        if not self.rate_limiter.is_ai_service_allowed(user_id, ip):
+        if not await self.rate_limiter.check_ai_service(user_id, ip):
             logger.warning(f"AI service rate limit exceeded for user:{user_id} ip:{ip}")
             return False
         return True
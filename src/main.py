@@ -28,6 +28,9 @@ from src.core.security import (
     cleanup_rate_limiters,
     get_rate_limiter,
 )
+from src.services.bailian_service import close_bailian_service, get_bailian_service
+from src.services.formula_service import flush_formula_hit_counts, get_formula_service
+from src.utils.ocr import get_ocr_preprocess_pool
 
 
 @asynccontextmanager
@@ -39,6 +42,7 @@ async def lifespan(app: FastAPI):
     system_collector = None
     cleanup_task = None
     rate_limit_cleanup_task = None
+    formula_preload_task = None
 
     # 启动时
     logger.info("🚀 应用启动中...")
@@ -53,6 +57,23 @@ async def lifespan(app: FastAPI):
         cleanup_task = asyncio.create_task(cleanup_old_metrics())
         rate_limit_cleanup_task = asyncio.create_task(cleanup_rate_limiters())
 
+    # 预热百炼连接池，避免首批请求承担 TLS 握手
+    if settings.BAILIAN_API_KEY and settings.ENVIRONMENT != "testing":
+        try:
+            await asyncio.wait_for(
+                get_bailian_service().warm_up(),
+                timeout=settings.BAILIAN_CONNECT_TIMEOUT,
+            )
+        except Exception as e:
+            logger.warning(f"百炼连接池预热失败，首个请求将建立连接: {e}")
+
+    # 后台预热热门公式缓存，并定期批量写回公式命中次数
+    if settings.ENVIRONMENT != "testing":
+        formula_preload_task = asyncio.create_task(
+            get_formula_service().preload_hot_formulas()
+        )
+    formula_flush_task = asyncio.create_task(flush_formula_hit_counts())
+
     yield
 
     # 关闭时
@@ -67,6 +88,18 @@ async def lifespan(app: FastAPI):
             rate_limit_cleanup_task.cancel()
         logger.info("✅ 性能监控已停止")
 
+    # 写回剩余的公式命中次数
+    if formula_preload_task:
+        formula_preload_task.cancel()
+    formula_flush_task.cancel()
+    await get_formula_service().flush_hit_counts()
+
+    # 关闭百炼共享连接池
+    await close_bailian_service()
+
+    # 关闭OCR图像预处理进程池
+    get_ocr_preprocess_pool().shutdown(wait=False)
+
 
 def create_app() -> FastAPI:
     """创建 FastAPI 应用实例"""
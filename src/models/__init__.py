@@ -6,6 +6,9 @@
 # 基础模型
 from .base import BaseModel
 
+# 学情日汇总模型
+from .daily_stats import UserDailyStats
+
 # 作业相关模型
 from .homework import DifficultyLevel as HomeworkDifficultyLevel
 from .homework import (
@@ -56,6 +59,9 @@ from .review import MistakeReviewSession
 # 复习计划模型 (AI生成)
 from .revision_plan import RevisionPlan
 
+# 内容寻址存储对象模型
+from .stored_object import StoredObject
+
 # 学习记录模型
 from .study import (
     DifficultyLevel,
@@ -98,6 +104,10 @@ __all__ = [
     "DifficultyLevel",
     "MasteryStatus",
     "MistakeReview",
+    # 学情日汇总模型
+    "UserDailyStats",
+    # 内容寻址存储对象模型
+    "StoredObject",
     # 复习会话模型
     "MistakeReviewSession",
     # 复习计划模型
@@ -0,0 +1,77 @@
+"""
+学情日汇总模型
+按 用户/日期/学科 预聚合问答、会话、错题、复习和 token 计数，
+学情分析接口读取汇总表而不是逐行扫描明细表
+"""
+
+from sqlalchemy import (
+    Column,
+    Date,
+    ForeignKey,
+    Index,
+    Integer,
+    String,
+    UniqueConstraint,
+)
+from sqlalchemy.dialects.postgresql import UUID
+
+from .base import BaseModel, is_sqlite
+
+# 学科为空时使用的占位值（唯一约束列不能为 NULL）
+UNKNOWN_SUBJECT = "unknown"
+
+
+class UserDailyStats(BaseModel):
+    """
+    用户学情日汇总模型
+    每个 (user_id, stat_date, subject) 一行，由写路径增量维护，可全量重建
+    """
+
+    __tablename__ = "user_daily_stats"
+
+    # 用户关联
+    if is_sqlite:
+        user_id = Column(
+            String(36),
+            ForeignKey("users.id", ondelete="CASCADE"),
+            nullable=False,
+            index=True,
+            comment="用户ID",
+        )
+    else:
+        user_id = Column(
+            UUID(as_uuid=True),
+            ForeignKey("users.id", ondelete="CASCADE"),
+            nullable=False,
+            index=True,
+            comment="用户ID",
+        )
+
+    stat_date = Column(Date, nullable=False, comment="统计日期")
+
+    subject = Column(
+        String(50),
+        nullable=False,
+        default=UNKNOWN_SUBJECT,
+        comment="学科（未知学科记为 unknown）",
+    )
+
+    # 计数器
+    question_count = Column(Integer, default=0, nullable=False, comment="提问数")
+    image_question_count = Column(
+        Integer, default=0, nullable=False, comment="图片提问数"
+    )
+    session_count = Column(Integer, default=0, nullable=False, comment="新建会话数")
+    mistake_count = Column(Integer, default=0, nullable=False, comment="新增错题数")
+    review_count = Column(Integer, default=0, nullable=False, comment="完成复习数")
+    tokens_used = Column(Integer, default=0, nullable=False, comment="token消耗")
+
+    __table_args__ = (
+        UniqueConstraint(
+            "user_id", "stat_date", "subject", name="uq_user_daily_stats_key"
+        ),
+        Index("idx_user_daily_stats_user_date", "user_id", "stat_date"),
+    )
+
+    def __repr__(self) -> str:
+        return f"<UserDailyStats(user_id='{self.user_id}', stat_date='{self.stat_date}', subject='{self.subject}')>"
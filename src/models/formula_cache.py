@@ -51,7 +51,10 @@ class FormulaCacheModel(BaseModel):
     )
 
     # 额外元数据（JSON格式，存储渲染参数等）
-    metadata = Column(Text, nullable=True, comment="额外元数据（JSON格式）")
+    # 属性名 metadata 被 Declarative API 保留，列名保持不变
+    extra_metadata = Column(
+        "metadata", Text, nullable=True, comment="额外元数据（JSON格式）"
+    )
 
     # 创建索引以优化查询性能
     __table_args__ = (
@@ -0,0 +1,53 @@
+"""
+内容寻址存储对象模型
+按文件内容的 SHA-256 记录已上传的对象和引用计数，
+重复上传同一文件时直接复用已有对象
+"""
+
+from sqlalchemy import Column, Index, Integer, String, UniqueConstraint
+
+from .base import BaseModel
+
+
+class StoredObject(BaseModel):
+    """
+    已存储对象模型
+    每个 (namespace, content_hash, storage_type) 一行，引用计数归零时删除对象
+    """
+
+    __tablename__ = "stored_objects"
+
+    # 命名空间（上传子目录或 ai_analysis:{user_id}），不同命名空间之间不共享对象
+    namespace = Column(String(64), nullable=False, comment="命名空间")
+
+    content_hash = Column(String(64), nullable=False, comment="文件内容SHA-256")
+
+    storage_type = Column(String(16), nullable=False, comment="存储类型：local或oss")
+
+    # OSS 对象名或本地文件路径
+    object_key = Column(String(512), nullable=False, comment="对象名或本地路径")
+
+    file_url = Column(String(1024), nullable=False, comment="访问URL")
+
+    file_size = Column(Integer, nullable=False, default=0, comment="文件大小")
+
+    mime_type = Column(String(100), nullable=True, comment="MIME类型")
+
+    width = Column(Integer, nullable=True, comment="图片宽度")
+
+    height = Column(Integer, nullable=True, comment="图片高度")
+
+    ref_count = Column(Integer, nullable=False, default=1, comment="引用计数")
+
+    __table_args__ = (
+        UniqueConstraint(
+            "namespace",
+            "content_hash",
+            "storage_type",
+            name="uq_stored_objects_content",
+        ),
+        Index("idx_stored_objects_key", "namespace", "object_key"),
+    )
+
+    def __repr__(self) -> str:
+        return f"<StoredObject(namespace='{self.namespace}', hash='{str(self.content_hash)[:8]}', refs={self.ref_count})>"
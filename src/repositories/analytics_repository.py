@@ -9,9 +9,10 @@ from datetime import datetime, timedelta
 from typing import Any, Dict, List, Optional
 from uuid import UUID
 
-from sqlalchemy import and_, desc, func, select, text
+from sqlalchemy import and_, case, desc, func, select, text, true
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from src.models.daily_stats import UserDailyStats
 from src.models.homework import HomeworkSubmission
 from src.models.learning import Question
 from src.repositories.base_repository import BaseRepository
@@ -105,6 +106,150 @@ class AnalyticsRepository(BaseRepository):
                 "question_count": 0,
             }
 
+    async def get_learning_stats_overview(
+        self, user_id: UUID, start_date: Optional[datetime] = None
+    ) -> Dict[str, Any]:
+        """
+        获取学习统计总览（单条语句聚合所有计数器）
+
+        问题、会话、错题计数读取 user_daily_stats 日汇总表，
+        作业计数与平均分仍从明细表条件聚合；同一次扫描同时得到
+        "时间范围内"与"全部时间"两组计数。时间范围按天对齐。
+
+        Args:
+            user_id: 用户ID
+            start_date: 开始日期（None 表示全部时间）
+
+        Returns:
+            学习统计计数字典
+        """
+        try:
+            daily_in_range = (
+                UserDailyStats.stat_date >= start_date.date() if start_date else true()
+            )
+
+            def _sum_in_range(column):
+                return func.coalesce(
+                    func.sum(case((daily_in_range, column), else_=0)), 0
+                )
+
+            daily_subq = (
+                select(
+                    func.coalesce(func.sum(UserDailyStats.question_count), 0).label(
+                        "total_questions_all"
+                    ),
+                    _sum_in_range(UserDailyStats.question_count).label(
+                        "total_questions"
+                    ),
+                    _sum_in_range(UserDailyStats.image_question_count).label(
+                        "image_questions"
+                    ),
+                    _sum_in_range(UserDailyStats.session_count).label("total_sessions"),
+                    _sum_in_range(UserDailyStats.mistake_count).label("mistake_count"),
+                )
+                .where(UserDailyStats.user_id == str(user_id))
+                .subquery()
+            )
+
+            homework_in_range = (
+                HomeworkSubmission.created_at >= start_date if start_date else true()
+            )
+            homework_subq = (
+                select(
+                    func.count(HomeworkSubmission.id).label("total_homework_all"),
+                    func.count(case((homework_in_range, HomeworkSubmission.id))).label(
+                        "total_homework"
+                    ),
+                    func.avg(
+                        case((homework_in_range, HomeworkSubmission.total_score))
+                    ).label("avg_score"),
+                )
+                # student_id 在所有数据库上都是 UUID 类型，需传入 UUID 对象
+                .where(HomeworkSubmission.student_id == UUID(str(user_id)))
+                .subquery()
+            )
+
+            # 单次查询获取所有统计数据
+            stmt = select(
+                daily_subq.c.total_questions_all,
+                daily_subq.c.total_questions,
+                daily_subq.c.image_questions,
+                homework_subq.c.total_homework_all,
+                homework_subq.c.total_homework,
+                homework_subq.c.avg_score,
+                daily_subq.c.total_sessions,
+                daily_subq.c.mistake_count,
+            )
+
+            result = await self.db.execute(stmt)
+            row = result.one()
+
+            return {
+                "total_questions": int(row.total_questions or 0),
+                "total_questions_all": int(row.total_questions_all or 0),
+                "image_questions": int(row.image_questions or 0),
+                "total_homework": int(row.total_homework or 0),
+                "total_homework_all": int(row.total_homework_all or 0),
+                "avg_score": round(float(row.avg_score), 1) if row.avg_score else 0.0,
+                "total_sessions": int(row.total_sessions or 0),
+                "mistake_count": int(row.mistake_count or 0),
+            }
+
+        except Exception as e:
+            logger.error(f"获取学习统计总览失败: {e}", exc_info=True)
+            return {
+                "total_questions": 0,
+                "total_questions_all": 0,
+                "image_questions": 0,
+                "total_homework": 0,
+                "total_homework_all": 0,
+                "avg_score": 0.0,
+                "total_sessions": 0,
+                "mistake_count": 0,
+            }
+
+    async def get_daily_question_activity(
+        self, user_id: UUID, start_date: Optional[datetime] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        按天统计问答活跃度（同时用于学习天数与学习趋势）
+
+        读取 user_daily_stats 日汇总表，无需扫描问题明细。
+
+        Args:
+            user_id: 用户ID
+            start_date: 开始日期（None 表示全部时间）
+
+        Returns:
+            按日期升序的 [{"date", "activity"}] 列表
+        """
+        try:
+            conditions = [UserDailyStats.user_id == str(user_id)]
+            if start_date:
+                conditions.append(UserDailyStats.stat_date >= start_date.date())
+
+            activity = func.sum(UserDailyStats.question_count)
+            stmt = (
+                select(
+                    UserDailyStats.stat_date.label("date"),
+                    activity.label("activity"),
+                )
+                .where(and_(*conditions))
+                .group_by(UserDailyStats.stat_date)
+                .having(activity > 0)
+                .order_by(UserDailyStats.stat_date)
+            )
+
+            result = await self.db.execute(stmt)
+            return [
+                {"date": str(row.date), "activity": int(row.activity)}
+                for row in result.all()
+            ]
+
+        except Exception as e:
+            logger.error(f"获取每日问答活跃度失败: {e}", exc_info=True)
+            return []
+
     async def get_subject_performance_batch(
         self, user_id: UUID, start_date: Optional[datetime] = None
     ) -> List[Dict[str, Any]]:
@@ -197,33 +342,10 @@ class AnalyticsRepository(BaseRepository):
             时间序列数据
         """
         try:
-            # 检测数据库类型
-            is_sqlite = "sqlite" in str(self.db.bind.engine.url)
-
-            # 根据粒度和数据库类型选择日期截断函数
-            if granularity == "weekly":
-                if is_sqlite:
-                    # SQLite: 使用strftime获取周开始日期
-                    date_trunc = func.date(
-                        HomeworkSubmission.created_at,
-                        "-"
-                        + func.strftime("%w", HomeworkSubmission.created_at)
-                        + " days",
-                    )
-                else:
-                    # PostgreSQL: 使用date_trunc
-                    date_trunc = func.date_trunc("week", HomeworkSubmission.created_at)
-            elif granularity == "monthly":
-                if is_sqlite:
-                    # SQLite: 使用strftime格式化为月份开始
-                    date_trunc = func.strftime(
-                        "%Y-%m-01", HomeworkSubmission.created_at
-                    )
-                else:
-                    # PostgreSQL: 使用date_trunc
-                    date_trunc = func.date_trunc("month", HomeworkSubmission.created_at)
-            else:  # daily
-                date_trunc = func.date(HomeworkSubmission.created_at)
+            date_trunc = self.period_expression(
+                HomeworkSubmission.created_at, granularity
+            )
+            daily_period = self.period_expression(UserDailyStats.stat_date, granularity)
 
             # 使用 CTE 优化复杂查询
             homework_cte = (
@@ -246,19 +368,20 @@ class AnalyticsRepository(BaseRepository):
                 .cte("homework_stats")
             )
 
+            # 问题数读取日汇总表
             question_cte = (
                 select(
-                    date_trunc.label("period"),
-                    func.count(Question.id).label("question_count"),
+                    daily_period.label("period"),
+                    func.sum(UserDailyStats.question_count).label("question_count"),
                 )
                 .where(
                     and_(
-                        Question.user_id == str(user_id),
-                        Question.created_at >= start_date,
-                        Question.created_at <= end_date,
+                        UserDailyStats.user_id == str(user_id),
+                        UserDailyStats.stat_date >= start_date.date(),
+                        UserDailyStats.stat_date <= end_date.date(),
                     )
                 )
-                .group_by(date_trunc)
+                .group_by(daily_period)
                 .cte("question_stats")
             )
 
@@ -316,6 +439,120 @@ class AnalyticsRepository(BaseRepository):
             logger.error(f"获取时间序列数据失败: {e}", exc_info=True)
             return []
 
+    async def get_question_counts_by_period(
+        self,
+        user_id: UUID,
+        start_date: datetime,
+        end_date: datetime,
+        granularity: str = "daily",
+    ) -> Dict[str, int]:
+        """
+        按时间周期统计提问数（读取日汇总表）
+
+        Args:
+            user_id: 用户ID
+            start_date: 开始日期
+            end_date: 结束日期
+            granularity: 时间粒度
+
+        Returns:
+            {周期字符串: 提问数}
+        """
+        try:
+            period = self.period_expression(UserDailyStats.stat_date, granularity)
+            stmt = (
+                select(
+                    period.label("period"),
+                    func.sum(UserDailyStats.question_count).label("question_count"),
+                )
+                .where(
+                    and_(
+                        UserDailyStats.user_id == str(user_id),
+                        UserDailyStats.stat_date >= start_date.date(),
+                        UserDailyStats.stat_date <= end_date.date(),
+                    )
+                )
+                .group_by(period)
+            )
+
+            result = await self.db.execute(stmt)
+            return {
+                self._period_key(row.period): int(row.question_count or 0)
+                for row in result.all()
+            }
+
+        except Exception as e:
+            logger.error(f"按周期统计提问数失败: {e}", exc_info=True)
+            return {}
+
+    async def get_subject_question_counts(
+        self, user_id: UUID, start_date: Optional[datetime] = None
+    ) -> Dict[str, int]:
+        """
+        按学科统计提问数（读取日汇总表）
+
+        Args:
+            user_id: 用户ID
+            start_date: 开始日期（None 表示全部时间）
+
+        Returns:
+            {学科: 提问数}
+        """
+        try:
+            conditions = [UserDailyStats.user_id == str(user_id)]
+            if start_date:
+                conditions.append(UserDailyStats.stat_date >= start_date.date())
+
+            stmt = (
+                select(
+                    UserDailyStats.subject,
+                    func.sum(UserDailyStats.question_count).label("question_count"),
+                )
+                .where(and_(*conditions))
+                .group_by(UserDailyStats.subject)
+            )
+
+            result = await self.db.execute(stmt)
+            return {row.subject: int(row.question_count or 0) for row in result.all()}
+
+        except Exception as e:
+            logger.error(f"按学科统计提问数失败: {e}", exc_info=True)
+            return {}
+
+    @staticmethod
+    def _period_key(period: Any) -> str:
+        """将周期值统一转换为 YYYY-MM-DD 字符串"""
+        return str(period.date()) if hasattr(period, "date") else str(period)
+
+    def period_expression(self, column, granularity: str):
+        """
+        按时间粒度构建周期截断表达式
+
+        Args:
+            column: 日期/时间列
+            granularity: 时间粒度（daily/weekly/monthly）
+
+        Returns:
+            周期表达式
+        """
+        # 检测数据库类型
+        is_sqlite = "sqlite" in str(self.db.bind.engine.url)
+
+        if granularity == "weekly":
+            if is_sqlite:
+                # SQLite: 使用strftime获取周开始日期
+                return func.date(column, "-" + func.strftime("%w", column) + " days")
+            # PostgreSQL: 使用date_trunc
+            return func.date_trunc("week", column)
+        if granularity == "monthly":
+            if is_sqlite:
+                # SQLite: 使用strftime格式化为月份开始
+                return func.strftime("%Y-%m-01", column)
+            # PostgreSQL: 使用date_trunc
+            return func.date_trunc("month", column)
+        # daily
+        return func.date(column)
+
     async def get_knowledge_point_stats(
         self, user_id: UUID, subject: Optional[str] = None
     ) -> List[Dict[str, Any]]:
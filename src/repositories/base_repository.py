@@ -99,6 +99,34 @@ class BaseRepository(Generic[ModelType]):
             logger.error(f"Error getting {self.model.__name__} by id {record_id}: {e}")
             raise
 
+    async def get_by_ids(self, record_ids: List[str]) -> Dict[str, ModelType]:
+        """
+        根据ID列表批量获取记录（单次 IN 查询）
+
+        Args:
+            record_ids: 记录ID列表
+
+        Returns:
+            以字符串ID为键的模型实例字典，不存在的ID不会出现在结果中
+        """
+        if not record_ids:
+            return {}
+
+        try:
+            unique_ids = list(dict.fromkeys(record_ids))
+            stmt = select(self.model).where(self.model.id.in_(unique_ids))
+            result = await self.db.execute(stmt)
+            instances = result.scalars().all()
+
+            logger.debug(
+                f"Found {len(instances)}/{len(unique_ids)} {self.model.__name__} records by ids"
+            )
+            return {str(instance.id): instance for instance in instances}
+
+        except Exception as e:
+            logger.error(f"Error getting {self.model.__name__} by ids: {e}")
+            raise
+
     async def get_by_field(self, field: str, value: Any) -> Optional[ModelType]:
         """
         根据字段值获取记录
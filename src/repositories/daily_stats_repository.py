@@ -0,0 +1,313 @@
+"""
+学情日汇总仓储层
+提供 user_daily_stats 汇总表的增量维护、区间查询和全量重建
+
+作者: AI Agent
+创建时间: 2025-11-25
+版本: v1.0
+"""
+
+from collections import defaultdict
+from datetime import date, datetime, time
+from typing import Any, Dict, List, Optional, Tuple
+from uuid import UUID
+
+from sqlalchemy import and_, case, delete, func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.core.logging import get_logger
+from src.models.base import is_sqlite
+from src.models.daily_stats import UNKNOWN_SUBJECT, UserDailyStats
+from src.models.learning import Answer, ChatSession, Question
+from src.models.study import MistakeRecord, MistakeReview
+from src.repositories.base_repository import BaseRepository
+
+logger = get_logger(__name__)
+
+# 可增量维护的计数列
+COUNTER_FIELDS = (
+    "question_count",
+    "image_question_count",
+    "session_count",
+    "mistake_count",
+    "review_count",
+    "tokens_used",
+)
+
+
+def _to_date(value: Any) -> Optional[date]:
+    """将 func.date() 的结果统一转换为 date（SQLite 返回字符串）"""
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+class UserDailyStatsRepository(BaseRepository[UserDailyStats]):
+    """学情日汇总仓储"""
+
+    def __init__(self, db: AsyncSession):
+        super().__init__(UserDailyStats, db)
+
+    @staticmethod
+    def _user_key(user_id: Any) -> Any:
+        """SQLite 使用字符串主键，PostgreSQL 使用 UUID"""
+        return str(user_id) if is_sqlite else UUID(str(user_id))
+
+    def _upsert_statement(self, values: Dict[str, Any], deltas: Dict[str, int]):
+        """构建 INSERT ... ON CONFLICT DO UPDATE 累加语句"""
+        if self.db.bind.dialect.name == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+
+        table = UserDailyStats.__table__
+        stmt = dialect_insert(table).values(**values)
+        update_values = {name: table.c[name] + stmt.excluded[name] for name in deltas}
+        update_values["updated_at"] = stmt.excluded.updated_at
+
+        return stmt.on_conflict_do_update(
+            index_elements=[table.c.user_id, table.c.stat_date, table.c.subject],
+            set_=update_values,
+        )
+
+    async def increment(
+        self,
+        user_id: Any,
+        subject: Optional[str],
+        stat_date: Optional[date] = None,
+        **deltas: int,
+    ) -> bool:
+        """
+        原子累加某用户某天某学科的计数（不提交事务）
+
+        语句在 SAVEPOINT 中执行，汇总表写入失败只记录日志，
+        不会中断调用方的业务事务。
+
+        Args:
+            user_id: 用户ID
+            subject: 学科（为空时记为 unknown）
+            stat_date: 统计日期，默认今天
+            **deltas: 计数增量，如 question_count=1, tokens_used=300
+
+        Returns:
+            是否写入成功
+        """
+        deltas = {k: int(v) for k, v in deltas.items() if k in COUNTER_FIELDS and v}
+        if not deltas:
+            return True
+
+        values: Dict[str, Any] = {
+            "user_id": self._user_key(user_id),
+            "stat_date": stat_date or date.today(),
+            "subject": subject or UNKNOWN_SUBJECT,
+        }
+        values.update({name: deltas.get(name, 0) for name in COUNTER_FIELDS})
+
+        try:
+            async with self.db.begin_nested():
+                await self.db.execute(self._upsert_statement(values, deltas))
+            return True
+        except Exception as e:
+            logger.warning(
+                f"更新学情日汇总失败: user={user_id}, subject={subject}, "
+                f"deltas={deltas}, error={e}"
+            )
+            return False
+
+    async def get_daily_series(
+        self,
+        user_id: Any,
+        start_date: Optional[date] = None,
+        end_date: Optional[date] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        查询按天汇总的计数（跨学科合并）
+
+        Args:
+            user_id: 用户ID
+            start_date: 开始日期（包含）
+            end_date: 结束日期（包含）
+
+        Returns:
+            按日期升序的计数字典列表
+        """
+        conditions = [UserDailyStats.user_id == self._user_key(user_id)]
+        if start_date:
+            conditions.append(UserDailyStats.stat_date >= start_date)
+        if end_date:
+            conditions.append(UserDailyStats.stat_date <= end_date)
+
+        stmt = (
+            select(
+                UserDailyStats.stat_date,
+                *[
+                    func.sum(getattr(UserDailyStats, name)).label(name)
+                    for name in COUNTER_FIELDS
+                ],
+            )
+            .where(and_(*conditions))
+            .group_by(UserDailyStats.stat_date)
+            .order_by(UserDailyStats.stat_date)
+        )
+
+        result = await self.db.execute(stmt)
+        return [
+            {
+                "date": _to_date(row.stat_date),
+                **{name: int(getattr(row, name) or 0) for name in COUNTER_FIELDS},
+            }
+            for row in result.all()
+        ]
+
+    async def rebuild(
+        self,
+        user_id: Optional[Any] = None,
+        start_date: Optional[date] = None,
+    ) -> int:
+        """
+        从明细表全量重建汇总行（回填 / 纠偏）
+
+        先删除范围内的汇总行，再按 (用户, 日期, 学科) 从问答、会话、
+        错题、复习记录重新聚合写入，并提交事务。
+
+        Args:
+            user_id: 仅重建该用户（默认全部用户）
+            start_date: 仅重建该日期及之后（默认全部历史）
+
+        Returns:
+            写入的汇总行数
+        """
+        since = datetime.combine(start_date, time.min) if start_date else None
+        totals: Dict[Tuple[str, date, str], Dict[str, int]] = defaultdict(
+            lambda: dict.fromkeys(COUNTER_FIELDS, 0)
+        )
+
+        def _merge(rows, **fields: int) -> None:
+            for row in rows:
+                stat_date = _to_date(row.stat_date)
+                if row.user_id is None or stat_date is None:
+                    continue
+                key = (str(row.user_id), stat_date, row.subject or UNKNOWN_SUBJECT)
+                for name, index in fields.items():
+                    totals[key][name] += int(row[index] or 0)
+
+        # 1. 提问数 / 图片提问数
+        question_date = func.date(Question.created_at)
+        stmt = select(
+            Question.user_id,
+            Question.subject,
+            question_date.label("stat_date"),
+            func.count(Question.id),
+            func.count(case((Question.has_images, Question.id))),
+        ).group_by(Question.user_id, Question.subject, question_date)
+        stmt = self._scope(stmt, Question.user_id, Question.created_at, user_id, since)
+        _merge(
+            (await self.db.execute(stmt)).all(),
+            question_count=3,
+            image_question_count=4,
+        )
+
+        # 2. token 消耗（按答案生成日期计入问题所属学科）
+        answer_date = func.date(Answer.created_at)
+        stmt = (
+            select(
+                Question.user_id,
+                Question.subject,
+                answer_date.label("stat_date"),
+                func.sum(Answer.tokens_used),
+            )
+            .join(Question, Question.id == Answer.question_id)
+            .group_by(Question.user_id, Question.subject, answer_date)
+        )
+        stmt = self._scope(stmt, Question.user_id, Answer.created_at, user_id, since)
+        _merge((await self.db.execute(stmt)).all(), tokens_used=3)
+
+        # 3. 新建会话数
+        session_date = func.date(ChatSession.created_at)
+        stmt = select(
+            ChatSession.user_id,
+            ChatSession.subject,
+            session_date.label("stat_date"),
+            func.count(ChatSession.id),
+        ).group_by(ChatSession.user_id, ChatSession.subject, session_date)
+        stmt = self._scope(
+            stmt, ChatSession.user_id, ChatSession.created_at, user_id, since
+        )
+        _merge((await self.db.execute(stmt)).all(), session_count=3)
+
+        # 4. 新增错题数
+        mistake_date = func.date(MistakeRecord.created_at)
+        stmt = select(
+            MistakeRecord.user_id,
+            MistakeRecord.subject,
+            mistake_date.label("stat_date"),
+            func.count(MistakeRecord.id),
+        ).group_by(MistakeRecord.user_id, MistakeRecord.subject, mistake_date)
+        stmt = self._scope(
+            stmt, MistakeRecord.user_id, MistakeRecord.created_at, user_id, since
+        )
+        _merge((await self.db.execute(stmt)).all(), mistake_count=3)
+
+        # 5. 完成复习数（学科取自错题）
+        review_date = func.date(MistakeReview.review_date)
+        stmt = (
+            select(
+                MistakeReview.user_id,
+                MistakeRecord.subject,
+                review_date.label("stat_date"),
+                func.count(MistakeReview.id),
+            )
+            .join(MistakeRecord, MistakeRecord.id == MistakeReview.mistake_id)
+            .group_by(MistakeReview.user_id, MistakeRecord.subject, review_date)
+        )
+        stmt = self._scope(
+            stmt, MistakeReview.user_id, MistakeReview.review_date, user_id, since
+        )
+        _merge((await self.db.execute(stmt)).all(), review_count=3)
+
+        # 6. 替换范围内的汇总行
+        delete_conditions = []
+        if user_id is not None:
+            delete_conditions.append(UserDailyStats.user_id == self._user_key(user_id))
+        if start_date:
+            delete_conditions.append(UserDailyStats.stat_date >= start_date)
+
+        try:
+            await self.db.execute(delete(UserDailyStats).where(*delete_conditions))
+
+            rows = [
+                {
+                    "user_id": self._user_key(key_user_id),
+                    "stat_date": stat_date,
+                    "subject": subject,
+                    **counters,
+                }
+                for (key_user_id, stat_date, subject), counters in totals.items()
+            ]
+            if rows:
+                await self.db.execute(insert(UserDailyStats), rows)
+
+            await self.db.commit()
+        except Exception as e:
+            await self.db.rollback()
+            logger.error(f"重建学情日汇总失败: {e}")
+            raise
+
+        logger.info(
+            f"Rebuilt {len(totals)} daily stats rows "
+            f"(user={user_id or 'all'}, since={start_date or 'all'})"
+        )
+        return len(totals)
+
+    @staticmethod
+    def _scope(stmt, user_column, time_column, user_id, since):
+        """为重建查询追加用户和起始时间过滤"""
+        if user_id is not None:
+            stmt = stmt.where(user_column == str(user_id))
+        if since is not None:
+            stmt = stmt.where(time_column >= since)
+        return stmt
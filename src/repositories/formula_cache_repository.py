@@ -3,8 +3,9 @@
 负责公式缓存的数据访问操作
 """
 
+from collections import defaultdict
 from datetime import datetime, timedelta
-from typing import List, Optional
+from typing import Dict, List, Mapping, Optional, Sequence
 
 from sqlalchemy import desc, func, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -53,6 +54,68 @@ class FormulaCacheRepository(BaseRepository[FormulaCacheModel]):
             logger.error(f"Error getting cache by hash {latex_hash}: {e}")
             return None
 
+    async def get_by_hashes(
+        self, latex_hashes: Sequence[str]
+    ) -> Dict[str, FormulaCacheModel]:
+        """
+        根据哈希值批量获取缓存（一条 IN 查询，不更新命中次数）
+
+        Args:
+            latex_hashes: LaTeX内容的MD5哈希列表
+
+        Returns:
+            以哈希为键的缓存记录字典，未命中的哈希不出现在结果中
+        """
+        if not latex_hashes:
+            return {}
+
+        try:
+            stmt = select(FormulaCacheModel).where(
+                FormulaCacheModel.latex_hash.in_(list(set(latex_hashes)))
+            )
+            result = await self.db.execute(stmt)
+            caches = {str(c.latex_hash): c for c in result.scalars().all()}
+            logger.debug(
+                f"Batch cache lookup: {len(caches)}/{len(set(latex_hashes))} hits"
+            )
+            return caches
+
+        except Exception as e:
+            logger.error(f"Error getting cache by {len(latex_hashes)} hashes: {e}")
+            return {}
+
+    async def increment_hit_counts(self, hit_counts: Mapping[str, int]) -> None:
+        """
+        批量增加缓存命中次数
+
+        命中次数相同的哈希合并为一条 UPDATE ... IN，一次提交。
+
+        Args:
+            hit_counts: {latex_hash: 累计命中次数}
+        """
+        by_count: Dict[int, List[str]] = defaultdict(list)
+        for latex_hash, count in hit_counts.items():
+            if count > 0:
+                by_count[count].append(latex_hash)
+        if not by_count:
+            return
+
+        try:
+            for count, latex_hashes in by_count.items():
+                stmt = (
+                    update(FormulaCacheModel)
+                    .where(FormulaCacheModel.latex_hash.in_(latex_hashes))
+                    .values(
+                        hit_count=FormulaCacheModel.hit_count + count,
+                        last_accessed_at=func.now(),
+                    )
+                )
+                await self.db.execute(stmt)
+            await self.db.commit()
+
+        except Exception as e:
+            logger.warning(f"Failed to increment hit counts: {e}")
+
     async def increment_hit_count(self, latex_hash: str) -> None:
         """
         增加缓存命中次数
@@ -113,7 +176,7 @@ class FormulaCacheRepository(BaseRepository[FormulaCacheModel]):
                 "formula_type": formula_type,
                 "hit_count": 0,
                 "last_accessed_at": datetime.now().isoformat(),
-                "metadata": metadata,
+                "extra_metadata": metadata,
             }
 
             cache = await self.create(cache_data)
@@ -7,11 +7,11 @@
 版本: v1.0
 """
 
-from datetime import datetime
+from datetime import datetime, timezone
 from typing import Any, Dict, List, Optional
 from uuid import UUID
 
-from sqlalchemy import and_, select
+from sqlalchemy import and_, func, select
 
 from src.core.logging import get_logger
 from src.models.knowledge_graph import (
@@ -19,11 +19,28 @@ from src.models.knowledge_graph import (
     MistakeKnowledgePoint,
     UserKnowledgeGraphSnapshot,
 )
+from src.models.study import KnowledgeMastery, MistakeRecord
 from src.repositories.base_repository import BaseRepository
 
 logger = get_logger(__name__)
 
 
+def _to_naive_datetime(value: Any) -> Optional[datetime]:
+    """
+    将时间戳统一为本地 naive datetime 以便比较
+
+    SQLite 下 created_at/updated_at 以 ISO 字符串存储，
+    PostgreSQL 下为带时区的 datetime。
+    """
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is not None:
+        value = value.astimezone().replace(tzinfo=None)
+    return value
+
+
 class MistakeKnowledgePointRepository(BaseRepository[MistakeKnowledgePoint]):
     """错题-知识点关联仓储"""
 
@@ -53,6 +70,48 @@ class MistakeKnowledgePointRepository(BaseRepository[MistakeKnowledgePoint]):
 
         return list(items)
 
+    async def find_by_mistakes(
+        self, mistake_ids: List[UUID]
+    ) -> Dict[str, List[MistakeKnowledgePoint]]:
+        """
+        批量查询多个错题关联的知识点（单次 IN 查询）
+
+        Args:
+            mistake_ids: 错题ID列表
+
+        Returns:
+            以错题ID字符串为键的知识点关联列表，排序规则与 find_by_mistake 一致
+        """
+        if not mistake_ids:
+            return {}
+
+        stmt = (
+            select(MistakeKnowledgePoint)
+            .where(
+                MistakeKnowledgePoint.mistake_id.in_(
+                    [str(mistake_id) for mistake_id in mistake_ids]
+                )
+            )
+            .order_by(
+                MistakeKnowledgePoint.mistake_id,
+                MistakeKnowledgePoint.is_primary.desc(),
+                MistakeKnowledgePoint.relevance_score.desc(),
+            )
+        )
+
+        result = await self.db.execute(stmt)
+        items = result.scalars().all()
+
+        grouped: Dict[str, List[MistakeKnowledgePoint]] = {}
+        for item in items:
+            grouped.setdefault(str(item.mistake_id), []).append(item)
+
+        logger.debug(
+            f"Found {len(items)} knowledge points for {len(mistake_ids)} mistakes"
+        )
+
+        return grouped
+
     async def find_by_knowledge_point(
         self,
         knowledge_point_id: UUID,
@@ -331,6 +390,123 @@ class UserKnowledgeGraphSnapshotRepository(BaseRepository[UserKnowledgeGraphSnap
 
         return snapshot
 
+    async def get_latest_change_time(
+        self, user_id: UUID, subject: str
+    ) -> Optional[datetime]:
+        """
+        查询用户某学科知识图谱源数据的最近变更时间（高水位）
+
+        单条语句取掌握度、错题、学习轨迹三张表 updated_at 的最大值，
+        与上一份快照的创建时间比较即可判断是否需要重建快照。
+
+        Args:
+            user_id: 用户ID
+            subject: 学科
+
+        Returns:
+            最近变更时间（无任何数据时为 None）
+        """
+        # knowledge_mastery.user_id 在所有数据库上都是 UUID 类型
+        mastery_changed = (
+            select(func.max(KnowledgeMastery.updated_at))
+            .where(
+                and_(
+                    KnowledgeMastery.user_id == UUID(str(user_id)),
+                    KnowledgeMastery.subject == subject,
+                )
+            )
+            .scalar_subquery()
+        )
+        mistake_changed = (
+            select(func.max(MistakeRecord.updated_at))
+            .where(
+                and_(
+                    MistakeRecord.user_id == str(user_id),
+                    MistakeRecord.subject == subject,
+                )
+            )
+            .scalar_subquery()
+        )
+        track_changed = (
+            select(func.max(KnowledgePointLearningTrack.updated_at))
+            .join(
+                KnowledgeMastery,
+                KnowledgeMastery.id == KnowledgePointLearningTrack.knowledge_point_id,
+            )
+            .where(
+                and_(
+                    KnowledgePointLearningTrack.user_id == str(user_id),
+                    KnowledgeMastery.subject == subject,
+                )
+            )
+            .scalar_subquery()
+        )
+
+        result = await self.db.execute(
+            select(mastery_changed, mistake_changed, track_changed)
+        )
+        timestamps = [
+            _to_naive_datetime(value) for value in result.one() if value is not None
+        ]
+
+        return max(timestamps) if timestamps else None
+
+    async def is_snapshot_stale(self, snapshot: UserKnowledgeGraphSnapshot) -> bool:
+        """
+        判断快照之后源数据是否发生过变化
+
+        Args:
+            snapshot: 上一份快照
+
+        Returns:
+            是否需要重建
+        """
+        changed_at = await self.get_latest_change_time(
+            UUID(str(snapshot.user_id)), str(snapshot.subject)
+        )
+        if changed_at is None:
+            return False
+        return changed_at >= _to_naive_datetime(snapshot.created_at)
+
+    async def clone_snapshot(
+        self, previous: UserKnowledgeGraphSnapshot, period_type: str
+    ) -> UserKnowledgeGraphSnapshot:
+        """
+        复制上一份快照作为新的周期快照（源数据无变化时使用）
+
+        Args:
+            previous: 上一份快照
+            period_type: 周期类型
+
+        Returns:
+            新快照记录
+        """
+        snapshot = UserKnowledgeGraphSnapshot(
+            user_id=previous.user_id,
+            subject=previous.subject,
+            snapshot_date=datetime.now(timezone.utc),
+            period_type=period_type,
+            knowledge_points=previous.knowledge_points,
+            weak_chains=previous.weak_chains,
+            strong_areas=previous.strong_areas,
+            graph_data=previous.graph_data,
+            total_mistakes=previous.total_mistakes,
+            average_mastery=previous.average_mastery,
+            improvement_trend=previous.improvement_trend,
+            learning_profile=previous.learning_profile,
+            ai_recommendations=previous.ai_recommendations,
+            previous_snapshot_id=str(previous.id),
+        )
+        self.db.add(snapshot)
+        await self.db.flush()
+
+        logger.debug(
+            f"Cloned snapshot {previous.id} for user {previous.user_id}, "
+            f"subject {previous.subject}"
+        )
+
+        return snapshot
+
     async def compare_snapshots(
         self, current_id: UUID, previous_id: UUID
     ) -> Dict[str, Any]:
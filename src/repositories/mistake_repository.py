@@ -25,6 +25,28 @@ logger = get_logger(__name__)
 class MistakeRepository(BaseRepository[MistakeRecord]):
     """错题记录仓储"""
 
+    async def create(self, data: Dict[str, Any]) -> MistakeRecord:
+        """
+        创建错题记录
+
+        在同一事务中累加学情日汇总的错题数，覆盖所有错题创建入口
+        （手动创建、问答自动创建、作业批改创建）。
+
+        Args:
+            data: 创建数据
+
+        Returns:
+            创建的错题记录
+        """
+        from src.repositories.daily_stats_repository import UserDailyStatsRepository
+
+        if data.get("user_id"):
+            await UserDailyStatsRepository(self.db).increment(
+                data["user_id"], data.get("subject"), mistake_count=1
+            )
+
+        return await super().create(data)
+
     async def find_by_id(self, mistake_id: UUID) -> Optional[MistakeRecord]:
         """
         根据ID查找错题记录
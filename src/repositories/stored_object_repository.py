@@ -0,0 +1,180 @@
+"""
+内容寻址存储对象仓储层
+按内容哈希查找已上传的对象，原子维护引用计数
+"""
+
+from datetime import datetime
+from typing import Any, Dict, Optional, Sequence
+
+from sqlalchemy import delete, or_, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.core.logging import get_logger
+from src.models.stored_object import StoredObject
+from src.repositories.base_repository import BaseRepository
+
+logger = get_logger(__name__)
+
+
+class StoredObjectRepository(BaseRepository[StoredObject]):
+    """存储对象仓储"""
+
+    def __init__(self, db: AsyncSession):
+        super().__init__(StoredObject, db)
+
+    def _timestamp(self, value: datetime) -> Any:
+        """转换为 created_at 列的存储格式（SQLite 下为 ISO 字符串）"""
+        if self.db.bind.dialect.name == "sqlite":
+            return value.isoformat()
+        return value
+
+    async def acquire(
+        self,
+        namespace: str,
+        content_hash: str,
+        storage_type: str,
+        created_after: Optional[datetime] = None,
+    ) -> Optional[StoredObject]:
+        """
+        查找内容相同的已有对象并增加一次引用
+
+        Args:
+            namespace: 命名空间
+            content_hash: 文件内容SHA-256
+            storage_type: 存储类型
+            created_after: 只复用此时间之后登记的对象；更早的记录对应的对象
+                即将被定期清理，直接删除记录，由调用方重新上传
+
+        Returns:
+            已有对象（引用计数已加一），不存在时返回None
+        """
+        if created_after is not None:
+            await self.db.execute(
+                delete(StoredObject).where(
+                    StoredObject.namespace == namespace,
+                    StoredObject.content_hash == content_hash,
+                    StoredObject.storage_type == storage_type,
+                    StoredObject.created_at < self._timestamp(created_after),
+                )
+            )
+
+        stmt = (
+            update(StoredObject)
+            .where(
+                StoredObject.namespace == namespace,
+                StoredObject.content_hash == content_hash,
+                StoredObject.storage_type == storage_type,
+                StoredObject.ref_count > 0,
+            )
+            .values(ref_count=StoredObject.ref_count + 1)
+            .returning(StoredObject)
+            .execution_options(populate_existing=True)
+        )
+        result = await self.db.execute(stmt)
+        stored = result.scalar_one_or_none()
+        await self.db.commit()
+        return stored
+
+    async def register(self, values: Dict[str, Any]) -> StoredObject:
+        """
+        登记新上传的对象
+
+        并发上传同一内容时只有一行生效：冲突时给已有行加一次引用并返回
+        已有行，调用方据此判断自己上传的对象是否多余。
+
+        Args:
+            values: 列值，至少包含 namespace/content_hash/storage_type/object_key/file_url
+
+        Returns:
+            生效的对象记录
+        """
+        if self.db.bind.dialect.name == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+
+        table = StoredObject.__table__
+        values = {"ref_count": 1, **values}
+        stmt = (
+            dialect_insert(StoredObject)
+            .values(**values)
+            .on_conflict_do_update(
+                index_elements=[
+                    table.c.namespace,
+                    table.c.content_hash,
+                    table.c.storage_type,
+                ],
+                set_={"ref_count": table.c.ref_count + 1},
+            )
+            .returning(StoredObject)
+            .execution_options(populate_existing=True)
+        )
+        result = await self.db.execute(stmt)
+        stored = result.scalar_one()
+        await self.db.commit()
+        return stored
+
+    async def release(self, namespace: str, object_key: str) -> Optional[int]:
+        """
+        释放一次引用，归零时删除记录
+
+        Args:
+            namespace: 命名空间
+            object_key: 对象名或本地路径
+
+        Returns:
+            剩余引用数；对象未登记时返回None
+        """
+        stmt = (
+            update(StoredObject)
+            .where(
+                StoredObject.namespace == namespace,
+                StoredObject.object_key == object_key,
+            )
+            .values(ref_count=StoredObject.ref_count - 1)
+            .returning(StoredObject.ref_count)
+        )
+        result = await self.db.execute(stmt)
+        remaining = result.scalar_one_or_none()
+
+        if remaining is not None and remaining <= 0:
+            await self.db.execute(
+                delete(StoredObject).where(
+                    StoredObject.namespace == namespace,
+                    StoredObject.object_key == object_key,
+                    StoredObject.ref_count <= 0,
+                )
+            )
+            remaining = 0
+
+        await self.db.commit()
+        return remaining
+
+    async def delete_by_keys(self, namespace: str, object_keys: Sequence[str]) -> int:
+        """
+        删除已被清理的对象的记录（不考虑引用计数）
+
+        Args:
+            namespace: 命名空间，同时匹配其下按用户划分的子命名空间（namespace:xxx）
+            object_keys: 对象名列表
+
+        Returns:
+            删除的记录数
+        """
+        if not object_keys:
+            return 0
+
+        result = await self.db.execute(
+            delete(StoredObject).where(
+                or_(
+                    StoredObject.namespace == namespace,
+                    StoredObject.namespace.startswith(f"{namespace}:"),
+                ),
+                StoredObject.object_key.in_(list(object_keys)),
+            )
+        )
+        await self.db.commit()
+        logger.debug(
+            f"删除存储对象记录: namespace={namespace}, count={result.rowcount}"
+        )
+        return result.rowcount
@@ -54,6 +54,14 @@ class SubjectType(str, Enum):
     POLITICS = "politics"
 
 
+class FormulaOutputMode(str, Enum):
+    """答案中数学公式的输出方式"""
+
+    IMAGE = "image"  # OSS 图片 URL（每个公式一次图片请求）
+    SVG = "svg"  # 内联 SVG（data URI 图片，小程序 image 组件可直接显示）
+    MATHML = "mathml"  # 内联 MathML（浏览器原生排版）
+
+
 # ========== 基础Schema模型 ==========
 
 
@@ -122,6 +130,9 @@ class AskQuestionRequest(QuestionBase):
     use_context: bool = Field(default=True, description="是否使用学习上下文")
     include_history: bool = Field(default=True, description="是否包含历史对话")
     max_history: int = Field(default=10, ge=0, le=50, description="最大历史消息数")
+    formula_output: Optional[FormulaOutputMode] = Field(
+        None, description="公式输出方式，不提供则使用服务端默认配置"
+    )
 
     model_config = ConfigDict(
         json_schema_extra={
@@ -506,6 +517,9 @@ class QuestionHistoryQuery(BaseModel):
     end_date: Optional[datetime] = None
     page: int = Field(default=1, ge=1)
     size: int = Field(default=20, ge=1, le=100)
+    formula_output: Optional[FormulaOutputMode] = Field(
+        None, description="答案中公式的输出方式，不提供则使用服务端默认配置"
+    )
 
     @validator("subject", pre=True)
     def validate_subject(cls, v):
@@ -3,27 +3,39 @@ AI图片访问服务 - 专门为AI服务提供可访问的图片URL
 解决阿里云百炼AI要求公网可访问图片URL的问题
 """
 
+import hashlib
 import logging
 import uuid
 from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional
 
 import oss2
 from fastapi import UploadFile
 
 from src.core.config import get_settings
 from src.core.exceptions import AIServiceError
+from src.services.stored_object_service import get_stored_object_service
+from src.utils.oss_executor import oss_executor, put_object
 
 logger = logging.getLogger(__name__)
 settings = get_settings()
 
+# AI分析图片的对象名前缀，去重按用户划分子命名空间
+AI_ANALYSIS_NAMESPACE = "ai_analysis"
+
+
+def ai_analysis_namespace(user_id: str) -> str:
+    """用户的AI分析图片去重命名空间，不同用户之间不复用对象"""
+    return f"{AI_ANALYSIS_NAMESPACE}:{user_id}"
+
 
 class AIImageAccessService:
     """AI图片访问服务"""
 
     def __init__(self):
         """初始化AI图片访问服务"""
+        self.object_store = get_stored_object_service()
         self.bucket_name = settings.OSS_BUCKET_NAME
         self.endpoint = settings.OSS_ENDPOINT
 
@@ -161,12 +173,33 @@ class AIImageAccessService:
             )
 
             if self.is_oss_available and self.bucket:
+                # ♻️ 同一用户已上传过同一张图片（如同一份作业照片多次提问）：直接复用
+                # 临近清理的对象不复用，重新上传
+                namespace = ai_analysis_namespace(user_id)
+                content_hash = hashlib.sha256(content).hexdigest()
+                stored = await self.object_store.acquire(
+                    namespace,
+                    content_hash,
+                    "oss",
+                    created_after=datetime.now()
+                    - timedelta(hours=settings.AI_IMAGE_REUSE_HOURS),
+                )
+                if stored:
+                    return self._build_upload_result(
+                        stored["object_key"],
+                        len(content),
+                        file.content_type,
+                        deduplicated=True,
+                    )
+
                 # 上传到OSS（依赖Bucket级别的公共读权限）
                 # 注意：如果OSS不允许对象级ACL，移除 x-oss-object-acl
-                result = self.bucket.put_object(
+                result = await oss_executor.run(
+                    put_object,
+                    self.bucket,
                     object_name,
                     content,
-                    headers={
+                    {
                         # "x-oss-object-acl": "public-read",  # 暂时注释，使用Bucket级别权限
                         "Content-Type": file.content_type or "image/jpeg",
                         "Cache-Control": "max-age=86400",  # 缓存24小时
@@ -174,8 +207,31 @@ class AIImageAccessService:
                 )
 
                 if result.status == 200:
-                    # 生成AI服务可访问的公网URL
-                    public_url = self._generate_ai_accessible_url(object_name)
+                    registered = await self.object_store.register(
+                        namespace,
+                        content_hash,
+                        "oss",
+                        object_key=object_name,
+                        file_url=self._generate_ai_accessible_url(object_name),
+                        file_size=len(content),
+                        mime_type=file.content_type,
+                    )
+                    if registered and registered["object_key"] != object_name:
+                        # 并发上传了相同图片，使用先登记的对象，删除刚上传的这份
+                        await oss_executor.run(self.bucket.delete_object, object_name)
+                        object_name = registered["object_key"]
+
+                    upload_result = self._build_upload_result(
+                        object_name, len(content), file.content_type
+                    )
+                    public_url = upload_result["ai_accessible_url"]
+
+                    # 🖼️ 趁原图数据还在内存，后台生成视觉模型专用版本
+                    from src.services.vision_image_service import (
+                        get_vision_image_optimizer,
+                    )
+
+                    get_vision_image_optimizer().prepare(public_url, content)
 
                     logger.info(
                         f"AI图片上传成功: object={object_name}, url={public_url[:80]}...",
@@ -188,14 +244,7 @@ class AIImageAccessService:
                         },
                     )
 
-                    return {
-                        "ai_accessible_url": public_url,  # AI服务使用这个URL
-                        "object_name": object_name,
-                        "file_size": len(content),
-                        "content_type": file.content_type,
-                        "upload_time": datetime.now().isoformat(),
-                        "storage_type": "oss_public",
-                    }
+                    return upload_result
                 else:
                     raise AIServiceError(f"OSS上传失败: status={result.status}")
             else:
@@ -206,6 +255,36 @@ class AIImageAccessService:
             logger.error(f"AI图片上传失败: user={user_id}, error={e}")
             raise AIServiceError(f"图片上传失败: {str(e)}")
 
+    def _build_upload_result(
+        self,
+        object_name: str,
+        file_size: int,
+        content_type: Optional[str],
+        deduplicated: bool = False,
+    ) -> Dict[str, Any]:
+        """
+        构建OSS上传结果
+
+        Args:
+            object_name: OSS对象名
+            file_size: 文件大小
+            content_type: 内容类型
+            deduplicated: 是否复用了已上传的对象
+
+        Returns:
+            Dict: 包含AI可访问URL的信息
+        """
+        return {
+            # AI服务使用这个URL
+            "ai_accessible_url": self._generate_ai_accessible_url(object_name),
+            "object_name": object_name,
+            "file_size": file_size,
+            "content_type": content_type,
+            "upload_time": datetime.now().isoformat(),
+            "storage_type": "oss_public",
+            "deduplicated": deduplicated,
+        }
+
     def _validate_image_file(self, file: UploadFile, content: bytes) -> None:
         """
         验证图片文件
@@ -320,7 +399,7 @@ class AIImageAccessService:
 
         try:
             # 使用 exists 方法检查对象是否存在
-            exists = self.bucket.object_exists(object_name)
+            exists = await oss_executor.run(self.bucket.object_exists, object_name)
             logger.debug(f"文件存在检查: {object_name} -> {exists}")
             return exists
         except Exception as e:
@@ -373,10 +452,12 @@ class AIImageAccessService:
 
         try:
             # 上传文件到OSS
-            result = self.bucket.put_object(
+            result = await oss_executor.run(
+                put_object,
+                self.bucket,
                 object_name,
                 file_data,
-                headers={
+                {
                     "Content-Type": content_type,
                     "Cache-Control": "max-age=86400",  # 缓存24小时
                 },
@@ -422,12 +503,12 @@ class AIImageAccessService:
             logger.error(f"生成预签名URL失败: {e}")
             return None
 
-    async def cleanup_expired_images(self, hours_old: int = 24) -> int:
+    async def cleanup_expired_images(self, hours_old: Optional[int] = None) -> int:
         """
         清理过期的AI分析图片
 
         Args:
-            hours_old: 超过多少小时的图片被认为过期
+            hours_old: 超过多少小时的图片被认为过期，默认 AI_IMAGE_RETENTION_HOURS
 
         Returns:
             int: 清理的文件数量
@@ -437,18 +518,16 @@ class AIImageAccessService:
             return 0
 
         try:
+            if hours_old is None:
+                hours_old = settings.AI_IMAGE_RETENTION_HOURS
             cutoff_time = datetime.now() - timedelta(hours=hours_old)
-            deleted_count = 0
-
-            # 列出ai_analysis目录下的所有对象
-            for obj in oss2.ObjectIterator(self.bucket, prefix="ai_analysis/"):
-                if obj.last_modified.replace(tzinfo=None) < cutoff_time:
-                    try:
-                        self.bucket.delete_object(obj.key)
-                        deleted_count += 1
-                        logger.debug(f"删除过期AI图片: {obj.key}")
-                    except Exception as e:
-                        logger.error(f"删除文件失败: {obj.key}, error={e}")
+            # 列举和删除都是阻塞调用，放到 OSS 线程池中执行
+            expired_keys = await oss_executor.run(
+                self._list_objects_before, f"{AI_ANALYSIS_NAMESPACE}/", cutoff_time
+            )
+            # 先删除去重记录，避免新的上传复用即将被删除的对象
+            await self.object_store.forget(AI_ANALYSIS_NAMESPACE, expired_keys)
+            deleted_count = await oss_executor.run(self._delete_objects, expired_keys)
 
             logger.info(f"清理过期AI图片完成: 删除了{deleted_count}个文件")
             return deleted_count
@@ -457,6 +536,26 @@ class AIImageAccessService:
             logger.error(f"清理过期图片失败: {e}")
             return 0
 
+    def _list_objects_before(self, prefix: str, cutoff_time: datetime) -> List[str]:
+        """列举前缀下早于截止时间的对象（阻塞调用）"""
+        return [
+            obj.key
+            for obj in oss2.ObjectIterator(self.bucket, prefix=prefix)
+            if datetime.fromtimestamp(obj.last_modified) < cutoff_time
+        ]
+
+    def _delete_objects(self, object_keys: List[str]) -> int:
+        """逐个删除对象（阻塞调用）"""
+        deleted_count = 0
+        for key in object_keys:
+            try:
+                self.bucket.delete_object(key)
+                deleted_count += 1
+                logger.debug(f"删除过期AI图片: {key}")
+            except Exception as e:
+                logger.error(f"删除文件失败: {key}, error={e}")
+        return deleted_count
+
 
 # 全局实例
 ai_image_service = AIImageAccessService()
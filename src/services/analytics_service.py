@@ -19,6 +19,7 @@ from src.core.exceptions import NotFoundError, ServiceError
 from src.models.homework import HomeworkSubmission
 from src.models.learning import Question
 from src.models.user import User
+from src.repositories.analytics_repository import AnalyticsRepository
 
 logger = logging.getLogger("analytics_service")
 
@@ -28,6 +29,7 @@ class AnalyticsService:
 
     def __init__(self, db: AsyncSession):
         self.db = db
+        self.analytics_repo = AnalyticsRepository(db)
 
     async def get_learning_stats(
         self, user_id: UUID, time_range: str = "30d"
@@ -46,27 +48,32 @@ class AnalyticsService:
             # 计算时间范围
             start_date = self._calculate_start_date(time_range)
 
-            # 并行查询多个数据源
-            total_study_days = await self._count_study_days(user_id, start_date)
-            total_questions = await self._count_questions(user_id, start_date)
-            total_homework = await self._count_homework(user_id, start_date)
-            avg_score = await self._calculate_avg_score(user_id, start_date)
+            # 计数类指标合并为单条聚合查询，按天活跃度同时产出学习天数与趋势
+            overview = await self.analytics_repo.get_learning_stats_overview(
+                user_id, start_date
+            )
+            study_trend = await self.analytics_repo.get_daily_question_activity(
+                user_id, start_date
+            )
+            total_study_days = len(study_trend)
+            total_questions = overview["total_questions"]
+            total_homework = overview["total_homework"]
+            avg_score = overview["avg_score"]
             knowledge_points = await self._analyze_knowledge_points(user_id, start_date)
-            study_trend = await self._get_study_trend(user_id, start_date)
 
             # 新增统计
-            total_sessions = await self._count_sessions(user_id, start_date)
+            total_sessions = overview["total_sessions"]
             subject_stats = await self._get_subject_stats(user_id, start_date)
             learning_pattern = await self._analyze_learning_pattern(user_id, start_date)
 
             # "我的"页面统计数据（复用 analytics）
-            image_questions = await self._count_image_questions(user_id, start_date)
-            mistake_count = await self._count_mistakes(user_id, start_date)
+            image_questions = overview["image_questions"]
+            mistake_count = overview["mistake_count"]
 
             # 计算学习时长(估算:每个问答5分钟,每个作业15分钟)
             # 注意: 学习时长统计全部时间(与首页保持一致),不受time_range限制
-            total_questions_all = await self._count_questions(user_id, None)
-            total_homework_all = await self._count_homework(user_id, None)
+            total_questions_all = overview["total_questions_all"]
+            total_homework_all = overview["total_homework_all"]
             estimated_minutes = total_questions_all * 5 + total_homework_all * 15
             study_hours = round(estimated_minutes / 60, 1)
 
@@ -258,103 +265,6 @@ class AnalyticsService:
             logger.warning(f"计算学习天数失败: {e}")
             return 0
 
-    async def _count_questions(
-        self, user_id: UUID, start_date: Optional[datetime]
-    ) -> int:
-        """统计问题数量"""
-        try:
-            conditions = [Question.user_id == str(user_id)]
-            if start_date:
-                conditions.append(Question.created_at >= start_date)
-
-            stmt = select(func.count(Question.id)).where(and_(*conditions))
-            result = await self.db.execute(stmt)
-            return result.scalar() or 0
-
-        except Exception as e:
-            logger.warning(f"统计问题数量失败: {e}")
-            return 0
-
-    async def _count_homework(
-        self, user_id: UUID, start_date: Optional[datetime]
-    ) -> int:
-        """统计作业数量（已弃用，保留兼容性）"""
-        try:
-            conditions = [HomeworkSubmission.student_id == str(user_id)]
-            if start_date:
-                conditions.append(HomeworkSubmission.created_at >= start_date)
-
-            stmt = select(func.count(HomeworkSubmission.id)).where(and_(*conditions))
-            result = await self.db.execute(stmt)
-            return result.scalar() or 0
-
-        except Exception as e:
-            logger.warning(f"统计作业数量失败: {e}")
-            return 0
-
-    async def _count_image_questions(
-        self, user_id: UUID, start_date: Optional[datetime]
-    ) -> int:
-        """统计图片提问数量（作业问答模块）"""
-        try:
-            conditions = [
-                Question.user_id == str(user_id),
-                Question.has_images,  # 有图片的提问
-            ]
-            if start_date:
-                conditions.append(Question.created_at >= start_date)
-
-            stmt = select(func.count(Question.id)).where(and_(*conditions))
-            result = await self.db.execute(stmt)
-            return result.scalar() or 0
-
-        except Exception as e:
-            logger.warning(f"统计图片提问数量失败: {e}")
-            return 0
-
-    async def _count_mistakes(
-        self, user_id: UUID, start_date: Optional[datetime]
-    ) -> int:
-        """统计错题数量"""
-        try:
-            from src.models.study import MistakeRecord
-
-            conditions = [MistakeRecord.user_id == str(user_id)]
-            if start_date:
-                conditions.append(MistakeRecord.created_at >= start_date)
-
-            stmt = select(func.count(MistakeRecord.id)).where(and_(*conditions))
-            result = await self.db.execute(stmt)
-            return result.scalar() or 0
-
-        except Exception as e:
-            logger.warning(f"统计错题数量失败: {e}")
-            return 0
-
-    async def _calculate_avg_score(
-        self, user_id: UUID, start_date: Optional[datetime]
-    ) -> float:
-        """计算平均分"""
-        try:
-            conditions = [
-                HomeworkSubmission.student_id == str(user_id),
-                HomeworkSubmission.total_score.isnot(None),
-            ]
-            if start_date:
-                conditions.append(HomeworkSubmission.created_at >= start_date)
-
-            stmt = select(func.avg(HomeworkSubmission.total_score)).where(
-                and_(*conditions)
-            )
-            result = await self.db.execute(stmt)
-            avg_score = result.scalar()
-
-            return round(avg_score, 1) if avg_score else 0.0
-
-        except Exception as e:
-            logger.warning(f"计算平均分失败: {e}")
-            return 0.0
-
     async def _analyze_knowledge_points(
         self, user_id: UUID, start_date: Optional[datetime]
     ) -> List[Dict[str, Any]]:
@@ -399,35 +309,6 @@ class AnalyticsService:
             logger.warning(f"分析知识点失败: {e}")
             return []
 
-    async def _get_study_trend(
-        self, user_id: UUID, start_date: Optional[datetime]
-    ) -> List[Dict[str, Any]]:
-        """获取学习趋势"""
-        try:
-            conditions = [Question.user_id == str(user_id)]
-            if start_date:
-                conditions.append(Question.created_at >= start_date)
-
-            # 按日期分组统计
-            stmt = (
-                select(
-                    func.date(Question.created_at).label("date"),
-                    func.count(Question.id).label("activity"),
-                )
-                .where(and_(*conditions))
-                .group_by(func.date(Question.created_at))
-                .order_by("date")
-            )
-
-            result = await self.db.execute(stmt)
-            rows = result.all()
-
-            return [{"date": str(row.date), "activity": row.activity} for row in rows]
-
-        except Exception as e:
-            logger.warning(f"获取学习趋势失败: {e}")
-            return []
-
     async def get_learning_progress(
         self, user_id: UUID, start_date: str, end_date: str, granularity: str = "daily"
     ) -> Dict[str, Any]:
@@ -449,35 +330,10 @@ class AnalyticsService:
             start_dt = datetime.fromisoformat(start_date)
             end_dt = datetime.fromisoformat(end_date)
 
-            # 检测数据库类型
-            is_sqlite = "sqlite" in str(self.db.bind.engine.url)
-
             # 根据粒度和数据库类型调整查询
-            if granularity == "weekly":
-                if is_sqlite:
-                    # SQLite: 使用strftime获取周开始日期
-                    date_format = func.date(
-                        HomeworkSubmission.created_at,
-                        "-"
-                        + func.strftime("%w", HomeworkSubmission.created_at)
-                        + " days",
-                    )
-                else:
-                    # PostgreSQL: 使用date_trunc
-                    date_format = func.date_trunc("week", HomeworkSubmission.created_at)
-            elif granularity == "monthly":
-                if is_sqlite:
-                    # SQLite: 使用strftime格式化为月份开始
-                    date_format = func.strftime(
-                        "%Y-%m-01", HomeworkSubmission.created_at
-                    )
-                else:
-                    # PostgreSQL: 使用date_trunc
-                    date_format = func.date_trunc(
-                        "month", HomeworkSubmission.created_at
-                    )
-            else:  # daily
-                date_format = func.date(HomeworkSubmission.created_at)
+            date_format = self.analytics_repo.period_expression(
+                HomeworkSubmission.created_at, granularity
+            )
 
             # 查询作业进度数据
             homework_stmt = (
@@ -503,28 +359,11 @@ class AnalyticsService:
             homework_result = await self.db.execute(homework_stmt)
             homework_data = homework_result.all()
 
-            # 查询问答进度数据
-            question_stmt = (
-                select(
-                    date_format.label("period"),
-                    func.count(Question.id).label("question_count"),
-                )
-                .where(
-                    and_(
-                        Question.user_id == str(user_id),
-                        Question.created_at >= start_dt,
-                        Question.created_at <= end_dt,
-                    )
-                )
-                .group_by(date_format)
-                .order_by(date_format)
+            # 查询问答进度数据（日汇总表）
+            question_data = await self.analytics_repo.get_question_counts_by_period(
+                user_id, start_dt, end_dt, granularity
             )
 
-            question_result = await self.db.execute(question_stmt)
-            question_data = {
-                row.period: row.question_count for row in question_result.all()
-            }
-
             # 合并数据
             progress_data = []
             total_homework = 0
@@ -538,7 +377,7 @@ class AnalyticsService:
                     if hasattr(row.period, "date")
                     else str(row.period)
                 )
-                question_count = question_data.get(row.period, 0)
+                question_count = question_data.get(period_str, 0)
 
                 completion_rate = (
                     row.completed_count / row.homework_count
@@ -711,25 +550,11 @@ class AnalyticsService:
             homework_result = await self.db.execute(homework_stmt)
             homework_data = homework_result.all()
 
-            # 查询问答统计
-            question_conditions = [Question.user_id == str(user_id)]
-            if start_date:
-                question_conditions.append(Question.created_at >= start_date)
-
-            question_stmt = (
-                select(
-                    Question.subject,
-                    func.count(Question.id).label("question_count"),
-                )
-                .where(and_(*question_conditions))
-                .group_by(Question.subject)
+            # 查询问答统计（日汇总表）
+            question_data = await self.analytics_repo.get_subject_question_counts(
+                user_id, start_date
             )
 
-            question_result = await self.db.execute(question_stmt)
-            question_data = {
-                row.subject: row.question_count for row in question_result.all()
-            }
-
             # 合并并处理数据
             subjects = []
             total_subjects = len(homework_data)
@@ -804,36 +629,6 @@ class AnalyticsService:
             logger.error(f"获取学科统计失败: {e}", exc_info=True)
             raise ServiceError(f"获取学科统计失败: {str(e)}")
 
-    async def _count_sessions(
-        self, user_id: UUID, start_date: Optional[datetime]
-    ) -> int:
-        """
-        统计会话数
-
-        Args:
-            user_id: 用户ID
-            start_date: 开始日期
-
-        Returns:
-            会话总数
-        """
-        try:
-            from src.models.learning import ChatSession
-
-            conditions = [ChatSession.user_id == str(user_id)]
-            if start_date:
-                conditions.append(ChatSession.created_at >= start_date)
-
-            stmt = select(func.count(ChatSession.id)).where(and_(*conditions))
-            result = await self.db.execute(stmt)
-            count = result.scalar() or 0
-
-            return int(count)
-
-        except Exception as e:
-            logger.warning(f"统计会话数失败: {e}")
-            return 0
-
     async def _get_rating_stats(
         self, user_id: UUID, start_date: Optional[datetime]
     ) -> Dict[str, Any]:
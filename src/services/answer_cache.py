@@ -0,0 +1,189 @@
+"""
+非个性化问答答案缓存
+
+大量学生会提交完全相同的教材题目（例如同一道练习题的 OCR 文本），
+对不依赖学情上下文和历史对话的提问，按 (归一化题干, 学科, 模型)
+缓存 AI 答案，命中时直接回放，省去一次完整的大模型调用。
+
+缓存为进程内 TTL + LRU，默认关闭，通过 AI_ANSWER_CACHE_ENABLED 开启。
+"""
+
+import hashlib
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
+
+from src.core.config import settings
+from src.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+# 回放时每个增量块的字符数，模拟上游流式输出节奏
+REPLAY_CHUNK_CHARS = 32
+
+_WHITESPACE_RE = re.compile(r"\s+")
+_TRAILING_PUNCTUATION = "?？。.!！~～ "
+
+
+def normalize_question(text: str) -> str:
+    """
+    归一化题干文本
+
+    全角转半角（NFKC）、合并空白并去掉结尾的问号句号，使 OCR 结果中
+    常见的空白和标点差异不影响命中。保留大小写：数学题中 A（集合、矩阵）
+    与 a 含义不同，不能共享答案。
+
+    Args:
+        text: 原始题干
+
+    Returns:
+        归一化后的题干
+    """
+    text = unicodedata.normalize("NFKC", text or "")
+    text = _WHITESPACE_RE.sub(" ", text).strip()
+    return text.rstrip(_TRAILING_PUNCTUATION)
+
+
+@dataclass
+class CachedAnswer:
+    """缓存的答案"""
+
+    content: str
+    tokens_used: int
+    model: str
+
+
+class AnswerCache:
+    """按归一化题干缓存 AI 答案（进程内 TTL + LRU）"""
+
+    def __init__(
+        self,
+        enabled: Optional[bool] = None,
+        ttl: Optional[int] = None,
+        max_size: Optional[int] = None,
+    ):
+        self.enabled = settings.AI_ANSWER_CACHE_ENABLED if enabled is None else enabled
+        self.ttl = settings.AI_ANSWER_CACHE_TTL if ttl is None else ttl
+        self.max_size = settings.AI_ANSWER_CACHE_SIZE if max_size is None else max_size
+        self._entries: "OrderedDict[str, Tuple[float, CachedAnswer]]" = OrderedDict()
+        self._stats = {"hits": 0, "misses": 0, "bypassed": 0, "tokens_saved": 0}
+
+    @staticmethod
+    def make_key(
+        question: str,
+        subject: Optional[str],
+        model: str,
+    ) -> str:
+        """
+        生成缓存键
+
+        非个性化提问的提示词不含学段等用户信息，因此键中也不包含。
+
+        Args:
+            question: 题干原文
+            subject: 学科
+            model: 模型名
+
+        Returns:
+            缓存键（sha256）
+        """
+        raw = "\x1f".join([normalize_question(question), subject or "", model])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def lookup_key(
+        self,
+        question: str,
+        subject: Optional[str],
+        model: str,
+        personalized: bool,
+    ) -> Optional[str]:
+        """
+        判断本次提问能否使用缓存，可以则返回缓存键
+
+        带学情上下文、历史对话或图片的提问是个性化的，自动绕过缓存。
+
+        Returns:
+            缓存键；缓存关闭或需要绕过时返回 None
+        """
+        if not self.enabled or self.ttl <= 0 or self.max_size <= 0:
+            return None
+        if personalized or not normalize_question(question):
+            self._stats["bypassed"] += 1
+            return None
+        return self.make_key(question, subject, model)
+
+    def get(self, key: str) -> Optional[CachedAnswer]:
+        """读取缓存，命中时累计节省的 token"""
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+            self._stats["misses"] += 1
+            return None
+
+        self._entries.move_to_end(key)
+        answer = entry[1]
+        self._stats["hits"] += 1
+        self._stats["tokens_saved"] += answer.tokens_used
+        return answer
+
+    def set(self, key: str, answer: CachedAnswer) -> None:
+        """写入缓存，超出容量时淘汰最久未使用的条目"""
+        if not answer.content:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl, answer)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """清空缓存和统计"""
+        self._entries.clear()
+        self._stats = dict.fromkeys(self._stats, 0)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取命中率和节省的 token 数"""
+        lookups = self._stats["hits"] + self._stats["misses"]
+        return {
+            "enabled": self.enabled,
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            **self._stats,
+            "hit_rate": round(self._stats["hits"] / lookups, 4) if lookups else 0.0,
+        }
+
+
+async def replay_answer(answer: CachedAnswer) -> AsyncIterator[Dict[str, Any]]:
+    """
+    以百炼流式数据块的格式回放缓存答案
+
+    产出的数据块与 BailianService.chat_completion_stream 一致，
+    调用方可以沿用同一套 SSE 处理逻辑；usage 记为 0，因为没有消耗 token。
+
+    Args:
+        answer: 缓存的答案
+
+    Yields:
+        Dict: 流式数据块
+    """
+    full_content = ""
+    content = answer.content
+    for start in range(0, len(content), REPLAY_CHUNK_CHARS):
+        piece = content[start : start + REPLAY_CHUNK_CHARS]
+        full_content += piece
+        is_last = start + REPLAY_CHUNK_CHARS >= len(content)
+        yield {
+            "content": piece,
+            "full_content": full_content,
+            "finish_reason": "stop" if is_last else None,
+            "usage": {"total_tokens": 0} if is_last else {},
+            "request_id": "answer-cache",
+            "model": answer.model,
+        }
+
+
+# 全局实例
+answer_cache = AnswerCache()
@@ -26,11 +26,22 @@ from src.core.exceptions import (
     BailianServiceError,
     BailianTimeoutError,
 )
+from src.core.monitoring import StageTimer
 
 logger = logging.getLogger("bailian_service")
 settings = get_settings()
 
 
+def _h2_available() -> bool:
+    """HTTP/2 需要可选依赖 h2"""
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        logger.info("未安装 h2，百炼客户端使用 HTTP/1.1 连接池")
+        return False
+    return True
+
+
 class MessageRole(str, Enum):
     """消息角色枚举"""
 
@@ -75,6 +86,10 @@ class ChatCompletionResponse:
 class BailianService:
     """阿里云百炼智能体服务"""
 
+    # 纯文本 / 含图片消息分别使用的模型
+    TEXT_MODEL = "qwen-turbo"
+    VISION_MODEL = "qwen-vl-max"
+
     def __init__(self, settings_override=None):
         _settings = settings_override or get_settings()
         self.application_id = _settings.BAILIAN_APPLICATION_ID
@@ -83,15 +98,37 @@ class BailianService:
         self.timeout = _settings.BAILIAN_TIMEOUT
         self.max_retries = _settings.BAILIAN_MAX_RETRIES
 
-        # HTTP客户端配置
+        # HTTP客户端配置：共享连接池，复用 TLS 连接，避免突发请求反复握手
+        self.http2 = _settings.BAILIAN_HTTP2 and _h2_available()
+        self.limits = httpx.Limits(
+            max_connections=_settings.BAILIAN_MAX_CONNECTIONS,
+            max_keepalive_connections=_settings.BAILIAN_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=_settings.BAILIAN_KEEPALIVE_EXPIRY,
+        )
         self.client = httpx.AsyncClient(
-            timeout=httpx.Timeout(self.timeout),
+            timeout=httpx.Timeout(
+                self.timeout, connect=_settings.BAILIAN_CONNECT_TIMEOUT
+            ),
+            limits=self.limits,
+            http2=self.http2,
             headers={
                 "Authorization": f"Bearer {self.api_key}",
                 "Content-Type": "application/json",
                 "User-Agent": "wuhao-tutor/0.1.0",
             },
         )
+        self.warmup_connections = _settings.BAILIAN_WARMUP_CONNECTIONS
+
+        # 限制每个 worker 的并发上游流式调用数
+        self.max_concurrent_streams = _settings.BAILIAN_MAX_CONCURRENT_STREAMS
+        self._stream_slots = asyncio.Semaphore(self.max_concurrent_streams)
+        self._pool_stats = {
+            "active_streams": 0,
+            "peak_streams": 0,
+            "total_streams": 0,
+            "queued_streams": 0,
+            "warmup_connections": 0,
+        }
 
         # 懒加载公式服务，避免循环导入
         self._formula_service = None
@@ -240,6 +277,7 @@ class BailianService:
         self,
         messages: List[Union[Dict[str, Any], ChatMessage]],
         context: Optional[AIContext] = None,
+        timer: Optional[StageTimer] = None,
         **kwargs,
     ):
         """
@@ -248,6 +286,7 @@ class BailianService:
         Args:
             messages: 消息列表
             context: 调用上下文
+            timer: 调用方的阶段计时器，用于记录上游建连和首字节耗时
             **kwargs: 其他参数（temperature, max_tokens等）
 
         Yields:
@@ -268,7 +307,7 @@ class BailianService:
             self._log_request(payload, context)
 
             # 流式调用API
-            async for chunk in self._call_bailian_stream_api(payload):
+            async for chunk in self._call_bailian_stream_api(payload, timer=timer):
                 yield chunk
 
         except Exception as e:
@@ -278,7 +317,9 @@ class BailianService:
 
             raise BailianServiceError(f"流式聊天补全调用失败: {str(e)}") from e
 
-    async def _call_bailian_stream_api(self, payload: Dict[str, Any]):
+    async def _call_bailian_stream_api(
+        self, payload: Dict[str, Any], timer: Optional[StageTimer] = None
+    ):
         """
         流式调用百炼API (SSE)
 
@@ -286,6 +327,8 @@ class BailianService:
 
         Args:
             payload: 请求载荷
+            timer: 阶段计时器，记录 upstream_connect（发出请求到收到响应头）
+                和 upstream_first_byte（响应头到首个数据行）
 
         Yields:
             Dict: SSE 数据块
@@ -302,15 +345,25 @@ class BailianService:
         openai_payload["stream"] = True
         openai_payload["stream_options"] = {"include_usage": True}
 
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json",
-        }
+        # 超过并发上限时排队等待空闲槽位
+        if self._stream_slots.locked():
+            self._pool_stats["queued_streams"] += 1
+        await self._stream_slots.acquire()
+        self._pool_stats["active_streams"] += 1
+        self._pool_stats["total_streams"] += 1
+        self._pool_stats["peak_streams"] = max(
+            self._pool_stats["peak_streams"], self._pool_stats["active_streams"]
+        )
+
+        request_started = time.perf_counter()
 
         try:
-            async with self.client.stream(
-                "POST", url, json=openai_payload, headers=headers, timeout=120.0
-            ) as response:
+            # 认证头和超时沿用共享客户端的配置
+            async with self.client.stream("POST", url, json=openai_payload) as response:
+                headers_received = time.perf_counter()
+                if timer:
+                    timer.record("upstream_connect", headers_received - request_started)
+
                 # 处理HTTP错误
                 if response.status_code == 401:
                     raise BailianAuthError("API密钥无效或过期")
@@ -328,11 +381,20 @@ class BailianService:
                 # 解析SSE流 (OpenAI 格式)
                 full_content = ""
                 is_finished = False  # 🔧 标志：确保只发送一次 finish_reason="stop"
+                first_line = True
 
                 async for line in response.aiter_lines():
                     if not line or not line.strip():
                         continue
 
+                    if first_line:
+                        first_line = False
+                        if timer:
+                            timer.record(
+                                "upstream_first_byte",
+                                time.perf_counter() - headers_received,
+                            )
+
                     # SSE格式: data: {json}
                     if line.startswith("data:"):
                         data_str = line[5:].strip()
@@ -408,6 +470,68 @@ class BailianService:
             raise BailianTimeoutError(f"API调用超时（{self.timeout}秒）")
         except httpx.RequestError as e:
             raise BailianServiceError(f"网络请求错误: {str(e)}") from e
+        finally:
+            self._pool_stats["active_streams"] -= 1
+            self._stream_slots.release()
+
+    async def warm_up(self) -> int:
+        """
+        预热连接池：提前完成 DNS 解析和 TLS 握手
+
+        并发发送若干个轻量 HEAD 请求，建立的连接保留在池中供后续调用复用。
+        任何错误只记录日志，不影响应用启动。
+
+        Returns:
+            成功预热的连接数
+        """
+        if self.warmup_connections <= 0 or not self.api_key:
+            return 0
+
+        base_domain = self.base_url.replace("/api/v1", "")
+
+        async def _touch() -> bool:
+            try:
+                await self.client.head(base_domain)
+                return True
+            except httpx.HTTPError as e:
+                logger.warning(f"百炼连接预热失败: {e}")
+                return False
+
+        results = await asyncio.gather(
+            *[_touch() for _ in range(self.warmup_connections)]
+        )
+        warmed = sum(results)
+        self._pool_stats["warmup_connections"] = warmed
+        logger.info(
+            f"百炼连接池预热完成: {warmed}/{self.warmup_connections}, "
+            f"http2={self.http2}"
+        )
+        return warmed
+
+    def get_pool_stats(self) -> Dict[str, Any]:
+        """
+        获取连接池统计
+
+        Returns:
+            连接池配置、当前连接数和流式调用并发情况
+        """
+        connections = []
+        try:
+            # httpx 未公开连接池状态，读取底层 httpcore 连接池
+            connections = list(self.client._transport._pool.connections)
+        except AttributeError:
+            pass
+
+        return {
+            "http2": self.http2,
+            "max_connections": self.limits.max_connections,
+            "max_keepalive_connections": self.limits.max_keepalive_connections,
+            "keepalive_expiry": self.limits.keepalive_expiry,
+            "max_concurrent_streams": self.max_concurrent_streams,
+            "open_connections": len(connections),
+            "idle_connections": sum(1 for conn in connections if conn.is_idle()),
+            **self._pool_stats,
+        }
 
     async def _call_bailian_api_with_retry(
         self, payload: Dict[str, Any]
@@ -661,7 +785,7 @@ class BailianService:
         """
         # 检查是否包含图片，如果有则使用视觉模型
         has_images = self._has_images_in_messages(messages)
-        model = "qwen-vl-max" if has_images else "qwen-turbo"
+        model = self.VISION_MODEL if has_images else self.TEXT_MODEL
 
         # 🔍 调试日志：记录模型选择和图片检测
         if has_images:
@@ -345,8 +345,16 @@ class FileService:
         # 确保指针在开始位置
         file_buffer.seek(0)
 
-        # 上传
-        bucket.put_object(file_key, file_buffer, headers={"Content-Type": content_type})
+        # 上传（在 OSS 专用线程池中执行，不阻塞事件循环）
+        from src.utils.oss_executor import oss_executor, put_object
+
+        await oss_executor.run(
+            put_object,
+            bucket,
+            file_key,
+            file_buffer.getvalue(),
+            {"Content-Type": content_type},
+        )
 
         # 生成签名URL (有效期1小时)
         url = bucket.sign_url("GET", file_key, 3600)
@@ -4,21 +4,119 @@
 """
 
 import asyncio
+import base64
 import hashlib
 import logging
 import re
 import time
-from typing import Any, Dict, List, Optional
+from collections import Counter, OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple
 
 import httpx
 
 from src.core.config import get_settings
 from src.core.monitoring import get_formula_metrics
+from src.schemas.learning import FormulaOutputMode
+from src.utils.latex_svg import (
+    UnsupportedLatexError,
+    render_latex_mathml,
+    render_latex_svg,
+)
 
 logger = logging.getLogger(__name__)
 settings = get_settings()
 
 
+class HotFormulaCache:
+    """
+    热门公式 URL 缓存（进程内 LRU）
+
+    - 启动时按数据库命中次数预热 Top-N 公式，新渲染的公式也写入缓存
+    - URL 在信任期内直接使用，过期后 HEAD 校验一次再续期
+    - 命中次数先在内存中累计，由后台任务定期批量写回数据库
+    """
+
+    def __init__(
+        self,
+        max_size: Optional[int] = None,
+        trust_seconds: Optional[int] = None,
+    ):
+        self.max_size = (
+            settings.FORMULA_HOT_CACHE_SIZE if max_size is None else max_size
+        )
+        self.trust_seconds = (
+            settings.FORMULA_URL_TRUST_SECONDS
+            if trust_seconds is None
+            else trust_seconds
+        )
+        # latex_hash -> (url, 信任截止时间)
+        self._entries: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._pending_hits: Counter = Counter()
+        self._stats = {"hits": 0, "misses": 0, "revalidations": 0}
+
+    def get(self, key: str) -> Optional[Tuple[str, bool]]:
+        """
+        读取缓存
+
+        Returns:
+            (url, 是否仍在信任期内)；未缓存时返回 None
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            self._stats["misses"] += 1
+            return None
+
+        self._entries.move_to_end(key)
+        url, trusted_until = entry
+        trusted = trusted_until > time.monotonic()
+        self._stats["hits" if trusted else "revalidations"] += 1
+        return url, trusted
+
+    def set(self, key: str, url: str) -> None:
+        """写入（或续期）缓存，超出容量时淘汰最久未使用的条目"""
+        if self.max_size <= 0:
+            return
+        self._entries[key] = (url, time.monotonic() + self.trust_seconds)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def discard(self, key: str) -> None:
+        """移除失效的 URL"""
+        self._entries.pop(key, None)
+
+    def record_hits(self, keys: Iterable[str]) -> None:
+        """累计命中次数，等待批量写回"""
+        for key in keys:
+            self._pending_hits[key] += 1
+
+    def drain_hits(self) -> Dict[str, int]:
+        """取出并清空累计的命中次数"""
+        hits = dict(self._pending_hits)
+        self._pending_hits.clear()
+        return hits
+
+    def clear(self) -> None:
+        """清空缓存和统计"""
+        self._entries.clear()
+        self._pending_hits.clear()
+        self._stats = dict.fromkeys(self._stats, 0)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存统计"""
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "trust_seconds": self.trust_seconds,
+            "pending_hits": sum(self._pending_hits.values()),
+            **self._stats,
+        }
+
+
+# 进程内共享的热门公式缓存
+hot_formula_cache = HotFormulaCache()
+
+
 class FormulaService:
     """数学公式渲染服务 - 多层降级策略版本"""
 
@@ -32,6 +130,19 @@ class FormulaService:
         # 监控指标
         self.metrics = get_formula_metrics()
 
+        # 热门公式 URL 缓存
+        self.hot_cache = hot_formula_cache
+        # 内联公式片段缓存（键为 输出方式:内容哈希，空串表示本地不支持）
+        self._inline_cache: "OrderedDict[str, str]" = OrderedDict()
+        # 读取路径上未命中、转到后台渲染的公式（按缓存键去重）
+        self._queued_renders: Set[str] = set()
+        self._background_renders: Set["asyncio.Task[Any]"] = set()
+
+        # 并发渲染上限（URL 校验和渲染共用，所有请求共享）
+        self._render_semaphore = asyncio.Semaphore(
+            max(1, settings.FORMULA_RENDER_CONCURRENCY)
+        )
+
         # QuickLaTeX配置
         self.quicklatex_api = "https://quicklatex.com/latex3.f"
         self.default_formula_size = "\\large"  # 公式大小
@@ -42,6 +153,8 @@ class FormulaService:
 
         # 简单公式复杂度阈值
         self.simple_formula_max_length = 50
+        # 本地渲染字号（像素）
+        self.local_font_sizes = {"inline": 20, "block": 24}
         self.complex_commands = [
             r"\\frac",
             r"\\sum",
@@ -56,15 +169,21 @@ class FormulaService:
             r"\\infty",
         ]
 
-    async def process_text_with_formulas(self, text: str) -> str:
+    async def process_text_with_formulas(
+        self, text: str, output_mode: Optional[str] = None
+    ) -> str:
         """
-        处理包含LaTeX公式的文本，将公式转换为图片URL
+        处理包含LaTeX公式的文本，将公式转换为图片URL或内联片段
+
+        内联模式（svg / mathml）下公式直接嵌入文本，客户端一次响应即可
+        完整显示；本地渲染器不支持的公式仍使用图片URL。
 
         Args:
             text: 原始文本内容
+            output_mode: 公式输出方式 image / svg / mathml，默认 FORMULA_OUTPUT_MODE
 
         Returns:
-            处理后的文本，公式已替换为图片标签
+            处理后的文本，公式已替换为图片标签或内联 MathML
         """
         if not text:
             return text
@@ -75,18 +194,33 @@ class FormulaService:
             if not formulas:
                 return text
 
-            # 2. 批量渲染公式
-            formula_urls = await self._batch_render_formulas(formulas)
+            # 2. 内联模式先在本地渲染
+            mode = self._resolve_output_mode(output_mode)
+            inline_fragments: Dict[str, str] = {}
+            if mode != FormulaOutputMode.IMAGE:
+                inline_fragments = await self._render_inline_formulas(formulas, mode)
 
-            # 3. 替换原文中的公式
+            # 3. 批量渲染其余公式为图片URL
+            remaining = [f for f in formulas if f["content"] not in inline_fragments]
+            formula_urls = (
+                await self._batch_render_formulas(remaining) if remaining else {}
+            )
+
+            # SVG 片段是 data URI，沿用图片标签；MathML 直接嵌入
+            if mode == FormulaOutputMode.SVG:
+                formula_urls.update(inline_fragments)
+                inline_fragments = {}
+
+            # 4. 替换原文中的公式
             processed_text = await self._replace_formulas_with_images(
-                text, formulas, formula_urls
+                text, formulas, formula_urls, inline_fragments
             )
 
             logger.info(
                 f"成功处理 {len(formulas)} 个数学公式",
                 extra={
                     "formula_count": len(formulas),
+                    "output_mode": mode.value,
                     "original_length": len(text),
                     "processed_length": len(processed_text),
                 },
@@ -99,6 +233,199 @@ class FormulaService:
             # 出错时返回原文本，不影响正常功能
             return text
 
+    async def process_texts_with_formulas(
+        self, texts: Sequence[str], output_mode: Optional[str] = None
+    ) -> List[str]:
+        """
+        批量处理多段文本中的公式（如一页历史答案），不在请求中远程渲染
+
+        所有文本的公式合并后只查一次缓存；没有缓存图片的公式，本地能渲染的
+        内联为 SVG，否则保留 LaTeX，同时转到后台渲染，下次读取即可命中。
+
+        Args:
+            texts: 原始文本列表
+            output_mode: 公式输出方式 image / svg / mathml，默认 FORMULA_OUTPUT_MODE
+
+        Returns:
+            与输入顺序一致的处理后文本
+        """
+        results = list(texts)
+        try:
+            per_text = [self._extract_formulas(text) if text else [] for text in texts]
+            formulas = [formula for found in per_text for formula in found]
+            if not formulas:
+                return results
+
+            mode = self._resolve_output_mode(output_mode)
+            inline_fragments: Dict[str, str] = {}
+            if mode != FormulaOutputMode.IMAGE:
+                inline_fragments = await self._render_inline_formulas(formulas, mode)
+
+            remaining = [f for f in formulas if f["content"] not in inline_fragments]
+            formula_urls = await self._lookup_formula_urls(remaining)
+            misses = [f for f in remaining if f["content"] not in formula_urls]
+            if misses:
+                self._queue_background_render(misses)
+                # 本地渲染的 SVG 不依赖 OSS，先用 data URI 顶上
+                formula_urls.update(
+                    await self._render_inline_formulas(misses, FormulaOutputMode.SVG)
+                )
+
+            if mode == FormulaOutputMode.SVG:
+                formula_urls.update(inline_fragments)
+                inline_fragments = {}
+
+            for index, found in enumerate(per_text):
+                if found:
+                    results[index] = await self._replace_formulas_with_images(
+                        texts[index], found, formula_urls, inline_fragments
+                    )
+
+            logger.debug(
+                f"批量处理 {len(texts)} 段文本的 {len(formulas)} 个公式，"
+                f"后台渲染 {len(misses)} 个"
+            )
+            return results
+
+        except Exception as e:
+            logger.error(f"批量公式处理失败: {e}", exc_info=True)
+            return list(texts)
+
+    async def _lookup_formula_urls(
+        self, formulas: List[Dict[str, Any]]
+    ) -> Dict[str, str]:
+        """
+        只查已有的图片 URL（热门公式缓存 + 一次数据库 IN 查询），不校验、不渲染
+
+        Returns:
+            Dict: {formula_content: image_url}
+        """
+        keys: Dict[str, str] = {}
+        for formula_info in formulas:
+            content = formula_info["content"]
+            if content:
+                keys.setdefault(
+                    self._generate_cache_key(content, formula_info["type"]), content
+                )
+
+        urls: Dict[str, str] = {}
+        for key in keys:
+            entry = self.hot_cache.get(key)
+            if entry is not None and entry[1]:
+                urls[key] = entry[0]
+
+        missing = [key for key in keys if key not in urls]
+        if missing:
+            try:
+                records = await self._query_db_cache(missing)
+            except Exception as e:
+                logger.warning(f"公式缓存查询失败，按未命中处理: {e}")
+                records = {}
+            urls.update(
+                (key, str(record.image_url))
+                for key, record in records.items()
+                if record.image_url is not None
+            )
+
+        self.hot_cache.record_hits(urls)
+        return {keys[key]: url for key, url in urls.items()}
+
+    def _queue_background_render(self, formulas: List[Dict[str, Any]]) -> None:
+        """把未命中的公式转到后台渲染（同一公式只排队一次）"""
+        queued = []
+        for formula_info in formulas:
+            key = self._generate_cache_key(
+                formula_info["content"], formula_info["type"]
+            )
+            if key not in self._queued_renders:
+                self._queued_renders.add(key)
+                queued.append((key, formula_info))
+        if not queued:
+            return
+
+        async def render() -> None:
+            try:
+                await self._batch_render_formulas([info for _, info in queued])
+            finally:
+                self._queued_renders.difference_update(key for key, _ in queued)
+
+        task = asyncio.create_task(render())
+        self._background_renders.add(task)
+        task.add_done_callback(self._background_renders.discard)
+
+    @staticmethod
+    def _resolve_output_mode(output_mode: Optional[str]) -> FormulaOutputMode:
+        """解析公式输出方式，未知值回退到图片模式"""
+        try:
+            return FormulaOutputMode(output_mode or settings.FORMULA_OUTPUT_MODE)
+        except ValueError:
+            logger.warning(f"未知的公式输出方式 {output_mode}，使用图片模式")
+            return FormulaOutputMode.IMAGE
+
+    async def _render_inline_formulas(
+        self, formulas: List[Dict[str, Any]], mode: FormulaOutputMode
+    ) -> Dict[str, str]:
+        """
+        把公式渲染为内联片段（按输出方式和内容哈希缓存）
+
+        Returns:
+            Dict: {formula_content: 片段}；SVG 模式为 data URI，MathML 模式为
+            <math> 元素。本地渲染器不支持的公式不出现在结果中
+        """
+        fragments: Dict[str, str] = {}
+        pending: Dict[str, Tuple[str, str]] = {}
+        for formula_info in formulas:
+            content = formula_info["content"]
+            if not content or content in fragments or content in pending:
+                continue
+            formula_type = formula_info["type"]
+            key = f"{mode.value}:{self._generate_cache_key(content, formula_type)}"
+            cached = self._inline_cache.get(key)
+            if cached is None:
+                pending[content] = (key, formula_type)
+                continue
+            self._inline_cache.move_to_end(key)
+            if cached:
+                fragments[content] = cached
+
+        if pending:
+            rendered = await asyncio.to_thread(self._render_inline_batch, pending, mode)
+            for content, (key, _) in pending.items():
+                fragment = rendered.get(content, "")
+                self._inline_cache[key] = fragment
+                if fragment:
+                    fragments[content] = fragment
+            while len(self._inline_cache) > self.hot_cache.max_size:
+                self._inline_cache.popitem(last=False)
+
+        return fragments
+
+    def _render_inline_batch(
+        self, pending: Dict[str, Tuple[str, str]], mode: FormulaOutputMode
+    ) -> Dict[str, str]:
+        """在线程池中批量生成内联片段，跳过本地不支持的公式"""
+        fragments = {}
+        for content, (_, formula_type) in pending.items():
+            try:
+                if mode == FormulaOutputMode.MATHML:
+                    fragments[content] = render_latex_mathml(
+                        content, display=formula_type == "block"
+                    )
+                else:
+                    font_size = self.local_font_sizes.get(formula_type, 20)
+                    fragments[content] = self._svg_data_uri(
+                        render_latex_svg(content, font_size)
+                    )
+            except UnsupportedLatexError:
+                continue
+        return fragments
+
+    @staticmethod
+    def _svg_data_uri(svg: str) -> str:
+        """把 SVG 编码为 data URI"""
+        encoded = base64.b64encode(svg.encode("utf-8")).decode("ascii")
+        return f"data:image/svg+xml;base64,{encoded}"
+
     def _extract_formulas(self, text: str) -> List[Dict[str, Any]]:
         """
         从文本中提取LaTeX公式
@@ -154,38 +481,59 @@ class FormulaService:
         """
         批量渲染公式为图片URL
 
+        同一文本中重复的公式只处理一次；缓存用一次 IN 查询批量读取，
+        未命中的公式在信号量限制内并发渲染。
+
         Returns:
             Dict: {formula_content: image_url}
         """
-        formula_urls = {}
-
+        # 按缓存键去重
+        unique: Dict[str, Dict[str, Any]] = {}
         for formula_info in formulas:
             content = formula_info["content"]
             if not content:
                 continue
+            cache_key = self._generate_cache_key(content, formula_info["type"])
+            unique.setdefault(cache_key, formula_info)
 
-            try:
-                # 生成缓存键
-                cache_key = self._generate_cache_key(content, formula_info["type"])
-
-                # 检查缓存
-                cached_url = await self._get_cached_formula_url(cache_key)
-                if cached_url:
-                    formula_urls[content] = cached_url
-                    continue
-
-                # 渲染新公式
-                image_url = await self._render_single_formula(
-                    content, formula_info["type"], cache_key
-                )
+        if not unique:
+            return {}
 
-                if image_url:
-                    formula_urls[content] = image_url
+        cached_urls = await self._get_cached_formula_urls(list(unique))
 
+        async def render(cache_key: str, formula_info: Dict[str, Any]):
+            content = formula_info["content"]
+            try:
+                async with self._render_semaphore:
+                    return await self._render_single_formula(
+                        content, formula_info["type"], cache_key
+                    )
             except Exception as e:
                 logger.warning(f"渲染公式失败: {content[:50]}... - {e}")
-                continue
+                return None
 
+        pending = [
+            (cache_key, formula_info)
+            for cache_key, formula_info in unique.items()
+            if cache_key not in cached_urls
+        ]
+        rendered = await asyncio.gather(
+            *(render(cache_key, formula_info) for cache_key, formula_info in pending)
+        )
+
+        formula_urls = {}
+        for cache_key, formula_info in unique.items():
+            if cache_key in cached_urls:
+                formula_urls[formula_info["content"]] = cached_urls[cache_key]
+        for (cache_key, formula_info), image_url in zip(pending, rendered, strict=True):
+            if image_url:
+                formula_urls[formula_info["content"]] = image_url
+                self.hot_cache.set(cache_key, image_url)
+
+        logger.debug(
+            f"公式渲染: 共 {len(formulas)} 个, 去重后 {len(unique)} 个, "
+            f"缓存命中 {len(cached_urls)} 个"
+        )
         return formula_urls
 
     def _generate_cache_key(self, content: str, formula_type: str) -> str:
@@ -196,91 +544,226 @@ class FormulaService:
 
     async def _get_cached_formula_url(self, cache_key: str) -> Optional[str]:
         """
-        检查公式缓存（多层缓存策略）
+        检查单个公式的缓存
+
+        Returns:
+            缓存的图片 URL 或 None
+        """
+        return (await self._get_cached_formula_urls([cache_key])).get(cache_key)
+
+    async def _get_cached_formula_urls(self, cache_keys: List[str]) -> Dict[str, str]:
+        """
+        批量检查公式缓存（多层缓存策略）
 
         优先级：
-        1. 数据库缓存（最快）
-        2. OSS 文件存在检查
+        1. 进程内热门公式缓存（信任期内不发起任何网络请求）
+        2. 数据库缓存（一次 IN 查询，URL 并发校验）
+        3. OSS 文件存在检查（数据库未命中的公式并发检查）
 
         Returns:
-            缓存的图片 URL 或 None
+            以缓存键为键的图片 URL 字典，未命中的键不出现在结果中
         """
+        urls: Dict[str, str] = {}
+        stale: Dict[str, str] = {}
+        for key in cache_keys:
+            entry = self.hot_cache.get(key)
+            if entry is not None:
+                url, trusted = entry
+                (urls if trusted else stale)[key] = url
+
+        # 信任期已过的 URL 重新校验一次，失效的直接重新渲染
+        if stale:
+            valid = await asyncio.gather(
+                *(self._verify_url_limited(url) for url in stale.values())
+            )
+            for (key, url), ok in zip(stale.items(), valid, strict=True):
+                if ok:
+                    urls[key] = url
+                    self.hot_cache.set(key, url)
+                else:
+                    self.hot_cache.discard(key)
+                    logger.warning(f"缓存 URL 已失效，将重新渲染: {key[:8]}...")
+
+        self.hot_cache.record_hits(urls)
+
+        missing = [key for key in cache_keys if key not in urls and key not in stale]
+        if missing:
+            urls.update(await self._get_db_cached_formula_urls(missing))
+
+        return urls
+
+    async def _get_db_cached_formula_urls(
+        self, cache_keys: List[str]
+    ) -> Dict[str, str]:
+        """
+        从数据库和 OSS 批量检查公式缓存，命中结果写入热门公式缓存
+
+        Returns:
+            以缓存键为键的图片 URL 字典
+        """
+        try:
+            cached = await self._query_db_cache(cache_keys)
+
+            db_urls = {
+                key: str(record.image_url)
+                for key, record in cached.items()
+                if record.image_url is not None
+            }
+
+            # 验证 URL 是否仍然有效（每个 URL 一次 HEAD 请求，并发执行）
+            valid = await asyncio.gather(
+                *(self._verify_url_limited(url) for url in db_urls.values())
+            )
+            urls = {
+                key: url
+                for (key, url), ok in zip(db_urls.items(), valid, strict=True)
+                if ok
+            }
+            for key in db_urls.keys() - urls.keys():
+                logger.warning(f"缓存 URL 已失效，将重新渲染: {key[:8]}...")
+
+            if urls:
+                logger.debug(f"✅ 数据库缓存命中 {len(urls)} 个")
+                # 命中次数由后台任务批量写回
+                self.hot_cache.record_hits(urls)
+
+            # 数据库中没有，尝试检查 OSS（备用方案）
+            oss_keys = [key for key in cache_keys if key not in cached]
+            if oss_keys:
+                oss_urls = await asyncio.gather(
+                    *(self._get_oss_cached_url(key) for key in oss_keys)
+                )
+                urls.update(
+                    (key, url)
+                    for key, url in zip(oss_keys, oss_urls, strict=True)
+                    if url
+                )
+
+            for key, url in urls.items():
+                self.hot_cache.set(key, url)
+            return urls
+
+        except Exception as e:
+            logger.error(f"缓存检查失败: {e}")
+            return {}
+
+    async def _query_db_cache(self, cache_keys: List[str]) -> Dict[str, Any]:
+        """用一次 IN 查询读取数据库中的公式缓存记录"""
+        from src.core.database import get_db
+        from src.repositories.formula_cache_repository import FormulaCacheRepository
+
+        db_gen = get_db()
+        db = await db_gen.__anext__()
+        try:
+            return await FormulaCacheRepository(db).get_by_hashes(cache_keys)
+        finally:
+            await db_gen.aclose()
+
+    async def preload_hot_formulas(self, limit: Optional[int] = None) -> int:
+        """
+        按数据库命中次数预热热门公式缓存
+
+        Args:
+            limit: 预热数量，默认 FORMULA_HOT_PRELOAD_COUNT
+
+        Returns:
+            预热的公式数
+        """
+        limit = settings.FORMULA_HOT_PRELOAD_COUNT if limit is None else limit
+        limit = min(limit, self.hot_cache.max_size)
+        if limit <= 0:
+            return 0
+
         try:
-            # 1. 先查数据库缓存
             from src.core.database import get_db
             from src.repositories.formula_cache_repository import FormulaCacheRepository
 
             db_gen = get_db()
             db = await db_gen.__anext__()
             try:
-                cache_repo = FormulaCacheRepository(db)
-                cached = await cache_repo.get_by_hash(cache_key)
-
-                if cached is not None and cached.image_url is not None:
-                    logger.debug(f"✅ 数据库缓存命中: {cache_key[:8]}...")
-
-                    # 验证 URL 是否仍然有效（可选，增加一次网络请求）
-                    if await self._verify_url(str(cached.image_url)):
-                        # 数据库缓存有效，更新命中计数（异步，不等待）
-                        try:
-                            await cache_repo.increment_hit_count(cache_key)
-                        except Exception as e:
-                            logger.debug(f"更新命中计数失败（不影响主流程）: {e}")
-                        return (
-                            str(cached.image_url)
-                            if cached.image_url is not None
-                            else None
-                        )
-                    else:
-                        logger.warning(
-                            f"缓存 URL 已失效，将重新渲染: {cache_key[:8]}..."
-                        )
-                        return None
-
-                # 2. 数据库中没有，尝试检查 OSS（备用方案）
-                logger.debug(f"数据库缓存未命中: {cache_key[:8]}...")
-
-                # OSS 文件存在检查（如果 OSS 有 head_object 方法）
-                # 由于 file_exists 可能未实现，这里使用 try-except 包裹
-                try:
-                    png_path = f"{self.cache_prefix}{cache_key}.png"
-                    svg_path = f"{self.cache_prefix}{cache_key}.svg"
-
-                    # 检查 PNG 文件
-                    if hasattr(self.ai_image_service, "file_exists") and hasattr(
-                        self.ai_image_service, "get_file_url"
-                    ):
-                        if await self.ai_image_service.file_exists(png_path):  # type: ignore
-                            url = await self.ai_image_service.get_file_url(png_path)  # type: ignore
-                            if url is not None:
-                                logger.info(f"OSS 缓存命中（PNG）: {cache_key[:8]}...")
-                                # 回写到数据库缓存
-                                await self._save_to_db_cache(
-                                    cache_key, "", str(url), "inline"
-                                )
-                                return str(url)
-
-                            # 检查 SVG 文件
-                            if await self.ai_image_service.file_exists(svg_path):  # type: ignore
-                                url = await self.ai_image_service.get_file_url(svg_path)  # type: ignore
-                                if url is not None:
-                                    logger.info(
-                                        f"OSS 缓存命中（SVG）: {cache_key[:8]}..."
-                                    )
-                                    await self._save_to_db_cache(
-                                        cache_key, "", str(url), "inline"
-                                    )
-                                    return str(url)
-                except Exception as oss_err:
-                    logger.debug(f"OSS 检查失败（可能不支持）: {oss_err}")
+                records = await FormulaCacheRepository(db).get_hot_formulas(limit)
             finally:
                 await db_gen.aclose()
+        except Exception as e:
+            logger.warning(f"热门公式预热失败: {e}")
+            return 0
 
-            return None
+        # 从冷到热写入，最热的公式位于 LRU 尾部、最后被淘汰
+        loaded = 0
+        for record in reversed(records):
+            if record.image_url:
+                self.hot_cache.set(str(record.latex_hash), str(record.image_url))
+                loaded += 1
+
+        logger.info(f"✅ 已预热 {loaded} 个热门公式")
+        return loaded
 
+    async def flush_hit_counts(self) -> int:
+        """
+        把累计的命中次数批量写回数据库
+
+        Returns:
+            写回的命中次数
+        """
+        hits = self.hot_cache.drain_hits()
+        if not hits:
+            return 0
+
+        try:
+            from src.core.database import get_db
+            from src.repositories.formula_cache_repository import FormulaCacheRepository
+
+            db_gen = get_db()
+            db = await db_gen.__anext__()
+            try:
+                await FormulaCacheRepository(db).increment_hit_counts(hits)
+            finally:
+                await db_gen.aclose()
         except Exception as e:
-            logger.error(f"缓存检查失败: {e}")
-            return None
+            # 命中次数只用于统计和预热排序，丢失不影响主流程
+            logger.warning(f"公式命中次数写回失败: {e}")
+            return 0
+
+        return sum(hits.values())
+
+    async def _get_oss_cached_url(self, cache_key: str) -> Optional[str]:
+        """
+        检查 OSS 上是否已有渲染结果，命中时回写数据库缓存
+
+        Returns:
+            图片 URL 或 None
+        """
+        logger.debug(f"数据库缓存未命中: {cache_key[:8]}...")
+
+        # OSS 文件存在检查（如果 OSS 有 head_object 方法）
+        # 由于 file_exists 可能未实现，这里使用 try-except 包裹
+        try:
+            if not (
+                hasattr(self.ai_image_service, "file_exists")
+                and hasattr(self.ai_image_service, "get_file_url")
+            ):
+                return None
+
+            for suffix in ("png", "svg"):
+                path = f"{self.cache_prefix}{cache_key}.{suffix}"
+                if await self.ai_image_service.file_exists(path):  # type: ignore
+                    url = await self.ai_image_service.get_file_url(path)  # type: ignore
+                    if url is not None:
+                        logger.info(
+                            f"OSS 缓存命中（{suffix.upper()}）: {cache_key[:8]}..."
+                        )
+                        # 回写到数据库缓存
+                        await self._save_to_db_cache(cache_key, "", str(url), "inline")
+                        return str(url)
+        except Exception as oss_err:
+            logger.debug(f"OSS 检查失败（可能不支持）: {oss_err}")
+
+        return None
+
+    async def _verify_url_limited(self, url: str) -> bool:
+        """在并发上限内验证 URL"""
+        async with self._render_semaphore:
+            return await self._verify_url(url)
 
     async def _verify_url(self, url: str, timeout: float = 3.0) -> bool:
         """
@@ -338,8 +821,8 @@ class FormulaService:
         渲染单个公式（多层降级策略）
 
         降级顺序:
-        1. QuickLaTeX API (复杂公式优先)
-        2. 简单公式本地渲染 (Unicode转换)
+        1. 简单公式本地渲染 (Unicode转换 + SVG排版，无网络请求)
+        2. QuickLaTeX API (复杂公式，或本地不支持的语法)
         3. 文本降级 (返回原始LaTeX)
 
         Args:
@@ -360,7 +843,19 @@ class FormulaService:
             complexity = "simple" if is_simple else "complex"
             logger.debug(f"公式复杂度: {complexity} - {content[:30]}...")
 
-            # Level 1: QuickLaTeX API (所有公式都尝试)
+            # Level 1: 简单公式本地渲染（无外部请求）
+            if is_simple:
+                image_url = await self._render_simple_formula_locally(
+                    content, formula_type, cache_key
+                )
+
+                if image_url:
+                    response_time = time.time() - start_time
+                    self.metrics.record_success(response_time, f"{formula_type}_local")
+                    logger.info(f"✅ [Local] 简单公式本地渲染成功: {cache_key[:8]}...")
+                    return image_url
+
+            # Level 2: QuickLaTeX API（复杂公式，或本地渲染不支持的语法）
             latex_code = self._prepare_latex_code(content, formula_type)
             image_content = await self._call_quicklatex_api_with_fallback(
                 latex_code, content, formula_type
@@ -384,21 +879,6 @@ class FormulaService:
                     logger.info(f"✅ [QuickLaTeX] 公式渲染成功: {cache_key[:8]}...")
                     return image_url
 
-            # Level 2: 简单公式本地渲染
-            if is_simple:
-                logger.info(
-                    f"🔄 [Fallback] QuickLaTeX失败,尝试简单公式本地渲染: {content[:30]}..."
-                )
-                image_url = await self._render_simple_formula_locally(
-                    content, formula_type, cache_key
-                )
-
-                if image_url:
-                    response_time = time.time() - start_time
-                    self.metrics.record_success(response_time, f"{formula_type}_local")
-                    logger.info(f"✅ [Local] 简单公式本地渲染成功: {cache_key[:8]}...")
-                    return image_url
-
             # Level 3: 所有方法失败,记录失败
             logger.warning(f"❌ 公式渲染完全失败: {content[:50]}...")
             self.metrics.record_failure(
@@ -477,8 +957,6 @@ class FormulaService:
         try:
             if image_content.startswith("data:image/png;base64,"):
                 # PNG格式，保存为PNG文件
-                import base64
-
                 base64_data = image_content.split(",")[1]
                 image_bytes = base64.b64decode(base64_data)
 
@@ -586,8 +1064,6 @@ class FormulaService:
                 # 根据URL判断是PNG还是SVG
                 if image_url.endswith(".png"):
                     # 返回PNG的base64编码
-                    import base64
-
                     image_b64 = base64.b64encode(image_response.content).decode("utf-8")
                     return f"data:image/png;base64,{image_b64}"
                 else:
@@ -601,17 +1077,27 @@ class FormulaService:
             return None
 
     async def _replace_formulas_with_images(
-        self, text: str, formulas: List[Dict[str, Any]], formula_urls: Dict[str, str]
+        self,
+        text: str,
+        formulas: List[Dict[str, Any]],
+        formula_urls: Dict[str, str],
+        inline_markup: Optional[Dict[str, str]] = None,
     ) -> str:
-        """将文本中的公式替换为图片标签"""
+        """将文本中的公式替换为图片标签或内联 MathML"""
         processed_text = text
+        inline_markup = inline_markup or {}
 
         # 按位置倒序替换，避免位置偏移
         for formula_info in reversed(formulas):
             content = formula_info["content"]
             full_match = formula_info["full_match"]
 
-            if content in formula_urls:
+            if content in inline_markup:
+                markup = inline_markup[content]
+                if formula_info["type"] == "block":
+                    markup = f'<div class="math-formula-block" style="text-align: center; margin: 10px 0;">{markup}</div>'
+                processed_text = processed_text.replace(full_match, markup, 1)
+            elif content in formula_urls:
                 image_url = formula_urls[content]
                 formula_type = formula_info["type"]
 
@@ -658,12 +1144,10 @@ class FormulaService:
         self, content: str, formula_type: str, cache_key: str
     ) -> Optional[str]:
         """
-        本地渲染简单公式(暂时禁用,待PIL环境配置完成)
+        本地渲染简单公式（LaTeX 转 Unicode 后排版为 SVG）
 
-        TODO: 实现PIL图片生成
-        - 安装字体文件
-        - 配置PIL环境
-        - 实现LaTeX到Unicode转换
+        排版在线程池中执行，不阻塞事件循环；结果与远程渲染一样上传 OSS
+        并写入数据库缓存。OSS 不可用时返回内联的 data URI，保证离线可用。
 
         Args:
             content: LaTeX公式内容
@@ -671,10 +1155,27 @@ class FormulaService:
             cache_key: 缓存键
 
         Returns:
-            None (暂未实现)
+            图片URL；包含本地渲染器不支持的语法时返回 None
         """
-        logger.debug(f"本地渲染暂未启用: {content[:30]}...")
-        return None
+        font_size = self.local_font_sizes.get(formula_type, 20)
+        try:
+            svg = await asyncio.to_thread(render_latex_svg, content, font_size)
+        except UnsupportedLatexError as e:
+            logger.debug(f"本地渲染不支持，交给 QuickLaTeX: {content[:30]}... - {e}")
+            return None
+
+        image_url = await self._upload_to_oss(svg, cache_key, formula_type)
+        if image_url:
+            await self._save_to_db_cache(
+                latex_hash=cache_key,
+                latex_content=content,
+                image_url=image_url,
+                formula_type=formula_type,
+            )
+            return image_url
+
+        # OSS 不可用（如离线部署）时直接内联，不写数据库缓存
+        return self._svg_data_uri(svg)
 
     async def cleanup(self) -> None:
         """清理资源"""
@@ -691,3 +1192,16 @@ def get_formula_service() -> FormulaService:
     if _formula_service is None:
         _formula_service = FormulaService()
     return _formula_service
+
+
+async def flush_formula_hit_counts() -> None:
+    """定期把公式命中次数批量写回数据库的后台任务"""
+    interval = max(1, settings.FORMULA_HIT_FLUSH_INTERVAL)
+    while True:
+        try:
+            await asyncio.sleep(interval)
+            await get_formula_service().flush_hit_counts()
+        except asyncio.CancelledError:
+            break
+        except Exception as e:
+            logger.error(f"Error flushing formula hit counts: {e}")
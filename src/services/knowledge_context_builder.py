@@ -5,23 +5,38 @@ KnowledgeContextBuilder 服务 - MCP上下文构建器
 - 薄弱知识点分析
 - 学习偏好提取
 - 上下文摘要生成
+
+各项子分析使用独立数据库会话并发执行，同时占用的会话数由全进程共享的
+信号量限制（LEARNING_CONTEXT_DB_CONCURRENCY），避免并发的缓存未命中耗尽
+连接池。结果按 (用户, 学科) 进程内缓存，掌握度或错题发生写入时通过
+invalidate_learning_context 失效。
 """
 
+import asyncio
 import json
 import math
+import time
+from collections import OrderedDict
 from dataclasses import dataclass
 from datetime import datetime, timedelta
-from typing import Any, Dict, List, Optional
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, TypeVar
 
 from sqlalchemy import and_, func, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from src.core.config import settings
 from src.core.logging import get_logger
 from src.models.homework import Homework, HomeworkSubmission
 from src.models.learning import Question
+from src.utils.cache import cache_manager
 
 logger = get_logger(__name__)
 
+T = TypeVar("T")
+
+# 缓存键: (用户ID, 学科)
+ContextCacheKey = Tuple[str, Optional[str]]
+
 
 @dataclass
 class WeakKnowledgePoint:
@@ -87,11 +102,25 @@ class KnowledgeContextBuilder:
         self.time_decay_factor = 0.1  # 时间衰减因子
         self.max_context_days = 90  # 最大上下文天数
 
+        # 学情上下文缓存: key -> (过期时间, 上下文)
+        self.cache_ttl = settings.LEARNING_CONTEXT_CACHE_TTL
+        self.cache_max_size = settings.LEARNING_CONTEXT_CACHE_SIZE
+        self._cache: "OrderedDict[ContextCacheKey, Tuple[float, LearningContext]]" = (
+            OrderedDict()
+        )
+        # 每个用户的失效版本号，防止失效前开始的构建把旧结果写回缓存
+        self._generations: Dict[str, int] = {}
+        # 所有请求共享：限制子分析同时占用的数据库连接数
+        self._session_slots = asyncio.Semaphore(
+            max(1, settings.LEARNING_CONTEXT_DB_CONCURRENCY)
+        )
+
     async def build_context(
         self,
         user_id: str,
         subject: Optional[str] = None,
         session_type: str = "learning",
+        use_cache: bool = True,
     ) -> LearningContext:
         """构建用户学情上下文
 
@@ -99,40 +128,118 @@ class KnowledgeContextBuilder:
             user_id: 用户ID
             subject: 学科筛选（可选）
             session_type: 会话类型 learning/homework
+            use_cache: 是否使用缓存
 
         Returns:
             LearningContext: 完整的学习上下文
         """
+        key: ContextCacheKey = (str(user_id), subject)
+
+        if use_cache:
+            cached = self._get_cached(key)
+            if cached is not None:
+                logger.debug(
+                    f"⚡ 学情上下文缓存命中: user={user_id}, subject={subject}"
+                )
+                return cached
+
+        generation = self._generations.get(key[0], 0)
+
+        # 并行获取各类上下文数据（每项使用独立会话，AsyncSession 不支持并发查询；
+        # 同时打开的会话数受 _session_slots 限制）
+        (
+            weak_points,
+            preferences,
+            summary,
+            recent_errors,
+            mastery,
+            patterns,
+        ) = await asyncio.gather(
+            self._run_in_session(self._analyze_weak_knowledge_points, user_id, subject),
+            self._run_in_session(self._extract_learning_preferences, user_id, subject),
+            self._run_in_session(self._generate_context_summary, user_id, subject),
+            self._run_in_session(self._get_recent_errors, user_id, subject),
+            self._run_in_session(self._get_knowledge_mastery, user_id, subject),
+            self._run_in_session(self._analyze_study_patterns, user_id, subject),
+        )
+
+        context = LearningContext(
+            user_id=user_id,
+            generated_at=datetime.utcnow(),
+            weak_knowledge_points=weak_points,
+            learning_preferences=preferences,
+            context_summary=summary,
+            recent_errors=recent_errors,
+            knowledge_mastery=mastery,
+            study_patterns=patterns,
+        )
+
+        if use_cache and self._generations.get(key[0], 0) == generation:
+            self._set_cached(key, context)
+
+        return context
+
+    def invalidate(self, user_id: str) -> None:
+        """使某用户所有学科的缓存上下文失效
+
+        Args:
+            user_id: 用户ID
+        """
+        user_key = str(user_id)
+        self._generations[user_key] = self._generations.get(user_key, 0) + 1
+        for key in [key for key in self._cache if key[0] == user_key]:
+            del self._cache[key]
+
+    def clear_cache(self) -> None:
+        """清空全部缓存上下文"""
+        self._cache.clear()
+        self._generations.clear()
+
+    def _get_cached(self, key: ContextCacheKey) -> Optional[LearningContext]:
+        """读取未过期的缓存上下文"""
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+
+        expires_at, context = entry
+        if expires_at <= time.monotonic():
+            del self._cache[key]
+            return None
+
+        self._cache.move_to_end(key)
+        return context
+
+    def _set_cached(self, key: ContextCacheKey, context: LearningContext) -> None:
+        """写入缓存，超出容量时淘汰最久未使用的条目"""
+        if self.cache_ttl <= 0:
+            return
+
+        self._cache[key] = (time.monotonic() + self.cache_ttl, context)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_max_size:
+            self._cache.popitem(last=False)
+
+    async def _run_in_session(
+        self,
+        analysis: Callable[[AsyncSession, str, Optional[str]], Awaitable[T]],
+        user_id: str,
+        subject: Optional[str],
+    ) -> T:
+        """在独立数据库会话中执行一项子分析（受共享信号量限制）"""
         from src.core.database import AsyncSessionLocal
 
-        async with AsyncSessionLocal() as session:
-            # 并行获取各类上下文数据
-            weak_points = await self._analyze_weak_knowledge_points(
-                session, user_id, subject
-            )
-            preferences = await self._extract_learning_preferences(
-                session, user_id, subject
-            )
-            summary = await self._generate_context_summary(session, user_id, subject)
-            recent_errors = await self._get_recent_errors(session, user_id, subject)
-
-            # 🎯 NEW: 优先从知识图谱快照获取掌握度
-            mastery = await self._get_mastery_from_snapshot(
-                session, user_id, subject
-            ) or await self._calculate_knowledge_mastery(session, user_id, subject)
-
-            patterns = await self._analyze_study_patterns(session, user_id, subject)
-
-            return LearningContext(
-                user_id=user_id,
-                generated_at=datetime.utcnow(),
-                weak_knowledge_points=weak_points,
-                learning_preferences=preferences,
-                context_summary=summary,
-                recent_errors=recent_errors,
-                knowledge_mastery=mastery,
-                study_patterns=patterns,
-            )
+        async with self._session_slots:
+            async with AsyncSessionLocal() as session:
+                return await analysis(session, user_id, subject)
+
+    async def _get_knowledge_mastery(
+        self, session: AsyncSession, user_id: str, subject: Optional[str] = None
+    ) -> Dict[str, float]:
+        """获取知识点掌握度（优先知识图谱快照，缺失时实时计算）"""
+        # 🎯 NEW: 优先从知识图谱快照获取掌握度
+        return await self._get_mastery_from_snapshot(
+            session, user_id, subject
+        ) or await self._calculate_knowledge_mastery(session, user_id, subject)
 
     async def _analyze_weak_knowledge_points(
         self, session: AsyncSession, user_id: str, subject: Optional[str] = None
@@ -666,6 +773,32 @@ class KnowledgeContextBuilder:
 knowledge_context_builder = KnowledgeContextBuilder()
 
 
+def invalidate_learning_context(user_id: Any) -> None:
+    """掌握度或错题发生变化时调用，使该用户的缓存学情上下文失效
+
+    Args:
+        user_id: 用户ID
+    """
+    knowledge_context_builder.invalidate(str(user_id))
+
+
+def learning_analytics_cache_tags(user_id: Any) -> List[str]:
+    """学习分析缓存（LearningService.get_learning_analytics）的失效标签"""
+    return [f"learning_analytics:{user_id}"]
+
+
+async def invalidate_learning_analytics_cache(user_id: Any) -> None:
+    """提问、反馈或错题/掌握度变化时调用，使该用户的学习分析缓存失效
+
+    Args:
+        user_id: 用户ID
+    """
+    try:
+        await cache_manager.invalidate_tags(*learning_analytics_cache_tags(user_id))
+    except Exception as e:
+        logger.warning(f"学习分析缓存失效失败: user_id={user_id}, error={e}")
+
+
 async def main():
     """测试函数"""
     # 测试用例
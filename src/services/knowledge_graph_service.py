@@ -10,7 +10,7 @@
 import json
 import logging
 from datetime import datetime, timezone
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 from uuid import UUID
 
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -28,6 +28,11 @@ from src.repositories.knowledge_graph_repository import (
     MistakeKnowledgePointRepository,
     UserKnowledgeGraphSnapshotRepository,
 )
+from src.services.knowledge_context_builder import (
+    invalidate_learning_analytics_cache,
+    invalidate_learning_context,
+)
+from src.services.mistake_service import invalidate_mistake_list_cache
 
 logger = logging.getLogger(__name__)
 
@@ -233,6 +238,11 @@ class KnowledgeGraphService:
                 logger.warning(f"记录学习轨迹失败（不影响主流程）: {track_error}")
                 await self.db.rollback()  # 回滚学习轨迹，但知识点和关联已提交
 
+            # 新建了掌握度记录，缓存的学情上下文和错题列表关联已过期
+            invalidate_learning_context(user_id)
+            await invalidate_learning_analytics_cache(user_id)
+            await invalidate_mistake_list_cache(user_id)
+
             return created
 
         except Exception as e:
@@ -1355,6 +1365,54 @@ class KnowledgeGraphService:
             logger.error(f"获取学科知识图谱失败: {e}", exc_info=True)
             raise ServiceError(f"获取学科知识图谱失败: {str(e)}")
 
+    async def create_incremental_snapshot(
+        self,
+        user_id: UUID,
+        subject: str,
+        period_type: str = "daily",
+        auto_commit: bool = True,
+    ) -> Tuple[UserKnowledgeGraphSnapshot, bool]:
+        """
+        增量创建知识图谱快照
+
+        上一份快照之后掌握度、错题、学习轨迹均无变更时，直接复制上一份快照，
+        跳过图谱构建和薄弱链分析；否则完整重建。
+
+        Args:
+            user_id: 用户ID
+            subject: 学科
+            period_type: 周期类型
+            auto_commit: 是否自动提交事务
+
+        Returns:
+            (快照, 是否重建)
+        """
+        try:
+            latest = await self.snapshot_repo.find_latest_by_user(user_id, subject)
+            if latest is not None and not await self.snapshot_repo.is_snapshot_stale(
+                latest
+            ):
+                snapshot = await self.snapshot_repo.clone_snapshot(latest, period_type)
+                if auto_commit:
+                    await self.db.commit()
+                logger.info(
+                    f"用户 {user_id} 的 {subject} 知识图谱无变化，复用上一份快照"
+                )
+                return snapshot, False
+
+        except Exception as e:
+            await self.db.rollback()
+            logger.error(f"增量快照检查失败: {e}", exc_info=True)
+            raise ServiceError(f"创建快照失败: {str(e)}")
+
+        snapshot = await self.create_knowledge_graph_snapshot(
+            user_id=user_id,
+            subject=subject,
+            period_type=period_type,
+            auto_commit=auto_commit,
+        )
+        return snapshot, True
+
     async def create_knowledge_graph_snapshot(
         self,
         user_id: UUID,
@@ -8,7 +8,7 @@ import json
 import logging
 import time
 from datetime import datetime, timedelta
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
 from uuid import UUID
 
 from sqlalchemy import and_, desc, func, join, select
@@ -23,6 +23,7 @@ from src.core.exceptions import (
     ServiceError,
     ValidationError,
 )
+from src.core.monitoring import StageTimer, get_metrics_collector
 from src.models.homework import HomeworkSubmission
 from src.models.learning import (
     Answer,
@@ -33,6 +34,7 @@ from src.models.learning import (
 )
 from src.models.user import User
 from src.repositories.base_repository import BaseRepository
+from src.repositories.daily_stats_repository import UserDailyStatsRepository
 from src.schemas.learning import (
     AnswerResponse,
     AskQuestionRequest,
@@ -47,13 +49,27 @@ from src.schemas.learning import (
     SessionListQuery,
     SessionResponse,
 )
+from src.services.answer_cache import CachedAnswer, answer_cache, replay_answer
 from src.services.bailian_service import (
     AIContext,
+    BailianService,
+    ChatCompletionResponse,
     ChatMessage,
     MessageRole,
     get_bailian_service,
 )
-from src.services.formula_service import FormulaService
+from src.services.formula_service import get_formula_service
+from src.services.knowledge_context_builder import (
+    invalidate_learning_analytics_cache,
+    invalidate_learning_context,
+    learning_analytics_cache_tags,
+)
+from src.services.mistake_service import invalidate_mistake_list_cache
+from src.services.vision_image_service import (
+    QA_PROFILE,
+    TEXT_PROFILE,
+    get_vision_image_optimizer,
+)
 from src.utils.cache import cache_result
 from src.utils.type_converters import (
     extract_orm_bool,
@@ -66,6 +82,9 @@ from src.utils.type_converters import (
 logger = logging.getLogger("learning_service")
 settings = get_settings()
 
+# 超出预算后继续在后台完成的学情上下文构建（保留引用，完成后写入缓存）
+_context_warmups: Set[asyncio.Task] = set()
+
 # ========== 作业批改 Prompt 常量 ==========
 
 HOMEWORK_CORRECTION_PROMPT = """
@@ -119,13 +138,15 @@ class LearningService:
     def __init__(self, db: AsyncSession):
         self.db = db
         self.bailian_service = get_bailian_service()
-        self.formula_service = FormulaService()  # 初始化公式服务
+        self.formula_service = get_formula_service()  # 共享实例（公式缓存和并发上限）
+        self.vision_image_optimizer = get_vision_image_optimizer()
 
         # 初始化仓储
         self.session_repo = BaseRepository(ChatSession, db)
         self.question_repo = BaseRepository(Question, db)
         self.answer_repo = BaseRepository(Answer, db)
         self.analytics_repo = BaseRepository(LearningAnalytics, db)
+        self.daily_stats_repo = UserDailyStatsRepository(db)
 
     # ========== 问答核心功能 ==========
 
@@ -217,23 +238,51 @@ class LearningService:
                 f"📋 消息详情: {json.dumps(messages_summary, ensure_ascii=False)}"
             )
 
-            ai_response = await self.bailian_service.chat_completion(
-                messages=message_dicts,
-                context=ai_context,
-                max_tokens=settings.AI_MAX_TOKENS,
-                temperature=settings.AI_TEMPERATURE,
-                top_p=settings.AI_TOP_P,
-            )
+            # ♻️ 非个性化提问优先使用答案缓存
+            cache_key = self._answer_cache_key(request, ai_context, message_dicts)
+            cached_answer = answer_cache.get(cache_key) if cache_key else None
+            if cached_answer:
+                logger.info(f"♻️ 命中答案缓存: key={cache_key[:12]}")
+                ai_response = ChatCompletionResponse(
+                    content=cached_answer.content,
+                    tokens_used=0,
+                    processing_time=0.0,
+                    model=cached_answer.model,
+                    request_id="answer-cache",
+                )
+            else:
+                ai_response = await self.bailian_service.chat_completion(
+                    messages=message_dicts,
+                    context=ai_context,
+                    max_tokens=settings.AI_MAX_TOKENS,
+                    temperature=settings.AI_TEMPERATURE,
+                    top_p=settings.AI_TOP_P,
+                )
 
             if not ai_response.success:
                 raise BailianServiceError(f"AI调用失败: {ai_response.error_message}")
 
+            if cache_key and not cached_answer:
+                answer_cache.set(
+                    cache_key,
+                    CachedAnswer(
+                        content=ai_response.content,
+                        tokens_used=ai_response.tokens_used,
+                        model=ai_response.model,
+                    ),
+                )
+
             # 6. 保存答案
             answer = await self._save_answer(question_id_str, ai_response)
             answer_id_str = extract_orm_uuid_str(answer, "id")  # 🔧 立即提取ID
 
             # 7. 更新会话统计
-            await self._update_session_stats(session_id_str, ai_response.tokens_used)
+            await self._update_session_stats(
+                session_id_str,
+                ai_response.tokens_used,
+                user_id=user_id,
+                subject=extract_orm_str(question, "subject"),
+            )
 
             # 8. 更新用户学习分析
             await self._update_learning_analytics(user_id, question, answer)
@@ -419,28 +468,43 @@ class LearningService:
         session = None
         full_answer_content = ""
 
+        # ⏱️ 首字延迟（TTFT）分阶段计时，写入 ttft 阶段直方图
+        ttft_timer = StageTimer("ttft")
+        first_token_sent = False
+
         try:
             # 1. 获取或创建会话
             session = await self._get_or_create_session(user_id, request)
             session_id = extract_orm_uuid_str(session, "id")
+            ttft_timer.mark("session")
 
             # 2. 保存问题（状态为未处理）
             question = await self._save_question(user_id, session_id, request)
             question_id = extract_orm_uuid_str(question, "id")
+            ttft_timer.mark("save_question")
 
-            # 3. 构建AI上下文
-            ai_context = await self._build_ai_context(
-                user_id, session, request.use_context
-            )
-
-            # 4. 构建对话消息
-            messages = await self._build_conversation_messages(
-                session_id,
-                request,
-                ai_context,
-                request.include_history,
-                request.max_history,
-            )
+            prefetch_budget = settings.AI_CONTEXT_PREFETCH_BUDGET_MS / 1000
+            if request.use_context and prefetch_budget > 0:
+                # 3-4. 低延迟模式：上下文与历史并发加载，超出预算的部分省略
+                ai_context, messages = await self._build_context_within_budget(
+                    user_id, session, request, prefetch_budget, timer=ttft_timer
+                )
+            else:
+                # 3. 构建AI上下文
+                ai_context = await self._build_ai_context(
+                    user_id, session, request.use_context
+                )
+                ttft_timer.mark("context_build")
+
+                # 4. 构建对话消息
+                messages = await self._build_conversation_messages(
+                    session_id,
+                    request,
+                    ai_context,
+                    request.include_history,
+                    request.max_history,
+                )
+                ttft_timer.mark("history_fetch")
 
             # 转换为字典格式
             message_dicts = []
@@ -462,18 +526,51 @@ class LearningService:
                 f"当前请求图片: {len(request.image_urls or [])}"
             )
 
-            async for chunk in self.bailian_service.chat_completion_stream(
-                messages=message_dicts,
-                context=ai_context,
-                max_tokens=settings.AI_MAX_TOKENS,
-                temperature=settings.AI_TEMPERATURE,
-                top_p=settings.AI_TOP_P,
-            ):
+            # ♻️ 非个性化提问优先回放答案缓存
+            cache_key = self._answer_cache_key(request, ai_context, message_dicts)
+            cached_answer = answer_cache.get(cache_key) if cache_key else None
+            if cached_answer:
+                logger.info(f"♻️ 命中答案缓存，回放缓存答案: key={cache_key[:12]}")
+                chunk_source = replay_answer(cached_answer)
+            else:
+                # 🖼️ 图片替换为视觉模型专用的缩放版本（数据库仍记录原图）
+                # 首字前只等缓存命中或 OSS 上已有的版本，新图在后台生成，本次用原图
+                image_messages = [m for m in message_dicts if m.get("image_urls")]
+                if image_messages:
+                    optimized_urls = iter(
+                        await self.vision_image_optimizer.optimize_urls(
+                            [url for m in image_messages for url in m["image_urls"]],
+                            QA_PROFILE,
+                            timeout=settings.VISION_IMAGE_PRESTREAM_TIMEOUT,
+                        )
+                    )
+                    for msg_dict in image_messages:
+                        msg_dict["image_urls"] = [
+                            next(optimized_urls) for _ in msg_dict["image_urls"]
+                        ]
+                ttft_timer.mark("image_optimize")
+
+                chunk_source = self.bailian_service.chat_completion_stream(
+                    messages=message_dicts,
+                    context=ai_context,
+                    max_tokens=settings.AI_MAX_TOKENS,
+                    temperature=settings.AI_TEMPERATURE,
+                    top_p=settings.AI_TOP_P,
+                    timer=ttft_timer,
+                )
+
+            async for chunk in chunk_source:
                 # 🔧 防御性检查：确保 chunk 不为 None
                 if chunk is None:
                     logger.warning("收到 None chunk，跳过处理")
                     continue
 
+                is_first_token = not first_token_sent and bool(chunk.get("content"))
+                if is_first_token:
+                    # 含上游建连与首字节，两者明细由百炼服务单独记录；
+                    # 回放缓存答案单独记录，不拉低上游耗时统计
+                    ttft_timer.mark("cache_replay" if cached_answer else "upstream")
+
                 # 📝 调试：打印每个 chunk 的信息（使用 debug 级别，减少日志 I/O）
                 logger.debug(
                     f"📦 收到 chunk: content_len={len(chunk.get('content', ''))}, finish_reason={chunk.get('finish_reason')}"
@@ -491,6 +588,13 @@ class LearningService:
                     "finish_reason": chunk.get("finish_reason"),
                 }
 
+                if is_first_token:
+                    # 生成器被再次驱动时首个 SSE 事件已写出
+                    first_token_sent = True
+                    ttft_timer.mark("first_sse_sent")
+                    ttft_timer.finish("total")
+                    logger.info(f"⏱️ TTFT 阶段耗时: {ttft_timer.summary()}")
+
                 # 流式完成后保存数据
                 if chunk.get("finish_reason") == "stop":
                     logger.info("✅ 流式生成完成，开始后处理")
@@ -524,13 +628,28 @@ class LearningService:
 
                         # 8. 更新会话统计
                         tokens_used = chunk.get("usage", {}).get("total_tokens", 0)
-                        await self._update_session_stats(session_id, tokens_used)
+                        await self._update_session_stats(
+                            session_id,
+                            tokens_used,
+                            user_id=user_id,
+                            subject=extract_orm_str(question, "subject"),
+                        )
 
                         logger.info(f"✅ 核心数据保存完成: answer_id={answer_id}")
 
                         # 🔧 提交事务，确保核心数据立即持久化（修复1）
                         await self.db.commit()
                         logger.info("💾 核心数据事务已提交")
+
+                        if cache_key and not cached_answer:
+                            answer_cache.set(
+                                cache_key,
+                                CachedAnswer(
+                                    content=full_answer_content,
+                                    tokens_used=tokens_used,
+                                    model=chunk.get("model", BailianService.TEXT_MODEL),
+                                ),
+                            )
                     except Exception as save_err:
                         logger.error(f"保存答案失败: {save_err}", exc_info=True)
                         await self.db.rollback()
@@ -599,7 +718,7 @@ class LearningService:
         后台处理长时间操作（不阻塞 WebSocket 前端响应）
 
         包括：
-        - 公式增强
+        - 公式预渲染
         - 学习分析更新
         - 作业批改和错题创建
         """
@@ -608,25 +727,15 @@ class LearningService:
                 f"🔄 [后台] 开始后处理: user_id={user_id}, answer_id={answer_id}"
             )
 
-            # 1. 公式增强（可选）
-            enhanced_content = full_answer_content
+            # 1. 公式预渲染（可选）
+            # 数据库保存模型输出的原始 LaTeX，查询历史时再按客户端的输出方式
+            # 转换；这里只按本次请求的方式预热公式缓存
             try:
-                processed_content = (
-                    await self.formula_service.process_text_with_formulas(
-                        full_answer_content
-                    )
+                await self.formula_service.process_text_with_formulas(
+                    full_answer_content, output_mode=request.formula_output
                 )
-                if processed_content and processed_content != full_answer_content:
-                    enhanced_content = processed_content
-                    logger.info(
-                        f"✅ [后台] 公式增强成功，内容长度: {len(enhanced_content)}"
-                    )
-                    # 更新答案内容
-                    await self.answer_repo.update(
-                        answer_id, {"content": enhanced_content}
-                    )
             except Exception as formula_err:
-                logger.warning(f"[后台] 公式增强失败: {str(formula_err)}")
+                logger.warning(f"[后台] 公式预渲染失败: {str(formula_err)}")
 
             # 2. 更新学习分析
             try:
@@ -732,6 +841,9 @@ class LearningService:
             "context_enabled": request.use_context,
             "last_active_at": datetime.utcnow().isoformat(),
         }
+        await self.daily_stats_repo.increment(
+            user_id, session_data["subject"], session_count=1
+        )
         return await self.session_repo.create(session_data)
 
     async def _generate_session_title(self, first_question: str) -> str:
@@ -767,8 +879,39 @@ class LearningService:
             ),
             "is_processed": False,
         }
+        await self.daily_stats_repo.increment(
+            user_id,
+            question_data["subject"],
+            question_count=1,
+            image_question_count=1 if question_data["has_images"] else 0,
+        )
         return await self.question_repo.create(question_data)
 
+    def _answer_cache_key(
+        self,
+        request: AskQuestionRequest,
+        ai_context: AIContext,
+        message_dicts: List[Dict[str, Any]],
+    ) -> Optional[str]:
+        """
+        获取答案缓存键
+
+        带学情上下文、图片或历史对话（消息数超过系统提示词 + 当前问题）
+        的提问属于个性化提问，不使用缓存。
+
+        Returns:
+            缓存键；不可缓存时返回 None
+        """
+        personalized = bool(
+            request.use_context or request.image_urls or len(message_dicts) > 2
+        )
+        return answer_cache.lookup_key(
+            request.content,
+            ai_context.subject,
+            BailianService.TEXT_MODEL,
+            personalized,
+        )
+
     async def _build_ai_context(
         self, user_id: str, session: ChatSession, use_context: bool = True
     ) -> AIContext:
@@ -781,19 +924,7 @@ class LearningService:
 
         if use_context:
             # 获取用户信息
-            user_stmt = select(User).where(User.id == user_id)
-            user_result = await self.db.execute(user_stmt)
-            user = user_result.scalar_one_or_none()
-
-            if user:
-                context.grade_level = self._parse_grade_level(
-                    extract_orm_str(user, "grade_level")
-                )
-                context.metadata = {
-                    "user_school": extract_orm_str(user, "school"),
-                    "user_class": extract_orm_str(user, "class_name"),
-                    "learning_subjects": extract_orm_str(user, "study_subjects"),
-                }
+            await self._apply_user_profile(context, user_id)
 
             # 🚀 NEW: 集成 MCP 个性化学情上下文
             try:
@@ -807,49 +938,7 @@ class LearningService:
                     subject=extract_orm_str(session, "subject"),
                     session_type="learning",
                 )
-
-                # 将学情分析结果添加到AI上下文中
-                if learning_context.weak_knowledge_points:
-                    weak_points_summary = []
-                    for point in learning_context.weak_knowledge_points[
-                        :5
-                    ]:  # 取前5个最严重的
-                        weak_points_summary.append(
-                            {
-                                "knowledge": point.knowledge_name,
-                                "subject": point.subject,
-                                "error_rate": round(point.error_rate * 100, 1),
-                                "severity": round(point.severity_score * 100, 1),
-                            }
-                        )
-
-                    context.metadata = context.metadata or {}
-                    context.metadata.update(
-                        {
-                            "weak_knowledge_points": weak_points_summary,
-                            "learning_pace": learning_context.learning_preferences.learning_pace,
-                            "focus_duration": learning_context.learning_preferences.focus_duration,
-                            "current_level": learning_context.context_summary.current_level,
-                            "total_questions": learning_context.context_summary.total_questions,
-                            "learning_streak": learning_context.context_summary.learning_streak,
-                            "mcp_context_generated": True,
-                        }
-                    )
-
-                    logger.info(
-                        f"MCP上下文已构建 - 用户: {user_id}, 薄弱知识点: {len(learning_context.weak_knowledge_points)}"
-                    )
-                else:
-                    # 新用户或没有足够数据，标记为首次学习
-                    context.metadata = context.metadata or {}
-                    context.metadata.update(
-                        {
-                            "mcp_context_generated": True,
-                            "is_new_learner": True,
-                            "current_level": "beginner",
-                        }
-                    )
-                    logger.info(f"MCP上下文已构建 - 新学习者: {user_id}")
+                self._apply_learning_context(context, user_id, learning_context)
 
             except Exception as e:
                 logger.warning(f"MCP上下文构建失败，回退到传统模式: {str(e)}")
@@ -867,6 +956,186 @@ class LearningService:
 
         return context
 
+    async def _apply_user_profile(self, context: AIContext, user_id: str) -> None:
+        """将用户学段、学校等基础信息写入AI上下文"""
+        user_stmt = select(User).where(User.id == user_id)
+        user_result = await self.db.execute(user_stmt)
+        user = user_result.scalar_one_or_none()
+
+        if user:
+            context.grade_level = self._parse_grade_level(
+                extract_orm_str(user, "grade_level")
+            )
+            context.metadata = {
+                "user_school": extract_orm_str(user, "school"),
+                "user_class": extract_orm_str(user, "class_name"),
+                "learning_subjects": extract_orm_str(user, "study_subjects"),
+            }
+
+    def _apply_learning_context(
+        self, context: AIContext, user_id: str, learning_context: Any
+    ) -> None:
+        """将学情分析结果添加到AI上下文中"""
+        context.metadata = context.metadata or {}
+
+        if learning_context.weak_knowledge_points:
+            weak_points_summary = []
+            for point in learning_context.weak_knowledge_points[:5]:  # 取前5个最严重的
+                weak_points_summary.append(
+                    {
+                        "knowledge": point.knowledge_name,
+                        "subject": point.subject,
+                        "error_rate": round(point.error_rate * 100, 1),
+                        "severity": round(point.severity_score * 100, 1),
+                    }
+                )
+
+            context.metadata.update(
+                {
+                    "weak_knowledge_points": weak_points_summary,
+                    "learning_pace": learning_context.learning_preferences.learning_pace,
+                    "focus_duration": learning_context.learning_preferences.focus_duration,
+                    "current_level": learning_context.context_summary.current_level,
+                    "total_questions": learning_context.context_summary.total_questions,
+                    "learning_streak": learning_context.context_summary.learning_streak,
+                    "mcp_context_generated": True,
+                }
+            )
+
+            logger.info(
+                f"MCP上下文已构建 - 用户: {user_id}, 薄弱知识点: {len(learning_context.weak_knowledge_points)}"
+            )
+        else:
+            # 新用户或没有足够数据，标记为首次学习
+            context.metadata.update(
+                {
+                    "mcp_context_generated": True,
+                    "is_new_learner": True,
+                    "current_level": "beginner",
+                }
+            )
+            logger.info(f"MCP上下文已构建 - 新学习者: {user_id}")
+
+    async def _build_context_within_budget(
+        self,
+        user_id: str,
+        session: ChatSession,
+        request: AskQuestionRequest,
+        budget_seconds: float,
+        timer: Optional[StageTimer] = None,
+    ) -> Tuple[AIContext, List[ChatMessage]]:
+        """
+        在时间预算内构建AI上下文和对话消息（低延迟模式）
+
+        学情上下文和作业上下文各自使用独立数据库会话并发预取，
+        同时在主会话上加载用户信息和历史对话；预算用尽时仍未就绪的
+        部分直接省略，记录到 metadata["dropped_context"]，不阻塞上游调用。
+        未就绪的学情上下文不取消，在后台完成并写入缓存，供下一次提问使用。
+
+        Args:
+            user_id: 用户ID
+            session: 当前会话
+            request: 提问请求
+            budget_seconds: 可选上下文的等待预算（秒）
+            timer: TTFT 分阶段计时器（记录 history_fetch / context_build）
+
+        Returns:
+            (AI上下文, 对话消息列表)
+        """
+        from src.services.knowledge_context_builder import knowledge_context_builder
+
+        session_id = extract_orm_uuid_str(session, "id")
+        subject = extract_orm_str(session, "subject")
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + budget_seconds
+
+        # 1. 先发起可选部分的预取
+        prefetch: Dict[str, asyncio.Task] = {
+            "learning_context": asyncio.create_task(
+                knowledge_context_builder.build_context(
+                    user_id=user_id, subject=subject, session_type="learning"
+                )
+            ),
+            "homework_context": asyncio.create_task(
+                self._get_homework_context_isolated(user_id, subject)
+            ),
+        }
+
+        try:
+            # 2. 主会话上加载必需部分：用户信息 + 历史对话
+            context = AIContext(user_id=user_id, subject=subject, session_id=session_id)
+            await self._apply_user_profile(context, user_id)
+
+            history: List[ChatMessage] = []
+            if request.include_history and request.max_history > 0:
+                history = await self._get_conversation_history(
+                    session_id, request.max_history
+                )
+            if timer:
+                timer.mark("history_fetch")
+
+            # 3. 在剩余预算内等待可选部分
+            remaining = max(0.0, deadline - loop.time())
+            done, _ = await asyncio.wait(prefetch.values(), timeout=remaining)
+
+            dropped: List[str] = []
+            context.metadata = context.metadata or {}
+            for name, task in prefetch.items():
+                if task not in done:
+                    dropped.append(name)
+                    continue
+                try:
+                    result = task.result()
+                except Exception as e:
+                    logger.warning(f"上下文预取失败，已省略 {name}: {e}")
+                    dropped.append(name)
+                    if name == "learning_context":
+                        context.metadata["mcp_context_failed"] = True
+                    continue
+
+                if name == "learning_context":
+                    self._apply_learning_context(context, user_id, result)
+                elif result:
+                    context.metadata.update(result)
+        finally:
+            warmup = prefetch["learning_context"]
+            if not warmup.done():
+                # 学情上下文在后台完成并写入缓存，避免耗时稳定超出预算的用户永远拿不到
+                _context_warmups.add(warmup)
+                warmup.add_done_callback(self._finish_context_warmup)
+            homework = prefetch["homework_context"]
+            if not homework.done():
+                homework.cancel()
+
+        if dropped:
+            context.metadata["dropped_context"] = dropped
+            logger.info(
+                f"⏱️ 上下文预取超出预算 {budget_seconds * 1000:.0f}ms，已省略: {dropped}"
+            )
+        for name in dropped:
+            get_metrics_collector().increment_counter(
+                "context_prefetch_dropped", part=name
+            )
+
+        messages = await self._build_conversation_messages(
+            session_id,
+            request,
+            context,
+            request.include_history,
+            request.max_history,
+            history=history,
+        )
+        if timer:
+            timer.mark("context_build")
+        return context, messages
+
+    @staticmethod
+    def _finish_context_warmup(task: asyncio.Task) -> None:
+        """后台学情上下文构建完成：释放引用并记录失败"""
+        _context_warmups.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning(f"后台学情上下文构建失败: {task.exception()}")
+
     def _parse_grade_level(self, grade_level: Optional[str]) -> Optional[int]:
         """解析学段为数字"""
         if not grade_level:
@@ -882,10 +1151,23 @@ class LearningService:
         }
         return grade_mapping.get(grade_level)
 
-    async def _get_homework_context(
+    async def _get_homework_context_isolated(
         self, user_id: str, subject: Optional[str]
+    ) -> Optional[Dict[str, Any]]:
+        """在独立数据库会话中获取作业上下文，可与主会话上的查询并发"""
+        from src.core.database import AsyncSessionLocal
+
+        async with AsyncSessionLocal() as db:
+            return await self._get_homework_context(user_id, subject, db=db)
+
+    async def _get_homework_context(
+        self,
+        user_id: str,
+        subject: Optional[str],
+        db: Optional[AsyncSession] = None,
     ) -> Optional[Dict[str, Any]]:
         """获取作业相关上下文"""
+        db = db or self.db
         try:
             # 获取最近的作业记录
             stmt = (
@@ -899,7 +1181,7 @@ class LearningService:
             if subject:
                 stmt = stmt.where(HomeworkSubmission.subject == subject)
 
-            result = await self.db.execute(stmt)
+            result = await db.execute(stmt)
             submissions = result.scalars().all()
 
             if not submissions:
@@ -935,8 +1217,9 @@ class LearningService:
         context: AIContext,
         include_history: bool = True,
         max_history: int = 10,
+        history: Optional[List[ChatMessage]] = None,
     ) -> List[ChatMessage]:
-        """构建对话消息"""
+        """构建对话消息（history 为已预先加载的历史对话）"""
         messages = []
 
         # 1. 系统提示词
@@ -944,7 +1227,9 @@ class LearningService:
         messages.append(ChatMessage(role=MessageRole.SYSTEM, content=system_prompt))
 
         # 2. 历史对话
-        if include_history and max_history > 0:
+        if history is not None:
+            messages.extend(history)
+        elif include_history and max_history > 0:
             history_messages = await self._get_conversation_history(
                 session_id, max_history
             )
@@ -1147,12 +1432,18 @@ class LearningService:
 
         return related_topics[:5], suggested_questions[:3]  # 限制数量
 
-    async def _update_session_stats(self, session_id: str, tokens_used: int) -> None:
+    async def _update_session_stats(
+        self,
+        session_id: str,
+        tokens_used: int,
+        user_id: Optional[str] = None,
+        subject: Optional[str] = None,
+    ) -> None:
         """
         更新会话统计（优化版本）
 
         使用原始 SQL 更新以减少数据库往返，避免先读后写导致的锁争用
-        特别是在高并发流式请求中
+        特别是在高并发流式请求中。传入 user_id 时同时累加学情日汇总的 token 消耗。
         """
         try:
             from sqlalchemy import text
@@ -1179,6 +1470,11 @@ class LearningService:
             logger.debug(
                 f"⚡ 会话统计已更新（原子操作）: session_id={session_id}, tokens={tokens_used}"
             )
+
+            if user_id:
+                await self.daily_stats_repo.increment(
+                    user_id, subject, tokens_used=tokens_used
+                )
         except Exception as e:
             logger.warning(f"更新会话统计失败: {e}")
             # 继续处理，不阻塞流式响应
@@ -1210,6 +1506,7 @@ class LearningService:
                         "last_analyzed_at": datetime.utcnow().isoformat(),
                     },
                 )
+            await invalidate_learning_analytics_cache(user_id)
 
         except Exception as e:
             logger.warning(f"更新学习分析失败: {str(e)}")
@@ -1230,6 +1527,9 @@ class LearningService:
             "last_active_at": datetime.utcnow().isoformat(),
         }
 
+        await self.daily_stats_repo.increment(
+            user_id, session_data["subject"], session_count=1
+        )
         session = await self.session_repo.create(session_data)
 
         # 如果有初始问题，处理第一个问题
@@ -1396,18 +1696,14 @@ class LearningService:
         result = await self.db.execute(stmt)
         questions = result.scalars().all()
 
-        # 构建问答对
-        items = []
-        for question in questions:
-            item = {
-                "question": QuestionResponse.model_validate(question),
-                "answer": (
-                    AnswerResponse.model_validate(question.answer)
-                    if question.answer
-                    else None
-                ),
-            }
-            items.append(item)
+        # 构建问答对，整页答案中的公式按请求的输出方式一次转换
+        answers = await self._render_answers(
+            [question.answer for question in questions], query.formula_output
+        )
+        items = [
+            {"question": QuestionResponse.model_validate(question), "answer": answer}
+            for question, answer in zip(questions, answers, strict=True)
+        ]
 
         return {
             "total": total,
@@ -1419,6 +1715,35 @@ class LearningService:
             "items": items,
         }
 
+    async def _render_answers(
+        self, answers: Sequence[Optional[Answer]], output_mode: Optional[str]
+    ) -> List[Optional[AnswerResponse]]:
+        """
+        把保存的答案转换为响应，公式按输出方式渲染
+
+        整页答案的公式合并后只查一次缓存，未渲染过的公式在后台渲染，
+        不阻塞本次读取。
+
+        Args:
+            answers: 答案记录列表（问题没有答案时为None）
+            output_mode: 公式输出方式，不提供则使用 FORMULA_OUTPUT_MODE
+
+        Returns:
+            与输入顺序一致的答案响应，没有答案的位置为None
+        """
+        responses = [
+            AnswerResponse.model_validate(answer) if answer else None
+            for answer in answers
+        ]
+        contents = await self.formula_service.process_texts_with_formulas(
+            [response.content if response else "" for response in responses],
+            output_mode=output_mode,
+        )
+        return [
+            response.model_copy(update={"content": content}) if response else None
+            for response, content in zip(responses, contents, strict=True)
+        ]
+
     # ========== 反馈和评价功能 ==========
 
     async def submit_feedback(self, user_id: str, request: FeedbackRequest) -> bool:
@@ -1441,6 +1766,7 @@ class LearningService:
                 "is_helpful": request.is_helpful,
             },
         )
+        await invalidate_learning_analytics_cache(user_id)
 
         logger.info(
             "用户反馈已保存",
@@ -1455,7 +1781,8 @@ class LearningService:
 
     # ========== 学习分析功能 ==========
 
-    @cache_result(ttl=3600)  # 缓存1小时
+    # 缓存1小时，热点读走进程内缓存；相关写入按用户标签失效
+    @cache_result(ttl=3600, l1=True, tags=learning_analytics_cache_tags)
     async def get_learning_analytics(
         self, user_id: str
     ) -> Optional[LearningAnalyticsResponse]:
@@ -1761,6 +2088,8 @@ class LearningService:
 
             # 4. 创建错题记录
             mistake = await mistake_repo.create(mistake_data)
+            invalidate_learning_context(user_id)
+            await invalidate_learning_analytics_cache(user_id)
 
             logger.info(
                 f"📝 从学习问答创建错题: question_id={question_id}, mistake_id={mistake.id}, "
@@ -2553,9 +2882,9 @@ class LearningService:
 
             # 创建错题记录
             from src.models.study import MistakeRecord
-            from src.repositories.base_repository import BaseRepository
+            from src.repositories.mistake_repository import MistakeRepository
 
-            mistake_repo = BaseRepository(MistakeRecord, self.db)
+            mistake_repo = MistakeRepository(MistakeRecord, self.db)
 
             # 🛠️ 生成错题数据（使用结构化提取的数据）
             # 优先使用AI提取的知识点，降级使用规则提取
@@ -2652,6 +2981,8 @@ class LearningService:
             # 创建错题
             mistake = await mistake_repo.create(mistake_data)
             mistake_id_str = extract_orm_uuid_str(mistake, "id")  # 🔧 立即提取ID
+            invalidate_learning_context(user_id)
+            await invalidate_learning_analytics_cache(user_id)
 
             # 🎯 创建错题后立即关联知识点
             try:
@@ -3273,12 +3604,14 @@ class LearningService:
                 prompt += f"\n\n学生提示：{user_hint}"
                 logger.debug(f"📌 添加用户提示: {user_hint[:50]}...")
 
-            # 构建消息
+            # 构建消息（灰度缩放版本突出手写文字，失败时使用原图）
             messages = [
                 {
                     "role": "user",
                     "content": prompt,
-                    "image_urls": image_urls,
+                    "image_urls": await self.vision_image_optimizer.optimize_urls(
+                        image_urls, TEXT_PROFILE
+                    ),
                 }
             ]
 
@@ -3491,6 +3824,9 @@ class LearningService:
         # 🎯 刷新到数据库但不提交，让调用方统一管理事务
         await self.db.flush()
         logger.info(f"✅ 知识点掌握度更新完成: {len(knowledge_points)}个")
+        invalidate_learning_context(user_id)
+        await invalidate_learning_analytics_cache(user_id)
+        await invalidate_mistake_list_cache(user_id)
 
     def _infer_subject_from_knowledge_points(self, knowledge_points: List[str]) -> str:
         """
@@ -3704,6 +4040,8 @@ class LearningService:
                 # 创建错题记录
                 mistake = await mistake_repo.create(mistake_data)
                 mistake_id = str(mistake.id)
+                invalidate_learning_context(user_id)
+                await invalidate_learning_analytics_cache(user_id)
                 logger.info(
                     f"    ✅ 错题记录已创建: mistake_id={mistake_id}, "
                     f"knowledge_points={len(item.knowledge_points or [])}"
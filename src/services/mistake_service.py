@@ -16,9 +16,11 @@ from uuid import UUID
 
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from src.core.config import settings
 from src.core.exceptions import NotFoundError, ServiceError
 from src.models.base import is_sqlite
 from src.models.study import MistakeRecord, MistakeReview
+from src.repositories.daily_stats_repository import UserDailyStatsRepository
 from src.repositories.mistake_repository import MistakeRepository
 from src.repositories.mistake_review_repository import MistakeReviewRepository
 from src.schemas.mistake import (
@@ -36,9 +38,40 @@ from src.schemas.mistake import (
     UpdateMistakeRequest,
 )
 from src.services.algorithms.spaced_repetition import SpacedRepetitionAlgorithm
+from src.services.knowledge_context_builder import (
+    invalidate_learning_analytics_cache,
+    invalidate_learning_context,
+)
+from src.utils.cache import cache_manager
 
 logger = logging.getLogger(__name__)
 
+# 错题列表知识点关联的 Redis 缓存（按错题缓存，按用户标签失效）
+MISTAKE_LIST_CACHE_NAMESPACE = "mistake_kp"
+
+
+def _mistake_list_cache_tag(user_id: Any) -> str:
+    return f"mistake_list:{user_id}"
+
+
+def _mistake_list_cache_enabled() -> bool:
+    return settings.CACHE_ENABLED and settings.MISTAKE_LIST_CACHE_TTL > 0
+
+
+async def invalidate_mistake_list_cache(user_id: Any) -> None:
+    """
+    知识点关联或掌握度变化时调用，使该用户错题列表的知识点关联缓存失效
+
+    Args:
+        user_id: 用户ID
+    """
+    if not _mistake_list_cache_enabled():
+        return
+    try:
+        await cache_manager.invalidate_tags(_mistake_list_cache_tag(user_id))
+    except Exception as e:
+        logger.warning(f"错题列表缓存失效失败: user_id={user_id}, error={e}")
+
 
 class MistakeService:
     """错题服务"""
@@ -47,6 +80,7 @@ class MistakeService:
         self.db = db
         self.mistake_repo = MistakeRepository(MistakeRecord, db)
         self.review_repo = MistakeReviewRepository(MistakeReview, db)
+        self.daily_stats_repo = UserDailyStatsRepository(db)
         self.algorithm = SpacedRepetitionAlgorithm()
         self.bailian_service = bailian_service
 
@@ -62,8 +96,155 @@ class MistakeService:
         except Exception:
             return default
 
+    async def _load_list_associations(
+        self, mistakes: List[MistakeRecord]
+    ) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        批量加载列表页的知识点关联信息
+
+        先用一次 MGET 读取按错题缓存的关联信息，未命中的错题只发出两条
+        IN 查询（关联表 + 掌握度表），再用一次流水线写回缓存，
+        避免逐条查询带来的 N+1 往返。
+
+        Args:
+            mistakes: 当前页的错题记录
+
+        Returns:
+            以错题ID字符串为键的关联信息列表（每个错题最多3个）
+        """
+        from src.utils.type_converters import extract_orm_uuid_str
+
+        if not mistakes:
+            return {}
+
+        mistake_ids = [str(UUID(extract_orm_uuid_str(m, "id"))) for m in mistakes]
+        use_cache = _mistake_list_cache_enabled()
+
+        result: Dict[str, List[Dict[str, Any]]] = {}
+        if use_cache:
+            result = await cache_manager.get_many(
+                mistake_ids, namespace=MISTAKE_LIST_CACHE_NAMESPACE
+            )
+
+        missing = [
+            mistake
+            for mistake, mistake_id in zip(mistakes, mistake_ids, strict=True)
+            if mistake_id not in result
+        ]
+        if not missing:
+            return result
+
+        loaded = await self._query_list_associations(missing)
+        result.update(loaded)
+
+        if use_cache:
+            # 按用户分组写回，没有关联的错题也缓存空列表
+            by_user: Dict[str, Dict[str, Any]] = {}
+            for mistake in missing:
+                mistake_id = str(UUID(extract_orm_uuid_str(mistake, "id")))
+                user_id = extract_orm_uuid_str(mistake, "user_id")
+                by_user.setdefault(user_id, {})[mistake_id] = loaded.get(mistake_id, [])
+            for user_id, items in by_user.items():
+                await cache_manager.set_many(
+                    items,
+                    ttl=settings.MISTAKE_LIST_CACHE_TTL,
+                    namespace=MISTAKE_LIST_CACHE_NAMESPACE,
+                    tags=[_mistake_list_cache_tag(user_id)],
+                )
+
+        return result
+
+    async def _query_list_associations(
+        self, mistakes: List[MistakeRecord]
+    ) -> Dict[str, List[Dict[str, Any]]]:
+        """从数据库批量查询知识点关联信息（两条 IN 查询）"""
+        from src.models.knowledge_graph import MistakeKnowledgePoint
+        from src.models.study import KnowledgeMastery
+        from src.repositories.base_repository import BaseRepository
+        from src.repositories.knowledge_graph_repository import (
+            MistakeKnowledgePointRepository,
+        )
+        from src.utils.type_converters import extract_orm_uuid_str
+
+        mkp_repo = MistakeKnowledgePointRepository(MistakeKnowledgePoint, self.db)
+        km_repo = BaseRepository(KnowledgeMastery, self.db)
+
+        mistake_ids = [UUID(extract_orm_uuid_str(m, "id")) for m in mistakes]
+        grouped = await mkp_repo.find_by_mistakes(mistake_ids)
+
+        # 只取前3个知识点（列表页不需要全部显示）
+        top_associations = {
+            mistake_id: associations[:3] for mistake_id, associations in grouped.items()
+        }
+        kp_ids = [
+            str(assoc.knowledge_point_id)
+            for associations in top_associations.values()
+            for assoc in associations
+        ]
+        masteries = await km_repo.get_by_ids(kp_ids)
+
+        result: Dict[str, List[Dict[str, Any]]] = {}
+        for mistake_id, associations in top_associations.items():
+            items = []
+            for assoc in associations:
+                kp_id = str(assoc.knowledge_point_id)
+                mastery = masteries.get(kp_id)
+                items.append(
+                    {
+                        "association_id": str(assoc.id),
+                        "knowledge_point_id": kp_id,
+                        "knowledge_point_name": (
+                            getattr(mastery, "knowledge_point", "未知知识点")
+                            if mastery
+                            else "未知知识点"
+                        ),
+                        "relevance_score": float(
+                            str(getattr(assoc, "relevance_score", 0.0))
+                        ),
+                        "is_primary": getattr(assoc, "is_primary", False),
+                        "mastery_level": (
+                            float(str(getattr(mastery, "mastery_level", 0.0)))
+                            if mastery
+                            else 0.0
+                        ),
+                    }
+                )
+            result[mistake_id] = items
+
+        return result
+
+    async def _to_list_items(
+        self, mistakes: List[MistakeRecord]
+    ) -> List[MistakeListItem]:
+        """批量转换为列表项（知识点关联按页批量加载）"""
+        from src.utils.type_converters import extract_orm_uuid_str
+
+        try:
+            associations_map = await self._load_list_associations(mistakes)
+        except Exception as e:
+            # 知识点关联查询失败不影响列表返回
+            logger.warning(f"批量查询错题知识点关联失败: {e}")
+            associations_map = {}
+
+        list_items = []
+        for mistake in mistakes:
+            mistake_id = str(UUID(extract_orm_uuid_str(mistake, "id")))
+            list_items.append(
+                self._build_list_item(mistake, associations_map.get(mistake_id, []))
+            )
+        return list_items
+
     async def _to_list_item(self, mistake: MistakeRecord) -> MistakeListItem:
         """转换为列表项（包含知识点关联信息）"""
+        items = await self._to_list_items([mistake])
+        return items[0]
+
+    def _build_list_item(
+        self,
+        mistake: MistakeRecord,
+        knowledge_point_associations: List[Dict[str, Any]],
+    ) -> MistakeListItem:
+        """根据已加载的知识点关联信息构建列表项"""
 
         from src.utils.type_converters import (
             extract_orm_int,
@@ -95,53 +276,6 @@ class MistakeService:
                     return []
             return []
 
-        # 🎯 查询知识点关联信息（用于列表页显示掌握度）
-        knowledge_point_associations = []
-        try:
-            from src.models.knowledge_graph import MistakeKnowledgePoint
-            from src.models.study import KnowledgeMastery
-            from src.repositories.base_repository import BaseRepository
-            from src.repositories.knowledge_graph_repository import (
-                MistakeKnowledgePointRepository,
-            )
-
-            mkp_repo = MistakeKnowledgePointRepository(MistakeKnowledgePoint, self.db)
-            km_repo = BaseRepository(KnowledgeMastery, self.db)
-
-            # 查询错题的知识点关联
-            mistake_id = UUID(extract_orm_uuid_str(mistake, "id"))
-            associations = await mkp_repo.find_by_mistake(mistake_id)
-
-            # 只取前3个知识点（列表页不需要全部显示）
-            for assoc in associations[:3]:
-                kp_id = UUID(str(assoc.knowledge_point_id))
-                mastery = await km_repo.get_by_id(str(kp_id))
-
-                knowledge_point_associations.append(
-                    {
-                        "association_id": str(assoc.id),
-                        "knowledge_point_id": str(kp_id),
-                        "knowledge_point_name": (
-                            getattr(mastery, "knowledge_point", "未知知识点")
-                            if mastery
-                            else "未知知识点"
-                        ),
-                        "relevance_score": float(
-                            str(getattr(assoc, "relevance_score", 0.0))
-                        ),
-                        "is_primary": getattr(assoc, "is_primary", False),
-                        "mastery_level": (
-                            float(str(getattr(mastery, "mastery_level", 0.0)))
-                            if mastery
-                            else 0.0
-                        ),
-                    }
-                )
-
-        except Exception as e:
-            # 知识点关联查询失败不影响列表返回
-            logger.warning(f"查询错题 {mistake.id} 的知识点关联失败: {e}")
-
         return MistakeListItem(
             id=UUID(extract_orm_uuid_str(mistake, "id")),
             title=extract_orm_str(mistake, "title") or "未命名错题",
@@ -516,11 +650,8 @@ class MistakeService:
                 page_size=page_size,
             )
 
-        # 🎯 异步转换列表项（包含知识点关联查询）
-        list_items = []
-        for item in items:
-            list_item = await self._to_list_item(item)
-            list_items.append(list_item)
+        # 🎯 批量转换列表项（整页知识点关联一次性加载）
+        list_items = await self._to_list_items(items)
 
         return MistakeListResponse(
             items=list_items,
@@ -580,6 +711,8 @@ class MistakeService:
 
         # 创建记录
         mistake = await self.mistake_repo.create(data)
+        invalidate_learning_context(user_id)
+        await invalidate_learning_analytics_cache(user_id)
 
         logger.info(f"Created mistake {mistake.id} for user {user_id}")
 
@@ -726,12 +859,23 @@ class MistakeService:
             {"mid": mistake_id_str},
         )
 
-        # 3. 删除错题记录
+        # 3. 删除错题记录（同步扣减学情日汇总中创建当天的错题数）
+        created_at = getattr(mistake, "created_at", None)
+        if isinstance(created_at, str):
+            created_at = datetime.fromisoformat(created_at)
+        await self.daily_stats_repo.increment(
+            user_id,
+            getattr(mistake, "subject", None),
+            stat_date=created_at.date() if created_at else None,
+            mistake_count=-1,
+        )
         await self.mistake_repo.delete(mistake_id_str)
 
         # 🔧 Critical Fix #1: 确保删除操作成功提交
         await self.db.commit()
         logger.info(f"✅ 已删除错题 {mistake_id} 及所有关联数据")
+        invalidate_learning_context(user_id)
+        await invalidate_learning_analytics_cache(user_id)
 
         # 🔧 Phase 8.3: 删除后触发快照更新 (独立事务)
         if affected_subjects:
@@ -865,7 +1009,7 @@ class MistakeService:
         current_mastery = self.algorithm.calculate_mastery_level(review_history)
 
         # 4. 计算下次复习时间
-        from src.utils.type_converters import extract_orm_int
+        from src.utils.type_converters import extract_orm_int, extract_orm_str
 
         next_review, interval = self.algorithm.calculate_next_review(
             review_count=extract_orm_int(mistake, "review_count")
@@ -880,7 +1024,10 @@ class MistakeService:
         review_data["next_review_date"] = next_review
         review_data["interval_days"] = interval
 
-        # 6. 保存复习记录
+        # 6. 保存复习记录（同一事务累加学情日汇总的复习数）
+        await self.daily_stats_repo.increment(
+            user_id, extract_orm_str(mistake, "subject"), review_count=1
+        )
         review = await self.review_repo.create(review_data)
 
         from src.utils.type_converters import extract_orm_uuid_str
@@ -928,6 +1075,10 @@ class MistakeService:
             # 知识点掌握度更新失败不影响复习流程
             logger.warning(f"知识点掌握度更新失败: {e}")
 
+        invalidate_learning_context(user_id)
+        await invalidate_learning_analytics_cache(user_id)
+        await invalidate_mistake_list_cache(user_id)
+
         logger.info(
             f"Completed review for mistake {mistake_id}, mastery: {current_mastery}, next review: {next_review}"
         )
@@ -1539,8 +1690,7 @@ class MistakeService:
         items = []
         knowledge_points = set()
 
-        for m in mistakes:
-            item = await self._to_list_item(m)
+        for item in await self._to_list_items(mistakes):
             items.append(item)
             if item.knowledge_points:
                 knowledge_points.update(item.knowledge_points)
@@ -0,0 +1,187 @@
+"""
+内容寻址存储服务
+按文件内容的 SHA-256 登记已上传的对象并维护引用计数：
+- 重复上传同一文件时直接返回已有对象，不再上传
+- 删除时递减引用计数，归零才删除实际对象
+
+数据库不可用时只记录警告，调用方退化为普通上传。
+"""
+
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Optional, Sequence, TypeVar
+
+from src.core.config import settings
+from src.core.database import AsyncSessionLocal
+from src.core.logging import get_logger
+from src.models.stored_object import StoredObject
+from src.repositories.stored_object_repository import StoredObjectRepository
+
+logger = get_logger(__name__)
+
+T = TypeVar("T")
+
+
+def _to_dict(stored: StoredObject) -> Dict[str, Any]:
+    return {
+        "namespace": stored.namespace,
+        "content_hash": stored.content_hash,
+        "storage_type": stored.storage_type,
+        "object_key": stored.object_key,
+        "file_url": stored.file_url,
+        "file_size": stored.file_size,
+        "mime_type": stored.mime_type,
+        "width": stored.width,
+        "height": stored.height,
+        "ref_count": stored.ref_count,
+    }
+
+
+class StoredObjectService:
+    """内容寻址存储服务"""
+
+    def __init__(self, enabled: Optional[bool] = None):
+        """
+        Args:
+            enabled: 是否启用去重，默认 UPLOAD_DEDUP_ENABLED
+        """
+        self.enabled = settings.UPLOAD_DEDUP_ENABLED if enabled is None else enabled
+
+    async def _run(
+        self,
+        action: str,
+        operation: Callable[[StoredObjectRepository], Awaitable[T]],
+        default: T,
+    ) -> T:
+        """在独立会话中执行仓储操作，失败时返回默认值"""
+        if not self.enabled:
+            return default
+
+        try:
+            async with AsyncSessionLocal() as db:
+                return await operation(StoredObjectRepository(db))
+        except Exception as e:
+            logger.warning(f"{action}失败，按普通上传处理: {e}")
+            return default
+
+    async def acquire(
+        self,
+        namespace: str,
+        content_hash: str,
+        storage_type: str,
+        created_after: Optional[datetime] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        查找内容相同的已有对象，找到时增加一次引用
+
+        Args:
+            namespace: 命名空间
+            content_hash: 文件内容SHA-256
+            storage_type: 存储类型
+            created_after: 只复用此时间之后登记的对象（对象会被定期清理时使用）
+
+        Returns:
+            已有对象信息，不存在时返回None
+        """
+
+        async def operation(repo: StoredObjectRepository) -> Optional[Dict[str, Any]]:
+            stored = await repo.acquire(
+                namespace, content_hash, storage_type, created_after
+            )
+            return _to_dict(stored) if stored else None
+
+        stored = await self._run("查找已上传对象", operation, None)
+        if stored:
+            logger.info(
+                f"♻️ 复用已上传对象: {stored['object_key']}, refs={stored['ref_count']}"
+            )
+        return stored
+
+    async def register(
+        self,
+        namespace: str,
+        content_hash: str,
+        storage_type: str,
+        object_key: str,
+        file_url: str,
+        file_size: int = 0,
+        mime_type: Optional[str] = None,
+        width: Optional[int] = None,
+        height: Optional[int] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        登记新上传的对象
+
+        Args:
+            namespace: 命名空间
+            content_hash: 文件内容SHA-256
+            storage_type: 存储类型
+            object_key: 对象名或本地路径
+            file_url: 访问URL
+            file_size: 文件大小
+            mime_type: MIME类型
+            width: 图片宽度
+            height: 图片高度
+
+        Returns:
+            生效的对象信息；并发上传同一内容时 object_key 可能与传入的不同，
+            此时调用方应删除自己上传的对象。登记失败时返回None
+        """
+        values = {
+            "namespace": namespace,
+            "content_hash": content_hash,
+            "storage_type": storage_type,
+            "object_key": object_key,
+            "file_url": file_url,
+            "file_size": file_size,
+            "mime_type": mime_type,
+            "width": width,
+            "height": height,
+        }
+
+        async def operation(repo: StoredObjectRepository) -> Dict[str, Any]:
+            return _to_dict(await repo.register(values))
+
+        return await self._run("登记上传对象", operation, None)
+
+    async def release(self, namespace: str, object_key: str) -> Optional[int]:
+        """
+        释放一次引用
+
+        Args:
+            namespace: 命名空间
+            object_key: 对象名或本地路径
+
+        Returns:
+            剩余引用数；对象未登记或查询失败时返回None，调用方直接删除对象
+        """
+
+        async def operation(repo: StoredObjectRepository) -> Optional[int]:
+            return await repo.release(namespace, object_key)
+
+        return await self._run("释放对象引用", operation, None)
+
+    async def forget(self, namespace: str, object_keys: Sequence[str]) -> int:
+        """
+        删除已被清理的对象的记录
+
+        Args:
+            namespace: 命名空间（包括其下按用户划分的子命名空间）
+            object_keys: 对象名列表
+
+        Returns:
+            删除的记录数
+        """
+
+        async def operation(repo: StoredObjectRepository) -> int:
+            return await repo.delete_by_keys(namespace, object_keys)
+
+        return await self._run("删除对象记录", operation, 0)
+
+
+# 全局实例
+stored_object_service = StoredObjectService()
+
+
+def get_stored_object_service() -> StoredObjectService:
+    """获取内容寻址存储服务实例"""
+    return stored_object_service
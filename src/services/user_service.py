@@ -441,7 +441,7 @@ class UserService:
             "items": [UserResponse.model_validate(user) for user in users],
         }
 
-    @cache_result(ttl=300)  # 缓存5分钟
+    @cache_result(ttl=300, l1=True)  # 缓存5分钟，热点读走进程内缓存
     async def get_user_stats(self) -> Dict[str, Any]:
         """获取用户统计信息"""
         # 总用户数
@@ -0,0 +1,297 @@
+"""
+视觉模型图片优化服务
+
+发送给 qwen-vl 之前，把 OSS 上的原图替换为规格化后的版本（见
+src/utils/vision_image.py）。优化版本与原图存放在同一目录：
+
+    ai_analysis/abcd1234/20251128_xxx.jpg
+    ai_analysis/abcd1234/20251128_xxx.vl-qa.webp
+
+同一张图片只处理一次：进程内 LRU 记录 原图URL -> 优化版URL，
+未命中时先检查 OSS 上是否已有优化版本，再下载原图处理并上传。
+上传供 AI 分析的图片时已经拿到原图数据，会在后台提前生成。
+
+任何失败或超出时间预算都使用原图，不影响提问。
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+from urllib.parse import quote, unquote, urlsplit
+
+from src.core.config import settings
+from src.core.logging import get_logger
+from src.services.ai_image_service import ai_image_service
+from src.utils.oss_executor import oss_executor, put_object
+from src.utils.vision_image import (
+    PATCH_SIZE,
+    VisionImageProfile,
+    optimize_image_bytes,
+)
+
+logger = get_logger(__name__)
+
+# 调低 token 上限可以减少视觉 token，默认与模型一致只减少传输量
+_MAX_PIXELS = settings.VISION_IMAGE_MAX_TOKENS * PATCH_SIZE * PATCH_SIZE
+
+# 普通提问：保留颜色（几何图形、批注颜色）
+QA_PROFILE = VisionImageProfile(
+    name="qa",
+    max_pixels=_MAX_PIXELS,
+    format=settings.VISION_IMAGE_FORMAT,
+    quality=settings.VISION_IMAGE_QUALITY,
+)
+
+# 作业批改：灰度 + 自动对比度，突出手写文字
+TEXT_PROFILE = VisionImageProfile(
+    name="text",
+    max_pixels=_MAX_PIXELS,
+    grayscale=True,
+    autocontrast=True,
+    format=settings.VISION_IMAGE_FORMAT,
+    quality=settings.VISION_IMAGE_QUALITY,
+)
+
+# 优化版本的对象名标记，避免对优化版本再次优化
+VARIANT_MARKER = ".vl-"
+
+
+class VisionImageOptimizer:
+    """视觉模型图片优化器"""
+
+    def __init__(
+        self,
+        image_service: Any = None,
+        cache_size: Optional[int] = None,
+        cache_ttl: Optional[int] = None,
+    ):
+        """
+        Args:
+            image_service: 提供 bucket 的 AI 图片服务，默认全局 ai_image_service
+            cache_size: 进程内缓存条数，默认 VISION_IMAGE_CACHE_SIZE
+            cache_ttl: 缓存有效期（秒），需短于 AI 图片清理周期，默认 VISION_IMAGE_CACHE_TTL
+        """
+        self.image_service = image_service or ai_image_service
+        self.cache_size = cache_size or settings.VISION_IMAGE_CACHE_SIZE
+        self.cache_ttl = (
+            settings.VISION_IMAGE_CACHE_TTL if cache_ttl is None else cache_ttl
+        )
+        # (原图URL, 规格名) -> (使用的URL, 过期时间)
+        self._cache: "OrderedDict[Tuple[str, str], Tuple[str, float]]" = OrderedDict()
+        self._inflight: Dict[Tuple[str, str], "asyncio.Task[str]"] = {}
+        self._background: Set["asyncio.Task[str]"] = set()
+        self._stats = {
+            "hits": 0,
+            "optimized": 0,
+            "reused": 0,
+            "skipped": 0,
+            "errors": 0,
+        }
+
+    @property
+    def bucket(self) -> Any:
+        return self.image_service.bucket if self.image_service else None
+
+    def _object_key(self, url: str) -> Optional[str]:
+        """从本 bucket 的公开 URL 中解析对象名，其他 URL 返回None"""
+        parts = urlsplit(url)
+        if parts.scheme != "https" or parts.query:
+            return None
+        if not parts.netloc.startswith(f"{self.image_service.bucket_name}."):
+            return None
+        key = unquote(parts.path.lstrip("/"))
+        if not key or VARIANT_MARKER in key:
+            return None
+        return key
+
+    @staticmethod
+    def _variant_key(key: str, profile: VisionImageProfile) -> str:
+        stem = key.rsplit(".", 1)[0] if "." in key.rsplit("/", 1)[-1] else key
+        return f"{stem}{VARIANT_MARKER}{profile.name}.{profile.extension}"
+
+    @staticmethod
+    def _variant_url(url: str, variant_key: str) -> str:
+        parts = urlsplit(url)
+        return f"{parts.scheme}://{parts.netloc}/{quote(variant_key)}"
+
+    def _cache_get(self, cache_key: Tuple[str, str]) -> Optional[str]:
+        entry = self._cache.get(cache_key)
+        if entry is None:
+            return None
+        if entry[1] < time.monotonic():
+            del self._cache[cache_key]
+            return None
+        self._cache.move_to_end(cache_key)
+        return entry[0]
+
+    def _cache_set(self, cache_key: Tuple[str, str], url: str) -> None:
+        self._cache[cache_key] = (url, time.monotonic() + self.cache_ttl)
+        self._cache.move_to_end(cache_key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    async def optimize_urls(
+        self,
+        image_urls: Optional[Sequence[str]],
+        profile: VisionImageProfile = QA_PROFILE,
+        timeout: Optional[float] = None,
+    ) -> List[str]:
+        """
+        把图片URL替换为视觉模型专用的优化版本
+
+        Args:
+            image_urls: 原图URL列表
+            profile: 规格化参数
+            timeout: 等待时间预算（秒），默认 VISION_IMAGE_OPTIMIZE_TIMEOUT；
+                超时的图片使用原图，处理在后台继续，供下次使用
+
+        Returns:
+            与输入顺序一致的URL列表
+        """
+        urls = list(image_urls or [])
+        if (
+            not urls
+            or not settings.VISION_IMAGE_OPTIMIZE_ENABLED
+            or self.bucket is None
+        ):
+            return urls
+
+        results = list(urls)
+        tasks: Dict[int, "asyncio.Task[str]"] = {}
+        for index, url in enumerate(urls):
+            key = self._object_key(url)
+            if key is None:
+                continue
+            cached = self._cache_get((url, profile.name))
+            if cached is not None:
+                self._stats["hits"] += 1
+                results[index] = cached
+            else:
+                tasks[index] = self._start(url, key, profile)
+
+        if tasks:
+            timeout = (
+                settings.VISION_IMAGE_OPTIMIZE_TIMEOUT if timeout is None else timeout
+            )
+            done, pending = await asyncio.wait(set(tasks.values()), timeout=timeout)
+            if pending:
+                logger.warning(
+                    f"图片优化超出时间预算，{len(pending)}张使用原图: timeout={timeout}s"
+                )
+            for index, task in tasks.items():
+                if task in done and not task.cancelled():
+                    results[index] = task.result()
+
+        return results
+
+    def prepare(
+        self, url: str, data: bytes, profile: VisionImageProfile = QA_PROFILE
+    ) -> None:
+        """
+        用已有的原图数据在后台生成优化版本（上传图片后调用，无需再下载）
+
+        Args:
+            url: 原图URL
+            data: 原图数据
+            profile: 规格化参数
+        """
+        if not settings.VISION_IMAGE_OPTIMIZE_ENABLED or self.bucket is None:
+            return
+        key = self._object_key(url)
+        if key is not None and self._cache_get((url, profile.name)) is None:
+            self._start(url, key, profile, data)
+
+    def _start(
+        self,
+        url: str,
+        key: str,
+        profile: VisionImageProfile,
+        data: Optional[bytes] = None,
+    ) -> "asyncio.Task[str]":
+        """返回产出优化版URL的任务，同一张图片的并发请求共享一个任务"""
+        cache_key = (url, profile.name)
+        task = self._inflight.get(cache_key)
+        if task is None:
+            task = asyncio.create_task(self._optimize(url, key, profile, data))
+            self._inflight[cache_key] = task
+            # 调用方超时后任务继续执行，保留引用直到完成
+            self._background.add(task)
+            task.add_done_callback(self._background.discard)
+            task.add_done_callback(lambda _: self._inflight.pop(cache_key, None))
+        return task
+
+    async def _optimize(
+        self,
+        url: str,
+        key: str,
+        profile: VisionImageProfile,
+        data: Optional[bytes],
+    ) -> str:
+        cache_key = (url, profile.name)
+        variant_key = self._variant_key(key, profile)
+        variant_url = self._variant_url(url, variant_key)
+
+        try:
+            if data is None:
+                if await oss_executor.run(self.bucket.object_exists, variant_key):
+                    self._stats["reused"] += 1
+                    self._cache_set(cache_key, variant_url)
+                    return variant_url
+                data = await oss_executor.run(self._download, key)
+
+            started = time.perf_counter()
+            result = await asyncio.to_thread(optimize_image_bytes, data, profile)
+            if result is None:
+                # 原图已经足够小，直接使用原图
+                self._stats["skipped"] += 1
+                self._cache_set(cache_key, url)
+                return url
+
+            optimized, info = result
+            await oss_executor.run(
+                put_object,
+                self.bucket,
+                variant_key,
+                optimized,
+                {
+                    "Content-Type": profile.content_type,
+                    "Cache-Control": "max-age=86400",
+                },
+            )
+            self._stats["optimized"] += 1
+            self._cache_set(cache_key, variant_url)
+            logger.info(
+                f"🖼️ 图片已优化: {key} {info['original_width']}x{info['original_height']}"
+                f" -> {info['width']}x{info['height']}, "
+                f"{info['original_bytes'] // 1024}KB -> {info['bytes'] // 1024}KB, "
+                f"tokens {info['original_tokens']} -> {info['tokens']}, "
+                f"耗时 {(time.perf_counter() - started) * 1000:.0f}ms"
+            )
+            return variant_url
+
+        except Exception as e:
+            self._stats["errors"] += 1
+            logger.warning(f"图片优化失败，使用原图: {key}, error={e}")
+            return url
+
+    def _download(self, key: str) -> bytes:
+        """下载原图（阻塞调用）"""
+        return self.bucket.get_object(key).read()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存命中和处理统计"""
+        return {
+            "cache_size": len(self._cache),
+            "inflight": len(self._inflight),
+            **self._stats,
+        }
+
+
+# 全局实例
+vision_image_optimizer = VisionImageOptimizer()
+
+
+def get_vision_image_optimizer() -> VisionImageOptimizer:
+    """获取视觉模型图片优化器实例"""
+    return vision_image_optimizer
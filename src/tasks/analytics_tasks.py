@@ -0,0 +1,92 @@
+"""
+学情统计定时任务
+负责 user_daily_stats 日汇总表的回填与纠偏
+
+作者: AI Agent
+创建时间: 2025-11-25
+版本: v1.0
+"""
+
+import asyncio
+from datetime import date, datetime, timedelta
+from typing import Optional
+
+from src.core.database import AsyncSessionLocal
+from src.core.logging import configure_logging, get_logger
+from src.repositories.daily_stats_repository import UserDailyStatsRepository
+
+# 配置日志
+configure_logging()
+logger = get_logger(__name__)
+
+
+async def rebuild_daily_stats(
+    user_id: Optional[str] = None, days: Optional[int] = None
+) -> dict:
+    """
+    从明细表重建学情日汇总
+
+    上线后执行一次全量回填；之后可每日凌晨重建最近几天，
+    修正增量维护过程中因异常漏记的计数。
+
+    Args:
+        user_id: 仅重建该用户（默认全部用户）
+        days: 仅重建最近 N 天（默认全部历史）
+
+    Returns:
+        执行统计信息
+    """
+    start_date: Optional[date] = (
+        date.today() - timedelta(days=days - 1) if days else None
+    )
+
+    logger.info(
+        f"🚀 开始重建学情日汇总: user={user_id or 'all'}, since={start_date or 'all'}"
+    )
+    started_at = datetime.now()
+
+    stats = {"success": False, "rows": 0, "duration_seconds": 0.0, "error": None}
+
+    async with AsyncSessionLocal() as db:
+        try:
+            repo = UserDailyStatsRepository(db)
+            stats["rows"] = await repo.rebuild(user_id=user_id, start_date=start_date)
+            stats["success"] = True
+        except Exception as e:
+            stats["error"] = str(e)
+            logger.error(f"❌ 重建学情日汇总失败: {e}", exc_info=True)
+
+    stats["duration_seconds"] = round((datetime.now() - started_at).total_seconds(), 2)
+    logger.info(f"✅ 学情日汇总重建结束: {stats}")
+    return stats
+
+
+# Celery 任务包装（如果使用 Celery）
+try:
+    from celery import shared_task
+
+    @shared_task(name="analytics.rebuild_daily_stats")
+    def celery_rebuild_daily_stats(days: Optional[int] = 3):
+        """Celery 任务包装 - 默认纠偏最近3天"""
+        return asyncio.run(rebuild_daily_stats(days=days))
+
+except ImportError:
+    logger.warning("Celery 未安装，跳过 Celery 任务定义")
+
+
+# 命令行执行入口
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="学情日汇总任务")
+    parser.add_argument("--rebuild", action="store_true", help="从明细表重建日汇总")
+    parser.add_argument("--user-id", type=str, help="仅重建指定用户")
+    parser.add_argument("--days", type=int, help="仅重建最近 N 天")
+
+    args = parser.parse_args()
+
+    if args.rebuild:
+        stats = asyncio.run(rebuild_daily_stats(args.user_id, args.days))
+        print(f"执行统计: {stats}")
+    else:
+        parser.print_help()
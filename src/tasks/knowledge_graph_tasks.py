@@ -8,13 +8,18 @@
 """
 
 import asyncio
-from datetime import datetime, timedelta
-from typing import List, Tuple
+import hashlib
+import json
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import List, Optional, Set, Tuple
 from uuid import UUID
 
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from src.core.config import settings
 from src.core.database import AsyncSessionLocal
 from src.core.logging import configure_logging, get_logger
 from src.models.study import MistakeRecord
@@ -25,22 +30,47 @@ configure_logging()
 logger = get_logger(__name__)
 
 
-async def generate_daily_snapshots() -> dict:
+async def generate_daily_snapshots(
+    concurrency: Optional[int] = None,
+    batch_size: Optional[int] = None,
+    shard_index: int = 0,
+    shard_count: int = 1,
+    resume: bool = True,
+    incremental: bool = True,
+) -> dict:
     """
     每日凌晨3点生成知识图谱快照
 
     工作流程:
-    1. 查询所有有错题记录的用户
-    2. 为每个用户的每个学科生成快照
-    3. 记录成功和失败统计
-    4. 清理30天前的旧快照
+    1. 查询所有有错题记录的用户，按用户ID哈希取本分片负责的部分
+    2. 跳过断点文件中今天已完成的组合（崩溃后重跑可续跑）
+    3. 由 concurrency 个 worker 并发生成快照，每个 worker 独占一个数据库会话，
+       每累积 batch_size 个快照提交一次并写入断点；增量模式下源数据自上一份
+       快照后无变化的组合直接复制上一份快照，计入 skipped_count
+    4. 清理30天前的旧快照（仅 0 号分片执行）
+
+    Args:
+        concurrency: 并发 worker 数（默认 KG_SNAPSHOT_CONCURRENCY）
+        batch_size: 每批提交的快照数（默认 KG_SNAPSHOT_BATCH_SIZE）
+        shard_index: 当前分片序号（0 开始）
+        shard_count: 分片总数，多进程部署时每个进程负责一个分片
+        resume: 是否从断点续跑
+        incremental: 是否跳过无变化的组合（False 时全部重建）
 
     Returns:
         执行统计信息
     """
+    concurrency = max(1, concurrency or settings.KG_SNAPSHOT_CONCURRENCY)
+    batch_size = max(1, batch_size or settings.KG_SNAPSHOT_BATCH_SIZE)
+    if not 0 <= shard_index < shard_count:
+        raise ValueError(f"无效的分片参数: {shard_index}/{shard_count}")
+
     logger.info("=" * 60)
     logger.info("🚀 开始执行知识图谱快照定时任务")
     logger.info(f"⏰ 执行时间: {datetime.now().isoformat()}")
+    logger.info(
+        f"⚙️ 并发数={concurrency}, 批大小={batch_size}, 分片={shard_index}/{shard_count}"
+    )
     logger.info("=" * 60)
 
     stats = {
@@ -49,13 +79,20 @@ async def generate_daily_snapshots() -> dict:
         "success_count": 0,
         "failed_count": 0,
         "skipped_count": 0,
+        "resumed_count": 0,
+        "duration_seconds": 0.0,
+        "throughput": 0.0,
         "errors": [],
     }
 
     async with AsyncSessionLocal() as db:
         try:
-            # 1. 查询有错题记录的用户和学科
-            users_subjects = await _get_users_with_mistakes(db)
+            # 1. 查询有错题记录的用户和学科（仅本分片）
+            users_subjects = [
+                (user_id, subject)
+                for user_id, subject in await _get_users_with_mistakes(db)
+                if _shard_of(user_id, shard_count) == shard_index
+            ]
             stats["total_users"] = len(set(user_id for user_id, _ in users_subjects))
             stats["total_snapshots"] = len(users_subjects)
 
@@ -68,47 +105,64 @@ async def generate_daily_snapshots() -> dict:
                 logger.info("✅ 没有需要处理的数据，退出")
                 return stats
 
-            # 2. 为每个用户的每个学科生成快照
-            for user_id, subject in users_subjects:
-                try:
-                    # 创建新的数据库会话（避免单个失败影响整体）
-                    async with AsyncSessionLocal() as snapshot_db:
-                        kg_service = KnowledgeGraphService(snapshot_db)
-
-                        # 生成快照
-                        snapshot = await kg_service.create_knowledge_graph_snapshot(
-                            user_id=UUID(user_id), subject=subject, period_type="daily"
-                        )
+            # 2. 断点续跑：跳过今天已完成的组合
+            checkpoint = SnapshotCheckpoint(
+                _checkpoint_path(date.today(), shard_index, shard_count)
+            )
+            done = checkpoint.load() if resume else set()
+            if not resume:
+                checkpoint.clear()
 
-                        await snapshot_db.commit()
+            queue: asyncio.Queue = asyncio.Queue()
+            for user_id, subject in users_subjects:
+                if _checkpoint_key(user_id, subject) in done:
+                    stats["resumed_count"] += 1
+                else:
+                    queue.put_nowait((user_id, subject))
+
+            if stats["resumed_count"]:
+                logger.info(f"⏩ 断点续跑，跳过已完成 {stats['resumed_count']} 个")
+
+            # 3. worker 池并发生成快照
+            started_at = time.perf_counter()
+            await asyncio.gather(
+                *(
+                    _run_snapshot_worker(
+                        queue, checkpoint, stats, batch_size, incremental
+                    )
+                    for _ in range(min(concurrency, queue.qsize() or 1))
+                )
+            )
+            stats["duration_seconds"] = round(time.perf_counter() - started_at, 2)
+            if stats["duration_seconds"] > 0:
+                processed = stats["success_count"] + stats["skipped_count"]
+                stats["throughput"] = round(processed / stats["duration_seconds"], 2)
 
-                        stats["success_count"] += 1
-                        logger.info(
-                            f"✅ 成功生成快照: user={user_id}, subject={subject}, "
-                            f"snapshot_id={snapshot.id}"
-                        )
+            # 全部成功后删除断点，有失败时保留以便重跑只处理失败部分
+            if stats["failed_count"] == 0:
+                checkpoint.clear()
 
+            # 4. 清理30天前的旧快照（多分片时只由 0 号分片执行）
+            if shard_index == 0:
+                try:
+                    deleted_count = await _cleanup_old_snapshots(db, days=30)
+                    logger.info(f"🗑️ 清理了 {deleted_count} 个过期快照(30天前)")
                 except Exception as e:
-                    stats["failed_count"] += 1
-                    error_msg = f"user={user_id}, subject={subject}, error={str(e)}"
-                    stats["errors"].append(error_msg)
-                    logger.error(f"❌ 生成快照失败: {error_msg}", exc_info=True)
-
-            # 3. 清理30天前的旧快照
-            try:
-                deleted_count = await _cleanup_old_snapshots(db, days=30)
-                logger.info(f"🗑️ 清理了 {deleted_count} 个过期快照(30天前)")
-            except Exception as e:
-                logger.error(f"清理旧快照失败: {e}", exc_info=True)
+                    logger.error(f"清理旧快照失败: {e}", exc_info=True)
 
-            # 4. 输出统计信息
+            # 5. 输出统计信息
             logger.info("=" * 60)
             logger.info("📈 任务执行完成! 统计信息:")
             logger.info(f"  总用户数: {stats['total_users']}")
             logger.info(f"  总快照数: {stats['total_snapshots']}")
             logger.info(f"  成功: {stats['success_count']}")
             logger.info(f"  失败: {stats['failed_count']}")
-            logger.info(f"  跳过: {stats['skipped_count']}")
+            logger.info(f"  跳过(无变化): {stats['skipped_count']}")
+            logger.info(f"  续跑跳过: {stats['resumed_count']}")
+            logger.info(
+                f"  耗时: {stats['duration_seconds']}s, "
+                f"吞吐: {stats['throughput']} 快照/秒"
+            )
 
             if stats["errors"]:
                 logger.warning(f"  错误详情: {stats['errors'][:5]}")  # 只显示前5个
@@ -122,6 +176,175 @@ async def generate_daily_snapshots() -> dict:
             raise
 
 
+async def _run_snapshot_worker(
+    queue: asyncio.Queue,
+    checkpoint: "SnapshotCheckpoint",
+    stats: dict,
+    batch_size: int,
+    incremental: bool = True,
+) -> None:
+    """
+    快照 worker：复用一个数据库会话，按批提交
+
+    生成快照失败时会回滚整个事务，
+    因此本批次中尚未提交的成功项会被重新放回队列。
+
+    Args:
+        queue: 待处理的 (user_id, subject) 队列
+        checkpoint: 断点记录
+        stats: 共享统计信息
+        batch_size: 每批提交的快照数
+        incremental: 是否跳过无变化的组合
+    """
+    async with AsyncSessionLocal() as snapshot_db:
+        kg_service = KnowledgeGraphService(snapshot_db)
+        # (user_id, subject, 是否重建)
+        pending: List[Tuple[str, str, bool]] = []
+
+        while True:
+            try:
+                user_id, subject = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                break
+
+            try:
+                if incremental:
+                    _, rebuilt = await kg_service.create_incremental_snapshot(
+                        user_id=UUID(user_id),
+                        subject=subject,
+                        period_type="daily",
+                        auto_commit=False,
+                    )
+                else:
+                    await kg_service.create_knowledge_graph_snapshot(
+                        user_id=UUID(user_id),
+                        subject=subject,
+                        period_type="daily",
+                        auto_commit=False,
+                    )
+                    rebuilt = True
+                pending.append((user_id, subject, rebuilt))
+            except Exception as e:
+                stats["failed_count"] += 1
+                error_msg = f"user={user_id}, subject={subject}, error={str(e)}"
+                stats["errors"].append(error_msg)
+                logger.error(f"❌ 生成快照失败: {error_msg}")
+
+                # 事务已回滚，未提交的成功项重新入队
+                for pending_user_id, pending_subject, _ in pending:
+                    queue.put_nowait((pending_user_id, pending_subject))
+                pending = []
+                continue
+
+            if len(pending) >= batch_size:
+                await _commit_snapshot_batch(snapshot_db, pending, checkpoint, stats)
+                pending = []
+
+        if pending:
+            await _commit_snapshot_batch(snapshot_db, pending, checkpoint, stats)
+
+
+async def _commit_snapshot_batch(
+    db: AsyncSession,
+    batch: List[Tuple[str, str, bool]],
+    checkpoint: "SnapshotCheckpoint",
+    stats: dict,
+) -> None:
+    """
+    提交一批快照并记录断点
+
+    Args:
+        db: worker 的数据库会话
+        batch: 本批 (user_id, subject, 是否重建) 列表
+        checkpoint: 断点记录
+        stats: 共享统计信息
+    """
+    try:
+        await db.commit()
+        rebuilt_count = sum(1 for _, _, rebuilt in batch if rebuilt)
+        stats["success_count"] += rebuilt_count
+        stats["skipped_count"] += len(batch) - rebuilt_count
+        checkpoint.mark([(user_id, subject) for user_id, subject, _ in batch])
+        logger.info(
+            f"✅ 提交快照批次: {len(batch)} 个, 累计成功 {stats['success_count']}"
+        )
+    except Exception as e:
+        await db.rollback()
+        stats["failed_count"] += len(batch)
+        stats["errors"].append(f"batch_size={len(batch)}, error={str(e)}")
+        logger.error(f"❌ 快照批次提交失败: {e}", exc_info=True)
+    finally:
+        # 释放已提交对象，避免长时间运行的会话身份映射无限增长
+        db.expunge_all()
+
+
+def _shard_of(user_id: str, shard_count: int) -> int:
+    """按用户ID的稳定哈希计算所属分片（内置 hash 在进程间不稳定）"""
+    if shard_count <= 1:
+        return 0
+    digest = hashlib.md5(str(user_id).encode("utf-8")).hexdigest()
+    return int(digest, 16) % shard_count
+
+
+def _checkpoint_key(user_id: str, subject: str) -> str:
+    """断点记录中 (用户, 学科) 的键"""
+    return f"{user_id}:{subject}"
+
+
+def _checkpoint_path(run_date: date, shard_index: int, shard_count: int) -> Path:
+    """按运行日期和分片生成断点文件路径"""
+    return Path(settings.KG_SNAPSHOT_CHECKPOINT_DIR) / (
+        f"kg_snapshots_{run_date:%Y%m%d}_{shard_index}of{shard_count}.json"
+    )
+
+
+class SnapshotCheckpoint:
+    """
+    快照任务断点记录
+
+    以 JSON 文件保存当天已提交的 (用户, 学科) 组合，
+    每次批量提交后原子覆盖写入。
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._done: Set[str] = set()
+
+    def load(self) -> Set[str]:
+        """读取已完成的组合"""
+        try:
+            if self.path.exists():
+                data = json.loads(self.path.read_text(encoding="utf-8"))
+                self._done = set(data.get("done", []))
+        except Exception as e:
+            logger.warning(f"读取快照断点失败，将从头开始: {e}")
+            self._done = set()
+        return set(self._done)
+
+    def mark(self, pairs: List[Tuple[str, str]]) -> None:
+        """记录一批已提交的组合"""
+        self._done.update(
+            _checkpoint_key(user_id, subject) for user_id, subject in pairs
+        )
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_suffix(".tmp")
+            tmp_path.write_text(
+                json.dumps({"done": sorted(self._done)}), encoding="utf-8"
+            )
+            tmp_path.replace(self.path)
+        except Exception as e:
+            logger.warning(f"写入快照断点失败: {e}")
+
+    def clear(self) -> None:
+        """删除断点文件"""
+        self._done = set()
+        try:
+            self.path.unlink(missing_ok=True)
+        except Exception as e:
+            logger.warning(f"删除快照断点失败: {e}")
+
+
 async def _get_users_with_mistakes(db: AsyncSession) -> List[Tuple[str, str]]:
     """
     查询有错题记录的用户和学科组合
@@ -243,9 +466,11 @@ try:
     from celery import shared_task
 
     @shared_task(name="knowledge_graph.generate_daily_snapshots")
-    def celery_generate_daily_snapshots():
+    def celery_generate_daily_snapshots(shard_index: int = 0, shard_count: int = 1):
         """Celery 任务包装"""
-        return asyncio.run(generate_daily_snapshots())
+        return asyncio.run(
+            generate_daily_snapshots(shard_index=shard_index, shard_count=shard_count)
+        )
 
     @shared_task(name="knowledge_graph.generate_snapshot_for_user")
     def celery_generate_snapshot_for_user(user_id: str, subject: str):
@@ -263,6 +488,14 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="知识图谱快照任务")
     parser.add_argument("--user-id", type=str, help="指定用户ID（手动生成快照）")
     parser.add_argument("--subject", type=str, help="指定学科（手动生成快照）")
+    parser.add_argument("--concurrency", type=int, help="并发 worker 数")
+    parser.add_argument("--batch-size", type=int, help="每批提交的快照数")
+    parser.add_argument("--shard-index", type=int, default=0, help="当前分片序号")
+    parser.add_argument("--shard-count", type=int, default=1, help="分片总数")
+    parser.add_argument("--no-resume", action="store_true", help="忽略断点从头执行")
+    parser.add_argument(
+        "--full", action="store_true", help="不跳过无变化用户，全部重建"
+    )
 
     args = parser.parse_args()
 
@@ -272,5 +505,14 @@ if __name__ == "__main__":
         print(f"执行结果: {result}")
     else:
         # 批量生成快照
-        stats = asyncio.run(generate_daily_snapshots())
+        stats = asyncio.run(
+            generate_daily_snapshots(
+                concurrency=args.concurrency,
+                batch_size=args.batch_size,
+                shard_index=args.shard_index,
+                shard_count=args.shard_count,
+                resume=not args.no_resume,
+                incremental=not args.full,
+            )
+        )
         print(f"执行统计: {stats}")
@@ -5,25 +5,113 @@ Redis缓存工具模块
 
 import asyncio
 import hashlib
+import inspect
 import json
-import pickle
+import math
+import random
+import time
+from collections import OrderedDict
 from functools import wraps
-from typing import Any, Callable, Dict, Optional
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
 
 import redis.asyncio as redis
 from redis.asyncio import Redis
-from redis.exceptions import RedisError
+from redis.exceptions import NoScriptError, RedisError
 
 from src.core.config import settings
 from src.core.logging import get_logger
+from src.utils.cache_codec import CacheCodec, get_cache_codec
 
 logger = get_logger(__name__)
 
+# 标签失效时每批删除的键数量，避免单条命令阻塞 Redis
+INVALIDATION_BATCH_SIZE = 500
+
+# 将缓存键登记到标签有序集合（分值为该键的过期时刻），顺带移除已过期的成员，
+# 并把集合的过期时间延长到不短于该键（只延长不缩短，保证集合存活期间覆盖所有成员）。
+# 持续写入的热点命名空间集合大小只取决于仍存活的键数，不会无限增长。
+# ARGV: 成员, 过期时刻, 当前时刻, TTL（秒）
+_TAG_REGISTER_SCRIPT = """
+redis.call('ZADD', KEYS[1], ARGV[2], ARGV[1])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', '(' .. ARGV[3])
+if redis.call('TTL', KEYS[1]) < tonumber(ARGV[4]) then
+    redis.call('EXPIRE', KEYS[1], ARGV[4])
+end
+return 1
+"""
+# 通过 EVALSHA 发送，服务端缺少脚本时 SCRIPT LOAD 后重试一次
+_TAG_REGISTER_SHA = hashlib.sha1(_TAG_REGISTER_SCRIPT.encode()).hexdigest()
+
+
+# get_or_set 写入的包装值标记，附带计算耗时和过期时刻用于提前刷新
+_ENVELOPE_MARKER = "__wuhao_cache_entry__"
+
+_MISSING = object()
+
+
+class LocalLRUCache:
+    """
+    进程内 LRU 缓存（一级缓存）
+
+    容量有界、TTL 较短，用于挡在 Redis 前面减少热点键的网络往返。
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+
+    def get(self, key: str) -> Any:
+        """读取缓存，未命中或已过期返回 _MISSING"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return _MISSING
+        if entry[0] < time.monotonic():
+            del self._entries[key]
+            return _MISSING
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        """写入缓存，超出容量时淘汰最久未使用的条目"""
+        expires_at = time.monotonic() + min(ttl or self.ttl, self.ttl)
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        self._entries.pop(key, None)
+
+    def delete_prefix(self, prefix: str) -> None:
+        for key in [key for key in self._entries if key.startswith(prefix)]:
+            del self._entries[key]
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
 
 class RedisCache:
     """
     Redis缓存管理器
     提供异步缓存操作接口
+
+    可选的进程内一级缓存（L1）只在调用方传入 use_l1=True 时读写，
+    get_or_set 提供同键并发合并（single-flight）和概率提前刷新。
     """
 
     def __init__(
@@ -31,6 +119,9 @@ class RedisCache:
         redis_client: Optional[Redis] = None,
         prefix: str = "wuhao",
         default_ttl: int = 3600,
+        l1_max_size: Optional[int] = None,
+        l1_ttl: Optional[float] = None,
+        codec: Optional[CacheCodec] = None,
     ):
         """
         初始化Redis缓存管理器
@@ -39,10 +130,34 @@ class RedisCache:
             redis_client: Redis客户端实例
             prefix: 缓存键前缀
             default_ttl: 默认TTL（秒）
+            l1_max_size: 一级缓存容量，0 表示关闭（默认取配置）
+            l1_ttl: 一级缓存TTL（秒，默认取配置）
+            codec: 缓存值编解码器（默认按配置创建）
         """
         self.redis_client = redis_client or self._create_redis_client()
         self.prefix = prefix
         self.default_ttl = default_ttl
+        self.codec = codec or get_cache_codec()
+
+        l1_max_size = settings.CACHE_L1_MAX_SIZE if l1_max_size is None else l1_max_size
+        self.l1: Optional[LocalLRUCache] = (
+            LocalLRUCache(l1_max_size, l1_ttl or settings.CACHE_L1_TTL)
+            if l1_max_size > 0
+            else None
+        )
+        self.early_refresh_beta = settings.CACHE_EARLY_REFRESH_BETA
+        self._inflight: Dict[str, "asyncio.Future[Any]"] = {}
+        # 正在提前重算的键 -> 旧值，重算期间同进程的请求直接使用旧值
+        self._refreshing: Dict[str, Any] = {}
+        self._tier_stats = {
+            "l1_hits": 0,
+            "l1_misses": 0,
+            "l2_hits": 0,
+            "l2_misses": 0,
+            "early_refreshes": 0,
+            "coalesced": 0,
+            "stale_served": 0,
+        }
 
     def _create_redis_client(self) -> Redis:
         """创建Redis客户端"""
@@ -71,9 +186,27 @@ class RedisCache:
             return f"{self.prefix}:{namespace}:{key}"
         return f"{self.prefix}:{key}"
 
+    def _make_tag_key(self, tag: str) -> str:
+        """
+        生成标签有序集合的键
+
+        Args:
+            tag: 标签，如 "table:users"、"user:123"、"ns:query"
+
+        Returns:
+            标签有序集合在 Redis 中的键（tagz 与早期的 SET 标签键区分，
+            后者不再写入，到期自动删除）
+        """
+        return f"{self.prefix}:tagz:{tag}"
+
+    @staticmethod
+    def namespace_tag(namespace: str) -> str:
+        """命名空间对应的标签"""
+        return f"ns:{namespace}"
+
     def _serialize_value(self, value: Any) -> bytes:
         """
-        序列化值
+        序列化值（带版本和类型字节的格式，见 cache_codec）
 
         Args:
             value: 要序列化的值
@@ -81,14 +214,11 @@ class RedisCache:
         Returns:
             序列化后的bytes
         """
-        if isinstance(value, (str, int, float, bool)):
-            return json.dumps(value).encode("utf-8")
-        else:
-            return pickle.dumps(value)
+        return self.codec.encode(value)
 
     def _deserialize_value(self, data: bytes) -> Any:
         """
-        反序列化值
+        反序列化值，兼容旧的 JSON/pickle 格式
 
         Args:
             data: 序列化的数据
@@ -96,32 +226,43 @@ class RedisCache:
         Returns:
             反序列化后的值
         """
-        try:
-            # 先尝试JSON反序列化
-            return json.loads(data.decode("utf-8"))
-        except (json.JSONDecodeError, UnicodeDecodeError):
-            # 如果JSON失败，使用pickle
-            return pickle.loads(data)
+        return self.codec.decode(data)
 
-    async def get(self, key: str, namespace: str = "") -> Optional[Any]:
+    async def get(
+        self, key: str, namespace: str = "", use_l1: bool = False
+    ) -> Optional[Any]:
         """
         获取缓存值
 
         Args:
             key: 缓存键
             namespace: 命名空间
+            use_l1: 是否先查进程内一级缓存
 
         Returns:
             缓存值或None
         """
+        cache_key = self._make_key(key, namespace)
+        if use_l1 and self.l1 is not None:
+            value = self.l1.get(cache_key)
+            if value is not _MISSING:
+                self._tier_stats["l1_hits"] += 1
+                return value
+            self._tier_stats["l1_misses"] += 1
+
         try:
-            cache_key = self._make_key(key, namespace)
             data = await self.redis_client.get(cache_key)
             if data is None:
+                self._tier_stats["l2_misses"] += 1
                 logger.debug(f"Cache miss for key: {cache_key}")
                 return None
 
             value = self._deserialize_value(data)
+            self._tier_stats["l2_hits"] += 1
+            if isinstance(value, dict) and value.get(_ENVELOPE_MARKER):
+                value = value["value"]
+            if use_l1 and self.l1 is not None:
+                self.l1.set(cache_key, value)
             logger.debug(f"Cache hit for key: {cache_key}")
             return value
 
@@ -133,30 +274,61 @@ class RedisCache:
             return None
 
     async def set(
-        self, key: str, value: Any, ttl: Optional[int] = None, namespace: str = ""
+        self,
+        key: str,
+        value: Any,
+        ttl: Optional[int] = None,
+        namespace: str = "",
+        tags: Optional[Sequence[str]] = None,
+        use_l1: bool = False,
     ) -> bool:
         """
         设置缓存值
 
+        带命名空间的键会自动登记到命名空间标签，另可附加表、用户等标签，
+        之后通过 invalidate_tags 在所有 worker 间统一失效。
+
         Args:
             key: 缓存键
             value: 缓存值
             ttl: 过期时间（秒）
             namespace: 命名空间
+            tags: 额外的失效标签
+            use_l1: 是否同时写入进程内一级缓存
 
         Returns:
             是否设置成功
         """
+        cache_key = self._make_key(key, namespace)
+        if self.l1 is not None:
+            if use_l1:
+                self.l1.set(cache_key, value, ttl)
+            else:
+                self.l1.delete(cache_key)
+
         try:
-            cache_key = self._make_key(key, namespace)
             serialized_value = self._serialize_value(value)
             expire_time = ttl or self.default_ttl
 
-            result = await self.redis_client.setex(
-                cache_key, expire_time, serialized_value
-            )
+            all_tags = list(tags or [])
+            if namespace:
+                all_tags.append(self.namespace_tag(namespace))
+
+            if not all_tags:
+                result = await self.redis_client.setex(
+                    cache_key, expire_time, serialized_value
+                )
+            else:
+                # 写值和登记标签在同一次往返内完成
+                results = await self._execute_pipeline(
+                    lambda pipe: self._queue_set(
+                        pipe, cache_key, serialized_value, expire_time, all_tags
+                    )
+                )
+                result = results[0]
+
             logger.debug(f"Cache set for key: {cache_key}, ttl: {expire_time}")
-            return result
+            return bool(result)
 
         except RedisError as e:
             logger.error(f"Redis error when setting key {key}: {e}")
@@ -165,6 +337,50 @@ class RedisCache:
             logger.error(f"Error serializing value for key {key}: {e}")
             return False
 
+    def _queue_set(
+        self,
+        pipe: Any,
+        cache_key: str,
+        serialized_value: bytes,
+        expire_time: int,
+        tags: Sequence[str],
+    ) -> int:
+        """向流水线追加写值和登记标签的命令，返回追加的命令数"""
+        pipe.setex(cache_key, expire_time, serialized_value)
+        now = time.time()
+        for tag in tags:
+            pipe.evalsha(
+                _TAG_REGISTER_SHA,
+                1,
+                self._make_tag_key(tag),
+                cache_key,
+                now + expire_time,
+                now,
+                expire_time,
+            )
+        return 1 + len(tags)
+
+    async def _execute_pipeline(self, queue: Callable[[Any], Any]) -> List[Any]:
+        """
+        执行流水线；标签脚本未加载（Redis 重启或首次使用）时加载后重试一次
+
+        Args:
+            queue: 向流水线追加命令的函数
+
+        Returns:
+            各命令的结果
+        """
+        for attempt in range(2):
+            try:
+                async with self.redis_client.pipeline(transaction=False) as pipe:
+                    queue(pipe)
+                    return await pipe.execute()
+            except NoScriptError:
+                if attempt:
+                    raise
+                await self.redis_client.script_load(_TAG_REGISTER_SCRIPT)
+        return []
+
     async def delete(self, key: str, namespace: str = "") -> bool:
         """
         删除缓存值
@@ -176,8 +392,11 @@ class RedisCache:
         Returns:
             是否删除成功
         """
+        cache_key = self._make_key(key, namespace)
+        if self.l1 is not None:
+            self.l1.delete(cache_key)
+
         try:
-            cache_key = self._make_key(key, namespace)
             result = await self.redis_client.delete(cache_key)
             logger.debug(f"Cache deleted for key: {cache_key}")
             return bool(result)
@@ -228,48 +447,437 @@ class RedisCache:
             logger.error(f"Redis error when setting expiry for key {key}: {e}")
             return False
 
-    async def clear_namespace(self, namespace: str) -> int:
+    async def get_many(
+        self, keys: Sequence[str], namespace: str = "", use_l1: bool = False
+    ) -> Dict[str, Any]:
         """
-        清空指定命名空间的所有缓存
+        批量获取缓存值（一次 MGET 往返）
+
+        Args:
+            keys: 缓存键列表
+            namespace: 命名空间
+            use_l1: 是否先查进程内一级缓存
+
+        Returns:
+            命中的键到值的映射，未命中的键不出现在结果中
+        """
+        found: Dict[str, Any] = {}
+        pending: List[Tuple[str, str]] = []
+        for key in dict.fromkeys(keys):
+            cache_key = self._make_key(key, namespace)
+            if use_l1 and self.l1 is not None:
+                value = self.l1.get(cache_key)
+                if value is not _MISSING:
+                    self._tier_stats["l1_hits"] += 1
+                    found[key] = value
+                    continue
+                self._tier_stats["l1_misses"] += 1
+            pending.append((key, cache_key))
+
+        if not pending:
+            return found
+
+        try:
+            results = await self.redis_client.mget(
+                [cache_key for _, cache_key in pending]
+            )
+        except RedisError as e:
+            logger.error(f"Redis error when getting {len(pending)} keys: {e}")
+            return found
+
+        for (key, cache_key), data in zip(pending, results, strict=True):
+            if data is None:
+                self._tier_stats["l2_misses"] += 1
+                continue
+            try:
+                value = self._deserialize_value(data)
+            except Exception as e:
+                logger.error(f"Error deserializing cached value for key {key}: {e}")
+                continue
+            if isinstance(value, dict) and value.get(_ENVELOPE_MARKER):
+                value = value["value"]
+            self._tier_stats["l2_hits"] += 1
+            if use_l1 and self.l1 is not None:
+                self.l1.set(cache_key, value)
+            found[key] = value
+
+        return found
+
+    async def set_many(
+        self,
+        items: Dict[str, Any],
+        ttl: Optional[int] = None,
+        namespace: str = "",
+        tags: Optional[Sequence[str]] = None,
+        ttls: Optional[Dict[str, int]] = None,
+        use_l1: bool = False,
+    ) -> bool:
+        """
+        批量设置缓存值（一次流水线往返）
+
+        Args:
+            items: 键到值的映射
+            ttl: 默认过期时间（秒）
+            namespace: 命名空间
+            tags: 所有键共用的失效标签
+            ttls: 按键指定的过期时间，优先于 ttl
+            use_l1: 是否同时写入进程内一级缓存
+
+        Returns:
+            是否全部设置成功
+        """
+        if not items:
+            return True
+
+        all_tags = list(tags or [])
+        if namespace:
+            all_tags.append(self.namespace_tag(namespace))
+        ttls = ttls or {}
+
+        try:
+            entries = []
+            for key, value in items.items():
+                cache_key = self._make_key(key, namespace)
+                expire_time = ttls.get(key) or ttl or self.default_ttl
+                if self.l1 is not None:
+                    if use_l1:
+                        self.l1.set(cache_key, value, expire_time)
+                    else:
+                        self.l1.delete(cache_key)
+                entries.append((cache_key, self._serialize_value(value), expire_time))
+
+            setex_positions: List[int] = []
+
+            def queue(pipe: Any) -> None:
+                setex_positions.clear()
+                position = 0
+                for cache_key, serialized_value, expire_time in entries:
+                    setex_positions.append(position)
+                    position += self._queue_set(
+                        pipe, cache_key, serialized_value, expire_time, all_tags
+                    )
+
+            results = await self._execute_pipeline(queue)
+
+            logger.debug(f"Cache set for {len(items)} keys in namespace {namespace}")
+            return all(results[i] for i in setex_positions)
+
+        except RedisError as e:
+            logger.error(f"Redis error when setting {len(items)} keys: {e}")
+            return False
+        except Exception as e:
+            logger.error(f"Error serializing values for {len(items)} keys: {e}")
+            return False
+
+    async def delete_many(self, keys: Sequence[str], namespace: str = "") -> int:
+        """
+        批量删除缓存值（按 INVALIDATION_BATCH_SIZE 分批流水线删除）
 
         Args:
+            keys: 缓存键列表
             namespace: 命名空间
 
         Returns:
             删除的键数量
         """
+        cache_keys = [self._make_key(key, namespace) for key in dict.fromkeys(keys)]
+        deleted = 0
         try:
-            pattern = self._make_key("*", namespace)
-            keys = await self.redis_client.keys(pattern)
-            if keys:
-                deleted_count = await self.redis_client.delete(*keys)
-                logger.info(f"Cleared {deleted_count} keys from namespace: {namespace}")
-                return deleted_count
+            for start in range(0, len(cache_keys), INVALIDATION_BATCH_SIZE):
+                deleted += await self._unlink_batch(
+                    cache_keys[start : start + INVALIDATION_BATCH_SIZE]
+                )
+        except RedisError as e:
+            logger.error(f"Redis error when deleting {len(cache_keys)} keys: {e}")
+        return deleted
+
+    async def _unlink_batch(self, keys: Sequence[Any]) -> int:
+        """流水线删除一批键（UNLINK 在后台释放内存）"""
+        if not keys:
             return 0
+        if self.l1 is not None:
+            for key in keys:
+                self.l1.delete(key.decode() if isinstance(key, bytes) else key)
+        async with self.redis_client.pipeline(transaction=False) as pipe:
+            for key in keys:
+                pipe.unlink(key)
+            return sum(int(result or 0) for result in await pipe.execute())
+
+    async def _unlink_streamed(self, keys: AsyncIterator[Any]) -> int:
+        """边遍历边分批删除，内存占用与键总数无关"""
+        deleted = 0
+        batch: List[Any] = []
+        async for key in keys:
+            batch.append(key)
+            if len(batch) >= INVALIDATION_BATCH_SIZE:
+                deleted += await self._unlink_batch(batch)
+                batch = []
+        return deleted + await self._unlink_batch(batch)
+
+    async def invalidate_tags(self, *tags: str) -> int:
+        """
+        按标签失效缓存
+
+        用 ZSCAN 增量遍历标签有序集合，分批流水线删除成员键，最后删除集合本身；
+        标签登记在 Redis 中，对所有 worker 写入的缓存都有效。
+
+        Args:
+            *tags: 标签，如 "table:users"、"user:123"
+
+        Returns:
+            删除的缓存键数量
+        """
+        deleted = 0
+        try:
+            for tag in tags:
+                tag_key = self._make_tag_key(tag)
+                members = self.redis_client.zscan_iter(
+                    tag_key, count=INVALIDATION_BATCH_SIZE
+                )
+                deleted += await self._unlink_streamed(
+                    member async for member, _ in members
+                )
+                await self.redis_client.unlink(tag_key)
+            if deleted:
+                logger.info(f"Invalidated {deleted} keys by tags: {list(tags)}")
+            return deleted
 
         except RedisError as e:
-            logger.error(f"Redis error when clearing namespace {namespace}: {e}")
+            logger.error(f"Redis error when invalidating tags {tags}: {e}")
+            return deleted
+
+    async def scan_delete(self, pattern: str) -> int:
+        """
+        按通配模式删除键（SCAN 增量遍历，不阻塞 Redis）
+
+        用于清理未登记标签的旧缓存键。
+
+        Args:
+            pattern: 完整键的通配模式
+
+        Returns:
+            删除的键数量
+        """
+        try:
+            return await self._unlink_streamed(
+                self.redis_client.scan_iter(
+                    match=pattern, count=INVALIDATION_BATCH_SIZE
+                )
+            )
+        except RedisError as e:
+            logger.error(f"Redis error when scanning pattern {pattern}: {e}")
             return 0
 
+    async def clear_namespace(self, namespace: str, scan_legacy: bool = False) -> int:
+        """
+        清空指定命名空间的所有缓存
+
+        按命名空间标签删除。SCAN 会遍历整个键空间，只在显式传入
+        scan_legacy=True 时作为兜底，清理标签机制上线前写入的旧键。
+
+        Args:
+            namespace: 命名空间
+            scan_legacy: 是否 SCAN 兜底清理未登记标签的键（默认不扫描）
+
+        Returns:
+            删除的键数量
+        """
+        if self.l1 is not None:
+            self.l1.delete_prefix(self._make_key("", namespace))
+        deleted = await self.invalidate_tags(self.namespace_tag(namespace))
+        if scan_legacy:
+            deleted += await self.scan_delete(self._make_key("*", namespace))
+
+        if deleted:
+            logger.info(f"Cleared {deleted} keys from namespace: {namespace}")
+        return deleted
+
+    def _should_refresh_early(self, entry: Dict[str, Any]) -> bool:
+        """
+        概率提前刷新（XFetch）
+
+        越接近过期、重新计算越慢，越可能由某个请求提前重算，
+        避免热点键同时过期时大量请求一起回源。
+        """
+        if self.early_refresh_beta <= 0:
+            return False
+        delta = entry.get("delta", 0.0)
+        jitter = -delta * self.early_refresh_beta * math.log(1.0 - random.random())
+        return time.time() + jitter >= entry.get("expires_at", 0.0)
+
+    async def get_or_set(
+        self,
+        key: str,
+        loader: Callable[[], Awaitable[Any]],
+        ttl: Optional[int] = None,
+        namespace: str = "",
+        tags: Optional[Sequence[str]] = None,
+        use_l1: bool = False,
+    ) -> Any:
+        """
+        读取缓存，未命中时调用 loader 计算并写回
+
+        - 同一进程内同一键的并发未命中只执行一次 loader（single-flight）
+        - 接近过期时按概率提前重算（XFetch），重算期间本进程和其他进程的
+          请求都继续使用旧值
+        - loader 返回 None 时不写缓存
+
+        Args:
+            key: 缓存键
+            loader: 无参异步函数，返回要缓存的值
+            ttl: 过期时间（秒）
+            namespace: 命名空间
+            tags: 失效标签
+            use_l1: 是否使用进程内一级缓存
+
+        Returns:
+            缓存值或 loader 的结果
+        """
+        cache_key = self._make_key(key, namespace)
+
+        if use_l1 and self.l1 is not None:
+            value = self.l1.get(cache_key)
+            if value is not _MISSING:
+                self._tier_stats["l1_hits"] += 1
+                return value
+            self._tier_stats["l1_misses"] += 1
+
+        inflight = self._inflight.get(cache_key)
+        if inflight is not None:
+            return await self._join_inflight(cache_key, inflight, loader)
+
+        stale: Any = _MISSING
+        try:
+            data = await self.redis_client.get(cache_key)
+        except RedisError as e:
+            logger.error(f"Redis error when getting key {key}: {e}")
+            data = None
+
+        if data is not None:
+            try:
+                entry = self._deserialize_value(data)
+            except Exception as e:
+                logger.error(f"Error deserializing cached value for key {key}: {e}")
+                entry = None
+
+            if isinstance(entry, dict) and entry.get(_ENVELOPE_MARKER):
+                if not self._should_refresh_early(entry):
+                    self._tier_stats["l2_hits"] += 1
+                    if use_l1 and self.l1 is not None:
+                        self.l1.set(cache_key, entry["value"])
+                    return entry["value"]
+                self._tier_stats["early_refreshes"] += 1
+                stale = entry["value"]
+            elif entry is not None:
+                # 旧格式值没有提前刷新所需信息，直接使用
+                self._tier_stats["l2_hits"] += 1
+                return entry
+        else:
+            self._tier_stats["l2_misses"] += 1
+
+        # 再次检查：等待 Redis 期间可能已有其他协程开始计算
+        inflight = self._inflight.get(cache_key)
+        if inflight is not None:
+            return await self._join_inflight(cache_key, inflight, loader)
+
+        future: "asyncio.Future[Any]" = asyncio.get_running_loop().create_future()
+        self._inflight[cache_key] = future
+        if stale is not _MISSING:
+            self._refreshing[cache_key] = stale
+        try:
+            started = time.time()
+            value = await loader()
+            delta = time.time() - started
+
+            if value is not None:
+                expire_time = ttl or self.default_ttl
+                await self.set(
+                    key,
+                    {
+                        _ENVELOPE_MARKER: 1,
+                        "value": value,
+                        "delta": delta,
+                        "expires_at": time.time() + expire_time,
+                    },
+                    expire_time,
+                    namespace,
+                    tags=tags,
+                )
+                if use_l1 and self.l1 is not None:
+                    self.l1.set(cache_key, value, expire_time)
+
+            future.set_result(value)
+            return value
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # 标记异常已被读取，避免无等待方时产生告警
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(cache_key, None)
+            self._refreshing.pop(cache_key, None)
+
+    async def _join_inflight(
+        self,
+        cache_key: str,
+        future: "asyncio.Future[Any]",
+        loader: Callable[[], Awaitable[Any]],
+    ) -> Any:
+        """同键已在计算：提前重算时直接返回旧值，否则等待计算结果"""
+        if cache_key in self._refreshing:
+            self._tier_stats["stale_served"] += 1
+            return self._refreshing[cache_key]
+        return await self._await_inflight(future, loader)
+
+    async def _await_inflight(
+        self, future: "asyncio.Future[Any]", loader: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        """等待同键正在进行的计算；计算方被取消时自行回源"""
+        self._tier_stats["coalesced"] += 1
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            if future.cancelled():
+                return await loader()
+            raise
+
+    def get_tier_stats(self) -> Dict[str, Any]:
+        """获取各级缓存命中统计"""
+        stats: Dict[str, Any] = dict(self._tier_stats)
+        for tier in ("l1", "l2"):
+            lookups = stats[f"{tier}_hits"] + stats[f"{tier}_misses"]
+            stats[f"{tier}_hit_rate"] = (
+                round(stats[f"{tier}_hits"] / lookups, 4) if lookups else 0.0
+            )
+        stats["l1_enabled"] = self.l1 is not None
+        stats["l1_size"] = len(self.l1) if self.l1 is not None else 0
+        return stats
+
     async def get_stats(self) -> Dict[str, Any]:
         """
         获取缓存统计信息
 
         Returns:
-            统计信息字典
+            统计信息字典（含 Redis 服务端统计和本进程各级缓存命中率）
         """
+        stats: Dict[str, Any] = {"tiers": self.get_tier_stats()}
         try:
             info = await self.redis_client.info()
-            return {
-                "connected_clients": info.get("connected_clients", 0),
-                "used_memory": info.get("used_memory_human", "0B"),
-                "keyspace_hits": info.get("keyspace_hits", 0),
-                "keyspace_misses": info.get("keyspace_misses", 0),
-                "expired_keys": info.get("expired_keys", 0),
-            }
+            stats.update(
+                {
+                    "connected_clients": info.get("connected_clients", 0),
+                    "used_memory": info.get("used_memory_human", "0B"),
+                    "keyspace_hits": info.get("keyspace_hits", 0),
+                    "keyspace_misses": info.get("keyspace_misses", 0),
+                    "expired_keys": info.get("expired_keys", 0),
+                }
+            )
         except RedisError as e:
             logger.error(f"Redis error when getting stats: {e}")
-            return {}
+        return stats
 
     async def close(self):
         """关闭Redis连接"""
@@ -320,15 +928,24 @@ def cache(
     namespace: str = "default",
     key_generator: Optional[Callable] = None,
     cache_manager: Optional[RedisCache] = None,
+    tags: Optional[Union[Sequence[str], Callable[..., Sequence[str]]]] = None,
+    l1: bool = False,
 ):
     """
     缓存装饰器
 
+    同键并发未命中只回源一次，接近过期时概率提前刷新；
+    装饰实例方法时 self 不参与缓存键。
+
     Args:
         ttl: 缓存时间（秒）
         namespace: 命名空间
         key_generator: 自定义键生成函数
         cache_manager: 缓存管理器实例
+        tags: 失效标签（如 "table:users"），配合 invalidate_tags 使用；
+            也可以是接收与被装饰函数相同参数（不含 self）、返回标签列表的函数，
+            用于按参数打标签（如 "learning_analytics:<user_id>"）
+        l1: 是否启用进程内一级缓存（可容忍 CACHE_L1_TTL 秒跨进程不一致时开启）
 
     Returns:
         装饰器函数
@@ -338,27 +955,25 @@ def cache(
         _cache_manager = cache_manager or _get_default_cache_manager()
         _key_generator = key_generator or cache_key_generator
 
+        parameters = list(inspect.signature(func).parameters)
+        skip_self = bool(parameters) and parameters[0] in ("self", "cls")
+
         @wraps(func)
         async def async_wrapper(*args, **kwargs):
             # 生成缓存键
-            cache_key = f"{func.__name__}:{_key_generator(*args, **kwargs)}"
-
-            # 尝试从缓存获取
-            cached_result = await _cache_manager.get(cache_key, namespace)
-            if cached_result is not None:
-                logger.debug(f"Cache hit for function: {func.__name__}")
-                return cached_result
-
-            # 执行函数
-            logger.debug(f"Cache miss for function: {func.__name__}")
-            if asyncio.iscoroutinefunction(func):
-                result = await func(*args, **kwargs)
-            else:
-                result = func(*args, **kwargs)
-
-            # 存储到缓存
-            await _cache_manager.set(cache_key, result, ttl, namespace)
-            return result
+            key_args = args[1:] if skip_self else args
+            cache_key = f"{func.__name__}:{_key_generator(*key_args, **kwargs)}"
+            call_tags = tags(*key_args, **kwargs) if callable(tags) else tags
+
+            async def _load():
+                logger.debug(f"Cache miss for function: {func.__name__}")
+                if asyncio.iscoroutinefunction(func):
+                    return await func(*args, **kwargs)
+                return func(*args, **kwargs)
+
+            return await _cache_manager.get_or_set(
+                cache_key, _load, ttl, namespace, tags=call_tags, use_l1=l1
+            )
 
         @wraps(func)
         def sync_wrapper(*args, **kwargs):
@@ -448,18 +1063,25 @@ cache_manager = get_cache_manager()
 # ============================================================================
 
 
-def cache_result(ttl: int = 3600, namespace: str = "default"):
+def cache_result(
+    ttl: int = 3600,
+    namespace: str = "default",
+    l1: bool = False,
+    tags: Optional[Union[Sequence[str], Callable[..., Sequence[str]]]] = None,
+):
     """
     缓存结果装饰器（cache函数的别名）
 
     Args:
         ttl: 缓存时间（秒）
         namespace: 命名空间
+        l1: 是否启用进程内一级缓存
+        tags: 失效标签或按参数生成标签的函数，见 cache
 
     Returns:
         装饰器函数
     """
-    return cache(ttl=ttl, namespace=namespace)
+    return cache(ttl=ttl, namespace=namespace, l1=l1, tags=tags)
 
 
 def cache_key(*args, **kwargs) -> str:
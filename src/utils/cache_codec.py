@@ -0,0 +1,246 @@
+"""
+缓存值编解码
+
+写入 Redis 的值使用带版本号的自描述格式：
+
+    [魔数 0xC7][格式版本][类型字节][负载]
+
+类型字节低 4 位为编码方式，高 4 位为压缩算法，解码时按类型字节查表，
+不再像旧格式那样先尝试 JSON、失败后再回退 pickle。
+
+- 字符串直接存 UTF-8，bytes 原样存储
+- 数字、布尔、None 使用 JSON
+- dict/list 等复杂对象使用最高协议的 pickle（保留 tuple、非字符串键、
+  datetime 等类型，与旧格式语义一致）
+- 超过阈值的负载压缩存储，优先 zstd，其次 lz4，均未安装时使用 zlib
+
+旧格式（纯 JSON 或 pickle）的值仍可读取，滚动发布期间不需要清空缓存。
+"""
+
+import json
+import pickle
+import zlib
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from src.core.config import settings
+from src.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+try:
+    import zstandard  # type: ignore[import-not-found]
+except ImportError:  # pragma: no cover - 可选依赖
+    zstandard = None
+
+try:
+    import lz4.frame as lz4_frame  # type: ignore[import-not-found]
+except ImportError:  # pragma: no cover - 可选依赖
+    lz4_frame = None
+
+
+MAGIC = 0xC7  # 不是合法 JSON 的首字节，也不同于 pickle 的 0x80
+FORMAT_VERSION = 1
+
+# 编码方式（类型字节低 4 位）
+CODEC_BYTES = 0
+CODEC_STR = 1
+CODEC_JSON = 2
+CODEC_PICKLE = 3
+
+# 压缩算法（类型字节高 4 位）
+COMPRESSION_NONE = 0
+COMPRESSION_ZLIB = 1
+COMPRESSION_ZSTD = 2
+COMPRESSION_LZ4 = 3
+
+COMPRESSION_NAMES = {
+    "none": COMPRESSION_NONE,
+    "zlib": COMPRESSION_ZLIB,
+    "zstd": COMPRESSION_ZSTD,
+    "lz4": COMPRESSION_LZ4,
+}
+
+_HEADER_SIZE = 3
+_PICKLE_PROTOCOL = pickle.HIGHEST_PROTOCOL
+
+
+def _zstd_compress(data: bytes) -> bytes:
+    return zstandard.ZstdCompressor(level=3).compress(data)
+
+
+def _zstd_decompress(data: bytes) -> bytes:
+    return zstandard.ZstdDecompressor().decompress(data)
+
+
+_COMPRESSORS: Dict[int, Callable[[bytes], bytes]] = {
+    COMPRESSION_ZLIB: lambda data: zlib.compress(data, 1),
+}
+_DECOMPRESSORS: Dict[int, Callable[[bytes], bytes]] = {
+    COMPRESSION_NONE: lambda data: data,
+    COMPRESSION_ZLIB: zlib.decompress,
+}
+if zstandard is not None:
+    _COMPRESSORS[COMPRESSION_ZSTD] = _zstd_compress
+    _DECOMPRESSORS[COMPRESSION_ZSTD] = _zstd_decompress
+if lz4_frame is not None:
+    _COMPRESSORS[COMPRESSION_LZ4] = lz4_frame.compress
+    _DECOMPRESSORS[COMPRESSION_LZ4] = lz4_frame.decompress
+
+_DECODERS: Dict[int, Callable[[bytes], Any]] = {
+    CODEC_BYTES: bytes,
+    CODEC_STR: lambda data: data.decode("utf-8"),
+    CODEC_JSON: json.loads,
+    CODEC_PICKLE: pickle.loads,
+}
+
+
+def available_compression() -> int:
+    """当前环境可用的最佳压缩算法：zstd > lz4 > zlib"""
+    if COMPRESSION_ZSTD in _COMPRESSORS:
+        return COMPRESSION_ZSTD
+    if COMPRESSION_LZ4 in _COMPRESSORS:
+        return COMPRESSION_LZ4
+    return COMPRESSION_ZLIB
+
+
+def resolve_compression(name: str) -> int:
+    """
+    解析配置中的压缩算法名
+
+    Args:
+        name: auto / zstd / lz4 / zlib / none
+
+    Returns:
+        压缩算法编号；指定的算法未安装时退回可用的最佳算法
+    """
+    name = (name or "auto").lower()
+    if name == "auto":
+        return available_compression()
+    algorithm = COMPRESSION_NAMES.get(name)
+    if algorithm is None:
+        raise ValueError(f"未知的缓存压缩算法: {name}")
+    if algorithm != COMPRESSION_NONE and algorithm not in _COMPRESSORS:
+        fallback = available_compression()
+        logger.warning(f"缓存压缩算法 {name} 未安装，改用编号 {fallback}")
+        return fallback
+    return algorithm
+
+
+class CacheCodec:
+    """缓存值编解码器"""
+
+    def __init__(
+        self,
+        compress_threshold: int = 4096,
+        compression: str = "auto",
+    ):
+        """
+        Args:
+            compress_threshold: 负载超过该字节数时压缩，0 表示不压缩
+            compression: 压缩算法，auto / zstd / lz4 / zlib / none
+        """
+        self.compress_threshold = compress_threshold
+        self.compression = resolve_compression(compression)
+
+    @staticmethod
+    def _encode_payload(value: Any) -> Tuple[int, bytes]:
+        """按值类型选择编码方式"""
+        value_type = type(value)
+        if value_type is str:
+            return CODEC_STR, value.encode("utf-8")
+        if value_type in (bytes, bytearray, memoryview):
+            return CODEC_BYTES, bytes(value)
+        if value is None or value_type in (int, float, bool):
+            return CODEC_JSON, json.dumps(value).encode("utf-8")
+        return CODEC_PICKLE, pickle.dumps(value, protocol=_PICKLE_PROTOCOL)
+
+    def encode(self, value: Any) -> bytes:
+        """
+        编码缓存值
+
+        Args:
+            value: 要缓存的值
+
+        Returns:
+            带头部的字节串
+        """
+        codec, payload = self._encode_payload(value)
+        compression = COMPRESSION_NONE
+        if (
+            self.compress_threshold
+            and self.compression != COMPRESSION_NONE
+            and len(payload) > self.compress_threshold
+        ):
+            compressed = _COMPRESSORS[self.compression](payload)
+            # 压缩收益不明显（如已压缩的图片数据）时保留原文，省去解压开销
+            if len(compressed) < len(payload) * 0.9:
+                payload = compressed
+                compression = self.compression
+
+        header = bytes((MAGIC, FORMAT_VERSION, compression << 4 | codec))
+        return header + payload
+
+    def decode(self, data: bytes) -> Any:
+        """
+        解码缓存值，兼容旧格式
+
+        Args:
+            data: Redis 中读出的字节串
+
+        Returns:
+            原始值
+
+        Raises:
+            ValueError: 格式版本或类型字节无法识别
+        """
+        if not data or data[0] != MAGIC:
+            return decode_legacy(data)
+        if len(data) < _HEADER_SIZE or data[1] != FORMAT_VERSION:
+            raise ValueError(f"不支持的缓存格式版本: {data[1:2]!r}")
+
+        tag = data[2]
+        decompress = _DECOMPRESSORS.get(tag >> 4)
+        decoder = _DECODERS.get(tag & 0x0F)
+        if decompress is None or decoder is None:
+            raise ValueError(f"无法识别的缓存类型字节: {tag:#04x}")
+        return decoder(decompress(data[_HEADER_SIZE:]))
+
+
+def decode_legacy(data: bytes) -> Any:
+    """
+    解码旧格式缓存值（primitives 为 JSON，其余为 pickle）
+
+    Args:
+        data: 旧格式字节串
+
+    Returns:
+        原始值
+    """
+    if data[:1] == b"\x80":
+        return pickle.loads(data)
+    try:
+        return json.loads(data.decode("utf-8"))
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        # 协议 0/1 的 pickle 没有 0x80 前缀
+        return pickle.loads(data)
+
+
+def encode_legacy(value: Any) -> bytes:
+    """旧格式编码，仅用于基准对比和兼容性测试"""
+    if isinstance(value, (str, int, float, bool)):
+        return json.dumps(value).encode("utf-8")
+    return pickle.dumps(value)
+
+
+_default_codec: Optional[CacheCodec] = None
+
+
+def get_cache_codec() -> CacheCodec:
+    """获取按配置创建的全局编解码器"""
+    global _default_codec
+    if _default_codec is None:
+        _default_codec = CacheCodec(
+            compress_threshold=settings.CACHE_COMPRESS_THRESHOLD,
+            compression=settings.CACHE_COMPRESSION,
+        )
+    return _default_codec
@@ -4,6 +4,7 @@
 """
 
 import hashlib
+import os
 import uuid
 from datetime import datetime
 from pathlib import Path
@@ -17,6 +18,8 @@ from PIL import Image
 from src.core.config import settings
 from src.core.exceptions import AIServiceError
 from src.core.logging import get_logger
+from src.services.stored_object_service import get_stored_object_service
+from src.utils.oss_executor import MultipartStreamUpload, oss_executor, put_object
 
 logger = get_logger(__name__)
 
@@ -51,6 +54,12 @@ class UploadConfig:
         FileType.OTHER: 10 * 1024 * 1024,  # 10MB
     }
 
+    # 流式上传每次读取的块大小
+    STREAM_CHUNK_SIZE = 64 * 1024
+
+    # 解析图片尺寸最多缓冲的文件头（JPEG 的 SOF 可能排在 EXIF 之后）
+    IMAGE_HEADER_MAX_BYTES = 256 * 1024
+
     # MIME类型映射
     MIME_TYPES = {
         ".jpg": "image/jpeg",
@@ -111,6 +120,49 @@ class FileInfo:
         }
 
 
+class LocalStreamUpload:
+    """
+    流式写入本地文件
+
+    先写入同目录下的临时文件，完成后再改名，失败时删除临时文件，
+    不会留下写了一半的文件。
+    """
+
+    def __init__(self, file_path: Path):
+        """
+        Args:
+            file_path: 最终文件路径
+        """
+        self.file_path = file_path
+        self.temp_path = file_path.with_name(f"{file_path.name}.part")
+        self._file: Optional[Any] = None
+
+    async def _open(self) -> Any:
+        if self._file is None:
+            self.file_path.parent.mkdir(parents=True, exist_ok=True)
+            self._file = await aiofiles.open(self.temp_path, "wb")
+        return self._file
+
+    async def write(self, data: bytes) -> None:
+        """追加写入数据"""
+        file = await self._open()
+        await file.write(data)
+
+    async def complete(self) -> None:
+        """关闭临时文件并改名为最终文件"""
+        file = await self._open()
+        await file.close()
+        self._file = None
+        os.replace(self.temp_path, self.file_path)
+
+    async def abort(self) -> None:
+        """关闭并删除临时文件"""
+        if self._file is not None:
+            await self._file.close()
+            self._file = None
+        self.temp_path.unlink(missing_ok=True)
+
+
 class AliCloudOSSStorage:
     """阿里云OSS存储服务"""
 
@@ -185,15 +237,16 @@ class AliCloudOSSStorage:
             if content_type:
                 headers["Content-Type"] = content_type
 
-            # 上传文件
+            # 上传文件（在 OSS 专用线程池中执行，不阻塞事件循环）
             if self.bucket is not None:
-                result = self.bucket.put_object(object_name, file_data, headers=headers)
+                result = await oss_executor.run(
+                    put_object, self.bucket, object_name, file_data, headers
+                )
             else:
                 raise AIServiceError("OSS客户端未初始化")
 
             if result.status == 200:
-                # 生成文件URL
-                file_url = f"https://{self.bucket_name}.{self.endpoint}/{object_name}"
+                file_url = self.get_file_url(object_name)
                 logger.info(f"文件上传到OSS成功: {object_name}")
                 return file_url
             else:
@@ -203,6 +256,31 @@ class AliCloudOSSStorage:
             logger.error(f"OSS文件上传失败: {e}")
             raise AIServiceError(f"文件上传失败: {e}")
 
+    def get_file_url(self, object_name: str) -> str:
+        """生成文件URL"""
+        return f"https://{self.bucket_name}.{self.endpoint}/{object_name}"
+
+    def create_stream_upload(
+        self, object_name: str, content_type: Optional[str] = None
+    ) -> MultipartStreamUpload:
+        """
+        创建流式分片上传
+
+        Args:
+            object_name: 对象名称
+            content_type: 内容类型
+
+        Returns:
+            流式上传对象，依次调用 write / complete，失败时调用 abort
+        """
+        if self.bucket is None:
+            raise AIServiceError("OSS服务不可用")
+
+        headers = {"Content-Type": content_type} if content_type else None
+        return MultipartStreamUpload(
+            self.bucket, object_name, headers=headers, executor=oss_executor
+        )
+
     async def delete_file(self, object_name: str) -> bool:
         """
         从OSS删除文件
@@ -218,7 +296,7 @@ class AliCloudOSSStorage:
                 return False
 
             if self.bucket is not None:
-                result = self.bucket.delete_object(object_name)
+                result = await oss_executor.run(self.bucket.delete_object, object_name)
                 logger.info(f"从OSS删除文件: {object_name}")
                 return result.status == 204
             else:
@@ -245,6 +323,7 @@ class FileUploadService:
 
         self.use_oss = use_oss
         self.oss_storage = AliCloudOSSStorage() if use_oss else None
+        self.object_store = get_stored_object_service()
 
         if use_oss and self.oss_storage and not self.oss_storage.is_available():
             logger.warning("OSS不可用，将使用本地存储")
@@ -294,15 +373,21 @@ class FileUploadService:
                 return False, f"不支持的文件类型: {ext}"
 
         # 检查文件大小
-        max_size = UploadConfig.MAX_FILE_SIZES.get(
-            file_type, UploadConfig.MAX_FILE_SIZES[FileType.OTHER]
-        )
+        max_size = self._get_max_file_size(file_type)
         if file_size > max_size:
-            max_size_mb = max_size / 1024 / 1024
-            return False, f"文件大小超出限制: {max_size_mb}MB"
+            return False, self._size_limit_message(max_size)
 
         return True, ""
 
+    def _get_max_file_size(self, file_type: str) -> int:
+        """获取文件类型的大小上限"""
+        return UploadConfig.MAX_FILE_SIZES.get(
+            file_type, UploadConfig.MAX_FILE_SIZES[FileType.OTHER]
+        )
+
+    def _size_limit_message(self, max_size: int) -> str:
+        return f"文件大小超出限制: {max_size / 1024 / 1024}MB"
+
     def _calculate_file_hash(self, file_data: bytes) -> str:
         """
         计算文件哈希
@@ -319,8 +404,10 @@ class FileUploadService:
         """
         获取图片信息
 
+        Image.open 只解析文件头，不解码像素，传入文件开头的一部分即可。
+
         Args:
-            file_data: 图片数据
+            file_data: 图片数据（或文件头）
 
         Returns:
             (宽度, 高度)
@@ -370,105 +457,135 @@ class FileUploadService:
         """
         保存上传文件
 
+        按块流式读取，单个上传的内存占用不随文件大小增长：
+        先扫描一遍计算哈希、检查大小、解析图片尺寸，同一子文件夹下已有
+        相同内容的文件时直接复用（引用计数加一），否则再流式写入存储。
+
         Args:
             upload_file: FastAPI上传文件对象
-            subfolder: 子文件夹
+            subfolder: 子文件夹（同时作为去重的命名空间）
 
         Returns:
             文件信息
         """
         try:
-            # 读取文件数据
-            file_data = await upload_file.read()
-
             # 检查文件名
             if not upload_file.filename:
                 raise AIServiceError("文件名不能为空")
 
-            # 验证文件
+            # 验证文件（客户端声明了大小时提前拒绝，读取过程中还会再检查）
             is_valid, error_msg = self._validate_file(
-                upload_file.filename, len(file_data)
+                upload_file.filename, upload_file.size or 0
             )
             if not is_valid:
                 raise AIServiceError(error_msg)
 
-            # 生成唯一文件名
-            unique_filename = self._generate_unique_filename(upload_file.filename)
             file_type = self._get_file_type(upload_file.filename)
 
-            # 生成存储路径
-            storage_path = (
-                f"{subfolder}/{self._get_storage_path(unique_filename, file_type)}"
-            )
-
-            # 计算文件哈希
-            file_hash = self._calculate_file_hash(file_data)
-
             # 获取MIME类型
-            file_suffix = (
-                Path(upload_file.filename).suffix.lower()
-                if upload_file.filename
-                else ""
-            )
+            file_suffix = Path(upload_file.filename).suffix.lower()
             mime_type = upload_file.content_type or UploadConfig.MIME_TYPES.get(
                 file_suffix, "application/octet-stream"
             )
 
-            # 获取图片尺寸（如果是图片）
-            width, height = None, None
-            if file_type == FileType.IMAGE:
-                width, height = self._get_image_info(file_data)
+            use_oss = bool(
+                self.use_oss and self.oss_storage and self.oss_storage.is_available()
+            )
+            storage_type = "oss" if use_oss else "local"
 
-            # 选择存储方式
-            if self.use_oss and self.oss_storage and self.oss_storage.is_available():
-                # 上传到OSS
-                file_url = await self.oss_storage.upload_file(
-                    file_data, storage_path, mime_type
+            # 第一遍：只读不写，超出大小限制时不会产生任何存储写入
+            file_size, file_hash, content_hash, width, height = await self._scan_upload(
+                upload_file,
+                max_size=self._get_max_file_size(file_type),
+                sniff_image=file_type == FileType.IMAGE,
+            )
+            metadata = {
+                "original_filename": upload_file.filename,
+                "file_type": file_type,
+                "content_hash": content_hash,
+                "namespace": subfolder,
+            }
+
+            # ♻️ 相同内容已上传过：直接复用，不再上传
+            stored = await self._acquire_stored_object(
+                subfolder, content_hash, storage_type
+            )
+            if stored:
+                logger.info(
+                    f"文件内容重复，复用已有文件: {upload_file.filename} -> "
+                    f"{stored['object_key']}"
                 )
-
-                file_info = FileInfo(
+                return FileInfo(
                     filename=upload_file.filename,
-                    file_path=storage_path,
-                    file_url=file_url,
-                    file_size=len(file_data),
-                    mime_type=mime_type,
+                    file_path=stored["object_key"],
+                    file_url=stored["file_url"],
+                    file_size=file_size,
+                    mime_type=stored["mime_type"] or mime_type,
                     file_hash=file_hash,
-                    storage_type="oss",
-                    width=width,
-                    height=height,
+                    storage_type=storage_type,
+                    width=stored["width"],
+                    height=stored["height"],
                     metadata={
-                        "original_filename": upload_file.filename,
-                        "unique_filename": unique_filename,
-                        "file_type": file_type,
+                        **metadata,
+                        "unique_filename": Path(stored["object_key"]).name,
+                        "deduplicated": True,
                     },
                 )
 
+            # 生成唯一文件名和存储路径
+            unique_filename = self._generate_unique_filename(upload_file.filename)
+            storage_path = (
+                f"{subfolder}/{self._get_storage_path(unique_filename, file_type)}"
+            )
+
+            if use_oss and self.oss_storage:
+                sink: Any = self.oss_storage.create_stream_upload(
+                    storage_path, mime_type
+                )
+                file_path = storage_path
+                file_url = self.oss_storage.get_file_url(storage_path)
             else:
-                # 保存到本地
                 local_file_path = self.base_upload_dir / storage_path
-                local_file_path.parent.mkdir(parents=True, exist_ok=True)
-
-                async with aiofiles.open(local_file_path, "wb") as f:
-                    await f.write(file_data)
+                sink = LocalStreamUpload(local_file_path)
+                file_path = str(local_file_path)
+                file_url = f"/uploads/{storage_path}"  # 相对URL
 
-                file_info = FileInfo(
-                    filename=upload_file.filename or "unknown",
-                    file_path=str(local_file_path),
-                    file_url=f"/uploads/{storage_path}",  # 相对URL
-                    file_size=len(file_data),
-                    mime_type=mime_type,
-                    file_hash=file_hash,
-                    storage_type="local",
-                    width=width,
-                    height=height,
-                    metadata={
-                        "original_filename": upload_file.filename,
-                        "unique_filename": unique_filename,
-                        "file_type": file_type,
-                    },
-                )
+            # 第二遍：流式写入存储
+            await upload_file.seek(0)
+            await self._write_upload(upload_file, sink)
+
+            registered = await self.object_store.register(
+                subfolder,
+                content_hash,
+                storage_type,
+                object_key=file_path,
+                file_url=file_url,
+                file_size=file_size,
+                mime_type=mime_type,
+                width=width,
+                height=height,
+            )
+            if registered and registered["object_key"] != file_path:
+                # 并发上传了相同内容，保留先登记的文件，删除刚写入的这份
+                await self._delete_object(storage_type, file_path)
+                file_path = registered["object_key"]
+                file_url = registered["file_url"]
+                unique_filename = Path(file_path).name
+
+            file_info = FileInfo(
+                filename=upload_file.filename,
+                file_path=file_path,
+                file_url=file_url,
+                file_size=file_size,
+                mime_type=mime_type,
+                file_hash=file_hash,
+                storage_type=storage_type,
+                width=width,
+                height=height,
+                metadata={**metadata, "unique_filename": unique_filename},
+            )
 
-            logger.info(f"文件上传成功: {upload_file.filename} -> {storage_path}")
+            logger.info(f"文件上传成功: {upload_file.filename} -> {file_path}")
             return file_info
 
         except Exception as e:
@@ -478,6 +595,85 @@ class FileUploadService:
             # 确保文件句柄被关闭
             await upload_file.seek(0)
 
+    async def _scan_upload(
+        self,
+        upload_file: UploadFile,
+        max_size: int,
+        sniff_image: bool = False,
+    ) -> Tuple[int, str, str, Optional[int], Optional[int]]:
+        """
+        流式扫描上传文件
+
+        Args:
+            upload_file: FastAPI上传文件对象
+            max_size: 文件大小上限，超出时立即停止读取
+            sniff_image: 是否从文件头解析图片尺寸
+
+        Returns:
+            (文件大小, MD5, SHA-256, 宽度, 高度)
+        """
+        md5 = hashlib.md5()
+        sha256 = hashlib.sha256()
+        file_size = 0
+        header = bytearray()
+        width, height = None, None
+
+        while chunk := await upload_file.read(UploadConfig.STREAM_CHUNK_SIZE):
+            file_size += len(chunk)
+            if file_size > max_size:
+                raise AIServiceError(self._size_limit_message(max_size))
+
+            md5.update(chunk)
+            sha256.update(chunk)
+
+            # 🖼️ 累积文件头直到解析出尺寸，最多 IMAGE_HEADER_MAX_BYTES
+            if sniff_image:
+                header += chunk[: UploadConfig.IMAGE_HEADER_MAX_BYTES - len(header)]
+                width, height = self._get_image_info(bytes(header))
+                if (
+                    width is not None
+                    or len(header) >= UploadConfig.IMAGE_HEADER_MAX_BYTES
+                ):
+                    sniff_image = False
+                    header = bytearray()
+
+        return file_size, md5.hexdigest(), sha256.hexdigest(), width, height
+
+    async def _write_upload(self, upload_file: UploadFile, sink: Any) -> None:
+        """
+        流式写入存储
+
+        Args:
+            upload_file: FastAPI上传文件对象（已定位到开头）
+            sink: LocalStreamUpload 或 MultipartStreamUpload，失败时清理已写入的数据
+        """
+        try:
+            while chunk := await upload_file.read(UploadConfig.STREAM_CHUNK_SIZE):
+                await sink.write(chunk)
+
+            result = await sink.complete()
+            if result is not None and result.status != 200:
+                raise AIServiceError(f"OSS上传失败: {result.status}")
+
+        except BaseException:
+            await sink.abort()
+            raise
+
+    async def _acquire_stored_object(
+        self, namespace: str, content_hash: str, storage_type: str
+    ) -> Optional[Dict[str, Any]]:
+        """查找可复用的已上传文件，本地文件已不存在时作废记录"""
+        stored = await self.object_store.acquire(namespace, content_hash, storage_type)
+        if (
+            stored
+            and storage_type == "local"
+            and not Path(stored["object_key"]).exists()
+        ):
+            logger.warning(f"已登记的本地文件不存在，重新上传: {stored['object_key']}")
+            await self.object_store.forget(namespace, [stored["object_key"]])
+            return None
+        return stored
+
     async def save_multiple_files(
         self, upload_files: List[UploadFile], subfolder: str = "general"
     ) -> List[FileInfo]:
@@ -508,6 +704,8 @@ class FileUploadService:
         """
         删除文件
 
+        去重复用的文件只递减引用计数，最后一个引用删除时才删除实际文件。
+
         Args:
             file_info: 文件信息
 
@@ -515,24 +713,50 @@ class FileUploadService:
             是否删除成功
         """
         try:
-            if file_info.storage_type == "oss":
-                # 从OSS删除
-                if self.oss_storage:
-                    return await self.oss_storage.delete_file(file_info.file_path)
-            else:
-                # 从本地删除
-                local_path = Path(file_info.file_path)
-                if local_path.exists():
-                    local_path.unlink()
-                    logger.info(f"本地文件删除成功: {file_info.file_path}")
+            namespace = file_info.metadata.get("namespace")
+            if namespace:
+                remaining = await self.object_store.release(
+                    namespace, file_info.file_path
+                )
+                if remaining:
+                    logger.info(
+                        f"文件仍被引用，保留: {file_info.file_path}, refs={remaining}"
+                    )
                     return True
 
-            return False
+            return await self._delete_object(
+                file_info.storage_type, file_info.file_path
+            )
 
         except Exception as e:
             logger.error(f"文件删除失败: {e}")
             return False
 
+    async def _delete_object(self, storage_type: str, file_path: str) -> bool:
+        """
+        删除实际存储的文件
+
+        Args:
+            storage_type: 存储类型
+            file_path: OSS对象名或本地路径
+
+        Returns:
+            是否删除成功
+        """
+        if storage_type == "oss":
+            # 从OSS删除
+            if self.oss_storage:
+                return await self.oss_storage.delete_file(file_path)
+        else:
+            # 从本地删除
+            local_path = Path(file_path)
+            if local_path.exists():
+                local_path.unlink()
+                logger.info(f"本地文件删除成功: {file_path}")
+                return True
+
+        return False
+
 
 # 全局文件上传服务实例
 _file_upload_service_instance: Optional[FileUploadService] = None
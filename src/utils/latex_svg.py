@@ -0,0 +1,507 @@
+"""
+简单 LaTeX 公式本地渲染
+
+把不含分数、根号、求和等复杂结构的公式转换为 Unicode 文本，
+再排版为 SVG（上下标用 tspan 偏移）或 MathML，不依赖 QuickLaTeX
+或字体文件，可以完全离线运行。
+
+支持的语法：
+- 字母（斜体）、数字、运算符和括号
+- 一层上下标：x^2、a_{n+1}、x_1^2
+- 希腊字母、常用关系符号和箭头、\\sin 等函数名
+- \\text{...}、\\mathrm{...}、\\operatorname{...}、\\left/\\right、间距命令
+
+遇到不支持的命令或嵌套上下标时抛出 UnsupportedLatexError，
+调用方应降级到远程渲染。
+"""
+
+import math
+import unicodedata
+from typing import List, Tuple
+from xml.sax.saxutils import escape
+
+
+class UnsupportedLatexError(ValueError):
+    """公式包含本地渲染器不支持的语法"""
+
+
+# 上下标级别
+BASE = 0
+SUPERSCRIPT = 1
+SUBSCRIPT = 2
+
+GREEK = {
+    "alpha": "α",
+    "beta": "β",
+    "gamma": "γ",
+    "delta": "δ",
+    "epsilon": "ϵ",
+    "varepsilon": "ε",
+    "zeta": "ζ",
+    "eta": "η",
+    "theta": "θ",
+    "vartheta": "ϑ",
+    "iota": "ι",
+    "kappa": "κ",
+    "lambda": "λ",
+    "mu": "μ",
+    "nu": "ν",
+    "xi": "ξ",
+    "pi": "π",
+    "rho": "ρ",
+    "sigma": "σ",
+    "tau": "τ",
+    "upsilon": "υ",
+    "phi": "ϕ",
+    "varphi": "φ",
+    "chi": "χ",
+    "psi": "ψ",
+    "omega": "ω",
+    "Gamma": "Γ",
+    "Delta": "Δ",
+    "Theta": "Θ",
+    "Lambda": "Λ",
+    "Xi": "Ξ",
+    "Pi": "Π",
+    "Sigma": "Σ",
+    "Phi": "Φ",
+    "Psi": "Ψ",
+    "Omega": "Ω",
+}
+
+# 需要两侧留空的关系符号和二元运算符
+OPERATORS = {
+    "times": "×",
+    "cdot": "·",
+    "div": "÷",
+    "pm": "±",
+    "mp": "∓",
+    "le": "≤",
+    "leq": "≤",
+    "ge": "≥",
+    "geq": "≥",
+    "ne": "≠",
+    "neq": "≠",
+    "approx": "≈",
+    "equiv": "≡",
+    "sim": "∼",
+    "cong": "≅",
+    "propto": "∝",
+    "to": "→",
+    "rightarrow": "→",
+    "leftarrow": "←",
+    "leftrightarrow": "↔",
+    "Rightarrow": "⇒",
+    "Leftarrow": "⇐",
+    "Leftrightarrow": "⇔",
+    "in": "∈",
+    "notin": "∉",
+    "subset": "⊂",
+    "subseteq": "⊆",
+    "supset": "⊃",
+    "supseteq": "⊇",
+    "cup": "∪",
+    "cap": "∩",
+    "land": "∧",
+    "lor": "∨",
+    "perp": "⊥",
+    "parallel": "∥",
+    "mid": "∣",
+    "lt": "<",
+    "gt": ">",
+}
+
+SYMBOLS = {
+    "infty": "∞",
+    "emptyset": "∅",
+    "varnothing": "∅",
+    "forall": "∀",
+    "exists": "∃",
+    "neg": "¬",
+    "angle": "∠",
+    "triangle": "△",
+    "circ": "∘",
+    "degree": "°",
+    "cdots": "⋯",
+    "ldots": "…",
+    "dots": "…",
+    "prime": "′",
+    "because": "∵",
+    "therefore": "∴",
+    "{": "{",
+    "}": "}",
+    "%": "%",
+    "$": "$",
+    "#": "#",
+    "&": "&",
+    "|": "‖",
+}
+
+SPACES = {
+    ",": "\u2009",
+    ":": "\u2005",
+    ";": "\u2005",
+    " ": "\u2005",
+    "quad": "\u2003",
+    "qquad": "\u2003\u2003",
+    "!": "",
+}
+
+FUNCTIONS = {
+    "sin",
+    "cos",
+    "tan",
+    "cot",
+    "sec",
+    "csc",
+    "arcsin",
+    "arccos",
+    "arctan",
+    "sinh",
+    "cosh",
+    "tanh",
+    "log",
+    "ln",
+    "lg",
+    "exp",
+    "max",
+    "min",
+    "det",
+    "gcd",
+    "deg",
+    "arg",
+}
+
+# 参数按原文输出（正体）的命令
+TEXT_COMMANDS = {"text", "textrm", "mathrm", "mbox", "operatorname"}
+
+# 只影响排版、可以忽略的命令
+IGNORED_COMMANDS = {"left", "right", "displaystyle", "textstyle", "limits"}
+
+_OPERATOR_CHARS = set("+=<>") | set(OPERATORS.values())
+_OPENING = set("([{|") | {"−"}
+_MATH_SPACE = "\u2005"
+
+# 字宽（em），只用于估算 SVG 宽度
+_NARROW = set("ijlrtf()[]{}|.,;:!'′ ") | {"\u2009"}
+_WIDE = set("mwMW") | {"\u2003"}
+
+Run = Tuple[str, int, bool]  # (文本, 上下标级别, 是否斜体)
+
+
+class _Parser:
+    """逐字符解析 LaTeX，生成带上下标级别的文本片段"""
+
+    def __init__(self, latex: str):
+        self.latex = latex
+        self.pos = 0
+        self.runs: List[Run] = []
+        # 与 runs 一一对应的 MathML 元素名（mi / mn / mo / mtext / space）
+        self.kinds: List[str] = []
+
+    def parse(self) -> List[Run]:
+        self._parse_sequence(BASE, in_group=False)
+        if not "".join(text for text, _, _ in self.runs).strip():
+            raise UnsupportedLatexError("公式为空")
+        return _merge_runs(self.runs)
+
+    def _parse_sequence(self, script: int, in_group: bool) -> None:
+        while self.pos < len(self.latex):
+            char = self.latex[self.pos]
+            if char == "}":
+                if not in_group:
+                    raise UnsupportedLatexError("括号不匹配")
+                self.pos += 1
+                return
+            self._parse_atom(script)
+        if in_group:
+            raise UnsupportedLatexError("括号不匹配")
+
+    def _parse_atom(self, script: int) -> None:
+        char = self.latex[self.pos]
+        self.pos += 1
+
+        if char.isspace():
+            return
+        if char == "{":
+            self._parse_sequence(script, in_group=True)
+        elif char in "^_":
+            if script != BASE:
+                raise UnsupportedLatexError("不支持嵌套上下标")
+            self._parse_script_argument(SUPERSCRIPT if char == "^" else SUBSCRIPT)
+        elif char == "'":
+            self._emit("′", script, kind="mo")
+        elif char == "\\":
+            self._parse_command(script)
+        elif char == "-":
+            self._emit_operator("−", script)
+        elif char in _OPERATOR_CHARS:
+            self._emit_operator(char, script)
+        elif char in "&~":
+            raise UnsupportedLatexError(f"不支持的字符: {char}")
+        elif char == "," and script == BASE:
+            self._emit(",", script, kind="mo")
+            self._emit("\u2009", script, kind="space")
+        elif char.isascii() and char.isalpha():
+            self._emit(char, script, italic=True, kind="mi")
+        elif char.isdigit() or char == ".":
+            self._emit(char, script, kind="mn")
+        elif unicodedata.east_asian_width(char) in ("W", "F"):
+            self._emit(char, script, kind="mtext")
+        else:
+            self._emit(char, script, kind="mo")
+
+    def _parse_script_argument(self, script: int) -> None:
+        """解析 ^ / _ 后的单个参数"""
+        while self.pos < len(self.latex) and self.latex[self.pos].isspace():
+            self.pos += 1
+        if self.pos >= len(self.latex):
+            raise UnsupportedLatexError("上下标缺少参数")
+        if self.latex[self.pos] in "^_}":
+            raise UnsupportedLatexError("上下标参数无效")
+        self._parse_atom(script)
+
+    def _parse_command(self, script: int) -> None:
+        name = self._read_command_name()
+
+        if name in GREEK:
+            self._emit(GREEK[name], script, italic=name[0].islower(), kind="mi")
+        elif name in OPERATORS:
+            self._emit_operator(OPERATORS[name], script)
+        elif name in SYMBOLS:
+            self._emit(SYMBOLS[name], script, kind="mi")
+        elif name in SPACES:
+            if script == BASE and SPACES[name]:
+                self._emit(SPACES[name], script, kind="space")
+        elif name in FUNCTIONS:
+            self._emit(name, script, kind="mi")
+            # 函数名与参数之间留一个细空格
+            if script == BASE:
+                self._emit("\u2009", script, kind="space")
+        elif name in TEXT_COMMANDS:
+            self._emit(self._read_raw_group(), script, kind="mtext")
+        elif name in IGNORED_COMMANDS:
+            if name in ("left", "right") and self.latex[self.pos : self.pos + 1] == ".":
+                self.pos += 1
+        else:
+            raise UnsupportedLatexError(f"不支持的命令: \\{name}")
+
+    def _read_command_name(self) -> str:
+        if self.pos >= len(self.latex):
+            raise UnsupportedLatexError("公式以反斜杠结尾")
+        start = self.pos
+        while self.pos < len(self.latex) and self.latex[self.pos].isascii():
+            if not self.latex[self.pos].isalpha():
+                break
+            self.pos += 1
+        if self.pos == start:
+            # 单个非字母字符的命令，如 \, \{
+            self.pos += 1
+        return self.latex[start : self.pos]
+
+    def _read_raw_group(self) -> str:
+        """读取 {...} 中的原文（不解析其中的命令）"""
+        while self.pos < len(self.latex) and self.latex[self.pos].isspace():
+            self.pos += 1
+        if self.latex[self.pos : self.pos + 1] != "{":
+            raise UnsupportedLatexError("文本命令缺少参数")
+        end = self.latex.find("}", self.pos)
+        if end == -1 or "{" in self.latex[self.pos + 1 : end]:
+            raise UnsupportedLatexError("文本命令参数无效")
+        text = self.latex[self.pos + 1 : end]
+        self.pos = end + 1
+        return text
+
+    def _emit(
+        self, text: str, script: int, italic: bool = False, kind: str = "mo"
+    ) -> None:
+        self.runs.append((text, script, italic))
+        self.kinds.append(kind)
+
+    def _emit_operator(self, symbol: str, script: int) -> None:
+        """运算符两侧留空；上下标内和一元运算（如开头的负号）不留空"""
+        previous = self.runs[-1] if self.runs else None
+        unary = (
+            previous is None
+            or previous[0].rstrip(_MATH_SPACE)[-1:] in _OPENING | _OPERATOR_CHARS
+        )
+        if script != BASE or (unary and symbol in "−+±∓"):
+            self._emit(symbol, script)
+        else:
+            self._emit(f"{_MATH_SPACE}{symbol}{_MATH_SPACE}", script)
+
+
+def _merge_runs(runs: List[Run]) -> List[Run]:
+    """合并相邻的同类片段，减少 tspan 数量"""
+    merged: List[Run] = []
+    for text, script, italic in runs:
+        if not text:
+            continue
+        if merged and merged[-1][1:] == (script, italic):
+            merged[-1] = (merged[-1][0] + text, script, italic)
+        else:
+            merged.append((text, script, italic))
+    return merged
+
+
+def parse_latex(latex: str) -> List[Run]:
+    """
+    把简单 LaTeX 公式解析为文本片段
+
+    Args:
+        latex: 公式内容（不含 $ 定界符）
+
+    Returns:
+        (文本, 上下标级别, 是否斜体) 列表
+
+    Raises:
+        UnsupportedLatexError: 包含不支持的语法
+    """
+    return _Parser(latex).parse()
+
+
+def _char_width(char: str) -> float:
+    if unicodedata.east_asian_width(char) in ("W", "F"):
+        return 1.0
+    if char in _NARROW:
+        return 0.3
+    if char == _MATH_SPACE:
+        return 0.25
+    if char in _WIDE:
+        return 0.85
+    return 0.55
+
+
+def render_latex_svg(latex: str, font_size: int = 20) -> str:
+    """
+    把简单 LaTeX 公式渲染为 SVG
+
+    Args:
+        latex: 公式内容（不含 $ 定界符）
+        font_size: 正文字号（像素）
+
+    Returns:
+        SVG 文本
+
+    Raises:
+        UnsupportedLatexError: 包含不支持的语法
+    """
+    runs = parse_latex(latex)
+    script_size = round(font_size * 0.7, 1)
+    shifts = {
+        BASE: 0.0,
+        SUPERSCRIPT: -round(font_size * 0.45, 1),
+        SUBSCRIPT: round(font_size * 0.25, 1),
+    }
+    padding = max(2, font_size // 8)
+
+    scripts = {script for _, script, _ in runs}
+    ascent = font_size * (0.8 + (0.45 if SUPERSCRIPT in scripts else 0))
+    descent = font_size * (0.25 + (0.25 if SUBSCRIPT in scripts else 0))
+
+    width = 0.0
+    offset = 0.0
+    spans = []
+    for text, script, italic in runs:
+        size = script_size if script != BASE else font_size
+        width += sum(_char_width(char) for char in text) * size
+
+        attrs = ""
+        dy = shifts[script] - offset
+        if dy:
+            attrs += f' dy="{dy:g}"'
+            offset = shifts[script]
+        if script != BASE:
+            attrs += f' font-size="{script_size:g}"'
+        if italic:
+            attrs += ' font-style="italic"'
+        spans.append(f"<tspan{attrs}>{escape(text)}</tspan>")
+
+    svg_width = math.ceil(width) + 2 * padding
+    svg_height = math.ceil(ascent + descent) + 2 * padding
+    baseline = round(padding + ascent, 1)
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{svg_width}" '
+        f'height="{svg_height}" viewBox="0 0 {svg_width} {svg_height}">'
+        f'<text x="{padding}" y="{baseline:g}" font-size="{font_size}" '
+        f"font-family=\"'Times New Roman', STIXGeneral, serif\">"
+        f"{''.join(spans)}</text></svg>"
+    )
+
+
+def _mathml_tokens(parser: _Parser) -> List[Tuple[str, int]]:
+    """把解析结果转换为 (MathML 元素, 上下标级别) 列表，相邻数字合并为一个 mn"""
+    tokens: List[Tuple[str, int]] = []
+    previous_kind = None
+    for (text, script, italic), kind in zip(parser.runs, parser.kinds, strict=True):
+        text = text.strip(f"{_MATH_SPACE}\u2009")
+        if kind == "space" or not text:
+            previous_kind = None
+            continue
+        if kind == "mn" and previous_kind == "mn" and tokens[-1][1] == script:
+            number = tokens[-1][0][len("<mn>") : -len("</mn>")]
+            tokens[-1] = (f"<mn>{number}{escape(text)}</mn>", script)
+        elif kind == "mi" and len(text) == 1 and not italic:
+            tokens.append((f'<mi mathvariant="normal">{escape(text)}</mi>', script))
+        else:
+            tokens.append((f"<{kind}>{escape(text)}</{kind}>", script))
+        previous_kind = kind
+    return tokens
+
+
+def render_latex_mathml(latex: str, display: bool = False) -> str:
+    """
+    把简单 LaTeX 公式转换为 MathML
+
+    Args:
+        latex: 公式内容（不含 $ 定界符）
+        display: 是否为块级公式
+
+    Returns:
+        <math> 元素文本
+
+    Raises:
+        UnsupportedLatexError: 包含不支持的语法
+    """
+    parser = _Parser(latex)
+    parser.parse()
+
+    elements: List[str] = []
+    # 最近一个下标元素的 (底数, 下标)，紧跟上标时合并为 msubsup
+    last_sub = None
+    tokens = _mathml_tokens(parser)
+    index = 0
+    while index < len(tokens):
+        element, script = tokens[index]
+        index += 1
+        if script == BASE:
+            elements.append(element)
+            last_sub = None
+            continue
+
+        group = [element]
+        while index < len(tokens) and tokens[index][1] == script:
+            group.append(tokens[index][0])
+            index += 1
+        argument = group[0] if len(group) == 1 else f"<mrow>{''.join(group)}</mrow>"
+
+        if script == SUPERSCRIPT and last_sub is not None:
+            base, sub = last_sub
+            elements[-1] = f"<msubsup>{base}{sub}{argument}</msubsup>"
+            last_sub = None
+            continue
+
+        base = elements.pop() if elements else "<mrow></mrow>"
+        if script == SUBSCRIPT:
+            elements.append(f"<msub>{base}{argument}</msub>")
+            last_sub = (base, argument)
+        else:
+            elements.append(f"<msup>{base}{argument}</msup>")
+            last_sub = None
+
+    alttext = escape(latex, {'"': "&quot;"})
+    return (
+        '<math xmlns="http://www.w3.org/1998/Math/MathML" '
+        f'display="{"block" if display else "inline"}" alttext="{alttext}">'
+        f"<mrow>{''.join(elements)}</mrow></math>"
+    )
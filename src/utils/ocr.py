@@ -7,11 +7,14 @@ import asyncio
 import base64
 import hashlib
 import hmac
+import multiprocessing
 import time
 import urllib.parse
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
 
 import cv2
 import httpx
@@ -23,6 +26,9 @@ from src.core.logging import get_logger
 
 logger = get_logger(__name__)
 
+# 图片路径或内存中的图片数据
+ImageSource = Union[str, bytes]
+
 
 class OCRType:
     """OCR识别类型常量"""
@@ -64,6 +70,188 @@ class OCRResult:
         }
 
 
+def preprocess_image(
+    image: ImageSource, enhance: bool = True
+) -> Tuple[str, Dict[str, Any]]:
+    """
+    图像预处理（CPU 密集，在预处理进程池的子进程中执行）
+
+    Args:
+        image: 图片路径或图片数据（bytes 直接解码，不读磁盘）
+        enhance: 是否进行图像增强
+
+    Returns:
+        base64编码的图片数据和图片信息
+
+    Raises:
+        ValueError: 图片无法解码
+    """
+    # 读取图片
+    if isinstance(image, (bytes, bytearray)):
+        decoded = cv2.imdecode(np.frombuffer(image, dtype=np.uint8), cv2.IMREAD_COLOR)
+        original_size = len(image)
+        source = f"<{original_size} bytes>"
+    else:
+        decoded = cv2.imread(image)
+        original_size = Path(image).stat().st_size if decoded is not None else 0
+        source = image
+    if decoded is None:
+        raise ValueError(f"无法读取图片: {source}")
+    image_data = decoded
+
+    # 获取原始图片信息
+    height, width = image_data.shape[:2]
+
+    # 图像增强处理
+    if enhance:
+        # 转为灰度图
+        if len(image_data.shape) == 3:
+            gray = cv2.cvtColor(image_data, cv2.COLOR_BGR2GRAY)
+        else:
+            gray = image_data
+
+        # 降噪
+        gray = cv2.medianBlur(gray, 3)
+
+        # 自适应直方图均衡化
+        clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
+        gray = clahe.apply(gray)
+
+        # 锐化
+        kernel = np.array([[-1, -1, -1], [-1, 9, -1], [-1, -1, -1]])
+        gray = cv2.filter2D(gray, -1, kernel)
+
+        # 转回BGR格式
+        image_data = cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR)
+
+    # 图片尺寸优化（如果太大就压缩）
+    max_size = 2048
+    if max(width, height) > max_size:
+        scale = max_size / max(width, height)
+        new_width = int(width * scale)
+        new_height = int(height * scale)
+        image_data = cv2.resize(
+            image_data, (new_width, new_height), interpolation=cv2.INTER_AREA
+        )
+        logger.debug(f"图片已压缩: {width}x{height} -> {new_width}x{new_height}")
+
+    # 转换为base64
+    _, encoded_image = cv2.imencode(".jpg", image_data, [cv2.IMWRITE_JPEG_QUALITY, 85])
+    base64_image = base64.b64encode(encoded_image).decode("utf-8")
+
+    # 图片信息
+    image_info = {
+        "original_width": width,
+        "original_height": height,
+        "processed_width": image_data.shape[1],
+        "processed_height": image_data.shape[0],
+        "original_size": original_size,
+        "processed_size": len(base64_image),
+        "enhanced": enhance,
+    }
+
+    logger.debug(f"图片预处理完成: {image_info}")
+    return base64_image, image_info
+
+
+class OCRPreprocessPool:
+    """
+    OCR 图像预处理进程池
+
+    OpenCV 预处理单张图片需要几百毫秒 CPU，放在事件循环里会阻塞所有请求。
+    预处理在独立的进程池中执行，同时处理的图片数有上限；进程池无法创建
+    或子进程崩溃时降级为线程池（OpenCV 大部分操作会释放 GIL）。
+    """
+
+    def __init__(
+        self,
+        max_workers: Optional[int] = None,
+        use_processes: Optional[bool] = None,
+    ):
+        """
+        Args:
+            max_workers: 进程/线程数，默认 OCR_PREPROCESS_WORKERS
+            use_processes: 是否使用进程池，默认 OCR_PREPROCESS_USE_PROCESSES
+        """
+        self.max_workers = max_workers or settings.OCR_PREPROCESS_WORKERS
+        self.use_processes = (
+            settings.OCR_PREPROCESS_USE_PROCESSES
+            if use_processes is None
+            else use_processes
+        )
+        self.mode: Optional[str] = None  # process / thread，首次使用时确定
+        self._executor: Optional[Executor] = None
+        # 排队中的图片数据也占内存，进入执行器前限制并发
+        self._semaphore = asyncio.Semaphore(self.max_workers * 2)
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.use_processes:
+                try:
+                    # spawn：不继承事件循环和连接池等父进程状态
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.max_workers,
+                        mp_context=multiprocessing.get_context("spawn"),
+                    )
+                    self.mode = "process"
+                except (OSError, NotImplementedError) as e:
+                    logger.warning(f"OCR预处理进程池创建失败，使用线程池: {e}")
+            if self._executor is None:
+                self._use_threads()
+        assert self._executor is not None
+        return self._executor
+
+    def _use_threads(self) -> None:
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_workers, thread_name_prefix="ocr-preprocess"
+        )
+        self.mode = "thread"
+
+    def _fallback_to_threads(self, error: BaseException) -> None:
+        logger.warning(f"OCR预处理进程池不可用，降级为线程池: {error}")
+        broken = self._executor
+        self._use_threads()
+        if broken is not None:
+            broken.shutdown(wait=False, cancel_futures=True)
+
+    async def run(
+        self, image: ImageSource, enhance: bool = True
+    ) -> Tuple[str, Dict[str, Any]]:
+        """
+        预处理单张图片
+
+        Args:
+            image: 图片路径或图片数据
+            enhance: 是否进行图像增强
+
+        Returns:
+            base64编码的图片数据和图片信息
+        """
+        async with self._semaphore:
+            loop = asyncio.get_running_loop()
+            executor = self._get_executor()
+            try:
+                return await loop.run_in_executor(
+                    executor, preprocess_image, image, enhance
+                )
+            except (BrokenProcessPool, OSError) as e:
+                # OSError 来自启动子进程失败；读图失败时 preprocess_image 抛 ValueError
+                if self.mode != "process":
+                    raise
+                if self._executor is executor:
+                    self._fallback_to_threads(e)
+                return await loop.run_in_executor(
+                    self._get_executor(), preprocess_image, image, enhance
+                )
+
+    def shutdown(self, wait: bool = True) -> None:
+        """关闭执行器"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait, cancel_futures=True)
+            self._executor = None
+            self.mode = None
+
+
 class AliCloudOCRService:
     """
     阿里云OCR服务
@@ -91,6 +279,8 @@ class AliCloudOCRService:
         self.region = region
         self.endpoint = f"https://ocr.{region}.aliyuncs.com"
 
+        self.preprocess_pool = get_ocr_preprocess_pool()
+
         if not self.access_key_id or not self.access_key_secret:
             logger.warning("阿里云OCR服务未配置完整的访问凭证，将无法使用OCR功能")
 
@@ -129,83 +319,39 @@ class AliCloudOCRService:
         return signature
 
     def _preprocess_image(
-        self, image_path: str, enhance: bool = True
+        self, image: ImageSource, enhance: bool = True
     ) -> Tuple[str, Dict[str, Any]]:
         """
-        图像预处理
+        图像预处理（同步执行，会阻塞事件循环，异步代码请使用 _preprocess_image_async）
 
         Args:
-            image_path: 图片路径
+            image: 图片路径或图片数据
             enhance: 是否进行图像增强
 
         Returns:
             base64编码的图片数据和图片信息
         """
         try:
-            # 读取图片
-            image = cv2.imread(image_path)
-            if image is None:
-                raise ValueError(f"无法读取图片: {image_path}")
-
-            # 获取原始图片信息
-            height, width = image.shape[:2]
-            original_size = Path(image_path).stat().st_size
-
-            # 图像增强处理
-            if enhance:
-                # 转为灰度图
-                if len(image.shape) == 3:
-                    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-                else:
-                    gray = image
-
-                # 降噪
-                gray = cv2.medianBlur(gray, 3)
-
-                # 自适应直方图均衡化
-                clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
-                gray = clahe.apply(gray)
-
-                # 锐化
-                kernel = np.array([[-1, -1, -1], [-1, 9, -1], [-1, -1, -1]])
-                gray = cv2.filter2D(gray, -1, kernel)
-
-                # 转回BGR格式
-                image = cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR)
-
-            # 图片尺寸优化（如果太大就压缩）
-            max_size = 2048
-            if max(width, height) > max_size:
-                scale = max_size / max(width, height)
-                new_width = int(width * scale)
-                new_height = int(height * scale)
-                image = cv2.resize(
-                    image, (new_width, new_height), interpolation=cv2.INTER_AREA
-                )
-                logger.debug(
-                    f"图片已压缩: {width}x{height} -> {new_width}x{new_height}"
-                )
+            return preprocess_image(image, enhance)
+        except Exception as e:
+            logger.error(f"图片预处理失败: {e}")
+            raise AIServiceError(f"图片预处理失败: {e}")
 
-            # 转换为base64
-            _, encoded_image = cv2.imencode(
-                ".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, 85]
-            )
-            base64_image = base64.b64encode(encoded_image).decode("utf-8")
-
-            # 图片信息
-            image_info = {
-                "original_width": width,
-                "original_height": height,
-                "processed_width": image.shape[1],
-                "processed_height": image.shape[0],
-                "original_size": original_size,
-                "processed_size": len(base64_image),
-                "enhanced": enhance,
-            }
+    async def _preprocess_image_async(
+        self, image: ImageSource, enhance: bool = True
+    ) -> Tuple[str, Dict[str, Any]]:
+        """
+        在预处理进程池中执行图像预处理
 
-            logger.debug(f"图片预处理完成: {image_info}")
-            return base64_image, image_info
+        Args:
+            image: 图片路径或图片数据
+            enhance: 是否进行图像增强
 
+        Returns:
+            base64编码的图片数据和图片信息
+        """
+        try:
+            return await self.preprocess_pool.run(image, enhance)
         except Exception as e:
             logger.error(f"图片预处理失败: {e}")
             raise AIServiceError(f"图片预处理失败: {e}")
@@ -284,97 +430,45 @@ class AliCloudOCRService:
             raise AIServiceError(f"OCR服务调用失败: {e}")
 
     async def recognize_general_text(
-        self, image_path: str, enhance: bool = True
+        self, image: ImageSource, enhance: bool = True
     ) -> OCRResult:
         """
         通用文字识别
 
         Args:
-            image_path: 图片路径
+            image: 图片路径或图片数据
             enhance: 是否进行图像增强
 
         Returns:
             OCR识别结果
         """
-        start_time = asyncio.get_event_loop().time()
-
-        try:
-            if not self.access_key_id or not self.access_key_secret:
-                raise AIServiceError("OCR服务未配置完整的访问凭证")
-
-            # 图像预处理
-            base64_image, image_info = self._preprocess_image(image_path, enhance)
-
-            # 调用OCR API
-            response = await self._call_ocr_api(
-                action="RecognizeGeneral", image_data=base64_image
-            )
-
-            # 处理响应
-            text_lines = []
-            word_info = []
-            total_confidence = 0.0
-            word_count = 0
-
-            # 解析识别结果
-            if "Data" in response and "Content" in response["Data"]:
-                for item in response["Data"]["Content"]:
-                    text = item.get("Text", "")
-                    confidence = (
-                        float(item.get("Confidence", 0)) / 100.0
-                    )  # 转换为0-1范围
+        return await self._recognize("RecognizeGeneral", "通用", image, enhance)
 
-                    if text.strip():
-                        text_lines.append(text)
-                        word_info.append(
-                            {
-                                "text": text,
-                                "confidence": confidence,
-                                "positions": {
-                                    "left": item.get("Left", 0),
-                                    "top": item.get("Top", 0),
-                                    "width": item.get("Width", 0),
-                                    "height": item.get("Height", 0),
-                                },
-                            }
-                        )
-
-                        total_confidence += confidence
-                        word_count += 1
-
-            # 合并文本
-            full_text = "\n".join(text_lines)
-            average_confidence = (
-                total_confidence / word_count if word_count > 0 else 0.0
-            )
-
-            processing_time = asyncio.get_event_loop().time() - start_time
-
-            logger.info(
-                f"通用OCR识别完成: {word_count}个文本块, 平均置信度: {average_confidence:.2f}"
-            )
+    async def recognize_handwritten_text(
+        self, image: ImageSource, enhance: bool = True
+    ) -> OCRResult:
+        """
+        手写文字识别
 
-            return OCRResult(
-                text=full_text,
-                confidence=average_confidence,
-                word_info=word_info,
-                raw_response=response,
-                processing_time=processing_time,
-            )
+        Args:
+            image: 图片路径或图片数据
+            enhance: 是否进行图像增强
 
-        except Exception as e:
-            processing_time = asyncio.get_event_loop().time() - start_time
-            logger.error(f"通用OCR识别失败: {e}, 处理时间: {processing_time:.2f}s")
-            raise
+        Returns:
+            OCR识别结果
+        """
+        return await self._recognize("RecognizeHandwriting", "手写", image, enhance)
 
-    async def recognize_handwritten_text(
-        self, image_path: str, enhance: bool = True
+    async def _recognize(
+        self, action: str, label: str, image: ImageSource, enhance: bool
     ) -> OCRResult:
         """
-        手写文字识别
+        预处理图片并调用指定的OCR接口
 
         Args:
-            image_path: 图片路径
+            action: API动作
+            label: 日志中的识别类型名称
+            image: 图片路径或图片数据
             enhance: 是否进行图像增强
 
         Returns:
@@ -386,24 +480,27 @@ class AliCloudOCRService:
             if not self.access_key_id or not self.access_key_secret:
                 raise AIServiceError("OCR服务未配置完整的访问凭证")
 
-            # 图像预处理
-            base64_image, image_info = self._preprocess_image(image_path, enhance)
+            # 图像预处理（在进程池中执行，不阻塞事件循环）
+            base64_image, image_info = await self._preprocess_image_async(
+                image, enhance
+            )
 
             # 调用OCR API
-            response = await self._call_ocr_api(
-                action="RecognizeHandwriting", image_data=base64_image
-            )
+            response = await self._call_ocr_api(action=action, image_data=base64_image)
 
-            # 处理响应（与通用识别类似）
+            # 处理响应
             text_lines = []
             word_info = []
             total_confidence = 0.0
             word_count = 0
 
+            # 解析识别结果
             if "Data" in response and "Content" in response["Data"]:
                 for item in response["Data"]["Content"]:
                     text = item.get("Text", "")
-                    confidence = float(item.get("Confidence", 0)) / 100.0
+                    confidence = (
+                        float(item.get("Confidence", 0)) / 100.0
+                    )  # 转换为0-1范围
 
                     if text.strip():
                         text_lines.append(text)
@@ -423,6 +520,7 @@ class AliCloudOCRService:
                         total_confidence += confidence
                         word_count += 1
 
+            # 合并文本
             full_text = "\n".join(text_lines)
             average_confidence = (
                 total_confidence / word_count if word_count > 0 else 0.0
@@ -431,7 +529,7 @@ class AliCloudOCRService:
             processing_time = asyncio.get_event_loop().time() - start_time
 
             logger.info(
-                f"手写OCR识别完成: {word_count}个文本块, 平均置信度: {average_confidence:.2f}"
+                f"{label}OCR识别完成: {word_count}个文本块, 平均置信度: {average_confidence:.2f}"
             )
 
             return OCRResult(
@@ -444,17 +542,20 @@ class AliCloudOCRService:
 
         except Exception as e:
             processing_time = asyncio.get_event_loop().time() - start_time
-            logger.error(f"手写OCR识别失败: {e}, 处理时间: {processing_time:.2f}s")
+            logger.error(f"{label}OCR识别失败: {e}, 处理时间: {processing_time:.2f}s")
             raise
 
     async def auto_recognize(
-        self, image_path: str, ocr_type: str = OCRType.GENERAL, enhance: bool = True
+        self,
+        image: ImageSource,
+        ocr_type: str = OCRType.GENERAL,
+        enhance: bool = True,
     ) -> OCRResult:
         """
         自动识别（根据类型选择合适的OCR方法）
 
         Args:
-            image_path: 图片路径
+            image: 图片路径或图片数据
             ocr_type: OCR类型
             enhance: 是否进行图像增强
 
@@ -463,15 +564,53 @@ class AliCloudOCRService:
         """
         try:
             if ocr_type == OCRType.HANDWRITTEN:
-                return await self.recognize_handwritten_text(image_path, enhance)
+                return await self.recognize_handwritten_text(image, enhance)
             else:
                 # 默认使用通用识别
-                return await self.recognize_general_text(image_path, enhance)
+                return await self.recognize_general_text(image, enhance)
 
         except Exception as e:
             logger.error(f"自动OCR识别失败: {e}")
             raise
 
+    async def recognize_batch(
+        self,
+        images: Sequence[ImageSource],
+        ocr_type: str = OCRType.GENERAL,
+        enhance: bool = True,
+    ) -> List[Optional[OCRResult]]:
+        """
+        批量识别多页作业
+
+        各页的预处理在进程池中并行执行，识别请求并发发出。
+
+        Args:
+            images: 各页的图片路径或图片数据
+            ocr_type: OCR类型
+            enhance: 是否进行图像增强
+
+        Returns:
+            与输入顺序一致的识别结果，识别失败的页为None
+
+        Raises:
+            AIServiceError: 所有页都识别失败
+        """
+        if not images:
+            return []
+
+        results = await asyncio.gather(
+            *(self.auto_recognize(image, ocr_type, enhance) for image in images),
+            return_exceptions=True,
+        )
+
+        failures = [r for r in results if isinstance(r, BaseException)]
+        if len(failures) == len(results):
+            raise AIServiceError(f"批量OCR识别失败: {failures[0]}")
+        if failures:
+            logger.warning(f"批量OCR识别部分失败: {len(failures)}/{len(results)}页")
+
+        return [None if isinstance(r, BaseException) else r for r in results]
+
     def validate_image(self, image_path: str) -> bool:
         """
         验证图片是否有效
@@ -519,6 +658,23 @@ class AliCloudOCRService:
         return bool(self.access_key_id and self.access_key_secret)
 
 
+# 全局预处理进程池（首次预处理时才启动子进程）
+_ocr_preprocess_pool: Optional[OCRPreprocessPool] = None
+
+
+def get_ocr_preprocess_pool() -> OCRPreprocessPool:
+    """
+    获取OCR图像预处理进程池
+
+    Returns:
+        预处理进程池实例
+    """
+    global _ocr_preprocess_pool
+    if _ocr_preprocess_pool is None:
+        _ocr_preprocess_pool = OCRPreprocessPool()
+    return _ocr_preprocess_pool
+
+
 # 全局OCR服务实例
 _ocr_service_instance: Optional[AliCloudOCRService] = None
 
@@ -0,0 +1,293 @@
+"""
+OSS 阻塞调用执行器
+
+oss2 是同步 SDK，在 async 函数中直接调用 put_object 等方法会阻塞整个
+事件循环（一次 5MB 的作业照片上传期间，同一 worker 上所有用户的 SSE 流
+都会停顿）。所有 oss2 调用统一通过这里的共享线程池执行：
+
+- 线程数和排队深度都有上限，排队已满时立即拒绝，避免上传洪峰堆积内存
+- 记录排队深度、排队等待和执行耗时，由健康检查接口展示
+- 超过阈值的文件使用分片上传；流式上传边读边传，只缓冲一个分片
+"""
+
+import asyncio
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, List, Mapping, Optional, TypeVar
+
+import oss2
+
+from src.core.config import settings
+from src.core.exceptions import AIServiceError
+from src.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+T = TypeVar("T")
+
+
+class OSSExecutorBusyError(AIServiceError):
+    """OSS 执行器排队已满"""
+
+
+def _percentile(values: Deque[float], percentile: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(len(ordered) * percentile))
+    return round(ordered[index] * 1000, 2)
+
+
+class OSSExecutor:
+    """oss2 调用专用的有界线程池"""
+
+    def __init__(
+        self,
+        max_workers: Optional[int] = None,
+        max_queue: Optional[int] = None,
+    ):
+        """
+        Args:
+            max_workers: 线程数，默认 OSS_EXECUTOR_WORKERS
+            max_queue: 最多排队的任务数，默认 OSS_EXECUTOR_MAX_QUEUE
+        """
+        self.max_workers = max_workers or settings.OSS_EXECUTOR_WORKERS
+        self.max_queue = (
+            settings.OSS_EXECUTOR_MAX_QUEUE if max_queue is None else max_queue
+        )
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_workers, thread_name_prefix="oss"
+        )
+        self._lock = threading.Lock()
+        self._submitted = 0  # 已提交未完成（排队 + 执行中）
+        self._running = 0
+        self._stats = {"calls": 0, "errors": 0, "rejected": 0}
+        # 最近 1000 次调用的排队等待和执行耗时（秒）
+        self._queue_waits: Deque[float] = deque(maxlen=1000)
+        self._durations: Deque[float] = deque(maxlen=1000)
+
+    async def run(self, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """
+        在线程池中执行阻塞的 oss2 调用
+
+        Args:
+            func: 阻塞函数
+            *args: 位置参数
+            **kwargs: 关键字参数
+
+        Returns:
+            函数返回值
+
+        Raises:
+            OSSExecutorBusyError: 排队已满
+        """
+        with self._lock:
+            if self._submitted >= self.max_workers + self.max_queue:
+                self._stats["rejected"] += 1
+                raise OSSExecutorBusyError("OSS 上传繁忙，请稍后重试")
+            self._submitted += 1
+
+        submitted_at = time.perf_counter()
+
+        def call() -> T:
+            started_at = time.perf_counter()
+            with self._lock:
+                self._running += 1
+                self._queue_waits.append(started_at - submitted_at)
+            failed = False
+            try:
+                return func(*args, **kwargs)
+            except Exception:
+                failed = True
+                raise
+            finally:
+                with self._lock:
+                    self._running -= 1
+                    self._stats["calls"] += 1
+                    self._stats["errors"] += failed
+                    self._durations.append(time.perf_counter() - started_at)
+
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, call)
+        finally:
+            with self._lock:
+                self._submitted -= 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取排队深度、等待和执行耗时"""
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "running": self._running,
+                "queue_depth": max(0, self._submitted - self._running),
+                **self._stats,
+                "queue_wait_p50_ms": _percentile(self._queue_waits, 0.5),
+                "queue_wait_p95_ms": _percentile(self._queue_waits, 0.95),
+                "duration_p50_ms": _percentile(self._durations, 0.5),
+                "duration_p95_ms": _percentile(self._durations, 0.95),
+            }
+
+    def shutdown(self, wait: bool = True) -> None:
+        """关闭线程池"""
+        self._executor.shutdown(wait=wait)
+
+
+def put_object(
+    bucket: Any,
+    object_name: str,
+    data: bytes,
+    headers: Optional[Mapping[str, str]] = None,
+    multipart_threshold: Optional[int] = None,
+    part_size: Optional[int] = None,
+) -> Any:
+    """
+    上传对象，超过阈值时使用分片上传（阻塞调用，需在执行器中运行）
+
+    Args:
+        bucket: oss2.Bucket
+        object_name: 对象名
+        data: 文件内容
+        headers: 请求头（Content-Type 等）
+        multipart_threshold: 分片上传阈值，默认 OSS_MULTIPART_THRESHOLD
+        part_size: 分片大小，默认 OSS_MULTIPART_PART_SIZE
+
+    Returns:
+        oss2 的上传结果（含 status）
+    """
+    threshold = (
+        settings.OSS_MULTIPART_THRESHOLD
+        if multipart_threshold is None
+        else multipart_threshold
+    )
+    if len(data) <= threshold:
+        return bucket.put_object(object_name, data, headers=headers)
+
+    part_size = part_size or settings.OSS_MULTIPART_PART_SIZE
+    upload_id = bucket.init_multipart_upload(object_name, headers=headers).upload_id
+    try:
+        parts = []
+        for number, offset in enumerate(range(0, len(data), part_size), start=1):
+            result = bucket.upload_part(
+                object_name, upload_id, number, data[offset : offset + part_size]
+            )
+            parts.append(oss2.models.PartInfo(number, result.etag))
+        result = bucket.complete_multipart_upload(object_name, upload_id, parts)
+    except Exception:
+        # 失败时清理已上传的分片，避免产生碎片费用
+        try:
+            bucket.abort_multipart_upload(object_name, upload_id)
+        except Exception as e:
+            logger.warning(f"取消分片上传失败: {object_name}, error={e}")
+        raise
+
+    logger.debug(f"分片上传完成: {object_name}, parts={len(parts)}")
+    return result
+
+
+class MultipartStreamUpload:
+    """
+    流式分片上传
+
+    按分片缓冲写入的数据，缓冲满一个分片就上传，内存占用不超过一个分片。
+    数据总量不足一个分片时在 complete 中直接 put_object，避免小文件多发请求。
+    """
+
+    def __init__(
+        self,
+        bucket: Any,
+        object_name: str,
+        headers: Optional[Mapping[str, str]] = None,
+        part_size: Optional[int] = None,
+        executor: Optional[OSSExecutor] = None,
+    ):
+        """
+        Args:
+            bucket: oss2.Bucket
+            object_name: 对象名
+            headers: 请求头（Content-Type 等）
+            part_size: 分片大小，默认 OSS_MULTIPART_PART_SIZE
+            executor: 执行 oss2 调用的执行器，默认全局 oss_executor
+        """
+        self.bucket = bucket
+        self.object_name = object_name
+        self.headers = headers
+        self.part_size = part_size or settings.OSS_MULTIPART_PART_SIZE
+        self.executor = executor or oss_executor
+        self._buffer = bytearray()
+        self._upload_id: Optional[str] = None
+        self._parts: List[Any] = []
+
+    async def write(self, data: bytes) -> None:
+        """写入数据，缓冲满一个分片时上传"""
+        self._buffer += data
+        while len(self._buffer) >= self.part_size:
+            part = bytes(self._buffer[: self.part_size])
+            del self._buffer[: self.part_size]
+            await self._upload_part(part)
+
+    async def _upload_part(self, data: bytes) -> None:
+        if self._upload_id is None:
+            result = await self.executor.run(
+                self.bucket.init_multipart_upload,
+                self.object_name,
+                headers=self.headers,
+            )
+            self._upload_id = result.upload_id
+        number = len(self._parts) + 1
+        result = await self.executor.run(
+            self.bucket.upload_part, self.object_name, self._upload_id, number, data
+        )
+        self._parts.append(oss2.models.PartInfo(number, result.etag))
+
+    async def complete(self) -> Any:
+        """
+        上传剩余数据并完成上传
+
+        Returns:
+            oss2 的上传结果（含 status）
+        """
+        if self._upload_id is None:
+            data = bytes(self._buffer)
+            self._buffer.clear()
+            return await self.executor.run(
+                self.bucket.put_object, self.object_name, data, headers=self.headers
+            )
+
+        if self._buffer:
+            part = bytes(self._buffer)
+            self._buffer.clear()
+            await self._upload_part(part)
+        result = await self.executor.run(
+            self.bucket.complete_multipart_upload,
+            self.object_name,
+            self._upload_id,
+            self._parts,
+        )
+        logger.debug(f"流式分片上传完成: {self.object_name}, parts={len(self._parts)}")
+        return result
+
+    async def abort(self) -> None:
+        """取消上传，清理已上传的分片"""
+        self._buffer.clear()
+        if self._upload_id is None:
+            return
+        try:
+            await self.executor.run(
+                self.bucket.abort_multipart_upload, self.object_name, self._upload_id
+            )
+        except Exception as e:
+            logger.warning(f"取消分片上传失败: {self.object_name}, error={e}")
+        self._upload_id = None
+
+
+# 全局实例
+oss_executor = OSSExecutor()
+
+
+def get_oss_executor() -> OSSExecutor:
+    """获取 OSS 执行器实例"""
+    return oss_executor
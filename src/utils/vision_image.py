@@ -0,0 +1,175 @@
+"""
+视觉模型图片规格化
+
+qwen-vl 按 28×28 像素一个 token 计费，并在服务端把超过像素上限的图片
+缩小到上限以内（默认 1280 个 token，约 100 万像素）。手机拍的作业照片
+通常是 4000×3000 的 JPEG，多传的像素既拖慢上游下载，也不会被模型看到。
+
+这里按模型自己的缩放规则（边长取 28 的倍数、总像素不超过上限）一次缩放
+到位，透明背景合成为白色，可选转灰度和自动对比度以突出文字，再用
+WebP/JPEG 重新编码。
+"""
+
+import math
+from dataclasses import dataclass
+from io import BytesIO
+from typing import Any, Dict, Optional, Tuple
+
+from PIL import Image, ImageOps
+
+# qwen-vl 的 patch 边长（每个 patch 一个 token）
+PATCH_SIZE = 28
+MIN_PIXELS = 4 * PATCH_SIZE * PATCH_SIZE
+# 未开启 vl_high_resolution_images 时每张图最多 1280 个 token
+DEFAULT_MAX_PIXELS = 1280 * PATCH_SIZE * PATCH_SIZE
+
+# 不缩放时，重新编码至少要省下这个比例才使用优化版本
+MIN_SAVING_RATIO = 0.1
+
+
+@dataclass(frozen=True)
+class VisionImageProfile:
+    """图片规格化参数"""
+
+    name: str
+    max_pixels: int = DEFAULT_MAX_PIXELS
+    grayscale: bool = False
+    autocontrast: bool = False
+    format: str = "webp"  # webp / jpeg
+    quality: int = 80
+
+    @property
+    def extension(self) -> str:
+        return "jpg" if self.format == "jpeg" else self.format
+
+    @property
+    def content_type(self) -> str:
+        return f"image/{self.format}"
+
+
+def smart_resize(
+    width: int, height: int, max_pixels: int = DEFAULT_MAX_PIXELS
+) -> Tuple[int, int]:
+    """
+    计算模型实际使用的图片尺寸（与 qwen-vl 服务端的缩放规则一致）
+
+    Args:
+        width: 原始宽度
+        height: 原始高度
+        max_pixels: 像素上限
+
+    Returns:
+        (宽度, 高度)，均为 28 的倍数
+    """
+    w_bar = max(PATCH_SIZE, round(width / PATCH_SIZE) * PATCH_SIZE)
+    h_bar = max(PATCH_SIZE, round(height / PATCH_SIZE) * PATCH_SIZE)
+    if w_bar * h_bar > max_pixels:
+        beta = math.sqrt(width * height / max_pixels)
+        w_bar = max(PATCH_SIZE, math.floor(width / beta / PATCH_SIZE) * PATCH_SIZE)
+        h_bar = max(PATCH_SIZE, math.floor(height / beta / PATCH_SIZE) * PATCH_SIZE)
+    elif w_bar * h_bar < MIN_PIXELS:
+        beta = math.sqrt(MIN_PIXELS / (width * height))
+        w_bar = math.ceil(width * beta / PATCH_SIZE) * PATCH_SIZE
+        h_bar = math.ceil(height * beta / PATCH_SIZE) * PATCH_SIZE
+    return w_bar, h_bar
+
+
+def estimate_vision_tokens(
+    width: int, height: int, max_pixels: int = DEFAULT_MAX_PIXELS
+) -> int:
+    """
+    估算一张图片消耗的视觉 token 数
+
+    Args:
+        width: 图片宽度
+        height: 图片高度
+        max_pixels: 像素上限
+
+    Returns:
+        token 数（含图片起止两个特殊 token）
+    """
+    w_bar, h_bar = smart_resize(width, height, max_pixels)
+    return w_bar * h_bar // (PATCH_SIZE * PATCH_SIZE) + 2
+
+
+def flatten_transparency(image: Image.Image) -> Image.Image:
+    """
+    把带透明通道的图片合成到白色背景上
+
+    直接转换为 RGB / L 会丢弃 alpha，透明背景上的黑色笔迹会变成全黑。
+
+    Args:
+        image: 原图
+
+    Returns:
+        没有透明通道的图片；原图不透明时原样返回
+    """
+    if image.mode not in ("RGBA", "LA", "PA") and "transparency" not in image.info:
+        return image
+    rgba = image.convert("RGBA")
+    background = Image.new("RGBA", rgba.size, (255, 255, 255, 255))
+    return Image.alpha_composite(background, rgba).convert("RGB")
+
+
+def optimize_image_bytes(
+    data: bytes, profile: VisionImageProfile
+) -> Optional[Tuple[bytes, Dict[str, Any]]]:
+    """
+    生成视觉模型专用的图片（CPU 密集，需在线程中执行）
+
+    Args:
+        data: 原图数据
+        profile: 规格化参数
+
+    Returns:
+        (优化后的图片数据, 尺寸和体积信息)；原图已经足够小时返回None
+
+    Raises:
+        PIL.UnidentifiedImageError: 无法识别的图片
+    """
+    image = Image.open(BytesIO(data))
+    original_width, original_height = image.size
+
+    # EXIF 旋转 90° 时宽高互换，目标尺寸按显示方向计算
+    orientation = image.getexif().get(0x0112, 1)
+    rotated = orientation in (5, 6, 7, 8)
+    display_size = (
+        (original_height, original_width)
+        if rotated
+        else (original_width, original_height)
+    )
+    target = smart_resize(*display_size, profile.max_pixels)
+    # 未超过像素上限时保持原尺寸，对齐 28 的倍数由模型服务端完成
+    needs_resize = display_size[0] * display_size[1] > profile.max_pixels
+
+    # JPEG 在解码阶段按 1/2、1/4、1/8 缩小，大图解码快数倍
+    if needs_resize and image.format == "JPEG":
+        image.draft("RGB", (target[1], target[0]) if rotated else target)
+
+    image = flatten_transparency(ImageOps.exif_transpose(image))
+    image = image.convert("L" if profile.grayscale else "RGB")
+    if needs_resize:
+        image = image.resize(target, Image.Resampling.LANCZOS, reducing_gap=2.0)
+    if profile.autocontrast:
+        image = ImageOps.autocontrast(image, cutoff=1)
+
+    buffer = BytesIO()
+    if profile.format == "jpeg":
+        image.save(buffer, "JPEG", quality=profile.quality, optimize=True)
+    else:
+        image.save(buffer, "WEBP", quality=profile.quality, method=4)
+    optimized = buffer.getvalue()
+
+    if not needs_resize and len(optimized) > len(data) * (1 - MIN_SAVING_RATIO):
+        return None
+
+    return optimized, {
+        "original_width": display_size[0],
+        "original_height": display_size[1],
+        "width": image.width,
+        "height": image.height,
+        "original_bytes": len(data),
+        "bytes": len(optimized),
+        "original_tokens": estimate_vision_tokens(*display_size, profile.max_pixels),
+        "tokens": estimate_vision_tokens(image.width, image.height, profile.max_pixels),
+    }
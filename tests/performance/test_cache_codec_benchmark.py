@@ -0,0 +1,119 @@
+"""
+缓存编解码基准测试
+
+对比旧格式（JSON 尝试失败后回退 pickle）与新格式在典型缓存值上的
+编码/解码耗时和体积：
+- 知识图谱（节点 + 边）
+- 错题列表
+- 学习分析结果
+
+运行: pytest tests/performance/test_cache_codec_benchmark.py -s
+"""
+
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from src.utils.cache_codec import CacheCodec, decode_legacy, encode_legacy
+
+ROUNDS = 200
+
+
+def _knowledge_graph():
+    nodes = [
+        {
+            "id": f"kp-{i}",
+            "name": f"知识点{i}",
+            "mastery_level": i % 100 / 100,
+            "mistake_count": i % 7,
+            "parent_id": f"kp-{i // 5}" if i else None,
+        }
+        for i in range(300)
+    ]
+    edges = [
+        {"source": f"kp-{i}", "target": f"kp-{i + 1}", "type": "prerequisite"}
+        for i in range(299)
+    ]
+    return {"subject": "math", "nodes": nodes, "edges": edges}
+
+
+def _mistake_list():
+    base = datetime(2025, 3, 1)
+    return [
+        {
+            "id": f"00000000-0000-0000-0000-{i:012d}",
+            "subject": "math",
+            "title": f"一元二次方程第{i}题",
+            "ocr_text": "已知 x^2 - 5x + 6 = 0，求方程的解。" * 3,
+            "knowledge_points": ["一元二次方程", "因式分解"],
+            "created_at": base + timedelta(hours=i),
+            "next_review_at": base + timedelta(days=i % 14),
+        }
+        for i in range(50)
+    ]
+
+
+def _analytics():
+    return {
+        "total_questions": 328,
+        "avg_rating": 4.6,
+        "subject_stats": {
+            subject: {"count": 40 + n, "correct_rate": 0.7 + n / 100}
+            for n, subject in enumerate(["math", "physics", "chemistry", "english"])
+        },
+        "daily_activity": [
+            {"date": f"2025-03-{d:02d}", "questions": d % 9} for d in range(1, 31)
+        ],
+    }
+
+
+PAYLOADS = {
+    "knowledge_graph": _knowledge_graph(),
+    "mistake_list": _mistake_list(),
+    "analytics": _analytics(),
+}
+
+
+def _time_per_op(func, arg):
+    started = time.perf_counter()
+    for _ in range(ROUNDS):
+        func(arg)
+    return (time.perf_counter() - started) / ROUNDS * 1e6
+
+
+@pytest.mark.slow
+@pytest.mark.parametrize("name", list(PAYLOADS))
+def test_codec_benchmark(name):
+    """对比新旧格式的编解码耗时（微秒/次）和体积"""
+    value = PAYLOADS[name]
+    codec = CacheCodec(compress_threshold=4096)
+
+    legacy = encode_legacy(value)
+    encoded = codec.encode(value)
+    assert codec.decode(encoded) == value
+    assert codec.decode(legacy) == value
+
+    results = {
+        "legacy": (
+            _time_per_op(encode_legacy, value),
+            _time_per_op(decode_legacy, legacy),
+            len(legacy),
+        ),
+        "v1": (
+            _time_per_op(codec.encode, value),
+            _time_per_op(codec.decode, encoded),
+            len(encoded),
+        ),
+    }
+
+    print(f"\n[{name}]")
+    for fmt, (encode_us, decode_us, size) in results.items():
+        print(
+            f"  {fmt:<7} encode {encode_us:8.1f}us  "
+            f"decode {decode_us:8.1f}us  size {size:>7} B"
+        )
+
+    # 大负载压缩后体积应明显小于旧格式
+    if len(legacy) > codec.compress_threshold:
+        assert results["v1"][2] < results["legacy"][2]
@@ -0,0 +1,111 @@
+"""
+公式输出方式基准测试
+
+对比一条典型数学答案在三种公式输出方式下，客户端完整显示所需的
+数据量和请求数：
+- image：答案文本 + 每个公式一次图片请求
+- svg：data URI 内联在答案中
+- mathml：MathML 内联在答案中
+
+图片体积按本地渲染的 SVG 估算（QuickLaTeX 的 PNG 通常更大），每次图片请求
+另计请求/响应头开销。图片 URL 预先放入热门公式缓存，不发起网络请求。
+
+运行: pytest tests/performance/test_formula_output_benchmark.py -s
+"""
+
+import time
+
+import pytest
+
+from src.schemas.learning import FormulaOutputMode
+from src.services.formula_service import FormulaService, HotFormulaCache
+from src.utils.latex_svg import UnsupportedLatexError, render_latex_svg
+
+ROUNDS = 50
+HTTP_OVERHEAD_BYTES = 500  # 单次图片请求的请求头 + 响应头
+OSS_URL = "https://wuhao-tutor.oss-cn-hangzhou.aliyuncs.com/formula_cache/{key}.svg"
+
+ANSWER = r"""
+解方程 $x^2 - 5x + 6 = 0$。
+
+**第一步**：因式分解得 $(x - 2)(x - 3) = 0$，所以 $x_1 = 2$，$x_2 = 3$。
+
+**第二步**：验证。把 $x = 2$ 代入得 $2^2 - 5 \times 2 + 6 = 0$ ✓；
+把 $x = 3$ 代入得 $3^2 - 5 \times 3 + 6 = 0$ ✓。
+
+**推广**：对 $ax^2 + bx + c = 0$（$a \neq 0$），判别式
+$$\Delta = b^2 - 4ac$$
+当 $\Delta > 0$ 时有两个不等实根，求根公式为
+$$x = \frac{-b \pm \sqrt{\Delta}}{2a}$$
+由韦达定理 $x_1 + x_2 = 5$，$x_1 x_2 = 6$。
+"""
+
+
+@pytest.fixture
+def formula_service():
+    service = FormulaService()
+    service.hot_cache = HotFormulaCache(max_size=1000, trust_seconds=3600)
+    for formula in service._extract_formulas(ANSWER):
+        key = service._generate_cache_key(formula["content"], formula["type"])
+        service.hot_cache.set(key, OSS_URL.format(key=key))
+    return service
+
+
+def _image_bytes(service, formulas):
+    """估算图片模式下需要额外下载的字节数"""
+    total = 0
+    for formula in {f["content"]: f for f in formulas}.values():
+        font_size = service.local_font_sizes[formula["type"]]
+        try:
+            svg = render_latex_svg(formula["content"], font_size)
+        except UnsupportedLatexError:
+            svg = "x" * 2048  # 复杂公式按 2 KB 估算
+        total += len(svg.encode("utf-8")) + HTTP_OVERHEAD_BYTES
+    return total
+
+
+async def _measure(service, mode):
+    """返回 (答案字节数, 额外图片请求数, 总字节数, 每次处理耗时毫秒)"""
+    result = await service.process_text_with_formulas(ANSWER, mode)
+
+    started = time.perf_counter()
+    for _ in range(ROUNDS):
+        await service.process_text_with_formulas(ANSWER, mode)
+    elapsed_ms = (time.perf_counter() - started) / ROUNDS * 1000
+
+    image_formulas = [
+        f
+        for f in service._extract_formulas(ANSWER)
+        if OSS_URL.format(key=service._generate_cache_key(f["content"], f["type"]))
+        in result
+    ]
+    requests = len({f["content"] for f in image_formulas})
+    text_bytes = len(result.encode("utf-8"))
+    return (
+        text_bytes,
+        requests,
+        text_bytes + _image_bytes(service, image_formulas),
+        elapsed_ms,
+    )
+
+
+@pytest.mark.slow
+async def test_formula_output_benchmark(formula_service):
+    """对比三种输出方式的数据量、请求数和处理耗时"""
+    results = {
+        mode.value: await _measure(formula_service, mode) for mode in FormulaOutputMode
+    }
+
+    formula_count = len(formula_service._extract_formulas(ANSWER))
+    print(f"\n[{formula_count} formulas, {len(ANSWER.encode('utf-8'))} B raw answer]")
+    for mode, (text_bytes, requests, total_bytes, elapsed_ms) in results.items():
+        print(
+            f"  {mode:<7} answer {text_bytes:>6} B  image requests {requests:>2}  "
+            f"total {total_bytes:>6} B  process {elapsed_ms:6.2f}ms"
+        )
+
+    image = results["image"]
+    for mode in ("svg", "mathml"):
+        # 只有本地不支持的复杂公式仍需要图片请求
+        assert results[mode][1] < image[1]
+        assert results[mode][2] < image[2]
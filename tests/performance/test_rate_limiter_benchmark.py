@@ -0,0 +1,92 @@
+"""
+进程内限流器基准测试
+
+对比旧的时间戳队列滑动窗口与分桶环形数组滑动窗口在 1 万个不同键下的
+单次请求开销和内存占用。
+
+运行: pytest tests/performance/test_rate_limiter_benchmark.py -s
+"""
+
+import random
+import time
+import tracemalloc
+from collections import deque
+
+import pytest
+
+from src.core.security import SlidingWindowCounter
+
+DISTINCT_KEYS = 10_000
+REQUESTS = 200_000
+WINDOW = 60
+LIMIT = 500
+
+
+class DequeSlidingWindowCounter:
+    """旧实现：每个请求保存一个时间戳"""
+
+    def __init__(self, window_size: int, max_requests: int):
+        self.window_size = window_size
+        self.max_requests = max_requests
+        self.requests: deque = deque()
+
+    def is_allowed(self) -> bool:
+        now = time.time()
+        while self.requests and self.requests[0] <= now - self.window_size:
+            self.requests.popleft()
+
+        if len(self.requests) < self.max_requests:
+            self.requests.append(now)
+            return True
+        return False
+
+
+def _request_keys():
+    rng = random.Random(42)
+    # 20% 的键承担 80% 的请求，模拟少数活跃 IP
+    hot = DISTINCT_KEYS // 5
+    return [
+        f"ip:{rng.randrange(hot) if rng.random() < 0.8 else rng.randrange(DISTINCT_KEYS)}"
+        for _ in range(REQUESTS)
+    ]
+
+
+def _drive(counter_cls, keys):
+    counters = {}
+    for key in keys:
+        counter = counters.get(key)
+        if counter is None:
+            counter = counters[key] = counter_cls(WINDOW, LIMIT)
+        counter.is_allowed()
+    return counters
+
+
+def _run(counter_cls, keys):
+    """返回 (每次请求耗时微秒, 全部计数器占用的内存字节数)"""
+    started = time.perf_counter()
+    _drive(counter_cls, keys)
+    elapsed = time.perf_counter() - started
+
+    # 内存单独测量，避免 tracemalloc 的开销计入耗时
+    tracemalloc.start()
+    counters = _drive(counter_cls, keys)
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del counters
+
+    return elapsed / REQUESTS * 1e6, memory
+
+
+@pytest.mark.slow
+def test_rate_limiter_benchmark():
+    """对比新旧计数器的单次请求开销和内存"""
+    keys = _request_keys()
+    old_us, old_memory = _run(DequeSlidingWindowCounter, keys)
+    new_us, new_memory = _run(SlidingWindowCounter, keys)
+
+    print(f"\n[{DISTINCT_KEYS} keys, {REQUESTS} requests, limit {LIMIT}/{WINDOW}s]")
+    print(f"  deque   {old_us:6.2f}us/req  memory {old_memory / 1024:8.0f} KiB")
+    print(f"  bucket  {new_us:6.2f}us/req  memory {new_memory / 1024:8.0f} KiB")
+
+    # 热点键在窗口内累积数百个时间戳，分桶计数的内存应明显更小
+    assert new_memory < old_memory
@@ -0,0 +1,98 @@
+"""
+视觉模型图片优化基准测试
+
+用一张合成的 4000×3000 手机作业照片（纸张底色 + 文字行 + 传感器噪声），
+对比原图和优化版本：
+- 体积与按 10 Mbps 估算的上游下载耗时
+- 本地处理耗时
+- 不同像素上限下的视觉 token 数
+
+注意：qwen-vl 默认把每张图缩到 1280 个 token 以内，按默认上限缩放只减少
+传输量和上游解码时间，token 数不变；只有把上限调低时 token 才会减少。
+
+运行: pytest tests/performance/test_vision_image_benchmark.py -s
+"""
+
+import time
+from io import BytesIO
+
+import pytest
+from PIL import Image, ImageDraw
+
+from src.utils.vision_image import (
+    PATCH_SIZE,
+    VisionImageProfile,
+    estimate_vision_tokens,
+    optimize_image_bytes,
+)
+
+ROUNDS = 3
+BANDWIDTH_BYTES_PER_SECOND = 10 * 1000 * 1000 / 8
+TOKEN_BUDGETS = (1280, 768, 512)
+
+
+@pytest.fixture(scope="module")
+def homework_photo():
+    width, height = 4000, 3000
+    noise = Image.effect_noise((width, height), 24)
+    paper = Image.merge(
+        "RGB",
+        (
+            noise.point(lambda v: v + 20),
+            noise.point(lambda v: v + 15),
+            noise.point(lambda v: v),
+        ),
+    )
+    draw = ImageDraw.Draw(paper)
+    for row in range(40):
+        y = 200 + row * 65
+        for col in range(0, 3400, 90):
+            draw.rectangle(
+                (300 + col, y, 360 + col, y + 40), outline=(40, 40, 60), width=4
+            )
+    buffer = BytesIO()
+    paper.save(buffer, "JPEG", quality=92)
+    return buffer.getvalue()
+
+
+def _measure(data, profile):
+    """返回 (优化结果, 平均处理耗时毫秒)"""
+    result = optimize_image_bytes(data, profile)
+    started = time.perf_counter()
+    for _ in range(ROUNDS):
+        optimize_image_bytes(data, profile)
+    return result, (time.perf_counter() - started) / ROUNDS * 1000
+
+
+@pytest.mark.slow
+def test_vision_image_benchmark(homework_photo):
+    """对比原图与不同规格优化版本的体积、耗时和 token 数"""
+    original_bytes = len(homework_photo)
+    original_ms = original_bytes / BANDWIDTH_BYTES_PER_SECOND * 1000
+    print(
+        f"\n  original   {original_bytes / 1024:>7.0f} KB  "
+        f"transfer {original_ms:>6.0f}ms  "
+        f"tokens {estimate_vision_tokens(4000, 3000):>5}"
+    )
+
+    for budget in TOKEN_BUDGETS:
+        for grayscale in (False, True):
+            profile = VisionImageProfile(
+                name="bench",
+                max_pixels=budget * PATCH_SIZE * PATCH_SIZE,
+                grayscale=grayscale,
+            )
+            (optimized, info), process_ms = _measure(homework_photo, profile)
+            transfer_ms = len(optimized) / BANDWIDTH_BYTES_PER_SECOND * 1000
+            label = f"{budget}{' gray' if grayscale else ''}"
+            print(
+                f"  {label:<10} {len(optimized) / 1024:>7.0f} KB  "
+                f"transfer {transfer_ms:>6.0f}ms  process {process_ms:>5.0f}ms  "
+                f"{info['width']}x{info['height']}  "
+                f"tokens {estimate_vision_tokens(4000, 3000):>5} -> {info['tokens']:>5}"
+            )
+
+            # 处理耗时加上传输耗时仍远小于直接传原图
+            assert len(optimized) < original_bytes / 10
+            assert process_ms + transfer_ms < original_ms
+            assert info["tokens"] <= budget + 2
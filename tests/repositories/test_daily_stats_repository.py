@@ -0,0 +1,144 @@
+"""
+测试学情日汇总仓储层
+测试 UserDailyStatsRepository 的增量累加与全量重建
+
+作者: AI Agent
+创建时间: 2025-11-25
+版本: v1.0
+"""
+
+from datetime import date, datetime, timedelta
+from uuid import uuid4
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from src.models.base import Base
+from src.models.daily_stats import UNKNOWN_SUBJECT, UserDailyStats
+from src.models.learning import Answer, ChatSession, Question
+from src.models.study import MistakeRecord
+from src.repositories.daily_stats_repository import UserDailyStatsRepository
+from src.repositories.mistake_repository import MistakeRepository
+
+
+@pytest.fixture
+async def db_session():
+    """创建测试数据库会话"""
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:", echo=False)
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    async_session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    async with async_session() as session:
+        yield session
+
+    await engine.dispose()
+
+
+@pytest.fixture
+async def stats_repo(db_session):
+    """创建日汇总仓储实例"""
+    return UserDailyStatsRepository(db_session)
+
+
+class TestUserDailyStatsRepository:
+    """测试学情日汇总仓储"""
+
+    @pytest.mark.asyncio
+    async def test_increment_accumulates(self, db_session, stats_repo):
+        """测试同一天同学科的增量合并到一行"""
+        user_id = str(uuid4())
+
+        assert await stats_repo.increment(user_id, "math", question_count=1)
+        assert await stats_repo.increment(
+            user_id, "math", question_count=1, image_question_count=1
+        )
+        assert await stats_repo.increment(user_id, None, tokens_used=120)
+        await db_session.commit()
+
+        rows = (await db_session.execute(select(UserDailyStats))).scalars().all()
+        by_subject = {row.subject: row for row in rows}
+
+        assert len(rows) == 2
+        assert by_subject["math"].question_count == 2
+        assert by_subject["math"].image_question_count == 1
+        assert by_subject[UNKNOWN_SUBJECT].tokens_used == 120
+
+    @pytest.mark.asyncio
+    async def test_get_daily_series_merges_subjects(self, db_session, stats_repo):
+        """测试按天查询跨学科合并且遵守日期范围"""
+        user_id = str(uuid4())
+        today = date.today()
+        yesterday = today - timedelta(days=1)
+
+        await stats_repo.increment(user_id, "math", today, question_count=2)
+        await stats_repo.increment(user_id, "english", today, question_count=1)
+        await stats_repo.increment(user_id, "math", yesterday, session_count=1)
+        await db_session.commit()
+
+        series = await stats_repo.get_daily_series(user_id)
+        assert [day["date"] for day in series] == [yesterday, today]
+        assert series[1]["question_count"] == 3
+
+        recent = await stats_repo.get_daily_series(user_id, start_date=today)
+        assert len(recent) == 1
+
+    @pytest.mark.asyncio
+    async def test_mistake_create_updates_rollup(self, db_session, stats_repo):
+        """测试通过错题仓储创建错题时同步累加汇总"""
+        user_id = str(uuid4())
+        mistake_repo = MistakeRepository(MistakeRecord, db_session)
+
+        await mistake_repo.create(
+            {"user_id": user_id, "subject": "math", "title": "错题"}
+        )
+
+        series = await stats_repo.get_daily_series(user_id)
+        assert series[0]["mistake_count"] == 1
+
+    @pytest.mark.asyncio
+    async def test_rebuild_matches_source_rows(self, db_session, stats_repo):
+        """测试重建结果与明细表一致，且覆盖旧的汇总行"""
+        user_id = str(uuid4())
+        old = datetime.now() - timedelta(days=10)
+
+        session = ChatSession(user_id=user_id, title="会话", subject="math")
+        db_session.add(session)
+        await db_session.flush()
+
+        question = Question(
+            session_id=session.id,
+            user_id=user_id,
+            content="题目",
+            subject="math",
+            has_images=True,
+        )
+        old_question = Question(
+            session_id=session.id,
+            user_id=user_id,
+            content="旧题目",
+            subject="math",
+            created_at=old.isoformat(),
+        )
+        db_session.add_all([question, old_question])
+        await db_session.flush()
+        db_session.add(Answer(question_id=question.id, content="解答", tokens_used=300))
+        db_session.add(MistakeRecord(user_id=user_id, subject="math", title="错题"))
+
+        # 漏记 / 错记的旧汇总行应被重建覆盖
+        await stats_repo.increment(user_id, "math", question_count=99)
+        await db_session.commit()
+
+        rows = await stats_repo.rebuild(user_id=user_id)
+        assert rows == 2
+
+        series = await stats_repo.get_daily_series(user_id)
+        assert [day["question_count"] for day in series] == [1, 1]
+        assert series[-1]["image_question_count"] == 1
+        assert series[-1]["session_count"] == 1
+        assert series[-1]["mistake_count"] == 1
+        assert series[-1]["tokens_used"] == 300
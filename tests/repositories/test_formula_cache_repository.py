@@ -0,0 +1,50 @@
+"""
+测试公式缓存仓储层
+测试 FormulaCacheRepository 写入缓存记录
+"""
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from src.models.base import Base
+from src.repositories.formula_cache_repository import FormulaCacheRepository
+
+HASH = "b" * 64
+
+
+@pytest.fixture
+async def db_session():
+    """创建测试数据库会话"""
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:", echo=False)
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    async_session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    async with async_session() as session:
+        yield session
+
+    await engine.dispose()
+
+
+class TestFormulaCacheRepository:
+    """测试公式缓存仓储"""
+
+    async def test_create_cache_stores_metadata(self, db_session):
+        """测试新建缓存记录时元数据写入 metadata 列，重复写入返回已有记录"""
+        repo = FormulaCacheRepository(db_session)
+
+        created = await repo.create_cache(
+            latex_hash=HASH,
+            latex_content="x^2",
+            image_url="https://cdn/formula.svg",
+            metadata='{"renderer": "local"}',
+        )
+
+        assert created is not None
+        assert created.extra_metadata == '{"renderer": "local"}'
+        assert (await repo.get_by_hash(HASH)).id == created.id
+        again = await repo.create_cache(HASH, "x^2", "https://cdn/other.svg")
+        assert again.id == created.id
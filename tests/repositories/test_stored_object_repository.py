@@ -0,0 +1,106 @@
+"""
+测试内容寻址存储对象仓储层
+测试 StoredObjectRepository 的引用计数维护
+"""
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from src.models.base import Base
+from src.models.stored_object import StoredObject
+from src.repositories.stored_object_repository import StoredObjectRepository
+
+HASH = "a" * 64
+
+
+@pytest.fixture
+async def db_session():
+    """创建测试数据库会话"""
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:", echo=False)
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    async_session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    async with async_session() as session:
+        yield session
+
+    await engine.dispose()
+
+
+@pytest.fixture
+async def object_repo(db_session):
+    """创建存储对象仓储实例"""
+    return StoredObjectRepository(db_session)
+
+
+def _values(object_key="homework/image/a.jpg", namespace="homework"):
+    return {
+        "namespace": namespace,
+        "content_hash": HASH,
+        "storage_type": "oss",
+        "object_key": object_key,
+        "file_url": f"https://bucket/{object_key}",
+        "file_size": 1024,
+    }
+
+
+class TestStoredObjectRepository:
+    """测试存储对象仓储"""
+
+    async def test_acquire_increments_existing(self, object_repo):
+        """测试命中时引用计数加一，未命中返回None"""
+        assert await object_repo.acquire("homework", HASH, "oss") is None
+
+        created = await object_repo.register(_values())
+        assert created.ref_count == 1
+
+        stored = await object_repo.acquire("homework", HASH, "oss")
+        assert stored.object_key == "homework/image/a.jpg"
+        assert stored.ref_count == 2
+        # 命名空间和存储类型不同都不复用
+        assert await object_repo.acquire("general", HASH, "oss") is None
+        assert await object_repo.acquire("homework", HASH, "local") is None
+
+    async def test_register_conflict_returns_existing(self, object_repo, db_session):
+        """测试并发登记相同内容时保留先登记的对象"""
+        await object_repo.register(_values("homework/image/first.jpg"))
+
+        winner = await object_repo.register(_values("homework/image/second.jpg"))
+
+        assert winner.object_key == "homework/image/first.jpg"
+        assert winner.ref_count == 2
+        rows = (await db_session.execute(select(StoredObject))).scalars().all()
+        assert len(rows) == 1
+
+    async def test_release_deletes_at_zero(self, object_repo, db_session):
+        """测试释放引用，归零时删除记录，未登记的对象返回None"""
+        await object_repo.register(_values())
+        await object_repo.acquire("homework", HASH, "oss")
+
+        assert await object_repo.release("homework", "homework/image/a.jpg") == 1
+        assert await object_repo.release("homework", "homework/image/a.jpg") == 0
+        assert (await db_session.execute(select(StoredObject))).first() is None
+        assert await object_repo.release("homework", "homework/image/a.jpg") is None
+
+    async def test_delete_by_keys(self, object_repo):
+        """测试按对象名删除记录"""
+        await object_repo.register(_values())
+
+        assert (
+            await object_repo.delete_by_keys("homework", ["homework/image/a.jpg"]) == 1
+        )
+        assert await object_repo.acquire("homework", HASH, "oss") is None
+        assert await object_repo.delete_by_keys("homework", []) == 0
+
+    async def test_delete_by_keys_includes_user_namespaces(self, object_repo):
+        """测试按前缀清理时同时删除按用户划分的子命名空间记录"""
+        key = "ai_analysis/user-1/a.jpg"
+        await object_repo.register(_values(key, namespace="ai_analysis:user-1"))
+        await object_repo.register(_values(key, namespace="ai_analysis_other"))
+
+        assert await object_repo.delete_by_keys("ai_analysis", [key]) == 1
+        assert await object_repo.acquire("ai_analysis_other", HASH, "oss")
@@ -0,0 +1,161 @@
+"""
+学情分析服务单元测试
+测试 AnalyticsService.get_learning_stats 的聚合查询
+
+作者: AI Agent
+创建时间: 2025-11-20
+版本: v1.0
+"""
+
+from datetime import datetime, timedelta
+from uuid import uuid4
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from src.models.base import Base
+from src.models.learning import ChatSession, Question
+from src.models.study import MistakeRecord
+from src.repositories.daily_stats_repository import UserDailyStatsRepository
+from src.services.analytics_service import AnalyticsService
+
+# get_learning_stats 允许的最大SQL语句数：
+# 计数总览 + 每日活跃度 + 知识点分组 + 学科分组 + 学习模式
+MAX_LEARNING_STATS_QUERIES = 5
+
+
+@pytest.fixture
+async def db_session():
+    """创建测试数据库会话"""
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:", echo=False)
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    async_session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    async with async_session() as session:
+        yield session
+
+    await engine.dispose()
+
+
+@pytest.fixture
+async def analytics_service(db_session):
+    """创建学情分析服务实例"""
+    return AnalyticsService(db_session)
+
+
+@pytest.fixture
+async def learning_data(db_session):
+    """创建示例学习数据（包含一条超出7天范围的旧问题），并回填日汇总"""
+    user_id = str(uuid4())
+    now = datetime.now()
+    old = now - timedelta(days=60)
+
+    session = ChatSession(user_id=user_id, title="数学会话", subject="math")
+    old_session = ChatSession(
+        user_id=user_id, title="旧会话", subject="math", created_at=old.isoformat()
+    )
+    db_session.add_all([session, old_session])
+    await db_session.flush()
+
+    questions = [
+        Question(
+            session_id=session.id,
+            user_id=user_id,
+            content="一元二次方程怎么解？",
+            subject="math",
+            topic="一元二次方程",
+            difficulty_level=3,
+            has_images=True,
+        ),
+        Question(
+            session_id=session.id,
+            user_id=user_id,
+            content="判别式是什么？",
+            subject="math",
+            topic="一元二次方程",
+            difficulty_level=3,
+        ),
+        Question(
+            session_id=old_session.id,
+            user_id=user_id,
+            content="勾股定理",
+            subject="math",
+            topic="勾股定理",
+            difficulty_level=2,
+            has_images=True,
+            created_at=old.isoformat(),
+        ),
+    ]
+    db_session.add_all(questions)
+
+    db_session.add_all(
+        [
+            MistakeRecord(user_id=user_id, subject="math", title="错题1"),
+            MistakeRecord(
+                user_id=user_id,
+                subject="math",
+                title="错题2",
+                created_at=old.isoformat(),
+            ),
+        ]
+    )
+    await db_session.commit()
+    await UserDailyStatsRepository(db_session).rebuild()
+
+    return user_id
+
+
+class TestAnalyticsService:
+    """测试学情分析服务"""
+
+    @pytest.mark.asyncio
+    async def test_learning_stats_all_range(self, analytics_service, learning_data):
+        """测试全部时间范围的统计结果"""
+        stats = await analytics_service.get_learning_stats(learning_data, "all")
+
+        assert stats["total_questions"] == 3
+        assert stats["total_sessions"] == 2
+        assert stats["total_study_days"] == 2
+        assert stats["total_homework"] == 0
+        assert stats["image_questions"] == 2
+        assert stats["mistake_count"] == 2
+        assert stats["avg_score"] == 0.0
+        assert stats["study_hours"] == round(3 * 5 / 60, 1)
+        assert sum(day["activity"] for day in stats["study_trend"]) == 3
+        assert stats["knowledge_points"][0]["name"] == "一元二次方程"
+
+    @pytest.mark.asyncio
+    async def test_learning_stats_time_range(self, analytics_service, learning_data):
+        """测试时间范围过滤，学习时长仍统计全部时间"""
+        stats = await analytics_service.get_learning_stats(learning_data, "7d")
+
+        assert stats["total_questions"] == 2
+        assert stats["total_sessions"] == 1
+        assert stats["total_study_days"] == 1
+        assert stats["image_questions"] == 1
+        assert stats["mistake_count"] == 1
+        assert stats["study_hours"] == round(3 * 5 / 60, 1)
+
+    @pytest.mark.asyncio
+    async def test_learning_stats_query_count(
+        self, db_session, analytics_service, learning_data
+    ):
+        """测试学习统计的SQL语句数保持固定"""
+        statements = []
+
+        def _count_statement(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        sync_engine = db_session.bind.sync_engine
+        event.listen(sync_engine, "before_cursor_execute", _count_statement)
+        try:
+            await analytics_service.get_learning_stats(learning_data, "30d")
+        finally:
+            event.remove(sync_engine, "before_cursor_execute", _count_statement)
+
+        assert len(statements) <= MAX_LEARNING_STATS_QUERIES, statements
@@ -0,0 +1,124 @@
+"""
+非个性化问答答案缓存测试
+
+测试覆盖：
+- 题干归一化
+- TTL 过期与容量淘汰
+- 个性化提问自动绕过
+- 以流式数据块格式回放
+"""
+
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+import pytest
+
+from src.schemas.learning import AskQuestionRequest
+from src.services import answer_cache as answer_cache_module
+from src.services.answer_cache import (
+    AnswerCache,
+    CachedAnswer,
+    normalize_question,
+    replay_answer,
+)
+from src.services.learning_service import LearningService
+
+
+def _answer(content="顶点式为 y=a(x-h)^2+k", tokens=120):
+    return CachedAnswer(content=content, tokens_used=tokens, model="qwen-turbo")
+
+
+class TestAnswerCache:
+    """测试答案缓存"""
+
+    def test_normalize_question(self):
+        """测试全角、空白和结尾标点差异归一化为同一题干"""
+        assert normalize_question("  什么是  二次函数？ ") == "什么是 二次函数"
+        assert normalize_question("ＡＢＣ\n\tdef?") == "ABC def"
+        assert AnswerCache.make_key(
+            "求 x+1=2 的解。", "math", "qwen-turbo"
+        ) == AnswerCache.make_key("求 x＋1＝2 的解", "math", "qwen-turbo")
+
+    def test_case_is_significant(self):
+        """测试大小写不同的题干（集合 A 与变量 a）不共享缓存"""
+        assert AnswerCache.make_key(
+            "求集合 A 的子集个数", "math", "qwen-turbo"
+        ) != AnswerCache.make_key("求集合 a 的子集个数", "math", "qwen-turbo")
+
+    def test_key_depends_on_subject_and_model(self):
+        """测试学科、模型不同时不共享缓存"""
+        base = AnswerCache.make_key("题目", "math", "qwen-turbo")
+
+        assert base != AnswerCache.make_key("题目", "physics", "qwen-turbo")
+        assert base != AnswerCache.make_key("题目", "math", "qwen-plus")
+
+    def test_hit_miss_and_tokens_saved(self):
+        """测试命中统计和节省的 token"""
+        cache = AnswerCache(enabled=True, ttl=60, max_size=10)
+        key = cache.lookup_key("题目", "math", "qwen-turbo", personalized=False)
+
+        assert cache.get(key) is None
+        cache.set(key, _answer(tokens=120))
+        assert cache.get(key).tokens_used == 120
+
+        stats = cache.get_stats()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 1
+        assert stats["tokens_saved"] == 120
+        assert stats["hit_rate"] == 0.5
+
+    def test_personalized_and_disabled_bypass(self):
+        """测试个性化提问和关闭缓存时不返回缓存键"""
+        cache = AnswerCache(enabled=True, ttl=60, max_size=10)
+        assert cache.lookup_key("题目", "math", "m", personalized=True) is None
+        assert cache.get_stats()["bypassed"] == 1
+
+        disabled = AnswerCache(enabled=False, ttl=60, max_size=10)
+        assert disabled.lookup_key("题目", "math", "m", personalized=False) is None
+
+    def test_ttl_and_lru_eviction(self, monkeypatch):
+        """测试过期和超出容量淘汰最久未使用的条目"""
+        now = [1000.0]
+        monkeypatch.setattr(answer_cache_module.time, "monotonic", lambda: now[0])
+        cache = AnswerCache(enabled=True, ttl=60, max_size=2)
+
+        cache.set("a", _answer())
+        cache.set("b", _answer())
+        cache.get("a")  # a 变为最近使用
+        cache.set("c", _answer())
+
+        assert cache.get("b") is None
+        assert cache.get("a") is not None
+
+        now[0] += 61
+        assert cache.get("a") is None
+        assert cache.get_stats()["size"] == 1
+
+    @pytest.mark.asyncio
+    async def test_replay_matches_stream_chunk_format(self):
+        """测试回放产出与百炼流式一致的数据块"""
+        content = "x" * 70
+        chunks = [chunk async for chunk in replay_answer(_answer(content=content))]
+
+        assert len(chunks) == 3
+        assert "".join(chunk["content"] for chunk in chunks) == content
+        assert chunks[-1]["full_content"] == content
+        assert [chunk["finish_reason"] for chunk in chunks] == [None, None, "stop"]
+        assert chunks[-1]["usage"] == {"total_tokens": 0}
+
+    def test_learning_service_bypasses_personalized_requests(self, monkeypatch):
+        """测试学情上下文、图片、历史对话的提问绕过缓存"""
+        cache = AnswerCache(enabled=True, ttl=60, max_size=10)
+        monkeypatch.setattr("src.services.learning_service.answer_cache", cache)
+        service = LearningService(db=MagicMock())
+        context = SimpleNamespace(subject="math")
+        messages = [{"role": "system"}, {"role": "user"}]
+
+        plain = AskQuestionRequest(content="什么是顶点式", use_context=False)
+        assert service._answer_cache_key(plain, context, messages) is not None
+
+        with_context = AskQuestionRequest(content="什么是顶点式")
+        assert service._answer_cache_key(with_context, context, messages) is None
+
+        with_history = messages[:1] + [{"role": "assistant"}] + messages[1:]
+        assert service._answer_cache_key(plain, context, with_history) is None
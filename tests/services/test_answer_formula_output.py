@@ -0,0 +1,89 @@
+"""
+答案公式输出方式测试
+
+测试覆盖：
+- 后台处理不把某个客户端的输出方式写回答案
+- 查询历史时按请求的输出方式渲染保存的 LaTeX
+"""
+
+from datetime import datetime
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from src.schemas.learning import AskQuestionRequest, FormulaOutputMode
+from src.services.learning_service import LearningService
+
+ANSWER = "顶点式为 $y=a(x-h)^2+k$，顶点是 $(h,k)$。"
+
+
+@pytest.fixture
+def service():
+    svc = LearningService(db=MagicMock())
+    svc.answer_repo = AsyncMock()
+    return svc
+
+
+def _answer(content):
+    now = datetime.now()
+    return SimpleNamespace(
+        id="answer-1",
+        question_id="question-1",
+        content=content,
+        confidence_score=None,
+        related_topics=None,
+        suggested_questions=None,
+        model_name=None,
+        tokens_used=None,
+        generation_time=None,
+        user_rating=None,
+        user_feedback=None,
+        is_helpful=None,
+        created_at=now,
+        updated_at=now,
+    )
+
+
+class TestAnswerFormulaOutput:
+    """测试保存与返回答案时的公式处理"""
+
+    @pytest.mark.asyncio
+    async def test_background_keeps_stored_latex(self, service):
+        """测试后台只预热公式缓存，不覆盖保存的答案"""
+        service.formula_service = AsyncMock()
+        service._update_learning_analytics = AsyncMock()
+        service._auto_create_mistake_if_needed = AsyncMock(return_value=None)
+        request = AskQuestionRequest(
+            content="什么是顶点式？", formula_output=FormulaOutputMode.MATHML
+        )
+
+        await service._background_post_processing(
+            user_id="user-1",
+            question_id="question-1",
+            answer_id="answer-1",
+            full_answer_content=ANSWER,
+            request=request,
+            question=SimpleNamespace(content="什么是顶点式？"),
+            chunk={},
+        )
+
+        service.formula_service.process_text_with_formulas.assert_awaited_once_with(
+            ANSWER, output_mode=FormulaOutputMode.MATHML
+        )
+        service.answer_repo.update.assert_not_awaited()
+
+    @pytest.mark.asyncio
+    async def test_history_renders_requested_mode(self, service):
+        """测试同一条答案按不同客户端的输出方式返回"""
+        stored = _answer(ANSWER)
+
+        (mathml, missing) = await service._render_answers(
+            [stored, None], FormulaOutputMode.MATHML
+        )
+        (svg,) = await service._render_answers([stored], FormulaOutputMode.SVG)
+
+        assert "<math" in mathml.content and "$" not in mathml.content
+        assert "data:image/svg+xml;base64," in svg.content
+        assert missing is None
+        assert stored.content == ANSWER
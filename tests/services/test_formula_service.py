@@ -0,0 +1,380 @@
+"""
+公式渲染服务并发测试
+
+测试覆盖：
+- 重复公式只渲染一次
+- 缓存使用一次批量查询
+- 未命中的公式并发渲染且不超过并发上限
+- 热门公式缓存：信任期、预热、命中次数批量写回
+- 简单公式本地渲染优先，不支持的语法降级到 QuickLaTeX
+- 内联 SVG / MathML 输出方式
+- 批量处理多段文本：一次缓存查询，未命中的公式转后台渲染
+"""
+
+import asyncio
+import time
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+import pytest
+
+from src.schemas.learning import FormulaOutputMode
+from src.services.formula_service import FormulaService, HotFormulaCache
+
+RENDER_LATENCY = 0.05
+
+
+@pytest.fixture
+def formula_service():
+    service = FormulaService()
+    service._render_semaphore = asyncio.Semaphore(4)
+    service.hot_cache = HotFormulaCache(max_size=100, trust_seconds=3600)
+    return service
+
+
+@pytest.fixture
+def formula_repo(monkeypatch):
+    """替换公式缓存仓储，记录批量查询和写回调用"""
+    from src.repositories import formula_cache_repository
+
+    repo = AsyncMock()
+    repo.get_by_hashes.return_value = {}
+    monkeypatch.setattr(
+        formula_cache_repository, "FormulaCacheRepository", lambda db: repo
+    )
+    return repo
+
+
+def _record(latex_hash, url):
+    return SimpleNamespace(latex_hash=latex_hash, image_url=url)
+
+
+def _formulas(contents):
+    return [
+        {"type": "inline", "content": content, "full_match": f"${content}$"}
+        for content in contents
+    ]
+
+
+class TestBatchRenderFormulas:
+    """测试批量公式渲染"""
+
+    async def test_duplicate_formulas_rendered_once(self, formula_service):
+        """测试同一文本中重复的公式只查一次缓存、渲染一次"""
+        formula_service._get_cached_formula_urls = AsyncMock(return_value={})
+        formula_service._render_single_formula = AsyncMock(
+            side_effect=lambda content, *_: f"https://oss/{content}.png"
+        )
+
+        urls = await formula_service._batch_render_formulas(
+            _formulas(["x^2", "y^2", "x^2", "x^2", ""])
+        )
+
+        assert urls == {"x^2": "https://oss/x^2.png", "y^2": "https://oss/y^2.png"}
+        assert formula_service._render_single_formula.await_count == 2
+        formula_service._get_cached_formula_urls.assert_awaited_once()
+        (cache_keys,) = formula_service._get_cached_formula_urls.await_args.args
+        assert len(cache_keys) == 2
+
+    async def test_cached_formulas_skip_rendering(self, formula_service):
+        """测试缓存命中的公式不再渲染"""
+        cached_key = formula_service._generate_cache_key("a+b", "inline")
+        formula_service._get_cached_formula_urls = AsyncMock(
+            return_value={cached_key: "https://oss/cached.png"}
+        )
+        formula_service._render_single_formula = AsyncMock(
+            return_value="https://oss/new.png"
+        )
+
+        urls = await formula_service._batch_render_formulas(_formulas(["a+b", "c+d"]))
+
+        assert urls == {"a+b": "https://oss/cached.png", "c+d": "https://oss/new.png"}
+        formula_service._render_single_formula.assert_awaited_once()
+
+    async def test_render_failure_does_not_affect_others(self, formula_service):
+        """测试单个公式渲染异常时其余公式照常返回"""
+        formula_service._get_cached_formula_urls = AsyncMock(return_value={})
+
+        async def render(content, *_):
+            if content == "bad":
+                raise RuntimeError("QuickLaTeX 超时")
+            return f"https://oss/{content}.png"
+
+        formula_service._render_single_formula = render
+
+        urls = await formula_service._batch_render_formulas(_formulas(["ok", "bad"]))
+
+        assert urls == {"ok": "https://oss/ok.png"}
+
+    async def test_misses_rendered_concurrently_within_limit(self, formula_service):
+        """测试未命中的公式并发渲染，且同时进行的渲染数不超过上限"""
+        formula_service._get_cached_formula_urls = AsyncMock(return_value={})
+        in_flight = 0
+        peak = 0
+
+        async def render(content, *_):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(RENDER_LATENCY)
+            in_flight -= 1
+            return f"https://oss/{content}.png"
+
+        formula_service._render_single_formula = render
+
+        started = time.perf_counter()
+        urls = await formula_service._batch_render_formulas(
+            _formulas([f"x_{i}" for i in range(12)])
+        )
+        elapsed = time.perf_counter() - started
+
+        assert len(urls) == 12
+        assert peak == 4
+        # 12 个公式、并发 4，约 3 轮渲染延迟，串行则需要 12 轮
+        assert elapsed < RENDER_LATENCY * 6
+
+
+class TestCachedFormulaLookup:
+    """测试缓存批量查询"""
+
+    async def test_batched_lookup_and_hit_count(self, formula_service, formula_repo):
+        """测试一次 IN 查询取回全部缓存，命中次数累计到内存等待写回"""
+        keys = [
+            formula_service._generate_cache_key(f"x_{i}", "inline") for i in range(3)
+        ]
+        formula_repo.get_by_hashes.return_value = {
+            key: _record(key, f"https://oss/{key}.png") for key in keys[:2]
+        }
+        formula_service._verify_url = AsyncMock(side_effect=[True, False])
+        formula_service._get_oss_cached_url = AsyncMock(return_value=None)
+
+        urls = await formula_service._get_cached_formula_urls(keys)
+
+        assert urls == {keys[0]: f"https://oss/{keys[0]}.png"}
+        formula_repo.get_by_hashes.assert_awaited_once_with(keys)
+        formula_repo.increment_hit_counts.assert_not_awaited()
+        assert formula_service.hot_cache.drain_hits() == {keys[0]: 1}
+        # 只有数据库中不存在的公式才检查 OSS
+        formula_service._get_oss_cached_url.assert_awaited_once_with(keys[2])
+
+
+class TestHotFormulaCache:
+    """测试热门公式缓存"""
+
+    async def test_trusted_hit_skips_db_and_head(self, formula_service, formula_repo):
+        """测试信任期内的热门公式不查数据库也不发 HEAD 请求"""
+        formula_service.hot_cache.set("hash-a", "https://oss/a.png")
+        formula_service._verify_url = AsyncMock(return_value=True)
+
+        urls = await formula_service._get_cached_formula_urls(["hash-a"])
+
+        assert urls == {"hash-a": "https://oss/a.png"}
+        formula_service._verify_url.assert_not_awaited()
+        formula_repo.get_by_hashes.assert_not_awaited()
+
+    async def test_expired_trust_revalidates_once(self, formula_service, formula_repo):
+        """测试信任期已过的 URL 重新校验，有效则续期，失效则移除"""
+        formula_service.hot_cache = HotFormulaCache(max_size=10, trust_seconds=0)
+        formula_service.hot_cache.set("hash-ok", "https://oss/ok.png")
+        formula_service.hot_cache.set("hash-gone", "https://oss/gone.png")
+        formula_service._verify_url = AsyncMock(side_effect=[True, False])
+
+        urls = await formula_service._get_cached_formula_urls(["hash-ok", "hash-gone"])
+
+        assert urls == {"hash-ok": "https://oss/ok.png"}
+        assert formula_service._verify_url.await_count == 2
+        assert formula_service.hot_cache.get("hash-gone") is None
+        # 失效的 URL 与数据库中记录相同，直接重新渲染
+        formula_repo.get_by_hashes.assert_not_awaited()
+
+    async def test_rendered_formula_cached(self, formula_service, formula_repo):
+        """测试新渲染的公式写入热门缓存，再次出现时不再查库"""
+        formula_service._render_single_formula = AsyncMock(
+            return_value="https://oss/new.png"
+        )
+
+        await formula_service._batch_render_formulas(_formulas(["e^x"]))
+        urls = await formula_service._batch_render_formulas(_formulas(["e^x"]))
+
+        assert urls == {"e^x": "https://oss/new.png"}
+        formula_service._render_single_formula.assert_awaited_once()
+        formula_repo.get_by_hashes.assert_awaited_once()
+
+    async def test_preload_hot_formulas(self, formula_service, formula_repo):
+        """测试按命中次数预热，最热的公式最后被淘汰"""
+        formula_service.hot_cache = HotFormulaCache(max_size=2, trust_seconds=3600)
+        formula_repo.get_hot_formulas.return_value = [
+            _record("hot", "https://oss/hot.png"),
+            _record("warm", "https://oss/warm.png"),
+        ]
+
+        loaded = await formula_service.preload_hot_formulas(limit=10)
+        formula_service.hot_cache.set("new", "https://oss/new.png")
+
+        assert loaded == 2
+        formula_repo.get_hot_formulas.assert_awaited_once_with(2)
+        assert formula_service.hot_cache.get("hot") == ("https://oss/hot.png", True)
+        assert formula_service.hot_cache.get("warm") is None
+
+    async def test_flush_hit_counts_batched(self, formula_service, formula_repo):
+        """测试命中次数合并后一次写回"""
+        formula_service.hot_cache.record_hits(["a", "b", "a"])
+        formula_service.hot_cache.record_hits(["a"])
+
+        flushed = await formula_service.flush_hit_counts()
+
+        assert flushed == 4
+        formula_repo.increment_hit_counts.assert_awaited_once_with({"a": 3, "b": 1})
+        assert await formula_service.flush_hit_counts() == 0
+
+
+class TestLocalRendering:
+    """测试简单公式本地渲染"""
+
+    @pytest.fixture(autouse=True)
+    def _no_db_cache(self, formula_service):
+        formula_service._save_to_db_cache = AsyncMock()
+
+    async def test_simple_formula_skips_quicklatex(self, formula_service):
+        """测试简单公式在本地渲染为 SVG 并上传，不请求 QuickLaTeX"""
+        formula_service._call_quicklatex_api_with_fallback = AsyncMock()
+        formula_service._upload_to_oss = AsyncMock(return_value="https://oss/x.svg")
+
+        url = await formula_service._render_single_formula("x^2+1", "inline", "k1")
+
+        assert url == "https://oss/x.svg"
+        formula_service._call_quicklatex_api_with_fallback.assert_not_awaited()
+        svg, cache_key, _ = formula_service._upload_to_oss.await_args.args
+        assert svg.startswith("<svg") and cache_key == "k1"
+        formula_service._save_to_db_cache.assert_awaited_once()
+
+    async def test_offline_returns_data_uri(self, formula_service):
+        """测试 OSS 不可用时返回内联 SVG，不写数据库缓存"""
+        formula_service._upload_to_oss = AsyncMock(return_value=None)
+
+        url = await formula_service._render_single_formula(
+            r"\alpha + \beta", "inline", "k2"
+        )
+
+        assert url.startswith("data:image/svg+xml;base64,")
+        formula_service._save_to_db_cache.assert_not_awaited()
+
+    async def test_unsupported_syntax_falls_back(self, formula_service):
+        """测试本地不支持的语法降级到 QuickLaTeX"""
+        formula_service._call_quicklatex_api_with_fallback = AsyncMock(
+            return_value="<svg>remote</svg>"
+        )
+        formula_service._upload_to_oss = AsyncMock(return_value="https://oss/r.svg")
+
+        url = await formula_service._render_single_formula("x^{2^n}", "inline", "k3")
+
+        assert url == "https://oss/r.svg"
+        formula_service._call_quicklatex_api_with_fallback.assert_awaited_once()
+
+
+class TestInlineOutputModes:
+    """测试内联公式输出方式"""
+
+    TEXT = r"由 $x^2 - 4 = 0$ 得 $$x = \pm 2$$，再验证 $\frac{1}{x}$。"
+
+    @pytest.fixture(autouse=True)
+    def _image_fallback(self, formula_service):
+        formula_service._batch_render_formulas = AsyncMock(
+            return_value={r"\frac{1}{x}": "https://oss/frac.png"}
+        )
+
+    async def test_mathml_mode(self, formula_service):
+        """测试 MathML 模式内联简单公式，本地不支持的公式仍使用图片"""
+        result = await formula_service.process_text_with_formulas(
+            self.TEXT, output_mode="mathml"
+        )
+
+        assert result.count("<math ") == 2
+        assert 'display="block"' in result and "math-formula-block" in result
+        assert '<img class="math-formula-inline" src="https://oss/frac.png"' in result
+        (remaining,) = formula_service._batch_render_formulas.await_args.args
+        assert [f["content"] for f in remaining] == [r"\frac{1}{x}"]
+
+    async def test_svg_mode_keeps_image_tags(self, formula_service):
+        """测试 SVG 模式输出 data URI 图片标签，小程序解析规则不变"""
+        result = await formula_service.process_text_with_formulas(
+            self.TEXT, output_mode=FormulaOutputMode.SVG
+        )
+
+        assert result.count('src="data:image/svg+xml;base64,') == 2
+        assert '<img class="math-formula-inline" src="data:image/svg+xml' in result
+        assert "https://oss/frac.png" in result
+
+    async def test_inline_fragments_cached(self, formula_service, monkeypatch):
+        """测试内联片段按内容哈希缓存，不支持的公式也只解析一次"""
+        calls = []
+        render_batch = formula_service._render_inline_batch
+
+        def counting_batch(pending, mode):
+            calls.append(sorted(pending))
+            return render_batch(pending, mode)
+
+        monkeypatch.setattr(formula_service, "_render_inline_batch", counting_batch)
+
+        first = await formula_service.process_text_with_formulas(self.TEXT, "mathml")
+        second = await formula_service.process_text_with_formulas(self.TEXT, "mathml")
+
+        assert first == second
+        assert len(calls) == 1 and len(calls[0]) == 3
+
+    async def test_unknown_mode_falls_back_to_image(self, formula_service):
+        """测试未知的输出方式回退到图片模式"""
+        await formula_service.process_text_with_formulas(self.TEXT, "png")
+
+        (formulas,) = formula_service._batch_render_formulas.await_args.args
+        assert len(formulas) == 3
+
+
+class TestBatchedTextProcessing:
+    """测试读取路径上批量处理多段文本"""
+
+    async def test_single_lookup_and_background_render(
+        self, formula_service, formula_repo
+    ):
+        """测试整页文本只查一次缓存，不校验 URL、不在请求中渲染"""
+        hot_key = formula_service._generate_cache_key("a+b", "inline")
+        db_key = formula_service._generate_cache_key("x^2", "inline")
+        formula_service.hot_cache.set(hot_key, "https://oss/hot.png")
+        formula_repo.get_by_hashes.return_value = {
+            db_key: _record(db_key, "https://oss/db.png")
+        }
+        formula_service._verify_url = AsyncMock(return_value=True)
+        formula_service._batch_render_formulas = AsyncMock(return_value={})
+        texts = [
+            "由 $a+b$ 和 $x^2$ 得 $y-1$",
+            "",
+            r"再算 $x^2$ 与 $\frac{1}{x}$",
+        ]
+
+        first, empty, second = await formula_service.process_texts_with_formulas(
+            texts, output_mode="image"
+        )
+
+        formula_repo.get_by_hashes.assert_awaited_once()
+        (queried,) = formula_repo.get_by_hashes.await_args.args
+        assert hot_key not in queried and len(queried) == 3
+        formula_service._verify_url.assert_not_awaited()
+        assert 'src="https://oss/hot.png"' in first
+        assert first.count('src="https://oss/db.png"') == 1
+        # 本地能渲染的未命中公式先内联 SVG，不支持的保留 LaTeX
+        assert "data:image/svg+xml;base64," in first
+        assert empty == ""
+        assert r"$\frac{1}{x}$" in second
+
+        await asyncio.gather(*formula_service._background_renders)
+        (rendered,) = formula_service._batch_render_formulas.await_args.args
+        assert sorted(f["content"] for f in rendered) == [r"\frac{1}{x}", "y-1"]
+        assert not formula_service._queued_renders
+
+    async def test_lookup_failure_keeps_text(self, formula_service, formula_repo):
+        """测试缓存查询失败时不影响读取"""
+        formula_repo.get_by_hashes.side_effect = RuntimeError("db down")
+        formula_service._batch_render_formulas = AsyncMock(return_value={})
+        text = r"$\frac{1}{x}$"
+
+        assert await formula_service.process_texts_with_formulas([text]) == [text]
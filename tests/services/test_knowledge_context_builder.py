@@ -4,6 +4,8 @@ KnowledgeContextBuilder 服务单元测试
 测试用户学情上下文构建的各个核心功能
 """
 
+import asyncio
+import time
 from datetime import datetime, timedelta
 from unittest.mock import AsyncMock
 
@@ -326,6 +328,115 @@ class TestKnowledgeContextBuilderPrivateMethods:
         assert len(result) == 0
 
 
+class TestKnowledgeContextBuilderCache:
+    """测试子分析并发执行与学情上下文缓存"""
+
+    ANALYSES = (
+        "_analyze_weak_knowledge_points",
+        "_extract_learning_preferences",
+        "_generate_context_summary",
+        "_get_recent_errors",
+        "_get_knowledge_mastery",
+        "_analyze_study_patterns",
+    )
+
+    @pytest.fixture
+    def builder(self):
+        """各项子分析被替换为耗时 50ms 的假实现"""
+        builder = KnowledgeContextBuilder()
+        builder.cache_ttl = 60
+        builder.calls = 0
+
+        async def slow_analysis(session, user_id, subject):
+            builder.calls += 1
+            await asyncio.sleep(0.05)
+            return []
+
+        for name in self.ANALYSES:
+            setattr(builder, name, slow_analysis)
+        return builder
+
+    @pytest.mark.asyncio
+    async def test_analyses_run_concurrently(self, builder):
+        """测试子分析并发执行，总耗时接近单项耗时"""
+        started = time.perf_counter()
+        await builder.build_context("user-1", "math", use_cache=False)
+        elapsed = time.perf_counter() - started
+
+        assert builder.calls == len(self.ANALYSES)
+        assert elapsed < 0.05 * len(self.ANALYSES) / 2
+
+    @pytest.mark.asyncio
+    async def test_sessions_bounded_across_requests(self, builder):
+        """测试多个请求同时未命中缓存时，同时打开的会话数不超过共享上限"""
+        builder._session_slots = asyncio.Semaphore(3)
+        active = 0
+        peak = 0
+
+        async def tracked_analysis(session, user_id, subject):
+            nonlocal active, peak
+            active += 1
+            peak = max(peak, active)
+            await asyncio.sleep(0.01)
+            active -= 1
+            return []
+
+        for name in self.ANALYSES:
+            setattr(builder, name, tracked_analysis)
+
+        await asyncio.gather(
+            *(builder.build_context(f"user-{i}", "math") for i in range(5))
+        )
+
+        assert peak == 3
+
+    @pytest.mark.asyncio
+    async def test_context_cached_per_user_and_subject(self, builder):
+        """测试同一 (用户, 学科) 命中缓存，不同学科分别构建"""
+        first = await builder.build_context("user-1", "math")
+        second = await builder.build_context("user-1", "math")
+        await builder.build_context("user-1", "english")
+
+        assert second is first
+        assert builder.calls == 2 * len(self.ANALYSES)
+
+    @pytest.mark.asyncio
+    async def test_invalidate_drops_all_subjects_of_user(self, builder):
+        """测试失效某用户后重新构建，其他用户不受影响"""
+        await builder.build_context("user-1", "math")
+        await builder.build_context("user-1", None)
+        await builder.build_context("user-2", "math")
+
+        builder.invalidate("user-1")
+        builder.calls = 0
+
+        await builder.build_context("user-1", "math")
+        await builder.build_context("user-1", None)
+        await builder.build_context("user-2", "math")
+
+        assert builder.calls == 2 * len(self.ANALYSES)
+
+    @pytest.mark.asyncio
+    async def test_invalidate_during_build_skips_caching(self, builder):
+        """测试构建过程中发生失效时，不缓存旧结果"""
+        task = asyncio.create_task(builder.build_context("user-1", "math"))
+        await asyncio.sleep(0.01)
+        builder.invalidate("user-1")
+        await task
+
+        assert builder._get_cached(("user-1", "math")) is None
+
+    @pytest.mark.asyncio
+    async def test_expired_entry_is_rebuilt(self, builder):
+        """测试过期条目重新构建"""
+        builder.cache_ttl = 0.01
+        await builder.build_context("user-1", "math")
+        await asyncio.sleep(0.02)
+        await builder.build_context("user-1", "math")
+
+        assert builder.calls == 2 * len(self.ANALYSES)
+
+
 # 参数化测试数据
 @pytest.mark.parametrize(
     "time_decay_factor,expected_min_weight",
@@ -7,6 +7,8 @@
 版本: v1.0
 """
 
+from datetime import datetime, timedelta
+from unittest.mock import AsyncMock
 from uuid import uuid4
 
 import pytest
@@ -14,7 +16,8 @@ from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker
 
 from src.models.base import Base
-from src.models.study import KnowledgeMastery
+from src.models.knowledge_graph import UserKnowledgeGraphSnapshot
+from src.models.study import KnowledgeMastery, MistakeRecord
 from src.services.knowledge_graph_service import KnowledgeGraphService
 
 
@@ -255,6 +258,89 @@ class TestKnowledgeGraphService:
                 assert dist["mastered"] > 0
 
 
+class TestIncrementalSnapshot:
+    """测试增量知识图谱快照"""
+
+    @pytest.fixture
+    async def previous_snapshot(self, db_session, sample_user_id):
+        """创建一份上一日快照，掌握度数据早于快照"""
+        yesterday = datetime.now() - timedelta(days=1)
+        db_session.add(
+            KnowledgeMastery(
+                user_id=sample_user_id,
+                subject="math",
+                knowledge_point="二次函数",
+                mastery_level=0.3,
+                updated_at=(yesterday - timedelta(hours=1)).isoformat(),
+            )
+        )
+        snapshot = UserKnowledgeGraphSnapshot(
+            user_id=str(sample_user_id),
+            subject="math",
+            period_type="daily",
+            knowledge_points=[{"name": "二次函数", "mastery": 0.3}],
+            total_mistakes=5,
+            average_mastery=0.3,
+            created_at=yesterday.isoformat(),
+        )
+        db_session.add(snapshot)
+        await db_session.commit()
+        return snapshot
+
+    @pytest.mark.asyncio
+    async def test_unchanged_user_clones_previous_snapshot(
+        self, kg_service, sample_user_id, previous_snapshot, monkeypatch
+    ):
+        """测试源数据无变化时复制上一份快照，不重建"""
+        rebuild = AsyncMock()
+        monkeypatch.setattr(kg_service, "create_knowledge_graph_snapshot", rebuild)
+
+        snapshot, rebuilt = await kg_service.create_incremental_snapshot(
+            sample_user_id, "math"
+        )
+
+        assert rebuilt is False
+        rebuild.assert_not_called()
+        assert snapshot.id != previous_snapshot.id
+        assert snapshot.previous_snapshot_id == str(previous_snapshot.id)
+        assert snapshot.knowledge_points == previous_snapshot.knowledge_points
+        assert snapshot.total_mistakes == 5
+
+    @pytest.mark.asyncio
+    async def test_new_mistake_triggers_rebuild(
+        self, db_session, kg_service, sample_user_id, previous_snapshot, monkeypatch
+    ):
+        """测试快照后新增错题时完整重建"""
+        db_session.add(
+            MistakeRecord(user_id=str(sample_user_id), subject="math", title="新错题")
+        )
+        await db_session.commit()
+
+        rebuild = AsyncMock(return_value=previous_snapshot)
+        monkeypatch.setattr(kg_service, "create_knowledge_graph_snapshot", rebuild)
+
+        _, rebuilt = await kg_service.create_incremental_snapshot(
+            sample_user_id, "math"
+        )
+
+        assert rebuilt is True
+        rebuild.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_other_subject_changes_are_ignored(
+        self, db_session, kg_service, sample_user_id, previous_snapshot
+    ):
+        """测试其他学科的变更不影响当前学科的高水位"""
+        db_session.add(
+            MistakeRecord(
+                user_id=str(sample_user_id), subject="english", title="英语错题"
+            )
+        )
+        await db_session.commit()
+
+        assert not await kg_service.snapshot_repo.is_snapshot_stale(previous_snapshot)
+
+
 if __name__ == "__main__":
     """直接运行测试"""
     pytest.main([__file__, "-v", "-s"])
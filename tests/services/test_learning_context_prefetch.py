@@ -0,0 +1,153 @@
+"""
+流式问答上下文预取（低延迟模式）测试
+
+测试覆盖：
+- 预算内就绪的学情/作业上下文被合并
+- 超出预算的部分被省略并记录
+- 预取失败降级为省略
+"""
+
+import asyncio
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from src.core.monitoring import get_metrics_collector
+from src.schemas.learning import AskQuestionRequest
+from src.services import knowledge_context_builder as builder_module
+from src.services import learning_service as learning_service_module
+from src.services.bailian_service import ChatMessage, MessageRole
+from src.services.learning_service import LearningService
+
+
+def _learning_context():
+    """无薄弱知识点的学情上下文（新学习者）"""
+    return SimpleNamespace(weak_knowledge_points=[])
+
+
+@pytest.fixture
+def service(monkeypatch):
+    """替换数据库相关依赖的 LearningService"""
+    svc = LearningService(db=MagicMock())
+    svc._apply_user_profile = AsyncMock()
+    svc._get_conversation_history = AsyncMock(
+        return_value=[ChatMessage(role=MessageRole.USER, content="上一个问题")]
+    )
+    return svc
+
+
+@pytest.fixture
+def chat_session():
+    return SimpleNamespace(id="session-1", subject="math")
+
+
+def _patch_sources(monkeypatch, service, learning_delay, homework_delay, **kwargs):
+    async def build_context(**_):
+        await asyncio.sleep(learning_delay)
+        if kwargs.get("learning_error"):
+            raise RuntimeError("builder down")
+        return _learning_context()
+
+    async def homework(user_id, subject):
+        await asyncio.sleep(homework_delay)
+        return {"recent_homework_count": 2}
+
+    monkeypatch.setattr(
+        builder_module.knowledge_context_builder, "build_context", build_context
+    )
+    service._get_homework_context_isolated = homework
+
+
+class TestContextPrefetch:
+    """测试时间预算内的上下文预取"""
+
+    @pytest.mark.asyncio
+    async def test_all_parts_ready_within_budget(
+        self, monkeypatch, service, chat_session
+    ):
+        _patch_sources(monkeypatch, service, 0, 0)
+        request = AskQuestionRequest(content="什么是顶点式？")
+
+        context, messages = await service._build_context_within_budget(
+            "user-1", chat_session, request, budget_seconds=1.0
+        )
+
+        assert context.metadata["is_new_learner"] is True
+        assert context.metadata["recent_homework_count"] == 2
+        assert "dropped_context" not in context.metadata
+        # 系统提示词 + 预加载的历史 + 当前问题
+        assert [m.role for m in messages] == [
+            MessageRole.SYSTEM,
+            MessageRole.USER,
+            MessageRole.USER,
+        ]
+
+    @pytest.mark.asyncio
+    async def test_straggler_is_dropped_and_recorded(
+        self, monkeypatch, service, chat_session
+    ):
+        _patch_sources(monkeypatch, service, 0, 5)
+        request = AskQuestionRequest(content="什么是顶点式？")
+        before = get_metrics_collector().get_counters("context_prefetch_dropped")
+
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        context, _ = await service._build_context_within_budget(
+            "user-1", chat_session, request, budget_seconds=0.05
+        )
+
+        assert loop.time() - started < 1
+        assert context.metadata["dropped_context"] == ["homework_context"]
+        assert context.metadata["mcp_context_generated"] is True
+        assert "recent_homework_count" not in context.metadata
+
+        after = get_metrics_collector().get_counters("context_prefetch_dropped")
+        key = "part=homework_context"
+        assert after[key] == before.get(key, 0) + 1
+
+    @pytest.mark.asyncio
+    async def test_failed_part_is_dropped(self, monkeypatch, service, chat_session):
+        _patch_sources(monkeypatch, service, 0, 0, learning_error=True)
+        request = AskQuestionRequest(content="什么是顶点式？", include_history=False)
+
+        context, messages = await service._build_context_within_budget(
+            "user-1", chat_session, request, budget_seconds=1.0
+        )
+
+        assert context.metadata["dropped_context"] == ["learning_context"]
+        assert context.metadata["mcp_context_failed"] is True
+        service._get_conversation_history.assert_not_called()
+        assert len(messages) == 2
+
+    @pytest.mark.asyncio
+    async def test_slow_learning_context_finishes_in_background(
+        self, monkeypatch, service, chat_session
+    ):
+        """测试超出预算的学情上下文不被取消，在后台完成以填充缓存"""
+        finished = []
+
+        async def build_context(**_):
+            await asyncio.sleep(0.1)
+            finished.append(True)
+            return _learning_context()
+
+        monkeypatch.setattr(
+            builder_module.knowledge_context_builder, "build_context", build_context
+        )
+        service._get_homework_context_isolated = AsyncMock(return_value=None)
+        timer = MagicMock()
+        request = AskQuestionRequest(content="什么是顶点式？")
+
+        context, _ = await service._build_context_within_budget(
+            "user-1", chat_session, request, budget_seconds=0.02, timer=timer
+        )
+
+        assert context.metadata["dropped_context"] == ["learning_context"]
+        assert [c.args[0] for c in timer.mark.call_args_list] == [
+            "history_fetch",
+            "context_build",
+        ]
+        await asyncio.gather(*learning_service_module._context_warmups)
+        assert finished == [True]
+        assert not learning_service_module._context_warmups
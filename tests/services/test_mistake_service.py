@@ -10,12 +10,16 @@
 from uuid import uuid4
 
 import pytest
+from sqlalchemy import event
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker
 
 from src.models.base import Base
+from src.models.knowledge_graph import MistakeKnowledgePoint
+from src.models.study import KnowledgeMastery, MistakeRecord
 from src.schemas.mistake import CreateMistakeRequest
-from src.services.mistake_service import MistakeService
+from src.services import mistake_service as mistake_service_module
+from src.services.mistake_service import MistakeService, invalidate_mistake_list_cache
 
 
 @pytest.fixture
@@ -114,6 +118,184 @@ class TestMistakeService:
         assert "math" in stats.by_subject or "english" in stats.by_subject
 
 
+# 一页错题列表允许的最大SQL语句数：count + 分页查询 + 关联IN查询 + 掌握度IN查询
+MAX_LIST_PAGE_QUERIES = 4
+
+
+class DictCacheManager:
+    """只实现批量接口的内存缓存替身，记录调用次数"""
+
+    def __init__(self):
+        self.values = {}
+        self.tags = {}
+        self.calls = []
+
+    async def get_many(self, keys, namespace=""):
+        self.calls.append("get_many")
+        return {k: self.values[k] for k in keys if k in self.values}
+
+    async def set_many(self, items, ttl=None, namespace="", tags=None):
+        self.calls.append("set_many")
+        self.values.update(items)
+        for tag in tags or []:
+            self.tags.setdefault(tag, set()).update(items)
+        return True
+
+    async def invalidate_tags(self, *tags):
+        for tag in tags:
+            for key in self.tags.pop(tag, set()):
+                self.values.pop(key, None)
+        return 0
+
+
+@pytest.fixture
+async def page_with_associations(db_session):
+    """创建一整页带知识点关联的错题"""
+    user_id = uuid4()
+
+    masteries = []
+    for i in range(5):
+        mastery = KnowledgeMastery(
+            id=str(uuid4()),
+            user_id=user_id,
+            subject="math",
+            knowledge_point=f"知识点{i}",
+            mastery_level=0.1 * i,
+        )
+        db_session.add(mastery)
+        masteries.append(mastery)
+
+    for i in range(20):
+        mistake = MistakeRecord(
+            id=str(uuid4()),
+            user_id=str(user_id),
+            subject="math",
+            title=f"错题 {i + 1}",
+            ocr_text=f"题目内容 {i + 1}",
+        )
+        db_session.add(mistake)
+        for j in range(4):
+            db_session.add(
+                MistakeKnowledgePoint(
+                    mistake_id=mistake.id,
+                    knowledge_point_id=masteries[(i + j) % 5].id,
+                    relevance_score=0.9 - 0.1 * j,
+                    is_primary=j == 0,
+                    error_type="calculation_error",
+                )
+            )
+
+    await db_session.commit()
+    return user_id, masteries
+
+
+class TestMistakeListQueryCount:
+    """错题列表查询次数回归测试（防止 N+1）"""
+
+    @pytest.mark.asyncio
+    async def test_list_page_query_count_is_constant(
+        self, db_session, mistake_service, page_with_associations
+    ):
+        """测试整页列表的SQL语句数与页大小无关"""
+        user_id, _ = page_with_associations
+
+        statements = []
+
+        def _count_statement(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        sync_engine = db_session.bind.sync_engine
+        event.listen(sync_engine, "before_cursor_execute", _count_statement)
+        try:
+            result = await mistake_service.get_mistake_list(
+                user_id=user_id, page=1, page_size=20
+            )
+        finally:
+            event.remove(sync_engine, "before_cursor_execute", _count_statement)
+
+        assert len(result.items) == 20
+        assert len(statements) <= MAX_LIST_PAGE_QUERIES, statements
+
+    @pytest.mark.asyncio
+    async def test_list_items_include_top_associations(
+        self, mistake_service, page_with_associations
+    ):
+        """测试批量加载的关联信息与逐条加载结果一致"""
+        user_id, masteries = page_with_associations
+        names = {str(m.id): m.knowledge_point for m in masteries}
+
+        result = await mistake_service.get_mistake_list(
+            user_id=user_id, page=1, page_size=20
+        )
+
+        for item in result.items:
+            associations = item.knowledge_point_associations
+            assert len(associations) == 3
+            assert associations[0]["is_primary"] is True
+            scores = [a["relevance_score"] for a in associations]
+            assert scores == sorted(scores, reverse=True)
+            for assoc in associations:
+                assert (
+                    assoc["knowledge_point_name"] == names[assoc["knowledge_point_id"]]
+                )
+
+
+class TestMistakeListCache:
+    """错题列表知识点关联缓存测试"""
+
+    @pytest.fixture
+    def fake_cache(self, monkeypatch):
+        cache = DictCacheManager()
+        monkeypatch.setattr(mistake_service_module, "cache_manager", cache)
+        monkeypatch.setattr(mistake_service_module.settings, "CACHE_ENABLED", True)
+        return cache
+
+    @pytest.mark.asyncio
+    async def test_cached_page_skips_association_queries(
+        self, db_session, mistake_service, page_with_associations, fake_cache
+    ):
+        """测试第二次加载整页只读一次缓存，不再查询关联表和掌握度表"""
+        user_id, _ = page_with_associations
+        first = await mistake_service.get_mistake_list(
+            user_id=user_id, page=1, page_size=20
+        )
+        assert fake_cache.calls == ["get_many", "set_many"]
+        assert len(fake_cache.values) == 20
+
+        statements = []
+
+        def _count_statement(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        sync_engine = db_session.bind.sync_engine
+        event.listen(sync_engine, "before_cursor_execute", _count_statement)
+        try:
+            second = await mistake_service.get_mistake_list(
+                user_id=user_id, page=1, page_size=20
+            )
+        finally:
+            event.remove(sync_engine, "before_cursor_execute", _count_statement)
+
+        # count + 分页查询
+        assert len(statements) == 2, statements
+        assert fake_cache.calls[2:] == ["get_many"]
+        assert [i.knowledge_point_associations for i in second.items] == [
+            i.knowledge_point_associations for i in first.items
+        ]
+
+    @pytest.mark.asyncio
+    async def test_invalidate_by_user(
+        self, mistake_service, page_with_associations, fake_cache
+    ):
+        """测试掌握度变化后按用户失效"""
+        user_id, _ = page_with_associations
+        await mistake_service.get_mistake_list(user_id=user_id, page=1, page_size=20)
+
+        await invalidate_mistake_list_cache(str(user_id))
+
+        assert fake_cache.values == {}
+
+
 if __name__ == "__main__":
     """直接运行测试"""
     pytest.main([__file__, "-v", "-s"])
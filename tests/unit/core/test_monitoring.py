@@ -12,9 +12,11 @@ import pytest
 from fastapi import Request, Response
 
 from src.core.monitoring import (
+    LatencyHistogram,
     MetricsCollector,
     PerformanceMonitoringMiddleware,
     RequestMetrics,
+    StageTimer,
     SystemMetricsCollector,
 )
 
@@ -145,3 +147,51 @@ async def test_system_metrics_collector_start_stop():
 
     stats = collector.get_system_stats()
     assert "uptime_seconds" in stats
+
+
+def test_latency_histogram_quantiles():
+    h = LatencyHistogram(buckets=(0.1, 0.5, 1.0))
+    for value in (0.05, 0.05, 0.3, 0.3, 0.8, 2.0):
+        h.observe(value)
+
+    snap = h.snapshot()
+    assert snap["count"] == 6
+    assert snap["max"] == 2.0
+    assert 0.1 < snap["p50"] <= 0.5
+    assert snap["p99"] <= 2.0
+    assert h.cumulative_counts() == [("0.1", 2), ("0.5", 4), ("1", 5), ("+Inf", 6)]
+
+
+def test_stage_timer_records_into_collector():
+    collector = MetricsCollector()
+    timer = StageTimer("ttft", collector)
+
+    timer.mark("session")
+    timer.record("upstream_connect", 0.2)
+    timer.finish()
+
+    stats = collector.get_histogram_stats("ttft")
+    assert set(stats) == {"session", "upstream_connect", "total"}
+    assert stats["upstream_connect"]["count"] == 1
+    assert "upstream_connect=200ms" in timer.summary()
+    assert collector.get_histogram_stats("other") == {}
+
+
+def test_render_prometheus_histogram():
+    collector = MetricsCollector()
+    collector.observe_stage("ttft", "total", 0.3)
+    collector.observe_stage("ttft", "total", 4.0)
+
+    text = collector.render_prometheus(labels={"version": "1.2.3"})
+
+    assert "# TYPE wuhao_ttft_stage_seconds histogram" in text
+    assert (
+        'wuhao_ttft_stage_seconds_bucket{version="1.2.3",stage="total",le="0.5"} 1'
+        in text
+    )
+    assert (
+        'wuhao_ttft_stage_seconds_bucket{version="1.2.3",stage="total",le="+Inf"} 2'
+        in text
+    )
+    assert 'wuhao_ttft_stage_seconds_count{version="1.2.3",stage="total"} 2' in text
+    assert text.endswith("\n")
@@ -8,11 +8,13 @@ from unittest.mock import MagicMock, patch
 
 import pytest
 from fastapi import Request, Response
+from redis.exceptions import ConnectionError as RedisConnectionError
 
 from src.core.security import (
     RateLimiter,
     RateLimitMiddleware,
     RateLimitRule,
+    RateLimitType,
     SlidingWindowCounter,
     TokenBucket,
 )
@@ -95,7 +97,7 @@ class TestSlidingWindowCounter:
 
         assert counter.window_size == 60
         assert counter.max_requests == 100
-        assert len(counter.requests) == 0
+        assert counter.get_request_count() == 0
 
     def test_allow_request_within_limit(self):
         """测试限制内允许请求"""
@@ -338,6 +340,55 @@ class TestRateLimitMiddleware:
             assert result.status_code == 429
 
 
+class TestBucketedSlidingWindow:
+    """分桶滑动窗口测试"""
+
+    def test_memory_independent_of_request_volume(self):
+        """测试槽数固定，不随请求数增长"""
+        counter = SlidingWindowCounter(window_size=3600, max_requests=100_000)
+        for _ in range(5000):
+            counter.is_allowed()
+
+        assert len(counter._slots) == SlidingWindowCounter.MAX_SLOTS + 1
+        assert counter.get_request_count() == 5000
+        assert not hasattr(counter, "__dict__")
+
+    def test_slots_expire_as_window_slides(self, monkeypatch):
+        """测试旧槽滑出窗口后释放配额"""
+        now = [1000.0]
+        monkeypatch.setattr(time, "time", lambda: now[0])
+        counter = SlidingWindowCounter(window_size=60, max_requests=3)
+
+        counter.is_allowed()
+        now[0] += 30
+        counter.is_allowed()
+        counter.is_allowed()
+        assert counter.is_allowed() is False
+        assert counter.get_reset_time() == 1061
+
+        now[0] += 30  # 第一个请求所在的槽仍有一部分在窗口内
+        assert counter.get_remaining_requests() == 0
+        now[0] += 1  # 第一个请求滑出窗口
+        assert counter.get_remaining_requests() == 1
+        now[0] += 60  # 全部滑出
+        assert counter.get_request_count() == 0
+
+    def test_never_exceeds_limit_within_window(self, monkeypatch):
+        """测试非整数时间戳下任意一个窗口内放行的请求都不超过上限"""
+        now = [1000.99]
+        monkeypatch.setattr(time, "time", lambda: now[0])
+        counter = SlidingWindowCounter(window_size=60, max_requests=100)
+
+        assert all(counter.is_allowed() for _ in range(100))
+        now[0] = 1060.0  # 距离上一批请求不到 60 秒
+        assert counter.is_allowed() is False
+        now[0] = 1060.995  # 上一批请求已经滑出窗口
+        assert counter.is_allowed() is False
+        now[0] = 1061.0
+        assert all(counter.is_allowed() for _ in range(100))
+        assert counter.is_allowed() is False
+
+
 class TestRateLimitEdgeCases:
     """限流边界情况测试"""
 
@@ -411,10 +462,138 @@ class TestRateLimitMetrics:
 
         counter.allow_request()
 
-        # 获取最早请求时间
-        if counter.requests:
-            reset_time = counter.requests[0] + counter.window_size
-            current_time = time.time()
+        reset_time = counter.get_reset_time()
+        current_time = time.time()
+
+        # 重置时间应该在未来，且不晚于一个窗口加一个槽宽之后
+        assert (
+            current_time
+            < reset_time
+            <= current_time + counter.window_size + counter.slot_width
+        )
+
+
+class FakeGCRARedis:
+    """按 Lua 脚本语义执行 GCRA 的 Redis 替身，多个限流器实例共享即模拟多 worker"""
+
+    def __init__(self):
+        self.tats = {}
+        self.now_ms = 1_000_000
+        self.calls = 0
+        self.fail = False
+
+    def register_script(self, script):
+        async def run(keys, args):
+            self.calls += 1
+            if self.fail:
+                raise RedisConnectionError("connection refused")
+            new_tats = []
+            for i, key in enumerate(keys):
+                interval, burst = args[2 * i], args[2 * i + 1]
+                tat = max(self.tats.get(key, self.now_ms), self.now_ms)
+                new_tat = tat + interval
+                if new_tat - burst > self.now_ms:
+                    return [0, i + 1, new_tat - burst - self.now_ms]
+                new_tats.append(new_tat)
+            self.tats.update(zip(keys, new_tats, strict=True))
+            return [1]
+
+        return run
+
+
+def _request(host="10.0.0.1", path="/api/test"):
+    request = MagicMock(spec=Request)
+    request.client.host = host
+    request.url.path = path
+    return request
+
+
+class TestDistributedRateLimiter:
+    """Redis 全局限流测试"""
+
+    @pytest.fixture
+    def redis(self):
+        return FakeGCRARedis()
+
+    def _limiter(self, redis, limit=3):
+        limiter = RateLimiter(redis_client=redis, backend="redis")
+        limiter.rules = [
+            RateLimitRule(limit=limit, window=60, rule_type=RateLimitType.PER_IP)
+        ]
+        return limiter
+
+    @pytest.mark.asyncio
+    async def test_limit_is_shared_across_workers(self, redis):
+        """测试多个 worker 共享同一配额"""
+        worker_a, worker_b = self._limiter(redis), self._limiter(redis)
+
+        results = [
+            (await worker.check(_request()))[0]
+            for worker in (worker_a, worker_b, worker_a, worker_b)
+        ]
+
+        assert results == [True, True, True, False]
+        assert worker_a.counters == {}  # 不占用进程内内存
+        assert worker_b.get_stats()["rejections"] == {"per_ip": 1}
+
+    @pytest.mark.asyncio
+    async def test_rejection_info_and_refill(self, redis):
+        """测试拒绝时返回重试时间，过一个发放间隔后恢复"""
+        limiter = self._limiter(redis)
+        for _ in range(3):
+            await limiter.check(_request())
+
+        allowed, rule, info = await limiter.check(_request())
+        assert allowed is False
+        assert rule.rule_type == RateLimitType.PER_IP
+        assert info["remaining"] == 0
+        assert info["reset"] >= int(time.time()) + 20
+
+        redis.now_ms += 20_000
+        assert (await limiter.check(_request()))[0] is True
+
+    @pytest.mark.asyncio
+    async def test_rejected_rule_does_not_consume_other_rules(self, redis):
+        """测试多条规则原子检查：被后一条规则拒绝时不消耗前一条的配额"""
+        limiter = self._limiter(redis, limit=5)
+        limiter.rules.append(
+            RateLimitRule(
+                limit=1,
+                window=60,
+                rule_type=RateLimitType.PER_ENDPOINT,
+                endpoint="/api/v1/auth/login",
+            )
+        )
+        login = _request(path="/api/v1/auth/login")
+
+        assert (await limiter.check(login))[0] is True
+        allowed, rule, _ = await limiter.check(login)
+
+        assert allowed is False
+        assert rule.label == "per_endpoint:/api/v1/auth/login"
+        ip_tat = next(v for k, v in redis.tats.items() if ":ip:" in k)
+        assert ip_tat == redis.now_ms + 12_000  # 只计入了一次
+
+    @pytest.mark.asyncio
+    async def test_falls_back_to_local_when_redis_down(self, redis):
+        """测试 Redis 不可用时退回进程内限流，并在冷却期内不再访问 Redis"""
+        redis.fail = True
+        limiter = self._limiter(redis, limit=1)
+
+        assert (await limiter.check(_request()))[0] is True
+        assert (await limiter.check(_request()))[0] is False
+        assert redis.calls == 1
+        assert limiter.get_stats()["backend"] == "local"
+        assert limiter.get_stats()["redis_failures"] == 1
+
+    @pytest.mark.asyncio
+    async def test_ai_service_bucket(self, redis):
+        """测试 AI 服务令牌桶：容量 20，之后每 3 秒补充 1 个"""
+        limiter = RateLimiter(redis_client=redis, backend="redis")
+
+        results = [await limiter.check_ai_service(user_id="u1") for _ in range(21)]
+        assert results.count(True) == 20
 
-            # 重置时间应该在未来
-            assert reset_time > current_time
+        redis.now_ms += 3_000
+        assert await limiter.check_ai_service(user_id="u1") is True
+        assert limiter.rejections["ai_service_bucket"] == 1
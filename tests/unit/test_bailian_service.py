@@ -45,6 +45,13 @@ def mock_settings():
         BAILIAN_BASE_URL="https://test-api.com/v1",
         BAILIAN_TIMEOUT=30,
         BAILIAN_MAX_RETRIES=3,
+        BAILIAN_MAX_CONNECTIONS=10,
+        BAILIAN_MAX_KEEPALIVE_CONNECTIONS=5,
+        BAILIAN_KEEPALIVE_EXPIRY=30.0,
+        BAILIAN_CONNECT_TIMEOUT=5.0,
+        BAILIAN_HTTP2=False,
+        BAILIAN_MAX_CONCURRENT_STREAMS=2,
+        BAILIAN_WARMUP_CONNECTIONS=2,
     )
 
 
@@ -124,6 +131,34 @@ class TestBailianServiceInit:
         assert headers["Content-Type"] == "application/json"
         assert "wuhao-tutor" in headers["User-Agent"]
 
+        # 检查连接池配置
+        limits = call_args.kwargs["limits"]
+        assert limits.max_connections == 10
+        assert limits.max_keepalive_connections == 5
+        assert call_args.kwargs["http2"] is False
+        assert timeout_arg.connect == 5.0
+
+    def test_pool_stats(self, bailian_service):
+        """测试连接池统计"""
+        stats = bailian_service.get_pool_stats()
+
+        assert stats["max_connections"] == 10
+        assert stats["max_concurrent_streams"] == 2
+        assert stats["active_streams"] == 0
+        assert stats["open_connections"] == 0
+
+    @pytest.mark.asyncio
+    async def test_warm_up_tolerates_errors(self, bailian_service):
+        """测试预热失败只记录日志"""
+        bailian_service.client.head = AsyncMock(
+            side_effect=[Mock(), httpx.ConnectError("refused")]
+        )
+
+        warmed = await bailian_service.warm_up()
+
+        assert warmed == 1
+        assert bailian_service.get_pool_stats()["warmup_connections"] == 1
+
 
 class TestMessageFormatting:
     """消息格式化测试"""
@@ -732,3 +767,56 @@ class TestIntegration:
 
                 # 验证重试了一次
                 assert mock_post.call_count == 2
+
+
+# ============================================================================
+# 流式调用并发控制测试
+# ============================================================================
+
+
+class TestStreamConcurrency:
+    """流式调用并发上限测试"""
+
+    @pytest.mark.asyncio
+    async def test_concurrent_streams_are_capped(self, bailian_service):
+        """测试同时进行的上游流式调用不超过上限"""
+        import asyncio
+        from contextlib import asynccontextmanager
+
+        active = 0
+        peak = 0
+
+        @asynccontextmanager
+        async def fake_stream(method, url, **kwargs):
+            nonlocal active, peak
+            # 认证头和超时由共享客户端提供，不再逐次传入
+            assert "headers" not in kwargs and "timeout" not in kwargs
+            active += 1
+            peak = max(peak, active)
+            await asyncio.sleep(0.01)
+
+            async def aiter_lines():
+                yield 'data: {"choices": [{"delta": {"content": "hi"}, "finish_reason": "stop"}]}'
+
+            try:
+                yield Mock(status_code=200, aiter_lines=aiter_lines)
+            finally:
+                active -= 1
+
+        bailian_service.client.stream = fake_stream
+        payload = bailian_service._build_request_payload(
+            [{"role": "user", "content": "hi"}]
+        )
+
+        async def consume():
+            return [c async for c in bailian_service._call_bailian_stream_api(payload)]
+
+        results = await asyncio.gather(*[consume() for _ in range(5)])
+
+        assert all(chunks[0]["content"] == "hi" for chunks in results)
+        assert peak == 2
+        stats = bailian_service.get_pool_stats()
+        assert stats["total_streams"] == 5
+        assert stats["peak_streams"] == 2
+        assert stats["active_streams"] == 0
+        assert stats["queued_streams"] > 0
@@ -0,0 +1,473 @@
+"""
+Redis 缓存工具单元测试
+
+使用内存中的 FakeRedis 替身模拟所需的 Redis 命令，测试覆盖：
+- 标签登记与按标签失效
+- SCAN 兜底清理旧键
+- QueryCache 跨 worker 失效
+- 进程内一级缓存、同键并发合并、概率提前刷新
+- MGET/流水线批量读写
+"""
+
+import asyncio
+import fnmatch
+
+import pytest
+from redis.exceptions import NoScriptError
+
+from src.core import performance
+from src.utils import cache as cache_module
+from src.utils.cache import RedisCache, cache
+
+
+class FakePipeline:
+    """按顺序缓存命令，execute 时依次执行"""
+
+    def __init__(self, redis):
+        self.redis = redis
+        self.commands = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        return False
+
+    def __getattr__(self, name):
+        def queue(*args, **kwargs):
+            self.commands.append((name, args, kwargs))
+            return self
+
+        return queue
+
+    async def execute(self):
+        self.redis.round_trips += 1
+        results = []
+        for name, args, kwargs in self.commands:
+            results.append(await getattr(self.redis, name)(*args, **kwargs))
+        self.commands = []
+        return results
+
+
+class FakeRedis:
+    """内存中的 Redis 替身，只实现缓存模块用到的命令"""
+
+    def __init__(self):
+        self.values = {}
+        self.zsets = {}
+        self.ttls = {}
+        self.scripts = set()
+        self.round_trips = 0
+        self.keys_called = False
+        self.get_calls = 0
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    async def get(self, key):
+        self.get_calls += 1
+        return self.values.get(key)
+
+    async def mget(self, keys):
+        self.round_trips += 1
+        return [self.values.get(key) for key in keys]
+
+    async def info(self):
+        return {"connected_clients": 1}
+
+    async def setex(self, key, ttl, value):
+        self.values[key] = value
+        self.ttls[key] = ttl
+        return True
+
+    async def script_load(self, script):
+        self.scripts.add(cache_module._TAG_REGISTER_SHA)
+        return cache_module._TAG_REGISTER_SHA
+
+    async def evalsha(self, sha, numkeys, tag_key, member, expires_at, now, ttl):
+        # 模拟标签登记脚本：ZADD + 移除已过期成员 + 只延长不缩短的 EXPIRE
+        if sha not in self.scripts:
+            raise NoScriptError("NOSCRIPT No matching script")
+        members = self.zsets.setdefault(tag_key, {})
+        members[member] = float(expires_at)
+        for key, score in list(members.items()):
+            if score < float(now):
+                del members[key]
+        if self.ttls.get(tag_key, -1) < int(ttl):
+            self.ttls[tag_key] = int(ttl)
+        return 1
+
+    async def unlink(self, *keys):
+        deleted = 0
+        for key in keys:
+            if self.values.pop(key, None) is not None:
+                deleted += 1
+            elif self.zsets.pop(key, None) is not None:
+                deleted += 1
+            self.ttls.pop(key, None)
+        return deleted
+
+    delete = unlink
+
+    async def zscan_iter(self, key, count=None):
+        for member, score in list(self.zsets.get(key, {}).items()):
+            yield member, score
+
+    async def scan_iter(self, match=None, count=None):
+        for key in list(self.values):
+            if match is None or fnmatch.fnmatchcase(key, match):
+                yield key
+
+    async def keys(self, pattern):
+        self.keys_called = True
+        return [key for key in self.values if fnmatch.fnmatchcase(key, pattern)]
+
+
+@pytest.fixture
+def fake_redis():
+    return FakeRedis()
+
+
+@pytest.fixture
+def redis_cache(fake_redis):
+    return RedisCache(redis_client=fake_redis, prefix="t", l1_max_size=0)
+
+
+@pytest.fixture
+def tiered_cache(fake_redis):
+    return RedisCache(redis_client=fake_redis, prefix="t", l1_max_size=2, l1_ttl=5)
+
+
+class TestTagInvalidation:
+    """测试标签失效"""
+
+    @pytest.mark.asyncio
+    async def test_set_registers_namespace_and_tags(self, redis_cache, fake_redis):
+        """测试写入时登记命名空间标签和额外标签"""
+        await redis_cache.set(
+            "k1", {"a": 1}, ttl=60, namespace="ns", tags=["table:users"]
+        )
+
+        assert list(fake_redis.zsets["t:tagz:ns:ns"]) == ["t:ns:k1"]
+        assert list(fake_redis.zsets["t:tagz:table:users"]) == ["t:ns:k1"]
+        assert await redis_cache.get("k1", "ns") == {"a": 1}
+        # 首次写入加载脚本后重试；之后写值和登记标签只需一次往返
+        fake_redis.round_trips = 0
+        await redis_cache.set("k2", 1, ttl=60, namespace="ns")
+        assert fake_redis.round_trips == 1
+
+    @pytest.mark.asyncio
+    async def test_expired_members_are_trimmed(
+        self, redis_cache, fake_redis, monkeypatch
+    ):
+        """测试持续写入时已过期的成员被移出标签集合，集合不会无限增长"""
+        now = [1000.0]
+        monkeypatch.setattr(cache_module.time, "time", lambda: now[0])
+
+        for i in range(100):
+            await redis_cache.set(f"k{i}", i, ttl=10, namespace="query")
+            now[0] += 1
+
+        # 只保留最近 10 秒内写入、仍未过期的键
+        assert len(fake_redis.zsets["t:tagz:ns:query"]) == 11
+
+    @pytest.mark.asyncio
+    async def test_tag_ttl_is_only_extended(self, redis_cache, fake_redis):
+        """测试标签集合过期时间不会被较短 TTL 缩短"""
+        await redis_cache.set("long", 1, ttl=600, tags=["table:users"])
+        await redis_cache.set("short", 1, ttl=60, tags=["table:users"])
+
+        assert fake_redis.ttls["t:tagz:table:users"] == 600
+
+    @pytest.mark.asyncio
+    async def test_invalidate_tags_deletes_members_in_batches(
+        self, redis_cache, fake_redis, monkeypatch
+    ):
+        """测试按标签分批删除成员和标签集合"""
+        monkeypatch.setattr(cache_module, "INVALIDATION_BATCH_SIZE", 3)
+        for i in range(7):
+            await redis_cache.set(f"k{i}", i, tags=["user:1"])
+        await redis_cache.set("other", 1, tags=["user:2"])
+        fake_redis.round_trips = 0
+
+        deleted = await redis_cache.invalidate_tags("user:1")
+
+        assert deleted == 7
+        assert fake_redis.round_trips == 3
+        assert "t:tagz:user:1" not in fake_redis.zsets
+        assert await redis_cache.get("other") == 1
+
+    @pytest.mark.asyncio
+    async def test_clear_namespace_uses_scan_for_legacy_keys(
+        self, redis_cache, fake_redis
+    ):
+        """测试清空命名空间不使用 KEYS，显式开启时 SCAN 兜底清理未登记标签的旧键"""
+        await redis_cache.set("tagged", 1, namespace="ns")
+        fake_redis.values["t:ns:legacy"] = b"1"
+        fake_redis.values["t:other:keep"] = b"1"
+
+        # 默认只按标签删除，不扫描整个键空间
+        assert await redis_cache.clear_namespace("ns") == 1
+        assert "t:ns:legacy" in fake_redis.values
+
+        deleted = await redis_cache.clear_namespace("ns", scan_legacy=True)
+
+        assert deleted == 1
+        assert fake_redis.keys_called is False
+        assert list(fake_redis.values) == ["t:other:keep"]
+
+
+class TestQueryCacheInvalidation:
+    """测试查询缓存跨 worker 失效"""
+
+    @pytest.mark.asyncio
+    async def test_invalidate_table_from_another_worker(self, fake_redis, monkeypatch):
+        """测试一个 worker 写入的缓存可被另一个 worker 按表失效"""
+        shared = RedisCache(redis_client=fake_redis, prefix="t")
+        monkeypatch.setattr(performance, "cache_manager", shared)
+        writer = performance.QueryCache()
+        other_worker = performance.QueryCache()
+        monkeypatch.setattr(performance, "query_cache", other_worker)
+
+        sql = "SELECT * FROM users WHERE id = :user_id"
+        await writer.set(sql, [{"id": 1}], params={"user_id": 1})
+        await writer.set("SELECT 1 FROM mistake_records", [1])
+
+        assert await performance.invalidate_cache_for_table("users") == 1
+        assert await writer.get(sql, {"user_id": 1}) is None
+        assert await writer.get("SELECT 1 FROM mistake_records") == [1]
+
+    @pytest.mark.asyncio
+    async def test_clear_all_and_user_tag(self, fake_redis, monkeypatch):
+        """测试按用户标签失效和清空全部查询缓存"""
+        monkeypatch.setattr(
+            performance, "cache_manager", RedisCache(redis_client=fake_redis)
+        )
+        query_cache = performance.QueryCache()
+
+        await query_cache.set("SELECT * FROM answers", [1], params={"user_id": 9})
+        await query_cache.set("SELECT * FROM answers", [2], params={"user_id": 8})
+
+        assert await query_cache.invalidate_pattern("user:9") == 1
+        await query_cache.clear_all()
+
+        assert fake_redis.values == {}
+        assert query_cache.get_stats()["cached_entries"] == 0
+
+
+class TestTwoTierCache:
+    """测试两级缓存"""
+
+    @pytest.mark.asyncio
+    async def test_l1_hit_skips_redis(self, tiered_cache, fake_redis):
+        """测试一级缓存命中不访问 Redis，未开启 use_l1 时不读一级缓存"""
+        await tiered_cache.set("k", {"v": 1}, use_l1=True)
+
+        assert await tiered_cache.get("k", use_l1=True) == {"v": 1}
+        assert fake_redis.get_calls == 0
+
+        assert await tiered_cache.get("k") == {"v": 1}
+        assert fake_redis.get_calls == 1
+
+        stats = (await tiered_cache.get_stats())["tiers"]
+        assert stats["l1_hits"] == 1
+        assert stats["l2_hits"] == 1
+        assert stats["l1_hit_rate"] == 1.0
+
+    @pytest.mark.asyncio
+    async def test_l1_is_bounded_and_invalidated(self, tiered_cache):
+        """测试一级缓存容量有界，删除和标签失效同步清理"""
+        for key in ("a", "b", "c"):
+            await tiered_cache.set(key, key, tags=["user:1"], use_l1=True)
+        assert len(tiered_cache.l1) == 2
+
+        await tiered_cache.delete("c")
+        assert tiered_cache.l1.get("t:c") is cache_module._MISSING
+        await tiered_cache.invalidate_tags("user:1")
+
+        assert len(tiered_cache.l1) == 0
+
+    @pytest.mark.asyncio
+    async def test_single_flight_collapses_concurrent_misses(self, tiered_cache):
+        """测试同键并发未命中只回源一次"""
+        calls = 0
+
+        async def loader():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return {"graph": [1, 2, 3]}
+
+        results = await asyncio.gather(
+            *[tiered_cache.get_or_set("hot", loader, ttl=60) for _ in range(10)]
+        )
+
+        assert calls == 1
+        assert all(result == {"graph": [1, 2, 3]} for result in results)
+        assert tiered_cache.get_tier_stats()["coalesced"] == 9
+
+    @pytest.mark.asyncio
+    async def test_loader_error_propagates_to_waiters(self, tiered_cache):
+        """测试回源失败时所有等待方都收到异常且不写缓存"""
+
+        async def loader():
+            await asyncio.sleep(0.01)
+            raise ValueError("db down")
+
+        results = await asyncio.gather(
+            *[tiered_cache.get_or_set("k", loader) for _ in range(3)],
+            return_exceptions=True,
+        )
+
+        assert all(isinstance(result, ValueError) for result in results)
+        assert await tiered_cache.get("k") is None
+
+    @pytest.mark.asyncio
+    async def test_early_refresh_near_expiry(self, redis_cache, monkeypatch):
+        """测试接近过期时按概率提前重算"""
+        values = iter([1, 2])
+
+        async def loader():
+            await asyncio.sleep(0.02)
+            return next(values)
+
+        assert await redis_cache.get_or_set("k", loader, ttl=60) == 1
+
+        # 远离过期：不提前刷新
+        monkeypatch.setattr(cache_module.random, "random", lambda: 0.5)
+        assert await redis_cache.get_or_set("k", loader, ttl=60) == 1
+
+        # 距过期 1 秒且计算耗时较长：提前刷新
+        now = cache_module.time.time()
+        monkeypatch.setattr(cache_module.time, "time", lambda: now + 59)
+        redis_cache.early_refresh_beta = 1000
+        assert await redis_cache.get_or_set("k", loader, ttl=60) == 2
+        assert redis_cache.get_tier_stats()["early_refreshes"] == 1
+
+    @pytest.mark.asyncio
+    async def test_early_refresh_serves_stale_in_process(
+        self, redis_cache, monkeypatch
+    ):
+        """测试提前重算期间同进程的其他请求直接使用旧值，不等待重算"""
+        values = iter([1, 2])
+        refresh_started = asyncio.Event()
+        release = asyncio.Event()
+
+        async def loader():
+            value = next(values)
+            if value == 2:
+                refresh_started.set()
+                await release.wait()
+            return value
+
+        assert await redis_cache.get_or_set("k", loader, ttl=60) == 1
+
+        now = cache_module.time.time()
+        monkeypatch.setattr(cache_module.time, "time", lambda: now + 59)
+        monkeypatch.setattr(cache_module.random, "random", lambda: 0.5)
+        redis_cache.early_refresh_beta = 1e9
+        refresh = asyncio.create_task(redis_cache.get_or_set("k", loader, ttl=60))
+        await refresh_started.wait()
+
+        assert await redis_cache.get_or_set("k", loader, ttl=60) == 1
+        assert redis_cache.get_tier_stats()["stale_served"] == 1
+
+        release.set()
+        assert await refresh == 2
+
+    @pytest.mark.asyncio
+    async def test_decorator_ignores_self_in_key(self, tiered_cache):
+        """测试装饰实例方法时不同实例共享缓存"""
+        calls = 0
+
+        class Service:
+            @cache(ttl=60, namespace="svc", cache_manager=tiered_cache, l1=True)
+            async def stats(self, user_id):
+                nonlocal calls
+                calls += 1
+                return {"user": user_id}
+
+        assert await Service().stats("u1") == {"user": "u1"}
+        assert await Service().stats("u1") == {"user": "u1"}
+        assert await Service().stats("u2") == {"user": "u2"}
+        assert calls == 2
+
+    @pytest.mark.asyncio
+    async def test_decorator_tags_from_arguments(self, tiered_cache):
+        """测试按参数生成标签，失效一个用户不影响其他用户"""
+        calls = []
+
+        class Service:
+            @cache(
+                ttl=3600,
+                namespace="svc",
+                cache_manager=tiered_cache,
+                tags=lambda user_id: [f"stats:{user_id}"],
+                l1=True,
+            )
+            async def stats(self, user_id):
+                calls.append(user_id)
+                return len(calls)
+
+        await Service().stats("u1")
+        await Service().stats(user_id="u2")
+        await tiered_cache.invalidate_tags("stats:u1")
+
+        assert await Service().stats("u1") == 3
+        assert await Service().stats(user_id="u2") == 2
+        assert calls == ["u1", "u2", "u1"]
+
+
+class TestBatchOperations:
+    """测试批量读写"""
+
+    @pytest.mark.asyncio
+    async def test_set_many_and_get_many_single_round_trip(
+        self, redis_cache, fake_redis
+    ):
+        """测试批量写入和读取各只需一次往返，支持按键指定 TTL"""
+        items = {f"k{i}": {"i": i} for i in range(10)}
+        await fake_redis.script_load(cache_module._TAG_REGISTER_SCRIPT)
+
+        assert await redis_cache.set_many(
+            items, ttl=60, namespace="ns", tags=["user:1"], ttls={"k0": 5}
+        )
+        assert fake_redis.round_trips == 1
+        assert fake_redis.ttls["t:ns:k0"] == 5
+        assert fake_redis.ttls["t:ns:k1"] == 60
+        assert len(fake_redis.zsets["t:tagz:user:1"]) == 10
+
+        found = await redis_cache.get_many(["k0", "k5", "missing"], namespace="ns")
+        assert fake_redis.round_trips == 2
+        assert found == {"k0": {"i": 0}, "k5": {"i": 5}}
+
+    @pytest.mark.asyncio
+    async def test_get_many_uses_l1_and_unwraps_envelopes(
+        self, tiered_cache, fake_redis
+    ):
+        """测试批量读取先查一级缓存，并解开 get_or_set 写入的包装值"""
+
+        async def loader():
+            return "computed"
+
+        await tiered_cache.get_or_set("a", loader)
+        await tiered_cache.set("b", "l1-value", use_l1=True)
+        fake_redis.round_trips = 0
+
+        found = await tiered_cache.get_many(["a", "b"], use_l1=True)
+
+        assert found == {"a": "computed", "b": "l1-value"}
+        assert fake_redis.round_trips == 1
+
+    @pytest.mark.asyncio
+    async def test_delete_many_in_batches(self, redis_cache, fake_redis, monkeypatch):
+        """测试批量删除按批次流水线执行"""
+        monkeypatch.setattr(cache_module, "INVALIDATION_BATCH_SIZE", 4)
+        await redis_cache.set_many({f"k{i}": i for i in range(10)})
+        fake_redis.round_trips = 0
+
+        deleted = await redis_cache.delete_many([f"k{i}" for i in range(10)])
+
+        assert deleted == 10
+        assert fake_redis.round_trips == 3
+        assert fake_redis.values == {}
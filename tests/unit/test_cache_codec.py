@@ -0,0 +1,89 @@
+"""
+缓存值编解码单元测试
+
+测试覆盖：
+- 各类型往返一致
+- 超过阈值压缩、收益不足时不压缩
+- 兼容读取旧格式
+- 无法识别的版本报错
+"""
+
+import os
+from datetime import datetime
+
+import pytest
+
+from src.utils import cache_codec
+from src.utils.cache_codec import CacheCodec, decode_legacy, encode_legacy
+
+
+@pytest.fixture
+def codec():
+    return CacheCodec(compress_threshold=256, compression="zlib")
+
+
+class TestCacheCodec:
+    """测试缓存编解码"""
+
+    @pytest.mark.parametrize(
+        "value",
+        [
+            "二次函数",
+            b"\x00\x01raw",
+            42,
+            3.5,
+            True,
+            None,
+            {"a": [1, 2], 3: (4, 5)},
+            [{"created_at": datetime(2025, 1, 1)}],
+        ],
+    )
+    def test_round_trip(self, codec, value):
+        """测试各类型编码后解码得到原值（保留 tuple、非字符串键等）"""
+        data = codec.encode(value)
+
+        assert data[0] == cache_codec.MAGIC
+        assert data[1] == cache_codec.FORMAT_VERSION
+        assert codec.decode(data) == value
+
+    def test_type_byte(self, codec):
+        """测试类型字节记录编码方式和压缩算法"""
+        assert codec.encode("x")[2] == cache_codec.CODEC_STR
+        assert codec.encode({"k": "v"})[2] == cache_codec.CODEC_PICKLE
+
+        large = codec.encode({"nodes": ["知识点"] * 500})
+        assert large[2] >> 4 == cache_codec.COMPRESSION_ZLIB
+        assert large[2] & 0x0F == cache_codec.CODEC_PICKLE
+        assert codec.decode(large) == {"nodes": ["知识点"] * 500}
+
+    def test_incompressible_payload_is_stored_raw(self, codec):
+        """测试压缩收益不足时保留原文"""
+        data = codec.encode(os.urandom(4096))
+
+        assert data[2] >> 4 == cache_codec.COMPRESSION_NONE
+
+    def test_reads_legacy_format(self, codec):
+        """测试可读取旧格式写入的值"""
+        for value in ["旧值", 7, {"a": 1}, [1, 2, 3]]:
+            legacy = encode_legacy(value)
+            assert codec.decode(legacy) == value
+            assert decode_legacy(legacy) == value
+
+    def test_unknown_version_raises(self, codec):
+        """测试无法识别的格式版本报错，由调用方按未命中处理"""
+        data = bytearray(codec.encode({"a": 1}))
+        data[1] = 99
+
+        with pytest.raises(ValueError):
+            codec.decode(bytes(data))
+
+    def test_missing_optional_compressor_falls_back(self):
+        """测试配置的压缩库未安装时退回可用算法"""
+        if cache_codec.zstandard is not None:
+            pytest.skip("zstandard 已安装")
+
+        codec = CacheCodec(compression="zstd")
+
+        assert codec.compression == cache_codec.available_compression()
+        with pytest.raises(ValueError):
+            CacheCodec(compression="brotli")
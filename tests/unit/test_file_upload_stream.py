@@ -0,0 +1,319 @@
+"""
+流式上传单元测试
+
+测试覆盖：
+- 本地存储：哈希、大小、图片尺寸与整文件计算一致，不留临时文件
+- 超出大小限制时中途中止并清理
+- OSS：按分片流式上传，小文件单次 put_object，失败时取消分片
+- 上传大文件时内存占用不随文件大小增长
+- 相同内容复用已有文件，删除时递减引用计数
+- AI分析图片只在同一用户内复用，临近清理的对象重新上传
+"""
+
+import hashlib
+import io
+import os
+import tracemalloc
+from types import SimpleNamespace
+
+import pytest
+from fastapi import UploadFile
+from PIL import Image
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from src.core.config import settings
+from src.core.exceptions import AIServiceError
+from src.models.base import Base
+from src.services import ai_image_service, stored_object_service
+from src.services.stored_object_service import StoredObjectService
+from src.utils import file_upload
+from src.utils.file_upload import FileUploadService, UploadConfig
+from src.utils.oss_executor import OSSExecutor
+
+
+class FakeBucket:
+    """模拟 oss2.Bucket，记录每次请求的数据大小"""
+
+    def __init__(self, fail_part=None):
+        self.fail_part = fail_part
+        self.calls = []
+
+    def put_object(self, key, data, headers=None):
+        self.calls.append(("put_object", len(data), headers))
+        return SimpleNamespace(status=200)
+
+    def init_multipart_upload(self, key, headers=None):
+        self.calls.append(("init", headers))
+        return SimpleNamespace(upload_id="upload-1")
+
+    def upload_part(self, key, upload_id, number, data):
+        if number == self.fail_part:
+            raise ConnectionError("part failed")
+        self.calls.append(("part", number, len(data)))
+        return SimpleNamespace(etag=f"etag-{number}")
+
+    def complete_multipart_upload(self, key, upload_id, parts):
+        self.calls.append(("complete", [p.part_number for p in parts]))
+        return SimpleNamespace(status=200)
+
+    def abort_multipart_upload(self, key, upload_id):
+        self.calls.append(("abort", upload_id))
+
+
+def _image_bytes(fmt, size=(640, 480), **save_kwargs):
+    buffer = io.BytesIO()
+    Image.new("RGB", size, (200, 30, 30)).save(buffer, fmt, **save_kwargs)
+    return buffer.getvalue()
+
+
+def _upload(data, filename="photo.png", content_type="image/png"):
+    return UploadFile(
+        io.BytesIO(data),
+        filename=filename,
+        headers={"content-type": content_type},
+    )
+
+
+@pytest.fixture
+def local_service(tmp_path):
+    service = FileUploadService(base_upload_dir=str(tmp_path), use_oss=False)
+    service.object_store = StoredObjectService(enabled=False)
+    return service
+
+
+@pytest.fixture
+async def object_store(tmp_path, monkeypatch):
+    """使用临时 SQLite 数据库的去重存储"""
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'objects.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    monkeypatch.setattr(
+        stored_object_service,
+        "AsyncSessionLocal",
+        sessionmaker(engine, class_=AsyncSession, expire_on_commit=False),
+    )
+    yield StoredObjectService(enabled=True)
+    await engine.dispose()
+
+
+@pytest.fixture
+def oss_service(tmp_path, monkeypatch):
+    executor = OSSExecutor(max_workers=2, max_queue=4)
+    monkeypatch.setattr(file_upload, "oss_executor", executor)
+    monkeypatch.setattr(settings, "OSS_MULTIPART_PART_SIZE", 1000)
+    service = FileUploadService(base_upload_dir=str(tmp_path), use_oss=False)
+    service.object_store = StoredObjectService(enabled=False)
+    service.oss_storage = file_upload.AliCloudOSSStorage()
+    service.oss_storage.bucket = FakeBucket()
+    service.use_oss = True
+    yield service
+    executor.shutdown()
+
+
+@pytest.fixture
+def ai_service(object_store, monkeypatch):
+    executor = OSSExecutor(max_workers=2, max_queue=4)
+    monkeypatch.setattr(ai_image_service, "oss_executor", executor)
+    service = ai_image_service.AIImageAccessService()
+    service.object_store = object_store
+    service.bucket = FakeBucket()
+    service.bucket_name = "wuhao"
+    service.endpoint = "oss-cn-hangzhou.aliyuncs.com"
+    service.is_oss_available = True
+    yield service
+    executor.shutdown()
+
+
+class TestLocalStreamUpload:
+    """测试流式保存到本地"""
+
+    async def test_matches_whole_file_results(self, local_service, tmp_path):
+        """测试哈希、大小和尺寸与整文件计算一致"""
+        data = _image_bytes("PNG", size=(1200, 900))
+        data += b"\0" * (3 * UploadConfig.STREAM_CHUNK_SIZE)  # 让文件跨多个块
+
+        info = await local_service.save_upload_file(_upload(data), "homework")
+
+        assert info.storage_type == "local"
+        assert info.file_size == len(data)
+        assert info.file_hash == hashlib.md5(data).hexdigest()
+        assert (info.width, info.height) == (1200, 900)
+        with open(info.file_path, "rb") as f:
+            assert f.read() == data
+        assert not list(tmp_path.rglob("*.part"))
+
+    async def test_jpeg_dimensions_after_large_exif(self, local_service):
+        """测试 SOF 排在大段 EXIF 之后的 JPEG 也能解析尺寸"""
+        exif = Image.Exif()
+        exif[0x010E] = "x" * 60000  # ImageDescription
+        data = _image_bytes("JPEG", size=(800, 600), exif=exif.tobytes())
+        assert len(data) > UploadConfig.STREAM_CHUNK_SIZE
+
+        info = await local_service.save_upload_file(
+            _upload(data, "photo.jpg", "image/jpeg")
+        )
+
+        assert (info.width, info.height) == (800, 600)
+
+    async def test_oversized_file_aborted(self, local_service, tmp_path, monkeypatch):
+        """测试超出大小限制时停止读取并删除已写入的数据"""
+        monkeypatch.setitem(UploadConfig.MAX_FILE_SIZES, "image", 100 * 1024)
+        upload = _upload(b"\0" * (10 * 1024 * 1024))
+        reads = []
+        original_read = upload.read
+
+        async def counting_read(size=-1):
+            reads.append(size)
+            return await original_read(size)
+
+        upload.read = counting_read
+
+        with pytest.raises(AIServiceError, match="文件大小超出限制"):
+            await local_service.save_upload_file(upload)
+
+        assert all(0 < size <= UploadConfig.STREAM_CHUNK_SIZE for size in reads)
+        assert len(reads) <= 2
+        assert not [p for p in tmp_path.rglob("*") if p.is_file()]
+
+    async def test_memory_bounded(self, local_service):
+        """测试上传 8MB 文件时峰值内存远小于文件大小"""
+        data = os.urandom(8 * 1024 * 1024)
+        upload = _upload(data, "notes.pdf", "application/pdf")
+
+        tracemalloc.start()
+        try:
+            info = await local_service.save_upload_file(upload)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        assert info.file_size == len(data)
+        assert peak < 1024 * 1024
+
+
+class TestOSSStreamUpload:
+    """测试流式上传到 OSS"""
+
+    async def test_multipart_parts(self, oss_service):
+        """测试按分片上传，最后一片为剩余数据"""
+        data = b"x" * 2500
+
+        info = await oss_service.save_upload_file(
+            _upload(data, "notes.txt", "text/plain")
+        )
+
+        assert info.storage_type == "oss"
+        assert info.file_url.endswith(info.file_path)
+        assert info.file_hash == hashlib.md5(data).hexdigest()
+        assert oss_service.oss_storage.bucket.calls == [
+            ("init", {"Content-Type": "text/plain"}),
+            ("part", 1, 1000),
+            ("part", 2, 1000),
+            ("part", 3, 500),
+            ("complete", [1, 2, 3]),
+        ]
+
+    async def test_small_file_single_put(self, oss_service):
+        """测试不足一个分片的文件直接 put_object"""
+        await oss_service.save_upload_file(_upload(b"x" * 300, "a.txt", "text/plain"))
+
+        assert oss_service.oss_storage.bucket.calls == [
+            ("put_object", 300, {"Content-Type": "text/plain"})
+        ]
+
+    async def test_failed_part_aborts(self, oss_service):
+        """测试分片失败时取消上传"""
+        oss_service.oss_storage.bucket = FakeBucket(fail_part=2)
+
+        with pytest.raises(AIServiceError):
+            await oss_service.save_upload_file(
+                _upload(b"x" * 2500, "a.txt", "text/plain")
+            )
+
+        assert oss_service.oss_storage.bucket.calls[-1] == ("abort", "upload-1")
+
+
+class TestUploadDeduplication:
+    """测试按内容去重"""
+
+    async def test_duplicate_reuses_file(self, local_service, object_store, tmp_path):
+        """测试相同内容复用已有文件，删除时最后一个引用才删除文件"""
+        local_service.object_store = object_store
+        data = _image_bytes("PNG")
+
+        first = await local_service.save_upload_file(_upload(data), "homework")
+        second = await local_service.save_upload_file(
+            _upload(data, "again.png"), "homework"
+        )
+        other = await local_service.save_upload_file(_upload(data), "general")
+
+        assert second.file_path == first.file_path
+        assert second.file_url == first.file_url
+        assert second.metadata["deduplicated"] is True
+        assert (second.width, second.height) == (640, 480)
+        # 不同子文件夹不共享
+        assert other.file_path != first.file_path
+        assert len([p for p in tmp_path.rglob("*.png")]) == 2
+
+        assert await local_service.delete_file(second)
+        assert os.path.exists(first.file_path)
+        assert await local_service.delete_file(first)
+        assert not os.path.exists(first.file_path)
+
+    async def test_missing_local_file_reuploaded(self, local_service, object_store):
+        """测试已登记的本地文件被外部删除后重新上传"""
+        local_service.object_store = object_store
+        data = _image_bytes("PNG")
+
+        first = await local_service.save_upload_file(_upload(data), "homework")
+        os.remove(first.file_path)
+        second = await local_service.save_upload_file(_upload(data), "homework")
+
+        assert second.file_path != first.file_path
+        assert "deduplicated" not in second.metadata
+        assert os.path.exists(second.file_path)
+
+    async def test_duplicate_skips_oss_upload(self, oss_service, object_store):
+        """测试重复上传到 OSS 时不再发起上传请求"""
+        oss_service.object_store = object_store
+        bucket = oss_service.oss_storage.bucket
+
+        first = await oss_service.save_upload_file(_upload(b"x" * 300, "a.txt"))
+        calls = len(bucket.calls)
+        second = await oss_service.save_upload_file(_upload(b"x" * 300, "b.txt"))
+
+        assert second.file_url == first.file_url
+        assert len(bucket.calls) == calls
+
+
+class TestAIImageDeduplication:
+    """测试AI分析图片去重"""
+
+    async def test_reuse_within_user_only(self, ai_service):
+        """测试同一用户复用已上传的图片，其他用户上传相同图片时单独保存"""
+        data = _image_bytes("PNG")
+
+        first = await ai_service.upload_for_ai_analysis("user-aaaa-1", _upload(data))
+        again = await ai_service.upload_for_ai_analysis("user-aaaa-1", _upload(data))
+        other = await ai_service.upload_for_ai_analysis("user-bbbb-2", _upload(data))
+
+        assert again["deduplicated"] is True
+        assert again["object_name"] == first["object_name"]
+        assert other["deduplicated"] is False
+        assert other["object_name"].startswith("ai_analysis/user-bbb/")
+        assert len(ai_service.bucket.calls) == 2
+
+    async def test_stale_object_reuploaded(self, ai_service, monkeypatch):
+        """测试登记时间超过复用时长的图片不再复用，重新上传"""
+        data = _image_bytes("PNG")
+        first = await ai_service.upload_for_ai_analysis("user-aaaa-1", _upload(data))
+
+        monkeypatch.setattr(ai_image_service.settings, "AI_IMAGE_REUSE_HOURS", 0)
+        second = await ai_service.upload_for_ai_analysis("user-aaaa-1", _upload(data))
+        monkeypatch.setattr(ai_image_service.settings, "AI_IMAGE_REUSE_HOURS", 12)
+        third = await ai_service.upload_for_ai_analysis("user-aaaa-1", _upload(data))
+
+        assert second["deduplicated"] is False
+        assert second["object_name"] != first["object_name"]
+        assert third["object_name"] == second["object_name"]
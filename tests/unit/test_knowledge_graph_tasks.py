@@ -0,0 +1,161 @@
+"""
+知识图谱快照任务单元测试
+
+测试覆盖：
+- worker 池并发生成与批量提交
+- 失败回滚后未提交项重新入队
+- 断点续跑
+- 按用户ID哈希分片
+- 增量模式跳过无变化的组合
+"""
+
+from unittest.mock import AsyncMock
+from uuid import uuid4
+
+import pytest
+
+from src.tasks import knowledge_graph_tasks as tasks
+
+
+class FakeSession:
+    """记录提交次数的假数据库会话"""
+
+    commits = 0
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        return False
+
+    async def commit(self):
+        FakeSession.commits += 1
+
+    async def rollback(self):
+        pass
+
+    def expunge_all(self):
+        pass
+
+
+class FakeKnowledgeGraphService:
+    """按预设失败集合生成快照的假服务"""
+
+    created = []
+    failing = set()
+    unchanged = set()
+
+    def __init__(self, db):
+        self.db = db
+
+    async def create_knowledge_graph_snapshot(
+        self, user_id, subject, period_type="manual", auto_commit=True
+    ):
+        if (str(user_id), subject) in self.failing:
+            raise RuntimeError("boom")
+        FakeKnowledgeGraphService.created.append((str(user_id), subject))
+
+    async def create_incremental_snapshot(
+        self, user_id, subject, period_type="daily", auto_commit=True
+    ):
+        if (str(user_id), subject) in self.unchanged:
+            return None, False
+        await self.create_knowledge_graph_snapshot(
+            user_id, subject, period_type, auto_commit
+        )
+        return None, True
+
+
+@pytest.fixture
+def snapshot_env(monkeypatch, tmp_path):
+    """替换数据库会话和知识图谱服务，断点写入临时目录"""
+    user_ids = [str(uuid4()) for _ in range(5)]
+    pairs = [
+        (user_id, subject) for user_id in user_ids for subject in ("math", "english")
+    ]
+
+    FakeSession.commits = 0
+    FakeKnowledgeGraphService.created = []
+    FakeKnowledgeGraphService.failing = set()
+    FakeKnowledgeGraphService.unchanged = set()
+
+    monkeypatch.setattr(tasks, "AsyncSessionLocal", FakeSession)
+    monkeypatch.setattr(tasks, "KnowledgeGraphService", FakeKnowledgeGraphService)
+    monkeypatch.setattr(
+        tasks, "_get_users_with_mistakes", AsyncMock(return_value=pairs)
+    )
+    monkeypatch.setattr(tasks, "_cleanup_old_snapshots", AsyncMock(return_value=0))
+    monkeypatch.setattr(tasks.settings, "KG_SNAPSHOT_CHECKPOINT_DIR", str(tmp_path))
+    return pairs
+
+
+class TestGenerateDailySnapshots:
+    """测试每日快照任务"""
+
+    @pytest.mark.asyncio
+    async def test_worker_pool_batches_commits(self, snapshot_env):
+        """测试并发生成全部快照，并按批提交"""
+        stats = await tasks.generate_daily_snapshots(concurrency=3, batch_size=2)
+
+        assert stats["success_count"] == len(snapshot_env)
+        assert stats["failed_count"] == 0
+        assert sorted(FakeKnowledgeGraphService.created) == sorted(snapshot_env)
+        assert FakeSession.commits < len(snapshot_env)
+        assert stats["throughput"] >= 0
+
+    @pytest.mark.asyncio
+    async def test_failure_requeues_pending_and_resumes(self, snapshot_env):
+        """测试失败后未提交项重新生成，重跑时跳过已完成项"""
+        failing = snapshot_env[0]
+        FakeKnowledgeGraphService.failing = {failing}
+
+        stats = await tasks.generate_daily_snapshots(concurrency=1, batch_size=4)
+
+        assert stats["failed_count"] == 1
+        assert stats["success_count"] == len(snapshot_env) - 1
+
+        # 修复后重跑，只处理上次失败的组合
+        FakeKnowledgeGraphService.failing = set()
+        FakeKnowledgeGraphService.created = []
+        stats = await tasks.generate_daily_snapshots(concurrency=2, batch_size=4)
+
+        assert stats["resumed_count"] == len(snapshot_env) - 1
+        assert FakeKnowledgeGraphService.created == [failing]
+
+    @pytest.mark.asyncio
+    async def test_shards_partition_users(self, snapshot_env):
+        """测试多个分片合起来恰好覆盖全部组合"""
+        total = 0
+        for shard_index in range(3):
+            stats = await tasks.generate_daily_snapshots(
+                shard_index=shard_index, shard_count=3
+            )
+            total += stats["success_count"]
+
+        assert total == len(snapshot_env)
+        assert sorted(FakeKnowledgeGraphService.created) == sorted(snapshot_env)
+
+    @pytest.mark.asyncio
+    async def test_incremental_skips_unchanged(self, snapshot_env):
+        """测试增量模式下无变化的组合计入 skipped_count"""
+        FakeKnowledgeGraphService.unchanged = set(snapshot_env[:3])
+
+        stats = await tasks.generate_daily_snapshots(concurrency=2, batch_size=4)
+
+        assert stats["skipped_count"] == 3
+        assert stats["success_count"] == len(snapshot_env) - 3
+
+        # 全量模式不跳过
+        FakeKnowledgeGraphService.created = []
+        stats = await tasks.generate_daily_snapshots(incremental=False)
+
+        assert stats["skipped_count"] == 0
+        assert stats["success_count"] == len(snapshot_env)
+
+    def test_shard_of_is_stable(self):
+        """测试分片计算在进程间稳定"""
+        user_id = "3f2504e0-4f89-11d3-9a0c-0305e82c3301"
+
+        assert tasks._shard_of(user_id, 1) == 0
+        assert tasks._shard_of(user_id, 4) == tasks._shard_of(user_id, 4)
+        assert 0 <= tasks._shard_of(user_id, 4) < 4
@@ -0,0 +1,126 @@
+"""
+简单 LaTeX 公式本地渲染单元测试
+
+测试覆盖：
+- 上下标、希腊字母、运算符间距
+- 文本命令和可忽略的排版命令
+- 不支持的语法抛出 UnsupportedLatexError
+- 输出为合法 SVG / MathML
+"""
+
+import xml.etree.ElementTree as ET
+
+import pytest
+
+from src.utils.latex_svg import (
+    BASE,
+    SUBSCRIPT,
+    SUPERSCRIPT,
+    UnsupportedLatexError,
+    parse_latex,
+    render_latex_mathml,
+    render_latex_svg,
+)
+
+SP = "\u2005"
+SVG_NS = "{http://www.w3.org/2000/svg}"
+MATHML_NS = "{http://www.w3.org/1998/Math/MathML}"
+
+
+class TestParseLatex:
+    """测试 LaTeX 解析"""
+
+    def test_scripts(self):
+        """测试上下标和斜体变量"""
+        assert parse_latex("x^2+1") == [
+            ("x", BASE, True),
+            ("2", SUPERSCRIPT, False),
+            (f"{SP}+{SP}1", BASE, False),
+        ]
+        assert parse_latex("a_{n+1}") == [
+            ("a", BASE, True),
+            ("n", SUBSCRIPT, True),
+            ("+1", SUBSCRIPT, False),
+        ]
+
+    def test_symbols_and_spacing(self):
+        """测试希腊字母、关系符号，以及一元负号不留空"""
+        assert parse_latex(r"-\alpha \leq \pi") == [
+            ("−", BASE, False),
+            ("α", BASE, True),
+            (f"{SP}≤{SP}", BASE, False),
+            ("π", BASE, True),
+        ]
+        assert parse_latex(r"x \in (-1, 2]")[1] == (
+            f"{SP}∈{SP}(−1,\u20092]",
+            BASE,
+            False,
+        )
+
+    def test_text_and_functions(self):
+        """测试文本命令、函数名和 \\left/\\right"""
+        assert parse_latex(r"\text{面积}=\sin\left(x\right)") == [
+            (f"面积{SP}={SP}sin\u2009(", BASE, False),
+            ("x", BASE, True),
+            (")", BASE, False),
+        ]
+
+    @pytest.mark.parametrize(
+        "latex",
+        [r"\frac{1}{2}", r"\sqrt{x}", "x^{2^3}", "x^", "{x", "a}", "a & b", "", "  "],
+    )
+    def test_unsupported(self, latex):
+        """测试不支持或不合法的语法交给远程渲染"""
+        with pytest.raises(UnsupportedLatexError):
+            parse_latex(latex)
+
+
+class TestRenderLatexSvg:
+    """测试 SVG 输出"""
+
+    def test_valid_svg(self):
+        """测试输出可解析，上标使用较小字号并上移"""
+        svg = render_latex_svg("x^2 < 4", font_size=20)
+        root = ET.fromstring(svg)
+
+        assert root.tag == f"{SVG_NS}svg"
+        assert int(root.get("width")) > 0 and int(root.get("height")) > 20
+        spans = root.findall(f"{SVG_NS}text/{SVG_NS}tspan")
+        assert spans[0].text == "x" and spans[0].get("font-style") == "italic"
+        assert spans[1].get("font-size") == "14" and float(spans[1].get("dy")) < 0
+        # 回到基线，并正确转义 <
+        assert float(spans[2].get("dy")) == -float(spans[1].get("dy"))
+        assert "&lt;" in svg
+
+    def test_width_grows_with_content(self):
+        """测试宽度随内容增长，块级字号更大"""
+        short = ET.fromstring(render_latex_svg("x"))
+        long = ET.fromstring(render_latex_svg("x + y + z = 1"))
+        large = ET.fromstring(render_latex_svg("x", font_size=40))
+
+        assert int(long.get("width")) > int(short.get("width"))
+        assert int(large.get("height")) > int(short.get("height"))
+
+
+class TestRenderLatexMathml:
+    """测试 MathML 输出"""
+
+    def test_structure(self):
+        """测试上下标合并为 msubsup，相邻数字合并为一个 mn"""
+        root = ET.fromstring(render_latex_mathml("x_1^2 - 3.14 = 0"))
+
+        assert root.tag == f"{MATHML_NS}math" and root.get("display") == "inline"
+        msubsup = root.find(f"{MATHML_NS}mrow/{MATHML_NS}msubsup")
+        assert [child.text for child in msubsup] == ["x", "1", "2"]
+        numbers = [el.text for el in root.iter(f"{MATHML_NS}mn")]
+        assert numbers == ["1", "2", "3.14", "0"]
+
+    def test_block_text_and_escaping(self):
+        """测试块级公式、文本命令和 alttext 转义"""
+        markup = render_latex_mathml(r"\text{面积} > \Delta", display=True)
+        root = ET.fromstring(markup)
+
+        assert root.get("display") == "block"
+        assert root.get("alttext") == r"\text{面积} > \Delta"
+        assert root.find(f".//{MATHML_NS}mtext").text == "面积"
+        assert root.find(f".//{MATHML_NS}mi").get("mathvariant") == "normal"
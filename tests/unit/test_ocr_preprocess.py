@@ -0,0 +1,174 @@
+"""
+OCR 图像预处理进程池单元测试
+
+测试覆盖：
+- 图片数据和图片路径的预处理结果一致
+- 进程池执行，进程池崩溃时降级为线程池
+- 预处理期间事件循环保持响应
+- 多页批量识别，单页失败不影响其他页
+"""
+
+import asyncio
+import time
+from concurrent.futures.process import BrokenProcessPool
+
+import cv2
+import numpy as np
+import pytest
+
+from src.core.exceptions import AIServiceError
+from src.utils.ocr import (
+    AliCloudOCRService,
+    OCRPreprocessPool,
+    OCRType,
+    preprocess_image,
+)
+
+
+def _page_bytes(width=1600, height=1200, seed=0):
+    """生成一页带噪点和文字的作业照片"""
+    rng = np.random.default_rng(seed)
+    image = rng.integers(180, 255, (height, width, 3), dtype=np.uint8)
+    cv2.putText(image, "x^2 - 5x + 6 = 0", (50, 200), 0, 3, (20, 20, 20), 5)
+    return cv2.imencode(".jpg", image)[1].tobytes()
+
+
+class BrokenExecutor:
+    """模拟子进程崩溃后的进程池"""
+
+    def submit(self, *args, **kwargs):
+        raise BrokenProcessPool("worker died")
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        pass
+
+
+class TestPreprocessImage:
+    """测试预处理函数"""
+
+    def test_bytes_match_path(self, tmp_path):
+        """测试内存数据与磁盘文件的预处理结果一致"""
+        data = _page_bytes(width=3000, height=1000)
+        path = tmp_path / "page.jpg"
+        path.write_bytes(data)
+
+        from_bytes = preprocess_image(data)
+        from_path = preprocess_image(str(path))
+
+        assert from_bytes == from_path
+        info = from_bytes[1]
+        assert info["original_size"] == len(data)
+        assert (info["processed_width"], info["processed_height"]) == (2048, 682)
+
+    def test_invalid_image(self):
+        """测试无法解码的数据抛出 ValueError"""
+        with pytest.raises(ValueError):
+            preprocess_image(b"not an image")
+
+
+class TestOCRPreprocessPool:
+    """测试预处理进程池"""
+
+    async def test_process_pool_result(self):
+        """测试在子进程中执行，结果与直接调用一致"""
+        pool = OCRPreprocessPool(max_workers=2, use_processes=True)
+        data = _page_bytes()
+        try:
+            result = await pool.run(data)
+        finally:
+            pool.shutdown()
+
+        assert result == preprocess_image(data)
+
+    async def test_broken_pool_falls_back_to_threads(self):
+        """测试进程池崩溃后降级为线程池并重试"""
+        pool = OCRPreprocessPool(max_workers=2, use_processes=True)
+        pool._executor = BrokenExecutor()
+        pool.mode = "process"
+
+        base64_image, _ = await pool.run(_page_bytes())
+
+        assert base64_image and pool.mode == "thread"
+        pool.shutdown()
+
+    async def test_thread_pool_errors_propagate(self):
+        """测试读图失败直接抛出，不触发降级"""
+        pool = OCRPreprocessPool(max_workers=1, use_processes=False)
+
+        with pytest.raises(ValueError):
+            await pool.run(b"broken")
+
+        assert pool.mode == "thread"
+        pool.shutdown()
+
+    async def test_event_loop_stays_responsive(self):
+        """测试批量预处理期间事件循环心跳不被阻塞"""
+        pool = OCRPreprocessPool(max_workers=2, use_processes=True)
+        pages = [_page_bytes(seed=i) for i in range(4)]
+        await asyncio.gather(pool.run(pages[0]), pool.run(pages[1]))  # 启动子进程
+
+        gaps = []
+
+        async def heartbeat(stop):
+            last = time.perf_counter()
+            while not stop.is_set():
+                await asyncio.sleep(0.005)
+                now = time.perf_counter()
+                gaps.append(now - last)
+                last = now
+
+        started = time.perf_counter()
+        for page in pages:
+            preprocess_image(page)
+        inline_seconds = time.perf_counter() - started
+
+        stop = asyncio.Event()
+        beat = asyncio.create_task(heartbeat(stop))
+        try:
+            await asyncio.gather(*(pool.run(page) for page in pages))
+        finally:
+            stop.set()
+            await beat
+            pool.shutdown()
+
+        # 直接调用时事件循环会整体阻塞 inline_seconds
+        assert max(gaps) < max(inline_seconds / 4, 0.05)
+
+
+class TestRecognizeBatch:
+    """测试多页批量识别"""
+
+    @pytest.fixture
+    def ocr_service(self, monkeypatch):
+        service = AliCloudOCRService(access_key_id="id", access_key_secret="secret")
+        service.preprocess_pool = OCRPreprocessPool(max_workers=2, use_processes=False)
+        actions = []
+
+        async def fake_call(action, image_data, additional_params=None):
+            actions.append(action)
+            return {
+                "Data": {"Content": [{"Text": f"第{len(actions)}行", "Confidence": 90}]}
+            }
+
+        monkeypatch.setattr(service, "_call_ocr_api", fake_call)
+        service.actions = actions
+        yield service
+        service.preprocess_pool.shutdown()
+
+    async def test_pages_in_order(self, ocr_service):
+        """测试结果与页序一致，失败的页为 None"""
+        pages = [_page_bytes(seed=1), b"broken", _page_bytes(seed=2)]
+
+        results = await ocr_service.recognize_batch(pages, OCRType.HANDWRITTEN)
+
+        assert results[1] is None
+        assert results[0].text and results[2].text
+        assert results[0].confidence == pytest.approx(0.9)
+        assert ocr_service.actions == ["RecognizeHandwriting"] * 2
+
+    async def test_all_pages_failed(self, ocr_service):
+        """测试所有页都失败时抛出异常"""
+        with pytest.raises(AIServiceError):
+            await ocr_service.recognize_batch([b"broken", b"also broken"])
+
+        assert await ocr_service.recognize_batch([]) == []
@@ -0,0 +1,154 @@
+"""
+OSS 执行器单元测试
+
+测试覆盖：
+- 并发上传期间事件循环保持响应
+- 排队已满时拒绝并计入统计
+- 大文件分片上传，失败时取消分片
+"""
+
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from src.utils import file_upload
+from src.utils.file_upload import AliCloudOSSStorage
+from src.utils.oss_executor import OSSExecutor, OSSExecutorBusyError, put_object
+
+UPLOAD_LATENCY = 0.2
+
+
+class FakeBucket:
+    """模拟同步的 oss2.Bucket，每次请求阻塞当前线程"""
+
+    def __init__(self, latency=UPLOAD_LATENCY, fail_part=None):
+        self.latency = latency
+        self.fail_part = fail_part
+        self.calls = []
+
+    def put_object(self, key, data, headers=None):
+        time.sleep(self.latency)
+        self.calls.append(("put_object", key, len(data)))
+        return SimpleNamespace(status=200)
+
+    def init_multipart_upload(self, key, headers=None):
+        self.calls.append(("init", key))
+        return SimpleNamespace(upload_id="upload-1")
+
+    def upload_part(self, key, upload_id, number, data):
+        if number == self.fail_part:
+            raise ConnectionError("part failed")
+        self.calls.append(("part", number, len(data)))
+        return SimpleNamespace(etag=f"etag-{number}")
+
+    def complete_multipart_upload(self, key, upload_id, parts):
+        self.calls.append(("complete", [p.part_number for p in parts]))
+        return SimpleNamespace(status=200)
+
+    def abort_multipart_upload(self, key, upload_id):
+        self.calls.append(("abort", upload_id))
+
+
+class TestOSSExecutor:
+    """测试 OSS 执行器"""
+
+    async def test_event_loop_stays_responsive(self, monkeypatch):
+        """测试多个并发上传期间事件循环心跳不被阻塞"""
+        executor = OSSExecutor(max_workers=4, max_queue=4)
+        monkeypatch.setattr(file_upload, "oss_executor", executor)
+        storage = AliCloudOSSStorage()
+        storage.bucket = FakeBucket()
+
+        gaps = []
+
+        async def heartbeat(stop):
+            last = time.perf_counter()
+            while not stop.is_set():
+                await asyncio.sleep(0.01)
+                now = time.perf_counter()
+                gaps.append(now - last)
+                last = now
+
+        stop = asyncio.Event()
+        beat = asyncio.create_task(heartbeat(stop))
+        started = time.perf_counter()
+        urls = await asyncio.gather(
+            *(
+                storage.upload_file(b"x" * 1024, f"homework/{i}.jpg", "image/jpeg")
+                for i in range(4)
+            )
+        )
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await beat
+
+        assert len(urls) == 4
+        # 4 个上传并行执行，且期间心跳间隔远小于单次上传耗时
+        assert elapsed < UPLOAD_LATENCY * 2
+        assert max(gaps) < UPLOAD_LATENCY / 2
+        stats = executor.get_stats()
+        assert stats["calls"] == 4 and stats["queue_depth"] == 0
+        assert stats["duration_p50_ms"] >= UPLOAD_LATENCY * 1000 * 0.9
+        executor.shutdown()
+
+    async def test_rejects_when_queue_full(self):
+        """测试线程和排队都已占满时立即拒绝"""
+        executor = OSSExecutor(max_workers=1, max_queue=1)
+        release = threading.Event()
+
+        running = asyncio.create_task(executor.run(release.wait))
+        queued = asyncio.create_task(executor.run(release.wait))
+        await asyncio.sleep(0.05)
+
+        assert executor.get_stats()["queue_depth"] == 1
+        with pytest.raises(OSSExecutorBusyError):
+            await executor.run(release.wait)
+
+        release.set()
+        await asyncio.gather(running, queued)
+        stats = executor.get_stats()
+        assert stats["rejected"] == 1 and stats["calls"] == 2
+        executor.shutdown()
+
+
+class TestMultipartUpload:
+    """测试分片上传"""
+
+    def test_small_file_single_request(self):
+        """测试小文件直接 put_object"""
+        bucket = FakeBucket(latency=0)
+
+        put_object(bucket, "a.jpg", b"x" * 100, multipart_threshold=1000)
+
+        assert bucket.calls == [("put_object", "a.jpg", 100)]
+
+    def test_large_file_multipart(self):
+        """测试大文件按分片上传"""
+        bucket = FakeBucket(latency=0)
+
+        result = put_object(
+            bucket, "a.jpg", b"x" * 2500, multipart_threshold=1000, part_size=1000
+        )
+
+        assert result.status == 200
+        assert bucket.calls == [
+            ("init", "a.jpg"),
+            ("part", 1, 1000),
+            ("part", 2, 1000),
+            ("part", 3, 500),
+            ("complete", [1, 2, 3]),
+        ]
+
+    def test_failed_part_aborts_upload(self):
+        """测试分片失败时取消上传并抛出异常"""
+        bucket = FakeBucket(latency=0, fail_part=2)
+
+        with pytest.raises(ConnectionError):
+            put_object(
+                bucket, "a.jpg", b"x" * 2500, multipart_threshold=1000, part_size=1000
+            )
+
+        assert bucket.calls[-1] == ("abort", "upload-1")
@@ -0,0 +1,273 @@
+"""
+视觉模型图片优化单元测试
+
+测试覆盖：
+- 缩放规则与 qwen-vl 一致，token 估算
+- EXIF 旋转、灰度、透明背景合成白底、已经足够小的图片不处理
+- 优化版本缓存、复用 OSS 上已有版本、失败和超时使用原图
+- 首字前的短预算只复用已有版本
+"""
+
+import asyncio
+import time
+from io import BytesIO
+from types import SimpleNamespace
+
+import pytest
+from PIL import Image
+
+from src.services import vision_image_service
+from src.services.vision_image_service import (
+    QA_PROFILE,
+    TEXT_PROFILE,
+    VisionImageOptimizer,
+)
+from src.utils.vision_image import (
+    DEFAULT_MAX_PIXELS,
+    PATCH_SIZE,
+    VisionImageProfile,
+    estimate_vision_tokens,
+    optimize_image_bytes,
+    smart_resize,
+)
+
+BUCKET_HOST = "https://wuhao.oss-cn-hangzhou.aliyuncs.com"
+ORIGINAL_KEY = "ai_analysis/abcd1234/20251128_photo.jpg"
+
+
+def _jpeg(width, height, exif_orientation=None):
+    image = Image.effect_noise((width, height), 64).convert("RGB")
+    buffer = BytesIO()
+    if exif_orientation:
+        exif = Image.Exif()
+        exif[0x0112] = exif_orientation
+        image.save(buffer, "JPEG", quality=95, exif=exif)
+    else:
+        image.save(buffer, "JPEG", quality=95)
+    return buffer.getvalue()
+
+
+class TestSmartResize:
+    """测试缩放规则"""
+
+    def test_large_image_fits_budget(self):
+        """测试大图缩小到像素上限以内，边长为 28 的倍数"""
+        width, height = smart_resize(4000, 3000)
+
+        assert width % PATCH_SIZE == 0 and height % PATCH_SIZE == 0
+        assert width * height <= DEFAULT_MAX_PIXELS
+        assert abs(width / height - 4 / 3) < 0.05
+        assert estimate_vision_tokens(4000, 3000) == width * height // 784 + 2
+
+    def test_small_image_kept(self):
+        """测试小图只对齐到 28 的倍数"""
+        assert smart_resize(560, 420) == (560, 420)
+        assert estimate_vision_tokens(560, 420) == 20 * 15 + 2
+
+    def test_lower_budget_fewer_tokens(self):
+        """测试降低像素上限时 token 数随之减少"""
+        assert estimate_vision_tokens(4000, 3000, 640 * 784) < estimate_vision_tokens(
+            4000, 3000
+        )
+
+
+class TestOptimizeImageBytes:
+    """测试图片规格化"""
+
+    def test_downscale_and_reencode(self):
+        """测试大图缩放并重新编码为 WebP"""
+        data = _jpeg(2400, 1800)
+
+        optimized, info = optimize_image_bytes(data, VisionImageProfile(name="qa"))
+
+        image = Image.open(BytesIO(optimized))
+        assert image.format == "WEBP"
+        assert image.size == smart_resize(2400, 1800)
+        assert info["bytes"] < info["original_bytes"]
+        assert (info["original_width"], info["original_height"]) == (2400, 1800)
+
+    def test_exif_orientation(self):
+        """测试按 EXIF 方向旋转后再计算目标尺寸"""
+        data = _jpeg(2400, 1800, exif_orientation=6)
+
+        optimized, info = optimize_image_bytes(
+            data, VisionImageProfile(name="qa", format="jpeg")
+        )
+
+        image = Image.open(BytesIO(optimized))
+        assert image.size == smart_resize(1800, 2400)
+        assert image.height > image.width
+        assert info["original_width"] == 1800
+
+    def test_grayscale(self):
+        """测试作业批改规格输出灰度图"""
+        optimized, _ = optimize_image_bytes(
+            _jpeg(2400, 1800),
+            VisionImageProfile(name="text", grayscale=True, format="jpeg"),
+        )
+
+        assert Image.open(BytesIO(optimized)).mode == "L"
+
+    @pytest.mark.parametrize("mode", ["RGBA", "LA", "P"])
+    def test_transparent_background_becomes_white(self, mode):
+        """测试透明背景上的黑色笔迹合成到白底后仍可辨认"""
+        image = Image.new("RGBA", (1600, 1200), (0, 0, 0, 0))
+        for x in range(100, 1500, 200):
+            image.paste((0, 0, 0, 255), (x, 100, x + 20, 1100))
+        if mode == "P":
+            image = image.convert("P", palette=Image.Palette.ADAPTIVE)
+            image.info["transparency"] = image.getpixel((0, 0))
+        else:
+            image = image.convert(mode)
+        buffer = BytesIO()
+        image.save(buffer, "PNG")
+
+        for profile in (QA_PROFILE, TEXT_PROFILE):
+            optimized, _ = optimize_image_bytes(buffer.getvalue(), profile)
+            result = Image.open(BytesIO(optimized)).convert("L")
+            assert result.getpixel((5, 5)) > 240
+            assert min(result.getdata()) < 30
+
+    def test_small_image_skipped(self):
+        """测试不需要缩放且重新编码收益不大时返回None"""
+        buffer = BytesIO()
+        Image.effect_noise((400, 300), 64).save(buffer, "WEBP", quality=80)
+
+        assert optimize_image_bytes(buffer.getvalue(), QA_PROFILE) is None
+
+
+class FakeBucket:
+    """模拟 oss2.Bucket，记录请求"""
+
+    def __init__(self, objects=None, fail=False, latency=0.0):
+        self.objects = dict(objects or {})
+        self.fail = fail
+        self.latency = latency
+        self.calls = []
+
+    def object_exists(self, key):
+        self.calls.append(("exists", key))
+        return key in self.objects
+
+    def get_object(self, key):
+        time.sleep(self.latency)
+        self.calls.append(("get", key))
+        if self.fail:
+            raise ConnectionError("download failed")
+        return BytesIO(self.objects[key])
+
+    def put_object(self, key, data, headers=None):
+        self.calls.append(("put", key, headers["Content-Type"]))
+        self.objects[key] = data
+        return SimpleNamespace(status=200)
+
+
+def _optimizer(bucket):
+    image_service = SimpleNamespace(bucket=bucket, bucket_name="wuhao")
+    return VisionImageOptimizer(image_service=image_service, cache_size=10)
+
+
+class TestVisionImageOptimizer:
+    """测试优化版本的生成和缓存"""
+
+    @pytest.fixture(autouse=True)
+    def _enabled(self, monkeypatch):
+        monkeypatch.setattr(
+            vision_image_service.settings, "VISION_IMAGE_OPTIMIZE_ENABLED", True
+        )
+
+    async def test_optimize_and_cache(self):
+        """测试首次生成并上传优化版本，之后命中缓存"""
+        url = f"{BUCKET_HOST}/{ORIGINAL_KEY}"
+        bucket = FakeBucket({ORIGINAL_KEY: _jpeg(2400, 1800)})
+        optimizer = _optimizer(bucket)
+
+        first = await optimizer.optimize_urls([url], QA_PROFILE)
+        second = await optimizer.optimize_urls([url], QA_PROFILE)
+
+        variant_key = "ai_analysis/abcd1234/20251128_photo.vl-qa.webp"
+        assert first == second == [f"{BUCKET_HOST}/{variant_key}"]
+        assert ("put", variant_key, "image/webp") in bucket.calls
+        assert len([c for c in bucket.calls if c[0] == "get"]) == 1
+        stats = optimizer.get_stats()
+        assert stats["optimized"] == 1 and stats["hits"] == 1
+
+    async def test_reuse_existing_variant(self):
+        """测试 OSS 上已有优化版本时不再下载原图"""
+        variant_key = "ai_analysis/abcd1234/20251128_photo.vl-text.webp"
+        bucket = FakeBucket({variant_key: b"webp"})
+        optimizer = _optimizer(bucket)
+
+        result = await optimizer.optimize_urls(
+            [f"{BUCKET_HOST}/{ORIGINAL_KEY}"], TEXT_PROFILE
+        )
+
+        assert result == [f"{BUCKET_HOST}/{variant_key}"]
+        assert bucket.calls == [("exists", variant_key)]
+
+    async def test_foreign_urls_untouched(self):
+        """测试其他域名、带签名参数和已优化的 URL 原样返回"""
+        bucket = FakeBucket()
+        optimizer = _optimizer(bucket)
+        urls = [
+            "https://example.com/a.jpg",
+            f"{BUCKET_HOST}/{ORIGINAL_KEY}?Signature=abc",
+            f"{BUCKET_HOST}/ai_analysis/x.vl-qa.webp",
+        ]
+
+        assert await optimizer.optimize_urls(urls) == urls
+        assert bucket.calls == []
+
+    async def test_failure_falls_back(self):
+        """测试下载失败时使用原图"""
+        url = f"{BUCKET_HOST}/{ORIGINAL_KEY}"
+        optimizer = _optimizer(FakeBucket({ORIGINAL_KEY: b""}, fail=True))
+
+        assert await optimizer.optimize_urls([url]) == [url]
+        assert optimizer.get_stats()["errors"] == 1
+
+    async def test_timeout_uses_original_and_finishes_in_background(self):
+        """测试超出时间预算时先用原图，后台完成后下次使用优化版本"""
+        url = f"{BUCKET_HOST}/{ORIGINAL_KEY}"
+        bucket = FakeBucket({ORIGINAL_KEY: _jpeg(1200, 900)}, latency=0.2)
+        optimizer = _optimizer(bucket)
+
+        assert await optimizer.optimize_urls([url], timeout=0.01) == [url]
+        await asyncio.gather(*optimizer._background)
+
+        result = await optimizer.optimize_urls([url], timeout=0.01)
+        assert result[0].endswith(".vl-qa.webp")
+
+    async def test_prestream_budget_reuses_existing_variants_only(self):
+        """测试首字前的短预算内复用已有版本，新图不等待生成"""
+        new_key = "ai_analysis/abcd1234/20251128_new.jpg"
+        variant_key = "ai_analysis/abcd1234/20251128_photo.vl-qa.webp"
+        bucket = FakeBucket(
+            {variant_key: b"webp", new_key: _jpeg(1200, 900)}, latency=0.5
+        )
+        optimizer = _optimizer(bucket)
+        urls = [f"{BUCKET_HOST}/{ORIGINAL_KEY}", f"{BUCKET_HOST}/{new_key}"]
+
+        started = time.perf_counter()
+        result = await optimizer.optimize_urls(
+            urls, timeout=vision_image_service.settings.VISION_IMAGE_PRESTREAM_TIMEOUT
+        )
+
+        assert time.perf_counter() - started < 0.2
+        assert result == [f"{BUCKET_HOST}/{variant_key}", urls[1]]
+        await asyncio.gather(*optimizer._background)
+        assert (await optimizer.optimize_urls(urls, timeout=0))[1].endswith(
+            "20251128_new.vl-qa.webp"
+        )
+
+    async def test_prepare_uses_uploaded_bytes(self):
+        """测试上传后用已有数据提前生成，不下载原图"""
+        url = f"{BUCKET_HOST}/{ORIGINAL_KEY}"
+        bucket = FakeBucket()
+        optimizer = _optimizer(bucket)
+
+        optimizer.prepare(url, _jpeg(2400, 1800))
+        await asyncio.gather(*optimizer._background)
+
+        assert [c[0] for c in bucket.calls] == ["put"]
+        assert (await optimizer.optimize_urls([url]))[0].endswith(".vl-qa.webp")